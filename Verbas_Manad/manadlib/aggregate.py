@@ -2,11 +2,35 @@ from __future__ import annotations
 
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
-from typing import Dict, Set, Tuple, Optional
+from typing import Dict, Iterator, List, Set, Tuple, Optional
 
+import numpy as np
 import pandas as pd
 
 from .layout import CAB_K300
+from .store import LIMITE_TERCO, store_disponivel, totais_k300
+
+
+BYTES_LOTE = 1024 * 1024
+_FOLGA = 32  # bytes livres em volta do bloco, para ler campos em palavras de 8 bytes
+
+# Campos do K300 lidos de forma vetorizada e a largura máxima (bytes) de cada um.
+# Campo mais largo, ou linha com espaço/controle/não-ASCII, segue pelo laço em Decimal.
+_DT, _COD, _VLR, _IND, _BASE = 5, 6, 7, 8, 10
+_LARGURA = {_DT: 8, _COD: 16, _VLR: 19, _IND: 8, _BASE: 8}
+_MASCARA_U8 = np.array([(1 << (8 * t)) - 1 for t in range(8)] + [(1 << 64) - 1], dtype=np.uint64)
+_ALTOS_U8 = np.array([((1 << 64) - 1) ^ ((1 << (8 * (8 - t))) - 1) for t in range(9)], dtype=np.uint64)
+_ZEROS_U8 = np.uint64(0x3030303030303030)
+_ACIMA_DE_9_U8 = np.uint64(0x4646464646464646)
+_BIT_ALTO_U8 = np.uint64(0x8080808080808080)
+
+# centavos = alto * 2**26 + baixo: cada parte somada em float64 pelo bincount sem perda
+_BITS_BAIXO = 26
+# |centavos| < 10**18 < 2**60, logo |alto| < 2**34: as somas de alto/baixo por célula cabem
+# em int64 até 2**28 linhas; antes disso vão para inteiros Python (_AgregadorK300._dobrar)
+_LINHAS_POR_DOBRA = 1 << 28
+
+_Chave = Tuple[str, str]
 
 
 def _parse_decimal_ptbr(v: str) -> Decimal:
@@ -34,6 +58,415 @@ def _ord_mmAAAA(x: str) -> int:
     return 99999999
 
 
+def _partes_k300(linha: str) -> List[str]:
+    partes = linha.rstrip("\n").split("|")[: len(CAB_K300)]
+    return partes + [""] * (len(CAB_K300) - len(partes))
+
+
+def _lotes_bytes(path_k300: Path, bytes_lote: int) -> Iterator[Tuple[bytearray, int, int]]:
+    """
+    K300.txt em blocos de linhas completas: (buffer, início, fim), com buffer[início:fim]
+    terminando em \\n e ao menos _FOLGA bytes livres antes e depois (leitura em palavras).
+    O buffer é reaproveitado entre os blocos.
+    """
+    buf = bytearray(2 * _FOLGA + bytes_lote)
+    resto = 0
+    with path_k300.open("rb") as f:
+        while True:
+            if 2 * _FOLGA + resto + bytes_lote > len(buf):
+                # linha maior que o bloco: amplia o buffer mantendo o pedaço pendente
+                maior = bytearray(2 * _FOLGA + resto + bytes_lote)
+                maior[_FOLGA:_FOLGA + resto] = buf[_FOLGA:_FOLGA + resto]
+                buf = maior
+            with memoryview(buf) as vista:
+                lidos = f.readinto(vista[_FOLGA + resto:_FOLGA + resto + bytes_lote])
+            fim = _FOLGA + resto + lidos
+            if not lidos:
+                if resto:
+                    buf[fim] = 10
+                    yield buf, _FOLGA, fim + 1
+                return
+            corte = buf.rfind(b"\n", _FOLGA, fim) + 1
+            if not corte:
+                resto += lidos
+                continue
+            yield buf, _FOLGA, corte
+            resto = fim - corte
+            buf[_FOLGA:_FOLGA + resto] = buf[corte:fim]
+
+
+def _codificar(palavras: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """
+    Códigos inteiros de um campo (palavras de 8 bytes por linha) por factorize,
+    na ordem de aparição, e o texto de cada código.
+    """
+    codigos, unicos = pd.factorize(palavras[:, 0])
+    textos = [int(u).to_bytes(8, "little") for u in unicos]
+    for k in range(1, palavras.shape[1]):
+        if not palavras[:, k].any():
+            continue
+        codigos_k, unicos_k = pd.factorize(palavras[:, k])
+        codigos, pares = pd.factorize(codigos.astype(np.int64) * len(unicos_k) + codigos_k)
+        textos = [
+            textos[p // len(unicos_k)] + int(unicos_k[p % len(unicos_k)]).to_bytes(8, "little")
+            for p in pares
+        ]
+    return codigos, [t.rstrip(b"\0").decode("ascii") for t in textos]
+
+
+def _oito_digitos(palavra: np.ndarray) -> np.ndarray:
+    """
+    Valor de 8 dígitos ASCII empacotados em uint64 (little-endian), sem laço por byte.
+    """
+    v = palavra - _ZEROS_U8
+    v = v * np.uint64(10) + (v >> np.uint64(8))
+    v = (
+        (v & np.uint64(0x000000FF000000FF)) * np.uint64(100 + (1000000 << 32))
+        + ((v >> np.uint64(16)) & np.uint64(0x000000FF000000FF)) * np.uint64(1 + (10000 << 32))
+    ) >> np.uint64(32)
+    return v.astype(np.int64)
+
+
+def _palavra_fixa(valores: Set[str]) -> np.ndarray:
+    """
+    Valores de até 8 bytes como a palavra uint64 que _AgregadorK300 lê do campo.
+    """
+    codificados = [v.encode("utf-8") for v in valores]
+    return np.array([int.from_bytes(v, "little") for v in codificados if len(v) <= 8], dtype=np.uint64)
+
+
+def _centavos_vetorizado(
+    byte: np.ndarray, palavra: np.ndarray, fim: np.ndarray, tam: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    VLR_RUBR que termina em `fim` (posição no buffer) em centavos int64, e a máscara
+    dos valores lidos exatamente: vazio ou [+-] + dígitos + vírgula + 2 decimais, com
+    até 16 bytes antes da vírgula. Os demais (pontos de milhar, expoente, texto...)
+    ficam para o _parse_decimal_ptbr.
+    """
+    antes = tam - 3  # bytes antes da vírgula, sinal incluso
+    casou = (
+        (antes >= 0)
+        & (antes <= 16)
+        & (byte[fim - 3] == 44)
+        & ((byte[fim - 2] - 48) < 10)
+        & ((byte[fim - 1] - 48) < 10)
+    )
+    inicial = byte[fim - 3 - np.clip(antes, 1, 16)]
+    sinal = casou & (antes >= 1) & ((inicial == 45) | (inicial == 43))
+
+    # os 16 bytes antes da vírgula em duas palavras; o que não é do campo, e o sinal, vira "0"
+    palavras = []
+    for desloc, cheios in ((19, np.clip(antes - 8, 0, 8)), (11, np.clip(antes, 0, 8))):
+        w = palavra[fim - desloc]
+        w = (w & _ALTOS_U8[cheios]) | (_ZEROS_U8 & ~_ALTOS_U8[cheios])
+        com_sinal = sinal & ((antes > 8) if desloc == 19 else (antes <= 8))
+        bits = np.uint64(8) * ((16 - antes) % 8).astype(np.uint64)
+        w = np.where(com_sinal, (w & ~(np.uint64(0xFF) << bits)) | (np.uint64(0x30) << bits), w)
+        casou &= (((w - _ZEROS_U8) | (w + _ACIMA_DE_9_U8) | w) & _BIT_ALTO_U8) == 0
+        palavras.append(w)
+
+    parte_inteira = _oito_digitos(palavras[0]) * 100_000_000 + _oito_digitos(palavras[1])
+    fracao = (byte[fim - 2].astype(np.int64) - 48) * 10 + (byte[fim - 1].astype(np.int64) - 48)
+    valor = parte_inteira * 100 + fracao
+    centavos = np.where(casou, np.where(sinal & (inicial == 45), -valor, valor), 0)
+    return centavos, casou | (tam == 0)
+
+
+class _AgregadorK300:
+    """
+    Soma por (DT_COMP, COD_RUBR) em centavos int64, bloco a bloco, com o mesmo
+    filtro e a mesma regra do 1/3 de férias do laço em Decimal.
+
+    DT_COMP e COD_RUBR viram ids globais (na ordem de aparição) e os acumuladores
+    são matrizes competência x rubrica somadas com bincount.
+    """
+
+    def __init__(
+        self,
+        selected_codigos: Set[str],
+        allowed_ind_rubr: Set[str],
+        allowed_ind_base_ps: Set[str],
+        terco: Set[str],
+        sample_size: int,
+    ) -> None:
+        self.selected_codigos = selected_codigos
+        self.allowed_ind_rubr = allowed_ind_rubr
+        self.allowed_ind_base_ps = allowed_ind_base_ps
+        self.terco = terco
+        self.sample_size = sample_size
+        self._ind_palavras = _palavra_fixa(allowed_ind_rubr)
+        self._base_palavras = _palavra_fixa(allowed_ind_base_ps)
+
+        self.ids_comp: Dict[str, int] = {}
+        self.ids_rubr: Dict[str, int] = {}
+        self.alto = np.zeros((0, 0), dtype=np.int64)
+        self.baixo = np.zeros((0, 0), dtype=np.int64)
+        self.dobrados: Dict[Tuple[int, int], int] = {}
+        self.linhas_vetor = 0
+        self.qtd = np.zeros((0, 0), dtype=np.int64)
+        self.primeira = np.zeros((0, 0), dtype=np.int64)
+        self.decimais: Dict[Tuple[int, int], Decimal] = {}
+        self.amostra: List[List[str]] = []
+        self.linhas_lidas = 0
+
+    # ---------- acumuladores ----------
+    @staticmethod
+    def _ids(mapa: Dict[str, int], textos: List[str]) -> np.ndarray:
+        return np.array([mapa.setdefault(t, len(mapa)) for t in textos], dtype=np.int64)
+
+    def _ajustar(self) -> None:
+        forma = (len(self.ids_comp), len(self.ids_rubr))
+        if forma == self.qtd.shape:
+            return
+        extra = ((0, forma[0] - self.qtd.shape[0]), (0, forma[1] - self.qtd.shape[1]))
+        self.alto = np.pad(self.alto, extra)
+        self.baixo = np.pad(self.baixo, extra)
+        self.qtd = np.pad(self.qtd, extra)
+        self.primeira = np.pad(self.primeira, extra, constant_values=np.iinfo(np.int64).max)
+
+    def _dobrar(self) -> None:
+        # passa alto/baixo acumulados para inteiros Python e zera as matrizes
+        rubrs = self.qtd.shape[1]
+        celulas = np.flatnonzero(self.alto.ravel() | self.baixo.ravel())
+        for celula, alto, baixo in zip(
+            celulas.tolist(), self.alto.ravel()[celulas].tolist(), self.baixo.ravel()[celulas].tolist()
+        ):
+            chave = divmod(celula, rubrs)
+            self.dobrados[chave] = self.dobrados.get(chave, 0) + (alto << _BITS_BAIXO) + baixo
+        self.alto[:] = 0
+        self.baixo[:] = 0
+        self.linhas_vetor = 0
+
+    def _somar(self, comp: np.ndarray, rubr: np.ndarray, centavos: np.ndarray, linhas: np.ndarray) -> None:
+        self._ajustar()
+        if not len(comp):
+            return
+        # células do bloco codificadas na ordem de aparição (linhas vêm em ordem crescente)
+        if self.linhas_vetor + len(comp) > _LINHAS_POR_DOBRA:
+            self._dobrar()
+        self.linhas_vetor += len(comp)
+        codigos, celulas = pd.factorize(comp * self.qtd.shape[1] + rubr)
+        primeiras = linhas[np.flatnonzero(np.diff(np.maximum.accumulate(codigos), prepend=-1) > 0)]
+        alto = centavos >> _BITS_BAIXO
+        baixo = centavos - (alto << _BITS_BAIXO)
+        if int(np.abs(alto).sum()) < 1 << 53:
+            soma_alto = np.rint(np.bincount(codigos, weights=alto, minlength=len(celulas))).astype(np.int64)
+        else:
+            # bloco grande demais para somar alto em float64 sem perda
+            soma_alto = np.zeros(len(celulas), dtype=np.int64)
+            np.add.at(soma_alto, codigos, alto)
+        soma_baixo = np.rint(np.bincount(codigos, weights=baixo, minlength=len(celulas))).astype(np.int64)
+
+        self.alto.ravel()[celulas] += soma_alto
+        self.baixo.ravel()[celulas] += soma_baixo
+        self.qtd.ravel()[celulas] += np.bincount(codigos, minlength=len(celulas))
+        primeira = self.primeira.ravel()
+        primeira[celulas] = np.minimum(primeira[celulas], primeiras + self.linhas_lidas)
+
+    # ---------- linha a linha (Decimal) ----------
+    def _chave_linha(self, partes: List[str]) -> Optional[_Chave]:
+        dt_comp = (partes[_DT] or "").strip()
+        cod_rubr = (partes[_COD] or "").strip()
+        ind_rubr = (partes[_IND] or "").strip()
+        ind_base_ps = (partes[_BASE] or "").strip()
+
+        if cod_rubr not in self.selected_codigos:
+            return None
+        if self.allowed_ind_rubr and ind_rubr not in self.allowed_ind_rubr:
+            return None
+        if self.allowed_ind_base_ps and ind_base_ps not in self.allowed_ind_base_ps:
+            return None
+        if cod_rubr in self.terco and _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
+            return None
+        return dt_comp, cod_rubr
+
+    def _linhas_texto(self, linhas: Dict[int, str]) -> List[int]:
+        """
+        Soma pelo laço em Decimal as linhas {nº da linha no bloco: texto}; devolve as aceitas.
+        """
+        aceitas, comp, rubr = [], [], []
+        for i, linha in linhas.items():
+            partes = _partes_k300(linha)
+            key = self._chave_linha(partes)
+            if key is None:
+                continue
+            c = self.ids_comp.setdefault(key[0], len(self.ids_comp))
+            r = self.ids_rubr.setdefault(key[1], len(self.ids_rubr))
+            self.decimais[(c, r)] = self.decimais.get((c, r), Decimal("0")) + _parse_decimal_ptbr(partes[_VLR])
+            aceitas.append(i)
+            comp.append(c)
+            rubr.append(r)
+        vazio = np.zeros(len(aceitas), dtype=np.int64)
+        self._somar(np.array(comp, dtype=np.int64), np.array(rubr, dtype=np.int64), vazio, np.array(aceitas, dtype=np.int64))
+        return aceitas
+
+    # ---------- vetorizado ----------
+    def bloco(self, buf: bytearray, inicio: int, fim: int) -> None:
+        if buf.find(b"\r", inicio, fim) >= 0:
+            # \r isolado também quebra linha na leitura em modo texto: bloco todo pelo laço
+            texto = buf[inicio:fim].decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+            linhas = texto.split("\n")[:-1]
+            aceitas = self._linhas_texto(dict(enumerate(linhas)))
+            for i in aceitas[: max(self.sample_size - len(self.amostra), 0)]:
+                self.amostra.append(_partes_k300(linhas[i]))
+            self.linhas_lidas += len(linhas)
+            return
+
+        byte = np.frombuffer(buf, dtype=np.uint8)
+        arr = byte[inicio:fim]
+        # palavra[p] = 8 bytes a partir da posição p do buffer (leitura desalinhada)
+        palavra = np.ndarray((len(buf) - 7,), dtype="<u8", buffer=buf, strides=(1,))
+        separadores = np.flatnonzero((arr == 124) | (arr == 10))
+        quebra = arr[separadores] == 10
+        fins = separadores[quebra]
+        inicios = np.concatenate(([0], fins[:-1] + 1))
+        n = len(fins)
+
+        def texto_linha(i: int) -> str:
+            return buf[inicio + inicios[i]:inicio + fins[i]].decode("utf-8", errors="ignore")
+
+        # linhas com byte fora de 0x21..0x7e (strip, controle, não-ASCII) vão pelo laço
+        irregular = np.zeros(n, dtype=bool)
+        if np.count_nonzero(arr < 33) + np.count_nonzero(arr > 126) > n:
+            especiais = np.flatnonzero((arr < 33) | (arr > 126))
+            especiais = especiais[arr[especiais] != 10]
+            irregular[np.searchsorted(fins, especiais)] = True
+
+        # fim_campo[:, k] = posição do separador que fecha o campo k (ou o \n)
+        if len(separadores) == n * len(CAB_K300) and quebra[len(CAB_K300) - 1:: len(CAB_K300)].all():
+            fim_campo = separadores.reshape(n, len(CAB_K300))
+        else:
+            pipes = separadores[~quebra]
+            pipes_ext = np.append(pipes, len(arr))
+            primeiro = np.searchsorted(pipes, inicios)
+            qtd_pipes = np.searchsorted(pipes, fins) - primeiro
+            fim_campo = np.empty((n, len(CAB_K300)), dtype=np.int64)
+            for k in range(len(CAB_K300)):
+                fim_campo[:, k] = np.where(
+                    qtd_pipes > k, pipes_ext[np.minimum(primeiro + k, len(pipes))], fins
+                )
+
+        def campo(k: int, linhas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # palavras de 8 bytes do campo (zeradas após o fim) e seu tamanho
+            fim_k = fim_campo[linhas, k]
+            ini_k = np.minimum(fim_campo[linhas, k - 1] + 1, fim_k)
+            tam = fim_k - ini_k
+            palavras = np.empty((len(linhas), _LARGURA[k] // 8), dtype=np.uint64)
+            for w in range(palavras.shape[1]):
+                palavras[:, w] = palavra[inicio + ini_k + 8 * w] & _MASCARA_U8[np.clip(tam - 8 * w, 0, 8)]
+            return palavras, tam
+
+        def aceitos(codigos: np.ndarray, textos: List[str], permitidos: Set[str]) -> np.ndarray:
+            return np.array([t in permitidos for t in textos], dtype=bool)[codigos]
+
+        linhas = np.flatnonzero(~irregular)
+        palavras, tam = campo(_COD, linhas)
+        longo = tam > _LARGURA[_COD]
+        cod_codes, cods = _codificar(palavras)
+        candidata = ~longo & aceitos(cod_codes, cods, self.selected_codigos)
+        pelo_laco = [linhas[longo], np.flatnonzero(irregular)]
+        linhas, cod_codes = linhas[candidata], cod_codes[candidata]
+
+        aceita = np.ones(len(linhas), dtype=bool)
+        longo = np.zeros(len(linhas), dtype=bool)
+        if self.allowed_ind_rubr:
+            palavras, tam = campo(_IND, linhas)
+            longo |= tam > _LARGURA[_IND]
+            aceita &= np.isin(palavras[:, 0], self._ind_palavras)
+        if self.allowed_ind_base_ps:
+            palavras, tam = campo(_BASE, linhas)
+            longo |= tam > _LARGURA[_BASE]
+            aceita &= np.isin(palavras[:, 0], self._base_palavras)
+
+        palavras, tam = campo(_DT, linhas)
+        longo |= tam > _LARGURA[_DT]
+        comp_codes, comps = _codificar(palavras)
+        if self.terco:
+            # ✅ regra 1/3 férias: DT_COMP > 08/2020 (ou inválido) sai das rubricas marcadas
+            fora = np.array([_ord_mmAAAA(c) > LIMITE_TERCO for c in comps], dtype=bool)
+            aceita &= ~(aceitos(cod_codes, cods, self.terco) & fora[comp_codes])
+
+        fim_v = fim_campo[linhas, _VLR]
+        tam = fim_v - np.minimum(fim_campo[linhas, _VLR - 1] + 1, fim_v)
+        longo |= tam > _LARGURA[_VLR]
+        centavos, exato = _centavos_vetorizado(byte, palavra, inicio + fim_v, tam)
+        laco = longo | ~exato
+        pelo_laco.append(linhas[laco])
+        vetor = aceita & ~laco
+
+        self._somar(
+            self._ids(self.ids_comp, comps)[comp_codes[vetor]],
+            self._ids(self.ids_rubr, cods)[cod_codes[vetor]],
+            centavos[vetor],
+            linhas[vetor],
+        )
+        aceitas = self._linhas_texto(
+            {
+                int(i): texto_linha(i) for i in np.sort(np.concatenate(pelo_laco))
+            }
+        )
+
+        falta = self.sample_size - len(self.amostra)
+        if falta > 0:
+            escolhidas = np.sort(np.concatenate((linhas[vetor], np.array(aceitas, dtype=np.int64))))
+            for i in escolhidas[:falta]:
+                self.amostra.append(_partes_k300(texto_linha(i)))
+        self.linhas_lidas += len(fins)
+
+    def totais(self) -> Dict[_Chave, Tuple[Decimal, int]]:
+        comps = list(self.ids_comp)
+        rubrs = list(self.ids_rubr)
+        celulas = np.flatnonzero(self.qtd.ravel())
+        celulas = celulas[np.argsort(self.primeira.ravel()[celulas], kind="stable")]
+        totais = {}
+        for celula, alto, baixo, qtd in zip(
+            celulas.tolist(),
+            self.alto.ravel()[celulas].tolist(),
+            self.baixo.ravel()[celulas].tolist(),
+            self.qtd.ravel()[celulas].tolist(),
+        ):
+            c, r = divmod(celula, len(rubrs))
+            centavos = (alto << _BITS_BAIXO) + baixo + self.dobrados.get((c, r), 0)
+            valor = Decimal(centavos).scaleb(-2)
+            if (c, r) in self.decimais:
+                valor += self.decimais[(c, r)]
+            totais[(comps[c], rubrs[r])] = (valor, qtd)
+        return totais
+
+
+def agregar_k300(
+    path_k300: Path,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool = False,
+    rubricas_terco_ferias: Optional[Set[str]] = None,
+    sample_size: int = 0,
+    bytes_lote: int = BYTES_LOTE,
+) -> Tuple[Dict[_Chave, Tuple[Decimal, int]], List[List[str]]]:
+    """
+    Soma exata e quantidade de linhas por (DT_COMP, COD_RUBR) direto do K300.txt,
+    na ordem em que cada par aparece, e as primeiras sample_size linhas filtradas.
+
+    Vetorizado por bloco com NumPy: campos localizados pelos separadores, códigos
+    de DT_COMP/COD_RUBR em inteiros (factorize), filtros e regra do 1/3 de férias
+    resolvidos sobre os valores distintos, e soma em centavos int64 com bincount.
+    O resultado é idêntico ao acumulado em Decimal linha a linha.
+    """
+    terco = set(map(str, rubricas_terco_ferias or set())) if aplicar_regra_terco_ferias else set()
+    agregador = _AgregadorK300(
+        set(map(str, selected_codigos)),
+        set(map(str, allowed_ind_rubr)),
+        set(map(str, allowed_ind_base_ps)),
+        terco,
+        sample_size,
+    )
+    for buf, inicio, fim in _lotes_bytes(path_k300, bytes_lote):
+        agregador.bloco(buf, inicio, fim)
+    return agregador.totais(), agregador.amostra
+
+
 def montar_pivot_dtcomp_por_rubrica(
     path_k300: Path,
     selected_codigos: Set[str],
@@ -42,58 +475,53 @@ def montar_pivot_dtcomp_por_rubrica(
     desc_map: Dict[str, str],
     aplicar_regra_terco_ferias: bool = False,
     rubricas_terco_ferias: Optional[Set[str]] = None,
+    path_store: Optional[Path] = None,
 ) -> pd.DataFrame:
     """
     DT_COMP (MMAAAA) x Rubricas selecionadas (colunas), soma(VLR_RUBR).
     ✅ Agora também aplica modulação do 1/3 de férias até 09/2020 quando ativada.
+    ✅ Com o store do spool (path_store) a soma sai de uma consulta indexada;
+       sem ele, da agregação vetorizada do K300.txt (agregar_k300).
     """
     selected_codigos = set(map(str, selected_codigos))
     allowed_ind_rubr = set(map(str, allowed_ind_rubr))
     allowed_ind_base_ps = set(map(str, allowed_ind_base_ps))
 
     rubricas_terco_ferias = set(map(str, rubricas_terco_ferias or set()))
-    LIMITE_TERCO = 202008  # AAAAMM (09/2020)
-
-    acc: Dict[Tuple[str, str], Decimal] = {}
-
-    with path_k300.open("r", encoding="utf-8", errors="ignore") as f:
-        for linha in f:
-            linha = linha.rstrip("\n")
-            partes = linha.split("|")
 
-            partes = partes[: len(CAB_K300)]
-            if len(partes) < len(CAB_K300):
-                partes += [""] * (len(CAB_K300) - len(partes))
+    if store_disponivel(path_store):
+        totais = totais_k300(
+            path_store, selected_codigos, allowed_ind_rubr, allowed_ind_base_ps,
+            aplicar_regra_terco_ferias, rubricas_terco_ferias,
+        )
+    else:
+        totais, _ = agregar_k300(
+            path_k300, selected_codigos, allowed_ind_rubr, allowed_ind_base_ps,
+            aplicar_regra_terco_ferias, rubricas_terco_ferias,
+        )
+    return pivot_totais_dtcomp(totais, desc_map)
 
-            dt_comp = (partes[5] or "").strip()
-            cod_rubr = (partes[6] or "").strip()
-            vl = (partes[7] or "").strip()
-            ind_rubr = (partes[8] or "").strip()
-            ind_base_ps = (partes[10] or "").strip()
 
-            if not dt_comp:
-                continue
-            if cod_rubr not in selected_codigos:
-                continue
-            if allowed_ind_rubr and ind_rubr not in allowed_ind_rubr:
-                continue
-            if allowed_ind_base_ps and ind_base_ps not in allowed_ind_base_ps:
-                continue
-
-            # ✅ regra 1/3 férias
-            if aplicar_regra_terco_ferias and cod_rubr in rubricas_terco_ferias:
-                if _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
-                    continue
-
-            valor = _parse_decimal_ptbr(vl)
-            key = (dt_comp, cod_rubr)
-            acc[key] = acc.get(key, Decimal("0")) + valor
+def pivot_totais_dtcomp(
+    totais: Dict[Tuple[str, str], Tuple[Decimal, int]],
+    desc_map: Dict[str, str],
+) -> pd.DataFrame:
+    """
+    Monta o pivot DT_COMP x Rubricas a partir dos totais por (DT_COMP, COD_RUBR)
+    de totais_k300/agregar_k300 (também usado no consolidado do lote).
+    """
+    acc = {key: valor for key, (valor, _) in totais.items() if key[0]}
 
     if not acc:
         return pd.DataFrame(columns=["DT_COMP"])
 
-    rows = [{"DT_COMP": dt, "COD_RUBR": cod, "TOTAL": float(total)} for (dt, cod), total in acc.items()]
-    df_long = pd.DataFrame(rows)
+    df_long = pd.DataFrame(
+        {
+            "DT_COMP": [dt for dt, _ in acc],
+            "COD_RUBR": [cod for _, cod in acc],
+            "TOTAL": [float(total) for total in acc.values()],
+        }
+    )
 
     df_pivot = df_long.pivot_table(
         index="DT_COMP",
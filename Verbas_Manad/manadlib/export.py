@@ -1,15 +1,26 @@
 from __future__ import annotations
 
+import heapq
 import io
 import tempfile
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import pandas as pd
 from openpyxl import Workbook
 
 from .layout import CAB_K300, CAB_K050
 from .aggregate import montar_pivot_dtcomp_por_rubrica
+from .store import iterar_k300, store_disponivel
+
+
+# Ordenação externa do K300_FILTRADO (sem store): linhas mantidas em memória por trecho
+LINHAS_POR_TRECHO = 200_000
+
+# (AAAAMM, ordem de aparição do DT_COMP, linha K300)
+_Registro = Tuple[int, int, str]
+_chave_registro = itemgetter(0, 1)
 
 
 def _ord_mmAAAA(x: str) -> int:
@@ -28,6 +39,49 @@ def _write_df_to_sheet(ws, df: pd.DataFrame):
         ws.append(list(row))
 
 
+def _gravar_trecho(trecho: List[_Registro], p: Path) -> Path:
+    trecho.sort(key=_chave_registro)
+    with p.open("w", encoding="utf-8", newline="\n") as out:
+        out.writelines(f"{ordem}|{rank}|{linha}\n" for ordem, rank, linha in trecho)
+    return p
+
+
+def _ler_trecho(p: Path) -> Iterator[_Registro]:
+    with p.open("r", encoding="utf-8", newline="\n") as f:
+        for registro in f:
+            ordem, rank, linha = registro.rstrip("\n").split("|", 2)
+            yield int(ordem), int(rank), linha
+
+
+def _ordenar_externo(registros: Iterator[_Registro], linhas_por_trecho: int = LINHAS_POR_TRECHO) -> Iterator[str]:
+    """
+    Linhas em ordem (AAAAMM, aparição do DT_COMP), estável, com memória limitada:
+    trechos de até linhas_por_trecho registros ordenados em memória; se houver mais
+    de um, cada trecho vai para um arquivo temporário e eles são intercalados (heapq.merge).
+    """
+    trecho: List[_Registro] = []
+    with tempfile.TemporaryDirectory(prefix="k300_ordenacao_") as tmp:
+        pasta = Path(tmp)
+        trechos: List[Path] = []
+        for registro in registros:
+            trecho.append(registro)
+            if len(trecho) >= linhas_por_trecho:
+                trechos.append(_gravar_trecho(trecho, pasta / f"trecho_{len(trechos):05d}.txt"))
+                trecho = []
+
+        if not trechos:
+            trecho.sort(key=_chave_registro)
+            for _, _, linha in trecho:
+                yield linha
+            return
+
+        if trecho:
+            trechos.append(_gravar_trecho(trecho, pasta / f"trecho_{len(trechos):05d}.txt"))
+            trecho = []
+        for _, _, linha in heapq.merge(*(_ler_trecho(p) for p in trechos), key=_chave_registro):
+            yield linha
+
+
 def _write_k300_filtrado_ordenado_com_colunas(
     ws,
     path_k300: Path,
@@ -37,13 +91,17 @@ def _write_k300_filtrado_ordenado_com_colunas(
     colnames_extra_por_cod: Dict[str, str],
     aplicar_regra_terco_ferias: bool,
     rubricas_terco_ferias: Set[str],
+    path_store: Optional[Path] = None,
 ):
     """
     Escreve K300_FILTRADO:
       - Mantém as 11 colunas originais (CAB_K300)
       - Adiciona colunas extras (uma por rubrica selecionada)
       - Ordena cronologicamente por DT_COMP (MMAAAA) usando chave AAAAMM
-      - Usa estratégia em disco (não RAM): separa em arquivos temporários por DT_COMP
+      - Com o store do spool (path_store), lê as linhas já filtradas e ordenadas
+        por consulta indexada; sem ele, ordenação externa em trechos de
+        LINHAS_POR_TRECHO linhas (_ordenar_externo)
+      - Colunas extras gravadas de forma esparsa (só a da rubrica da linha)
     """
     selected_codigos = set(map(str, selected_codigos))
     allowed_ind_rubr = set(map(str, allowed_ind_rubr))
@@ -56,61 +114,40 @@ def _write_k300_filtrado_ordenado_com_colunas(
     header_extra = [colnames_extra_por_cod[c] for c in cods_ordenados]
     ws.append(CAB_K300 + header_extra)
 
-    # cria pasta temp para buckets por competência
-    tmp_root = Path(tempfile.mkdtemp(prefix="k300_buckets_"))
-    buckets: Dict[str, Path] = {}
-
-    def get_bucket(dt_comp: str) -> Path:
-        if dt_comp not in buckets:
-            p = tmp_root / f"{dt_comp}.txt"
-            buckets[dt_comp] = p
-        return buckets[dt_comp]
-
-    # 1) varre K300 e grava linhas filtradas em bucket por DT_COMP
-    with path_k300.open("r", encoding="utf-8", errors="ignore") as f:
-        for linha in f:
-            linha = linha.rstrip("\n")
-            partes = linha.split("|")
-            partes = partes[: len(CAB_K300)]
-            if len(partes) < len(CAB_K300):
-                partes += [""] * (len(CAB_K300) - len(partes))
-
-            dt_comp = (partes[5] or "").strip()
-            cod = (partes[6] or "").strip()
-            ind_r = (partes[8] or "").strip()
-            ind_ps = (partes[10] or "").strip()
-
-            if cod not in selected_codigos:
-                continue
-            if allowed_ind_rubr and ind_r not in allowed_ind_rubr:
-                continue
-            if allowed_ind_base_ps and ind_ps not in allowed_ind_base_ps:
-                continue
-
-            # ✅ regra 1/3 férias
-            if aplicar_regra_terco_ferias and cod in rubricas_terco_ferias:
-                if _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
-                    continue
-
-            if not dt_comp:
-                continue
-
-            p = get_bucket(dt_comp)
-            with p.open("a", encoding="utf-8", newline="\n") as out:
-                out.write("|".join(partes) + "\n")
-
-    # 2) escreve em ordem cronológica DT_COMP (AAAAMM), sem alterar o texto MMAAAA
-    dts = sorted(buckets.keys(), key=_ord_mmAAAA)
-
     # mapa cod->index na área extra
     extra_idx = {cod: i for i, cod in enumerate(cods_ordenados)}
 
-    for dt in dts:
-        p = buckets[dt]
-        if not p.exists():
-            continue
-
-        with p.open("r", encoding="utf-8", errors="ignore") as f:
+    # colunas extras esparsas: só a célula da rubrica da linha é preenchida; as
+    # anteriores vão como None (o write_only não grava célula vazia) e as seguintes nem entram
+    vazios = [[None] * i for i in range(len(cods_ordenados))]
+
+    def escrever_linha(partes):
+        cod = (partes[6] or "").strip()
+        vl = (partes[7] or "").strip()
+
+        i = extra_idx.get(cod)
+        if i is None:
+            ws.append(partes)
+        else:
+            ws.append(partes + vazios[i] + [vl])  # mantém string PT-BR como veio
+
+    if store_disponivel(path_store):
+        for partes in iterar_k300(
+            path_store,
+            selected_codigos,
+            allowed_ind_rubr,
+            allowed_ind_base_ps,
+            aplicar_regra_terco_ferias,
+            rubricas_terco_ferias,
+            cronologico=True,
+        ):
+            escrever_linha(partes)
+        return
+
+    def registros() -> Iterator[_Registro]:
+        # 1) varre K300 e entrega as linhas filtradas com a chave cronológica
+        rank_dt: Dict[str, int] = {}
+        with path_k300.open("r", encoding="utf-8", errors="ignore") as f:
             for linha in f:
                 linha = linha.rstrip("\n")
                 partes = linha.split("|")
@@ -118,14 +155,32 @@ def _write_k300_filtrado_ordenado_com_colunas(
                 if len(partes) < len(CAB_K300):
                     partes += [""] * (len(CAB_K300) - len(partes))
 
+                dt_comp = (partes[5] or "").strip()
                 cod = (partes[6] or "").strip()
-                vl = (partes[7] or "").strip()
+                ind_r = (partes[8] or "").strip()
+                ind_ps = (partes[10] or "").strip()
 
-                extras = [""] * len(cods_ordenados)
-                if cod in extra_idx:
-                    extras[extra_idx[cod]] = vl  # mantém string PT-BR como veio
+                if cod not in selected_codigos:
+                    continue
+                if allowed_ind_rubr and ind_r not in allowed_ind_rubr:
+                    continue
+                if allowed_ind_base_ps and ind_ps not in allowed_ind_base_ps:
+                    continue
+
+                # ✅ regra 1/3 férias
+                if aplicar_regra_terco_ferias and cod in rubricas_terco_ferias:
+                    if _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
+                        continue
+
+                if not dt_comp:
+                    continue
+
+                rank = rank_dt.setdefault(dt_comp, len(rank_dt))
+                yield _ord_mmAAAA(dt_comp), rank, "|".join(partes)
 
-                ws.append(partes + extras)
+    # 2) escreve em ordem cronológica DT_COMP (AAAAMM), sem alterar o texto MMAAAA
+    for linha in _ordenar_externo(registros()):
+        escrever_linha(linha.split("|"))
 
 
 def gerar_excel_interno(
@@ -138,6 +193,7 @@ def gerar_excel_interno(
     df_rubricas: pd.DataFrame,
     aplicar_regra_terco_ferias: bool = False,
     rubricas_terco_ferias: Optional[Set[str]] = None,
+    path_store: Optional[Path] = None,
 ) -> bytes:
     """
     Gera Excel interno (mesmo resultado original + updates de hoje):
@@ -176,6 +232,7 @@ def gerar_excel_interno(
         colnames_extra_por_cod=colnames_extra_por_cod,
         aplicar_regra_terco_ferias=bool(aplicar_regra_terco_ferias),
         rubricas_terco_ferias=rubricas_terco_ferias,
+        path_store=path_store,
     )
 
     # 2) Aba RESUMO_DT_COMP (pivot)
@@ -187,6 +244,7 @@ def gerar_excel_interno(
         desc_map=desc_map,
         aplicar_regra_terco_ferias=bool(aplicar_regra_terco_ferias),
         rubricas_terco_ferias=set(rubricas_terco_ferias or set()),
+        path_store=path_store,
     )
 
     # ✅ aplica regra do 1/3 também no resumo (filtra linhas > 09/2020 só para rubricas_terco_ferias)
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+from openpyxl import Workbook
+
+from .aggregate import agregar_k300, pivot_totais_dtcomp
+from .export import gerar_excel_interno
+from .preview import ler_catalogo_k150
+from .spool import spool_init_state, spool_step
+from .store import store_disponivel, totais_k300
+
+
+EVENTOS_ALVO = {"K150", "K300", "K050"}
+BYTES_PASSO_LOTE = 64_000_000
+EXTENSOES_MANAD = {".txt", ".xlsx"}
+
+COLUNAS_VAZAO = [
+    "ARQUIVO", "STATUS", "MB", "LINHAS K300", "LINHAS FILTRADAS",
+    "SPOOL (s)", "EXCEL (s)", "TOTAL (s)", "MB/s", "SAIDA", "ERRO",
+]
+
+
+def _ord_mmAAAA(x: str) -> int:
+    s = (str(x) or "").strip()
+    if len(s) == 6 and s.isdigit():
+        mm = int(s[:2])
+        aaaa = int(s[2:])
+        if 1 <= mm <= 12:
+            return aaaa * 100 + mm
+    return 99999999
+
+
+def listar_arquivos_manad(entradas: Iterable[Path]) -> List[Path]:
+    """
+    Expande pastas nos arquivos .txt/.xlsx que contêm (sem recursão) e
+    remove repetidos, mantendo a ordem informada.
+    """
+    arquivos: List[Path] = []
+    vistos: Set[Path] = set()
+    for entrada in entradas:
+        entrada = Path(entrada)
+        if entrada.is_dir():
+            candidatos = sorted(p for p in entrada.iterdir() if p.is_file())
+        else:
+            candidatos = [entrada]
+        for p in candidatos:
+            if p.suffix.lower() not in EXTENSOES_MANAD:
+                continue
+            chave = p.resolve()
+            if chave not in vistos:
+                vistos.add(chave)
+                arquivos.append(p)
+    return arquivos
+
+
+def _nomes_saida(arquivos: List[Path]) -> List[str]:
+    """
+    Nome do Excel de cada MANAD; arquivos homônimos de pastas diferentes
+    recebem sufixo _2, _3...
+    """
+    usados: Dict[str, int] = {}
+    nomes = []
+    for p in arquivos:
+        base = p.stem
+        usados[base.lower()] = usados.get(base.lower(), 0) + 1
+        n = usados[base.lower()]
+        nomes.append(f"{base}.xlsx" if n == 1 else f"{base}_{n}.xlsx")
+    return nomes
+
+
+def _spool_arquivo(path: Path, tmp_dir: Path) -> dict:
+    """
+    Executa o spool_step até o fim lendo o arquivo do disco, sem Streamlit.
+    """
+    state = spool_init_state()
+    with path.open("rb") as arquivo:
+        # spool_step espera a interface do UploadedFile (name/size/seek/read).
+        arquivo.size = path.stat().st_size
+        while not state.get("done"):
+            state = spool_step(
+                state=state,
+                uploaded_file=arquivo,
+                tmp_dir=tmp_dir,
+                eventos_alvo=EVENTOS_ALVO,
+                batch_bytes=BYTES_PASSO_LOTE,
+            )
+    if state.get("error"):
+        raise RuntimeError(state["error"])
+    return state
+
+
+def _resultado_vazio(path: Path, erro: str = "") -> dict:
+    return {
+        "arquivo": str(path),
+        "saida": "",
+        "status": "erro",
+        "erro": erro,
+        "bytes": path.stat().st_size if path.exists() else 0,
+        "counts": {},
+        "segundos_spool": 0.0,
+        "segundos_excel": 0.0,
+        "segundos": 0.0,
+        "totais": {},
+        "catalogo": {},
+    }
+
+
+def processar_arquivo_manad(
+    path: Path,
+    path_excel: Path,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool = False,
+    rubricas_terco_ferias: Optional[Set[str]] = None,
+    manter_temporarios: bool = False,
+) -> dict:
+    """
+    Processa um MANAD completo (spool + Excel interno) e devolve um dicionário
+    serializável com a vazão, os totais por (DT_COMP, COD_RUBR) para o
+    consolidado e o catálogo K150. Erros voltam em "erro", sem interromper o lote.
+    """
+    path = Path(path)
+    path_excel = Path(path_excel)
+    inicio = time.perf_counter()
+    resultado = _resultado_vazio(path)
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="manad_lote_"))
+    try:
+        state = _spool_arquivo(path, tmp_dir)
+        resultado["counts"] = dict(state.get("counts") or {})
+        resultado["segundos_spool"] = time.perf_counter() - inicio
+
+        paths = state.get("paths") or {}
+        p_k300 = paths.get("K300")
+        if not p_k300 or not Path(p_k300).exists():
+            raise ValueError("K300 não encontrado no arquivo.")
+        p_k150 = Path(paths["K150"]) if paths.get("K150") and Path(paths["K150"]).exists() else None
+        p_k050 = Path(paths["K050"]) if paths.get("K050") and Path(paths["K050"]).exists() else None
+        path_store = Path(state["k300_store"]) if state.get("k300_store") else None
+
+        if p_k150 is not None:
+            df_rubricas = ler_catalogo_k150(p_k150)
+        else:
+            df_rubricas = pd.DataFrame(columns=["COD_RUBRICA", "DESC_RUBRICA"])
+
+        filtros = (
+            set(map(str, selected_codigos)), set(map(str, allowed_ind_rubr)),
+            set(map(str, allowed_ind_base_ps)), bool(aplicar_regra_terco_ferias),
+            set(map(str, rubricas_terco_ferias or set())),
+        )
+
+        inicio_excel = time.perf_counter()
+        excel_bytes = gerar_excel_interno(
+            path_k300=Path(p_k300),
+            path_k150=p_k150,
+            path_k050=p_k050,
+            selected_codigos=filtros[0],
+            allowed_ind_rubr=filtros[1],
+            allowed_ind_base_ps=filtros[2],
+            df_rubricas=df_rubricas,
+            aplicar_regra_terco_ferias=filtros[3],
+            rubricas_terco_ferias=filtros[4],
+            path_store=path_store,
+        )
+        path_excel.parent.mkdir(parents=True, exist_ok=True)
+        path_excel.write_bytes(excel_bytes)
+        resultado["saida"] = str(path_excel)
+
+        # O pivot do consolidado reaproveita o store já indexado deste arquivo.
+        if store_disponivel(path_store):
+            resultado["totais"] = totais_k300(path_store, *filtros)
+        else:
+            resultado["totais"], _ = agregar_k300(Path(p_k300), *filtros)
+        resultado["segundos_excel"] = time.perf_counter() - inicio_excel
+
+        resultado["catalogo"] = {
+            str(r["COD_RUBRICA"]): str(r["DESC_RUBRICA"])
+            for _, r in df_rubricas.iterrows()
+            if str(r["COD_RUBRICA"]) in filtros[0]
+        }
+        resultado["status"] = "ok"
+    except Exception as erro:
+        resultado["erro"] = f"{type(erro).__name__}: {erro}"
+    finally:
+        if not manter_temporarios:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        resultado["segundos"] = time.perf_counter() - inicio
+
+    return resultado
+
+
+def _df_vazao(resultados: List[dict]) -> pd.DataFrame:
+    rows = []
+    for r in resultados:
+        mb = r["bytes"] / 1_000_000
+        totais = r.get("totais") or {}
+        rows.append(
+            {
+                "ARQUIVO": Path(r["arquivo"]).name,
+                "STATUS": r["status"],
+                "MB": round(mb, 2),
+                "LINHAS K300": int((r.get("counts") or {}).get("K300", 0)),
+                "LINHAS FILTRADAS": int(sum(qtd for _, qtd in totais.values())),
+                "SPOOL (s)": round(r["segundos_spool"], 2),
+                "EXCEL (s)": round(r["segundos_excel"], 2),
+                "TOTAL (s)": round(r["segundos"], 2),
+                "MB/s": round(mb / r["segundos"], 1) if r["segundos"] > 0 else 0.0,
+                "SAIDA": Path(r["saida"]).name if r["saida"] else "",
+                "ERRO": r["erro"],
+            }
+        )
+    return pd.DataFrame(rows, columns=COLUNAS_VAZAO)
+
+
+def _df_resumo_por_arquivo(resultados: List[dict], desc_map: Dict[str, str]) -> pd.DataFrame:
+    """
+    Formato longo ARQUIVO x DT_COMP x COD_RUBR, para filtrar/pivotar no Excel.
+    """
+    rows = []
+    for r in resultados:
+        nome = Path(r["arquivo"]).name
+        for (dt_comp, cod), (valor, qtd) in (r.get("totais") or {}).items():
+            rows.append((nome, dt_comp, cod, desc_map.get(cod, ""), float(valor), int(qtd)))
+    rows.sort(key=lambda x: (x[0], _ord_mmAAAA(x[1]), x[1], x[2]))
+    return pd.DataFrame(rows, columns=["ARQUIVO", "DT_COMP", "COD_RUBR", "DESCRIÇÃO", "TOTAL", "QTD LINHAS"])
+
+
+def gerar_excel_consolidado(resultados: List[dict]) -> bytes:
+    """
+    Excel consolidado do lote:
+      - RESUMO_DT_COMP (DT_COMP x Rubricas, soma de todos os arquivos)
+      - RESUMO_POR_ARQUIVO (ARQUIVO, DT_COMP, COD_RUBR, TOTAL, QTD LINHAS)
+      - VAZAO (tempo e MB/s por arquivo)
+    """
+    desc_map: Dict[str, str] = {}
+    totais: Dict[Tuple[str, str], Tuple[Decimal, int]] = {}
+    for r in resultados:
+        for cod, desc in (r.get("catalogo") or {}).items():
+            if desc and not desc_map.get(cod):
+                desc_map[cod] = desc
+        for key, (valor, qtd) in (r.get("totais") or {}).items():
+            soma, n = totais.get(key, (Decimal("0"), 0))
+            totais[key] = (soma + valor, n + qtd)
+
+    wb = Workbook(write_only=True)
+    for titulo, df in (
+        ("RESUMO_DT_COMP", pivot_totais_dtcomp(totais, desc_map)),
+        ("RESUMO_POR_ARQUIVO", _df_resumo_por_arquivo(resultados, desc_map)),
+        ("VAZAO", _df_vazao(resultados)),
+    ):
+        ws = wb.create_sheet(title=titulo)
+        ws.append(list(df.columns))
+        for row in df.itertuples(index=False, name=None):
+            ws.append(list(row))
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def processar_lote_manad(
+    arquivos: List[Path],
+    pasta_saida: Path,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool = False,
+    rubricas_terco_ferias: Optional[Set[str]] = None,
+    workers: Optional[int] = None,
+    manter_temporarios: bool = False,
+    progresso: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Aplica a mesma seleção de rubricas a vários MANADs (TXT/XLSX), um processo
+    por arquivo. Grava um Excel interno por arquivo e o MANAD_Consolidado.xlsx
+    em pasta_saida. progresso(resultado) é chamado a cada arquivo concluído.
+    """
+    arquivos = [Path(p) for p in arquivos]
+    pasta_saida = Path(pasta_saida)
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(arquivos) or 1))
+
+    tarefas = [
+        dict(
+            path=p,
+            path_excel=pasta_saida / nome,
+            selected_codigos=set(map(str, selected_codigos)),
+            allowed_ind_rubr=set(map(str, allowed_ind_rubr)),
+            allowed_ind_base_ps=set(map(str, allowed_ind_base_ps)),
+            aplicar_regra_terco_ferias=bool(aplicar_regra_terco_ferias),
+            rubricas_terco_ferias=set(map(str, rubricas_terco_ferias or set())),
+            manter_temporarios=manter_temporarios,
+        )
+        for p, nome in zip(arquivos, _nomes_saida(arquivos))
+    ]
+
+    inicio = time.perf_counter()
+    resultados: List[Optional[dict]] = [None] * len(tarefas)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = {executor.submit(processar_arquivo_manad, **t): i for i, t in enumerate(tarefas)}
+            for futuro in as_completed(futuros):
+                i = futuros[futuro]
+                try:
+                    # consolidado na ordem de entrada, independente da ordem de conclusão
+                    resultados[i] = futuro.result()
+                except Exception as erro:
+                    # Processo do worker encerrado (ex.: falta de memória, BrokenProcessPool):
+                    # o arquivo entra como erro e o lote segue.
+                    resultados[i] = _resultado_vazio(tarefas[i]["path"], f"{type(erro).__name__}: {erro}")
+                if progresso:
+                    progresso(resultados[i])
+    else:
+        for i, t in enumerate(tarefas):
+            resultados[i] = processar_arquivo_manad(**t)
+            if progresso:
+                progresso(resultados[i])
+
+    path_consolidado = pasta_saida / "MANAD_Consolidado.xlsx"
+    path_consolidado.write_bytes(gerar_excel_consolidado(resultados))
+
+    segundos = time.perf_counter() - inicio
+    mb_total = sum(r["bytes"] for r in resultados) / 1_000_000
+    return {
+        "resultados": resultados,
+        "df_vazao": _df_vazao(resultados),
+        "consolidado": str(path_consolidado),
+        "workers": workers,
+        "arquivos": len(resultados),
+        "com_erro": sum(1 for r in resultados if r["status"] != "ok"),
+        "mb_total": mb_total,
+        "segundos": segundos,
+        "mb_por_segundo": mb_total / segundos if segundos > 0 else 0.0,
+    }
@@ -1,23 +1,14 @@
 from __future__ import annotations
 
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 
 import pandas as pd
 
 from .layout import CAB_K300, CAB_K150
-
-
-def _parse_decimal_ptbr(v: str) -> Decimal:
-    v = (v or "").strip()
-    if not v:
-        return Decimal("0")
-    v = v.replace(".", "").replace(",", ".")
-    try:
-        return Decimal(v)
-    except InvalidOperation:
-        return Decimal("0")
+from .aggregate import agregar_k300
+from .store import iterar_k300, store_disponivel, totais_k300
 
 
 def _ord_mmAAAA(x: str) -> int:
@@ -110,13 +101,18 @@ def gerar_previa_k300(
     sample_size: int = 200,
     aplicar_regra_terco_ferias: bool = False,
     rubricas_terco_ferias: Optional[Set[str]] = None,
+    path_store: Optional[Path] = None,
 ) -> Dict:
+    """
+    Prévia do K300 filtrado. Com o store do spool (path_store) os totais e a
+    amostra saem de consultas indexadas; sem ele, da agregação vetorizada do
+    K300.txt (agregar_k300).
+    """
     selected_codigos = set(map(str, selected_codigos))
     allowed_ind_rubr = set(map(str, allowed_ind_rubr))
     allowed_ind_base_ps = set(map(str, allowed_ind_base_ps))
 
     rubricas_terco_ferias = set(map(str, rubricas_terco_ferias or set()))
-    LIMITE_TERCO = 202008  # AAAAMM
 
     # mapa código -> descrição
     desc_map = {}
@@ -129,54 +125,32 @@ def gerar_previa_k300(
     totais_comp: Dict[str, Decimal] = {}
     qtd_comp: Dict[str, int] = {}
 
-    amostra: List[List[str]] = []
     rubricas_sem_mov = set(selected_codigos)
 
     linhas_filtradas = 0
     comps_distintas = set()
 
-    with path_k300.open("r", encoding="utf-8", errors="ignore") as f:
-        for linha in f:
-            linha = linha.rstrip("\n")
-            partes = linha.split("|")
-
-            partes = partes[: len(CAB_K300)]
-            if len(partes) < len(CAB_K300):
-                partes += [""] * (len(CAB_K300) - len(partes))
-
-            dt_comp = (partes[5] or "").strip()
-            cod_rubr = (partes[6] or "").strip()
-            vl = (partes[7] or "").strip()
-            ind_rubr = (partes[8] or "").strip()
-            ind_base_ps = (partes[10] or "").strip()
-
-            if cod_rubr not in selected_codigos:
-                continue
-            if allowed_ind_rubr and ind_rubr not in allowed_ind_rubr:
-                continue
-            if allowed_ind_base_ps and ind_base_ps not in allowed_ind_base_ps:
-                continue
-
-            # ✅ regra 1/3 férias até 09/2020 (sem alterar dt_comp)
-            if aplicar_regra_terco_ferias and cod_rubr in rubricas_terco_ferias:
-                if _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
-                    continue
-
-            valor = _parse_decimal_ptbr(vl)
-
-            totais_rub[cod_rubr] = totais_rub.get(cod_rubr, Decimal("0")) + valor
-            qtd_rub[cod_rubr] = qtd_rub.get(cod_rubr, 0) + 1
-
-            if dt_comp:
-                totais_comp[dt_comp] = totais_comp.get(dt_comp, Decimal("0")) + valor
-                qtd_comp[dt_comp] = qtd_comp.get(dt_comp, 0) + 1
-                comps_distintas.add(dt_comp)
-
-            rubricas_sem_mov.discard(cod_rubr)
-            linhas_filtradas += 1
-
-            if len(amostra) < sample_size:
-                amostra.append(partes)
+    filtros = (
+        selected_codigos, allowed_ind_rubr, allowed_ind_base_ps,
+        aplicar_regra_terco_ferias, rubricas_terco_ferias,
+    )
+    if store_disponivel(path_store):
+        totais = totais_k300(path_store, *filtros)
+        amostra = list(iterar_k300(path_store, *filtros, limite=sample_size))
+    else:
+        totais, amostra = agregar_k300(path_k300, *filtros, sample_size=sample_size)
+
+    for (dt_comp, cod_rubr), (valor, qtd) in totais.items():
+        totais_rub[cod_rubr] = totais_rub.get(cod_rubr, Decimal("0")) + valor
+        qtd_rub[cod_rubr] = qtd_rub.get(cod_rubr, 0) + qtd
+
+        if dt_comp:
+            totais_comp[dt_comp] = totais_comp.get(dt_comp, Decimal("0")) + valor
+            qtd_comp[dt_comp] = qtd_comp.get(dt_comp, 0) + qtd
+            comps_distintas.add(dt_comp)
+
+        rubricas_sem_mov.discard(cod_rubr)
+        linhas_filtradas += qtd
 
     total_geral = sum(totais_rub.values(), Decimal("0"))
 
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import os
+import threading
+import time
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, Set
+from typing import Dict, Optional, Set, TextIO
 
 import pandas as pd
 
 from .layout import extrair_codigo_evento
+from .store import StoreK300, caminho_store
+
+
+BUFFER_ESCRITA = 1024 * 1024
 
 
 def spool_init_state() -> dict:
@@ -22,6 +29,9 @@ def spool_init_state() -> dict:
         "counts": {},
         "is_txt": None,
         "total_bytes": 1,
+        "segundos": 0.0,
+        "mb_por_segundo": 0.0,
+        "k300_store": None,
     }
 
 
@@ -32,6 +42,107 @@ def _get_path(paths: Dict[str, str], tmp_dir: Path, codigo: str) -> Path:
     return Path(paths[codigo])
 
 
+class EscritorSpool:
+    """
+    Mantém um arquivo aberto (com buffer) por evento durante todo o upload.
+
+    Reabrir o arquivo a cada linha domina o tempo do spool em MANADs de vários GB.
+    Os arquivos são abertos em modo "a": se o processo do Streamlit reiniciar,
+    um novo escritor continua do ponto gravado no último passo; num erro,
+    descartar() volta cada arquivo ao tamanho do último flush.
+    As linhas K300 também são carregadas uma única vez no StoreK300.
+    """
+
+    def __init__(self, tmp_dir: Path, paths: Dict[str, str]):
+        self.tmp_dir = Path(tmp_dir)
+        self.paths = paths
+        self._arquivos: Dict[str, TextIO] = {}
+        self._gravado: Dict[str, int] = {}  # bytes de cada arquivo no último flush
+        self.store: Optional[StoreK300] = None
+
+    def arquivo(self, codigo: str) -> TextIO:
+        out = self._arquivos.get(codigo)
+        if out is None:
+            p = _get_path(self.paths, self.tmp_dir, codigo)
+            out = p.open("a", encoding="utf-8", newline="\n", buffering=BUFFER_ESCRITA)
+            self._arquivos[codigo] = out
+            self._gravado[codigo] = os.fstat(out.fileno()).st_size
+        return out
+
+    def escrever(self, codigo: str, linha: str) -> None:
+        self.arquivo(codigo).write(linha + "\n")
+        if codigo == "K300":
+            if self.store is None:
+                self.store = StoreK300(caminho_store(self.tmp_dir))
+            self.store.adicionar(linha)
+
+    def flush(self) -> None:
+        for codigo, out in self._arquivos.items():
+            out.flush()
+            self._gravado[codigo] = os.fstat(out.fileno()).st_size
+        if self.store is not None:
+            self.store.commit()
+
+    def finalizar(self) -> Optional[str]:
+        """
+        Fim do upload: indexa o store e devolve o caminho dele (None sem K300).
+        """
+        self.flush()
+        if self.store is None:
+            return None
+        self.store.finalizar()
+        return str(self.store.caminho)
+
+    def fechar(self, descartar: bool = False) -> None:
+        for codigo, out in self._arquivos.items():
+            if not descartar:
+                out.close()
+                continue
+            # O close grava o buffer do passo interrompido; o truncate o remove.
+            try:
+                out.close()
+            finally:
+                os.truncate(out.name, self._gravado[codigo])
+        self._arquivos.clear()
+        if self.store is not None:
+            self.store.fechar()
+            self.store = None
+
+
+# Escritores vivos entre os reruns do Streamlit, por pasta temporária do upload.
+_ESCRITORES: Dict[str, EscritorSpool] = {}
+_TRAVA_ESCRITORES = threading.Lock()
+
+
+def _obter_escritor(tmp_dir: Path, paths: Dict[str, str]) -> EscritorSpool:
+    chave = str(Path(tmp_dir).resolve())
+    with _TRAVA_ESCRITORES:
+        escritor = _ESCRITORES.get(chave)
+        if escritor is None:
+            escritor = EscritorSpool(tmp_dir, paths)
+            _ESCRITORES[chave] = escritor
+        escritor.paths = paths
+        return escritor
+
+
+def fechar_escritor(tmp_dir: Path, descartar: bool = False) -> None:
+    """
+    Fecha os arquivos do spool da pasta (fim do upload, erro ou novo processamento).
+    Com descartar=True (erro no passo), o que não recebeu flush é removido, para
+    os arquivos voltarem a corresponder a state["offset"].
+    """
+    with _TRAVA_ESCRITORES:
+        escritor = _ESCRITORES.pop(str(Path(tmp_dir).resolve()), None)
+    if escritor is not None:
+        escritor.fechar(descartar)
+
+
+def _registrar_vazao(state: dict, inicio: float) -> None:
+    state["segundos"] = float(state.get("segundos") or 0.0) + (time.perf_counter() - inicio)
+    if state["segundos"] > 0:
+        state["mb_por_segundo"] = state["offset"] / 1_000_000 / state["segundos"]
+
+
 def _normalizar_valor_excel(valor) -> str:
     """
     Mantém os valores do Excel como texto e evita NaN/None.
@@ -53,9 +164,8 @@ def _normalizar_valor_excel(valor) -> str:
 
 def _processar_xlsx(
     uploaded_file,
-    tmp_dir: Path,
+    escritor: EscritorSpool,
     eventos_alvo: Set[str],
-    paths: Dict[str, str],
     counts,
     progress_bar=None,
     status_slot=None,
@@ -97,23 +207,20 @@ def _processar_xlsx(
         if df_aba.empty:
             continue
 
-        p = _get_path(paths, tmp_dir, codigo_aba)
+        for valores_linha in df_aba.itertuples(index=False, name=None):
+            valores = [_normalizar_valor_excel(v) for v in valores_linha]
 
-        with p.open("a", encoding="utf-8", newline="\n") as out:
-            for valores_linha in df_aba.itertuples(index=False, name=None):
-                valores = [_normalizar_valor_excel(v) for v in valores_linha]
+            if not valores or not any(valores):
+                continue
 
-                if not valores or not any(valores):
-                    continue
+            # A coluna REG deve ser o primeiro campo.
+            # Se a planilha não trouxer REG, usa o nome da aba.
+            if valores[0].strip().upper() != codigo_aba:
+                valores.insert(0, codigo_aba)
 
-                # A coluna REG deve ser o primeiro campo.
-                # Se a planilha não trouxer REG, usa o nome da aba.
-                if valores[0].strip().upper() != codigo_aba:
-                    valores.insert(0, codigo_aba)
-
-                linha_manad = "|".join(valores)
-                out.write(linha_manad + "\n")
-                counts[codigo_aba] += 1
+            linha_manad = "|".join(valores)
+            escritor.escrever(codigo_aba, linha_manad)
+            counts[codigo_aba] += 1
 
 
 def spool_step(
@@ -129,6 +236,10 @@ def spool_step(
     Processa o MANAD em passos:
     - TXT: leitura incremental por bytes.
     - XLSX: lê as abas estruturadas e reconstrói as linhas MANAD.
+
+    Os arquivos por evento ficam abertos entre os passos e recebem flush ao fim
+    de cada passo, então o que está gravado sempre corresponde a state["offset"].
+    state["mb_por_segundo"] informa a vazão acumulada do spool.
     """
     eventos_alvo = {str(e).strip().upper() for e in eventos_alvo}
 
@@ -142,11 +253,16 @@ def spool_step(
         state["buffer"] = ""
         state["paths"] = state.get("paths") or {}
         state["counts"] = state.get("counts") or {}
+        state["segundos"] = 0.0
+        state["mb_por_segundo"] = 0.0
         state["initialized"] = True
+        fechar_escritor(tmp_dir)
 
         if status_slot:
             status_slot.info("Iniciando spool (modo incremental)...")
 
+    inicio = time.perf_counter()
+
     # ---------------------------
     # XLSX: processa em um passo
     # ---------------------------
@@ -156,20 +272,28 @@ def spool_step(
 
         counts = defaultdict(int, state.get("counts") or {})
         paths: Dict[str, str] = state.get("paths") or {}
-
-        _processar_xlsx(
-            uploaded_file=uploaded_file,
-            tmp_dir=tmp_dir,
-            eventos_alvo=eventos_alvo,
-            paths=paths,
-            counts=counts,
-            progress_bar=progress_bar,
-            status_slot=status_slot,
-        )
+        escritor = _obter_escritor(tmp_dir, paths)
+
+        try:
+            _processar_xlsx(
+                uploaded_file=uploaded_file,
+                escritor=escritor,
+                eventos_alvo=eventos_alvo,
+                counts=counts,
+                progress_bar=progress_bar,
+                status_slot=status_slot,
+            )
+            state["k300_store"] = escritor.finalizar()
+        except Exception:
+            fechar_escritor(tmp_dir, descartar=True)
+            raise
+        fechar_escritor(tmp_dir)
 
         state["paths"] = paths
         state["counts"] = dict(counts)
+        state["offset"] = state["total_bytes"]
         state["done"] = True
+        _registrar_vazao(state, inicio)
 
         if progress_bar:
             progress_bar.progress(1.0)
@@ -181,11 +305,13 @@ def spool_step(
     # ---------------------------
     counts = defaultdict(int, state.get("counts") or {})
     paths: Dict[str, str] = state.get("paths") or {}
+    escritor = _obter_escritor(tmp_dir, paths)
 
     try:
         uploaded_file.seek(state["offset"])
         chunk = uploaded_file.read(batch_bytes)
     except Exception as erro:
+        fechar_escritor(tmp_dir)
         state["counts"] = dict(counts)
         state["paths"] = paths
         state["done"] = True
@@ -199,22 +325,24 @@ def spool_step(
             codigo = extrair_codigo_evento(buf)
 
             if codigo and codigo in eventos_alvo:
-                p = _get_path(paths, tmp_dir, codigo)
-
-                with p.open("a", encoding="utf-8", newline="\n") as out:
-                    out.write(buf + "\n")
-
+                escritor.escrever(codigo, buf)
                 counts[codigo] += 1
 
+        try:
+            state["k300_store"] = escritor.finalizar()
+        finally:
+            fechar_escritor(tmp_dir)
+        state["buffer"] = ""
         state["counts"] = dict(counts)
         state["paths"] = paths
         state["done"] = True
+        _registrar_vazao(state, inicio)
 
         if progress_bar:
             progress_bar.progress(1.0)
 
         if status_slot:
-            status_slot.success("Spool finalizado (TXT).")
+            status_slot.success(f"Spool finalizado (TXT) — {state['mb_por_segundo']:.1f} MB/s.")
 
         return state
 
@@ -222,30 +350,35 @@ def spool_step(
     text = (state.get("buffer") or "") + text
 
     lines = text.split("\n")
-    state["buffer"] = lines[-1]
+    buffer = lines[-1]
     lines = lines[:-1]
 
-    for linha in lines:
-        linha = linha.rstrip("\r")
-
-        if not linha:
-            continue
+    try:
+        for linha in lines:
+            linha = linha.rstrip("\r")
 
-        codigo = extrair_codigo_evento(linha)
+            if not linha:
+                continue
 
-        if not codigo or codigo not in eventos_alvo:
-            continue
+            codigo = extrair_codigo_evento(linha)
 
-        p = _get_path(paths, tmp_dir, codigo)
+            if not codigo or codigo not in eventos_alvo:
+                continue
 
-        with p.open("a", encoding="utf-8", newline="\n") as out:
-            out.write(linha + "\n")
+            escritor.escrever(codigo, linha)
+            counts[codigo] += 1
 
-        counts[codigo] += 1
+        # Fim do passo: o conteúdo gravado passa a corresponder ao novo offset.
+        escritor.flush()
+    except Exception:
+        fechar_escritor(tmp_dir, descartar=True)
+        raise
 
+    state["buffer"] = buffer
     state["offset"] += len(chunk)
     state["counts"] = dict(counts)
     state["paths"] = paths
+    _registrar_vazao(state, inicio)
 
     if progress_bar:
         progress_bar.progress(
@@ -254,7 +387,8 @@ def spool_step(
 
     if status_slot:
         status_slot.text(
-            f"Spool em andamento... {state['offset']}/{state['total_bytes']} bytes"
+            f"Spool em andamento... {state['offset']}/{state['total_bytes']} bytes "
+            f"({state['mb_por_segundo']:.1f} MB/s)"
         )
 
     return state
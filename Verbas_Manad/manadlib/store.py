@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import sqlite3
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .layout import CAB_K300
+
+
+NOME_STORE = "K300.sqlite"
+LOTE_INSERCAO = 50_000
+LIMITE_TERCO = 202008  # AAAAMM
+LIMITE_CENTAVOS = 2 ** 63  # INTEGER do SQLite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta(chave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS competencias(
+    id INTEGER PRIMARY KEY,
+    dt_comp TEXT NOT NULL UNIQUE,
+    ordem INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rubricas(
+    id INTEGER PRIMARY KEY,
+    cod_rubr TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS k300(
+    seq INTEGER PRIMARY KEY,
+    comp_id INTEGER NOT NULL,
+    rubr_id INTEGER NOT NULL,
+    ind_rubr TEXT NOT NULL,
+    ind_base_ps TEXT NOT NULL,
+    centavos INTEGER,
+    campos TEXT NOT NULL
+);
+"""
+
+# Índice de cobertura: filtros e somas por rubrica/competência não tocam a tabela.
+_INDICE = (
+    "CREATE INDEX IF NOT EXISTS k300_rubr_comp "
+    "ON k300(rubr_id, comp_id, ind_rubr, ind_base_ps, centavos)"
+)
+
+
+def _ord_mmAAAA(x: str) -> int:
+    s = (str(x) or "").strip()
+    if len(s) == 6 and s.isdigit():
+        mm = int(s[:2])
+        aaaa = int(s[2:])
+        if 1 <= mm <= 12:
+            return aaaa * 100 + mm
+    return 99999999
+
+
+def _parse_decimal_ptbr(v: str) -> Decimal:
+    v = (v or "").strip()
+    if not v:
+        return Decimal("0")
+    v = v.replace(".", "").replace(",", ".")
+    try:
+        return Decimal(v)
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def _centavos(v: str) -> Optional[int]:
+    """
+    VLR_RUBR em centavos inteiros, com a mesma leitura de _parse_decimal_ptbr.
+    Retorna None quando o valor não é exato em centavos ou não cabe no INTEGER
+    (64 bits) do SQLite; essas linhas são somadas depois via Decimal.
+    """
+    texto = (v or "").strip().replace(".", "")
+    negativo = texto.startswith("-")
+    if texto[:1] in ("-", "+"):
+        texto = texto[1:]
+    inteiro, virgula, fracao = texto.partition(",")
+    if virgula and len(fracao) == 2 and fracao.isdecimal() and (inteiro.isdecimal() or not inteiro):
+        centavos = int(inteiro or "0") * 100 + int(fracao)
+        if centavos >= LIMITE_CENTAVOS:
+            return None
+        return -centavos if negativo else centavos
+
+    valor = _parse_decimal_ptbr(v)
+    if not valor.is_finite():
+        return None
+    escalado = valor * 100
+    if escalado != escalado.to_integral_value() or abs(escalado) >= LIMITE_CENTAVOS:
+        return None
+    return int(escalado)
+
+
+def _partes_k300(linha: str) -> List[str]:
+    partes = linha.split("|")
+    partes = partes[: len(CAB_K300)]
+    if len(partes) < len(CAB_K300):
+        partes += [""] * (len(CAB_K300) - len(partes))
+    return partes
+
+
+def caminho_store(tmp_dir: Path) -> Path:
+    return Path(tmp_dir) / NOME_STORE
+
+
+def store_disponivel(path_store: Optional[Path]) -> bool:
+    """
+    True quando o K300 do upload já foi carregado por completo no store.
+    """
+    if not path_store or not Path(path_store).exists():
+        return False
+    try:
+        conn = _conectar_leitura(Path(path_store))
+    except sqlite3.Error:
+        return False
+    try:
+        row = conn.execute("SELECT valor FROM meta WHERE chave='status'").fetchone()
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+    return bool(row) and row[0] == "concluido"
+
+
+class StoreK300:
+    """
+    Carga única do K300 em SQLite durante o spool.
+
+    DT_COMP e COD_RUBR viram inteiros (tabelas competencias/rubricas) e o valor
+    é guardado em centavos; a linha original fica em "campos" para a amostra e
+    o K300_FILTRADO. As linhas entram em lote e o commit acompanha o flush do
+    spool, então um rerun retoma do último passo gravado.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        self.conn = sqlite3.connect(str(self.caminho), check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.executescript(_SCHEMA)
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES('status','carregando')")
+        self.conn.commit()
+        self._comps: Dict[str, int] = {
+            dt: i for dt, i in self.conn.execute("SELECT dt_comp, id FROM competencias")
+        }
+        self._rubrs: Dict[str, int] = {
+            cod: i for cod, i in self.conn.execute("SELECT cod_rubr, id FROM rubricas")
+        }
+        self._pendentes: List[Tuple] = []
+
+    def _comp_id(self, dt_comp: str) -> int:
+        comp_id = self._comps.get(dt_comp)
+        if comp_id is None:
+            comp_id = int(self.conn.execute(
+                "INSERT INTO competencias(dt_comp, ordem) VALUES (?, ?)",
+                (dt_comp, _ord_mmAAAA(dt_comp)),
+            ).lastrowid)
+            self._comps[dt_comp] = comp_id
+        return comp_id
+
+    def _rubr_id(self, cod_rubr: str) -> int:
+        rubr_id = self._rubrs.get(cod_rubr)
+        if rubr_id is None:
+            rubr_id = int(self.conn.execute(
+                "INSERT INTO rubricas(cod_rubr) VALUES (?)", (cod_rubr,)
+            ).lastrowid)
+            self._rubrs[cod_rubr] = rubr_id
+        return rubr_id
+
+    def adicionar(self, linha: str) -> None:
+        partes = _partes_k300(linha)
+        self._pendentes.append((
+            self._comp_id((partes[5] or "").strip()),
+            self._rubr_id((partes[6] or "").strip()),
+            (partes[8] or "").strip(),
+            (partes[10] or "").strip(),
+            _centavos(partes[7]),
+            "|".join(partes),
+        ))
+        if len(self._pendentes) >= LOTE_INSERCAO:
+            self._gravar()
+
+    def _gravar(self) -> None:
+        if self._pendentes:
+            self.conn.executemany(
+                "INSERT INTO k300(comp_id, rubr_id, ind_rubr, ind_base_ps, centavos, campos) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._pendentes,
+            )
+            self._pendentes = []
+
+    def commit(self) -> None:
+        self._gravar()
+        self.conn.commit()
+
+    def finalizar(self) -> None:
+        self._gravar()
+        self.conn.execute(_INDICE)
+        self.conn.execute("ANALYZE")
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES('status','concluido')")
+        self.conn.commit()
+
+    def fechar(self) -> None:
+        # Sem commit: um passo interrompido é refeito a partir do offset anterior.
+        self._pendentes = []
+        self.conn.close()
+
+
+def _conectar_leitura(path_store: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{Path(path_store).as_posix()}?mode=ro", uri=True)
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _preparar_filtros(
+    conn: sqlite3.Connection,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool,
+    rubricas_terco_ferias: Set[str],
+) -> Tuple[str, list]:
+    """
+    Carrega as rubricas selecionadas em temp.sel e devolve o WHERE sobre k300 (alias k).
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.sel")
+    conn.execute("CREATE TEMP TABLE sel(rubr_id INTEGER PRIMARY KEY, terco INTEGER NOT NULL)")
+    terco = set(rubricas_terco_ferias) if aplicar_regra_terco_ferias else set()
+    conn.executemany(
+        "INSERT INTO temp.sel SELECT id, ? FROM rubricas WHERE cod_rubr=?",
+        [(int(cod in terco), cod) for cod in selected_codigos],
+    )
+    condicoes = ["k.rubr_id IN (SELECT rubr_id FROM temp.sel)"]
+    params: list = []
+    if allowed_ind_rubr:
+        condicoes.append(f"k.ind_rubr IN ({','.join('?' for _ in allowed_ind_rubr)})")
+        params.extend(sorted(allowed_ind_rubr))
+    if allowed_ind_base_ps:
+        condicoes.append(f"k.ind_base_ps IN ({','.join('?' for _ in allowed_ind_base_ps)})")
+        params.extend(sorted(allowed_ind_base_ps))
+    if terco:
+        condicoes.append(
+            "NOT (k.rubr_id IN (SELECT rubr_id FROM temp.sel WHERE terco=1) "
+            "AND k.comp_id IN (SELECT id FROM competencias WHERE ordem>?))"
+        )
+        params.append(LIMITE_TERCO)
+    return " WHERE " + " AND ".join(condicoes), params
+
+
+def _grupos_sem_limite(conn: sqlite3.Connection, where: str, params: list) -> List[Tuple[str, str, int, int]]:
+    acc: Dict[Tuple[str, str], List[int]] = {}
+    for dt, cod, centavos in conn.execute(
+        "SELECT c.dt_comp, r.cod_rubr, k.centavos FROM k300 k "
+        "JOIN competencias c ON c.id=k.comp_id JOIN rubricas r ON r.id=k.rubr_id"
+        + where
+        + " ORDER BY k.seq",
+        params,
+    ):
+        grupo = acc.setdefault((dt, cod), [0, 0])
+        grupo[0] += centavos or 0
+        grupo[1] += 1
+    return [(dt, cod, centavos, qtd) for (dt, cod), (centavos, qtd) in acc.items()]
+
+
+def totais_k300(
+    path_store: Path,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool = False,
+    rubricas_terco_ferias: Optional[Set[str]] = None,
+) -> Dict[Tuple[str, str], Tuple[Decimal, int]]:
+    """
+    Soma exata e quantidade de linhas por (DT_COMP, COD_RUBR) após os filtros,
+    na ordem em que cada par aparece no arquivo.
+    """
+    conn = _conectar_leitura(path_store)
+    try:
+        where, params = _preparar_filtros(
+            conn, set(map(str, selected_codigos)), set(map(str, allowed_ind_rubr)),
+            set(map(str, allowed_ind_base_ps)), bool(aplicar_regra_terco_ferias),
+            set(map(str, rubricas_terco_ferias or set())),
+        )
+        try:
+            grupos = conn.execute(
+                "SELECT c.dt_comp, r.cod_rubr, g.centavos, g.qtd FROM ("
+                "SELECT k.comp_id, k.rubr_id, SUM(k.centavos) centavos, COUNT(*) qtd, "
+                "MIN(k.seq) primeira FROM k300 k"
+                + where
+                + " GROUP BY k.comp_id, k.rubr_id) g "
+                "JOIN competencias c ON c.id=g.comp_id JOIN rubricas r ON r.id=g.rubr_id "
+                # Ordem da primeira ocorrência, como no scan do TXT.
+                "ORDER BY g.primeira",
+                params,
+            ).fetchall()
+        except sqlite3.OperationalError as erro:
+            if "overflow" not in str(erro):
+                raise
+            # SUM do SQLite estoura em 64 bits: soma em inteiros do Python.
+            grupos = _grupos_sem_limite(conn, where, params)
+        totais = {
+            (dt, cod): (Decimal(centavos or 0) / 100, int(qtd))
+            for dt, cod, centavos, qtd in grupos
+        }
+        # Valores fora do padrão de centavos: somados pelo Decimal, como no scan do TXT.
+        for dt, cod, campos in conn.execute(
+            "SELECT c.dt_comp, r.cod_rubr, k.campos FROM k300 k "
+            "JOIN competencias c ON c.id=k.comp_id JOIN rubricas r ON r.id=k.rubr_id"
+            + where
+            + " AND k.centavos IS NULL",
+            params,
+        ):
+            total, qtd = totais[(dt, cod)]
+            totais[(dt, cod)] = (total + _parse_decimal_ptbr(campos.split("|")[7]), qtd)
+    finally:
+        conn.close()
+    return totais
+
+
+def iterar_k300(
+    path_store: Path,
+    selected_codigos: Set[str],
+    allowed_ind_rubr: Set[str],
+    allowed_ind_base_ps: Set[str],
+    aplicar_regra_terco_ferias: bool = False,
+    rubricas_terco_ferias: Optional[Set[str]] = None,
+    cronologico: bool = False,
+    limite: Optional[int] = None,
+) -> Iterator[List[str]]:
+    """
+    Linhas filtradas (11 campos) na ordem do arquivo ou, com cronologico=True,
+    ordenadas por DT_COMP (AAAAMM) sem competências vazias.
+    """
+    conn = _conectar_leitura(path_store)
+    try:
+        where, params = _preparar_filtros(
+            conn, set(map(str, selected_codigos)), set(map(str, allowed_ind_rubr)),
+            set(map(str, allowed_ind_base_ps)), bool(aplicar_regra_terco_ferias),
+            set(map(str, rubricas_terco_ferias or set())),
+        )
+        if cronologico:
+            sql = (
+                "SELECT k.campos FROM k300 k JOIN competencias c ON c.id=k.comp_id"
+                + where
+                + " AND c.dt_comp<>'' "
+                # DT_COMP inválidos (mesma ordem) saem na ordem da primeira linha filtrada.
+                "ORDER BY c.ordem, MIN(k.seq) OVER (PARTITION BY k.comp_id), k.seq"
+            )
+        else:
+            sql = "SELECT k.campos FROM k300 k" + where + " ORDER BY k.seq"
+        if limite is not None:
+            sql += " LIMIT ?"
+            params.append(int(limite))
+        for (campos,) in conn.execute(sql, params):
+            yield campos.split("|")
+    finally:
+        conn.close()
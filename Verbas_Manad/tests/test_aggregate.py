@@ -0,0 +1,114 @@
+import random
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from manadlib.aggregate import _ord_mmAAAA, _parse_decimal_ptbr, _partes_k300, agregar_k300
+from manadlib.store import LIMITE_TERCO
+
+
+def _agregar_decimal(path_k300: Path, selected, ind, base, terco, sample_size):
+    """Laço Decimal linha a linha (leitura original do K300.txt)."""
+    totais = {}
+    amostra = []
+    with path_k300.open("r", encoding="utf-8", errors="ignore") as f:
+        for linha in f:
+            partes = _partes_k300(linha.rstrip("\n"))
+            dt_comp = (partes[5] or "").strip()
+            cod_rubr = (partes[6] or "").strip()
+            if cod_rubr not in selected:
+                continue
+            if ind and (partes[8] or "").strip() not in ind:
+                continue
+            if base and (partes[10] or "").strip() not in base:
+                continue
+            if cod_rubr in terco and _ord_mmAAAA(dt_comp) > LIMITE_TERCO:
+                continue
+            valor, qtd = totais.get((dt_comp, cod_rubr), (Decimal("0"), 0))
+            totais[(dt_comp, cod_rubr)] = (valor + _parse_decimal_ptbr(partes[7]), qtd + 1)
+            if len(amostra) < sample_size:
+                amostra.append(partes)
+    return totais, amostra
+
+
+def _valor(sorteio: random.Random) -> str:
+    digitos = lambda n: "".join(sorteio.choice("0123456789") for _ in range(n))  # noqa: E731
+    sinal = sorteio.choice(["", "", "", "-", "+"])
+    tipo = sorteio.randrange(10)
+    if tipo == 0:
+        return sorteio.choice(["", " ", "  ", "-", "+", ",", "abc", "1,2,3", "--1,00", "1,0a", ",5", "-,50"])
+    if tipo == 1:
+        # parte inteira de 16 e 17 dígitos (limite das palavras de 8 bytes)
+        return f"{sinal}{digitos(sorteio.choice([15, 16, 17, 18]))},{digitos(2)}"
+    if tipo == 2:
+        # separador de milhar
+        grupos = [digitos(3) for _ in range(sorteio.randint(1, 5))]
+        return f"{sinal}{sorteio.randint(1, 999)}.{'.'.join(grupos)},{digitos(2)}"
+    if tipo == 3:
+        # frações de tamanho fora do padrão e valores sem vírgula
+        return f"{sinal}{digitos(sorteio.randint(0, 9))}" + sorteio.choice(["", ",", f",{digitos(1)}", f",{digitos(3)}", f",{digitos(5)}"])
+    if tipo == 4:
+        return f" {sinal}{digitos(sorteio.randint(1, 6))},{digitos(2)} "
+    return f"{sinal}{digitos(sorteio.randint(1, 7))},{digitos(2)}"
+
+
+class AgregarK300Test(unittest.TestCase):
+    def test_totais_vetorizados_identicos_ao_decimal(self):
+        comps = ["012019", "122019", "082020", "092020", "112021", "", " 012020", "132020", "xx"]
+        with tempfile.TemporaryDirectory() as temp:
+            for semente in range(12):
+                sorteio = random.Random(semente)
+                linhas = []
+                for i in range(sorteio.randint(1, 3_000)):
+                    campos = [
+                        "K300", "1", "1", str(i), "1", sorteio.choice(comps),
+                        str(sorteio.randint(1, 12)), _valor(sorteio),
+                        sorteio.choice(["P", "D", "", " P"]), "1", sorteio.choice(["1", "2", "", "9"]),
+                    ]
+                    sorteio_tamanho = sorteio.random()
+                    if sorteio_tamanho < 0.02:
+                        campos = campos[: sorteio.randint(1, 10)]
+                    elif sorteio_tamanho < 0.04:
+                        campos.append("extra")
+                    linhas.append("|".join(campos))
+                fim = "\r\n" if semente % 4 == 3 else "\n"
+                path_k300 = Path(temp) / f"K300_{semente}.txt"
+                path_k300.write_text(fim.join(linhas) + sorteio.choice(["", fim]), encoding="utf-8", newline="")
+
+                filtros = (
+                    {str(c) for c in range(1, 9)},
+                    set() if semente % 3 == 0 else {"P", "D"},
+                    set() if semente % 2 else {"1", "2"},
+                )
+                terco = {"1", "2"} if semente % 2 else set()
+                esperado = _agregar_decimal(path_k300, *filtros, terco, 50)
+                for bytes_lote in (97, 4_093, 1 << 20):
+                    with self.subTest(semente=semente, bytes_lote=bytes_lote):
+                        totais, amostra = agregar_k300(
+                            path_k300, *filtros, bool(terco), terco, sample_size=50, bytes_lote=bytes_lote,
+                        )
+                        self.assertEqual(list(totais.items()), list(esperado[0].items()))
+                        self.assertEqual(amostra, esperado[1])
+
+    def test_totais_alem_de_int64(self):
+        valores = ["9000000000000000,00"] * 12 + ["-9999999999999999,99"] * 3 + ["1,01"]
+        with tempfile.TemporaryDirectory() as temp:
+            path_k300 = Path(temp) / "K300.txt"
+            linhas = [f"K300|1|2|3|4|012020|R{i % 2}|{v}|P|x|1" for i, v in enumerate(valores)]
+            linhas += [f"K300|1|2|3|4|022020|R1|9000000000000000,00|P|x|1"] * 12
+            path_k300.write_text("\n".join(linhas) + "\n", encoding="utf-8")
+            filtros = ({"R0", "R1"}, {"P"}, {"1"})
+            esperado = _agregar_decimal(path_k300, *filtros, set(), 5)
+            self.assertEqual(esperado[0][("022020", "R1")], (Decimal("108000000000000000.00"), 12))
+            # dobra pequena: as somas passam para inteiros Python no meio do arquivo
+            for bytes_lote, dobra in ((97, 1 << 28), (1 << 20, 1 << 28), (97, 3)):
+                with self.subTest(bytes_lote=bytes_lote, dobra=dobra), mock.patch("manadlib.aggregate._LINHAS_POR_DOBRA", dobra):
+                    totais, amostra = agregar_k300(path_k300, *filtros, False, set(), sample_size=5, bytes_lote=bytes_lote)
+                    self.assertEqual(list(totais.items()), list(esperado[0].items()))
+                    self.assertEqual(amostra, esperado[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
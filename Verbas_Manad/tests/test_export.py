@@ -0,0 +1,41 @@
+import random
+import unittest
+
+from manadlib.export import _ord_mmAAAA, _ordenar_externo
+
+
+def _ordem_por_baldes(linhas):
+    """Ordem original do K300_FILTRADO: um balde por DT_COMP, baldes por (AAAAMM, aparição)."""
+    baldes = {}
+    for linha in linhas:
+        baldes.setdefault(linha.split("|")[5], []).append(linha)
+    ordem = sorted(baldes, key=lambda dt: _ord_mmAAAA(dt))  # sorted é estável: empate fica na aparição
+    return [linha for dt in ordem for linha in baldes[dt]]
+
+
+class OrdenarExternoTest(unittest.TestCase):
+    def test_intercalacao_de_trechos_igual_aos_baldes(self):
+        comps = ["012020", "122019", "022020", "132020", "xx", "012021", "0120", "999999", "082020"]
+        for semente in range(8):
+            sorteio = random.Random(semente)
+            linhas = [
+                f"K300|1|1|{i}|1|{sorteio.choice(comps)}|{sorteio.randint(1, 9)}|{i},00|P|1|1"
+                for i in range(sorteio.randint(0, 600))
+            ]
+            rank = {}
+            registros = [
+                (_ord_mmAAAA(dt), rank.setdefault(dt, len(rank)), linha)
+                for linha, dt in ((linha, linha.split("|")[5]) for linha in linhas)
+            ]
+            esperado = _ordem_por_baldes(linhas)
+            for linhas_por_trecho in (1, 7, 64, 10_000):
+                with self.subTest(semente=semente, linhas_por_trecho=linhas_por_trecho):
+                    ordenadas = list(_ordenar_externo(iter(registros), linhas_por_trecho))
+                    self.assertEqual(ordenadas, esperado)
+                    # inválidos (99999999) saem por último
+                    invalidos = [linha for linha in ordenadas if _ord_mmAAAA(linha.split("|")[5]) == 99999999]
+                    self.assertEqual(ordenadas[len(ordenadas) - len(invalidos):], invalidos)
+
+
+if __name__ == "__main__":
+    unittest.main()
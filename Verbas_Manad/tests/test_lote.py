@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from manadlib.lote import processar_lote_manad
+
+
+def _manad(pasta: Path, nome: str, linhas_k300) -> Path:
+    linhas = ["0000|MANAD|teste", "K150|1|10|SALARIO", "K150|1|20|FERIAS"]
+    linhas += [
+        f"K300|1|1|{i}|1|{dt}|{cod}|{valor}|P|1|1" for i, (dt, cod, valor) in enumerate(linhas_k300)
+    ]
+    p = pasta / nome
+    p.write_bytes(("\r\n".join(linhas) + "\r\n").encode("latin1"))
+    return p
+
+
+class ProcessarLoteTest(unittest.TestCase):
+    def test_lote_consolida_e_isola_arquivo_com_erro(self):
+        conteudos = {
+            "emp_a.txt": [("012020", "10", "100,00"), ("012020", "20", "50,25"), ("022020", "10", "1.000,50")],
+            "emp_b.txt": [("012020", "10", "7,00"), ("032020", "20", "-3,10"), ("012020", "30", "999,00")],
+        }
+        esperado = {}
+        for linhas in conteudos.values():
+            for dt, cod, valor in linhas:
+                if cod in {"10", "20"}:
+                    chave = (dt, cod)
+                    esperado[chave] = esperado.get(chave, Decimal("0")) + Decimal(valor.replace(".", "").replace(",", "."))
+
+        for workers in (1, 2):
+            with self.subTest(workers=workers), tempfile.TemporaryDirectory() as temp:
+                pasta = Path(temp)
+                arquivos = [_manad(pasta, nome, linhas) for nome, linhas in conteudos.items()]
+                sem_k300 = pasta / "sem_k300.txt"
+                sem_k300.write_text("0000|MANAD|teste\nK150|1|10|SALARIO\n", encoding="latin1")
+                arquivos.insert(1, sem_k300)
+
+                lote = processar_lote_manad(
+                    arquivos, pasta / "saida", {"10", "20"}, {"P"}, {"1"}, workers=workers,
+                )
+
+                self.assertEqual(lote["arquivos"], 3)
+                self.assertEqual(lote["com_erro"], 1)
+                self.assertEqual([r["status"] for r in lote["resultados"]], ["ok", "erro", "ok"])
+                self.assertIn("K300", lote["resultados"][1]["erro"])
+                for r in (lote["resultados"][0], lote["resultados"][2]):
+                    self.assertTrue(Path(r["saida"]).exists())
+                    self.assertIn("K300_FILTRADO", load_workbook(r["saida"], read_only=True).sheetnames)
+
+                por_arquivo = {}
+                for r in lote["resultados"]:
+                    for chave, (valor, _) in r["totais"].items():
+                        por_arquivo[chave] = por_arquivo.get(chave, Decimal("0")) + valor
+                self.assertEqual(por_arquivo, esperado)
+
+                pivot = pd.read_excel(lote["consolidado"], sheet_name="RESUMO_DT_COMP", dtype={"DT_COMP": str})
+                pivot = pivot.set_index("DT_COMP")
+                self.assertEqual(list(pivot.index), ["012020", "022020", "032020"])
+                for (dt, cod), valor in esperado.items():
+                    coluna = next(c for c in pivot.columns if str(c).split(" - ")[0] == cod)
+                    self.assertAlmostEqual(pivot.loc[dt, coluna], float(valor))
+
+
+if __name__ == "__main__":
+    unittest.main()
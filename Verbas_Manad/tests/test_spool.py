@@ -0,0 +1,69 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from manadlib import spool
+from manadlib.spool import spool_init_state, spool_step
+from manadlib.store import iterar_k300
+
+
+def _arquivo() -> io.BytesIO:
+    linhas = ["0000|MANAD|teste"]
+    for i in range(400):
+        linhas.append(f"K300|1|1|{i}|1|0{i % 9 + 1}2020|{i % 3}|{i},50|P|1|1")
+        if i % 7 == 0:
+            linhas.append(f"K150|1|{i % 3}|RUBRICA {i}")
+    arquivo = io.BytesIO(("\r\n".join(linhas) + "\r\n").encode("latin1"))
+    arquivo.name = "manad.txt"
+    arquivo.size = len(arquivo.getvalue())
+    return arquivo
+
+
+class SpoolStepTest(unittest.TestCase):
+    def _conteudo(self, state: dict) -> tuple:
+        return (
+            Path(state["paths"]["K300"]).read_bytes(),
+            Path(state["paths"]["K150"]).read_bytes(),
+            list(iterar_k300(Path(state["k300_store"]), {"0", "1", "2"}, set(), set())),
+        )
+
+    def test_passo_com_erro_e_refeito_sem_duplicar_linhas(self):
+        with tempfile.TemporaryDirectory() as temp:
+            limpo = spool_init_state()
+            arquivo = _arquivo()
+            while not limpo["done"]:
+                spool_step(limpo, arquivo, Path(temp), {"K300", "K150"}, batch_bytes=4_000)
+
+            state = spool_init_state()
+            arquivo = _arquivo()
+            pasta = Path(temp) / "com_erro"
+            pasta.mkdir()
+            original = spool.extrair_codigo_evento
+            chamadas = []
+
+            def falha_no_meio(linha):
+                chamadas.append(linha)
+                if len(chamadas) == 150:
+                    raise RuntimeError("falha simulada")
+                return original(linha)
+
+            with mock.patch("manadlib.spool.extrair_codigo_evento", falha_no_meio):
+                with self.assertRaises(RuntimeError):
+                    while not state["done"]:
+                        spool_step(state, arquivo, pasta, {"K300", "K150"}, batch_bytes=4_000)
+            self.assertGreater(state["offset"], 0)
+            self.assertEqual(
+                len(Path(state["paths"]["K300"]).read_bytes().splitlines()), state["counts"]["K300"]
+            )
+
+            # rerun do Streamlit: retoma do offset do último passo concluído
+            while not state["done"]:
+                spool_step(state, arquivo, pasta, {"K300", "K150"}, batch_bytes=4_000)
+            self.assertEqual(state["counts"], limpo["counts"])
+            self.assertEqual(self._conteudo(state), self._conteudo(limpo))
+
+
+if __name__ == "__main__":
+    unittest.main()
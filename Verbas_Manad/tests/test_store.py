@@ -0,0 +1,100 @@
+import io
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+from manadlib.aggregate import agregar_k300
+from manadlib.export import _write_k300_filtrado_ordenado_com_colunas
+from manadlib.spool import spool_init_state, spool_step
+from manadlib.store import _parse_decimal_ptbr, iterar_k300, store_disponivel, totais_k300
+
+
+class _Planilha:
+    """Só o append do worksheet, para comparar as linhas do K300_FILTRADO."""
+
+    def __init__(self):
+        self.linhas = []
+
+    def append(self, linha):
+        self.linhas.append(list(linha))
+
+
+def _manad() -> bytes:
+    comps = ["032020", "012020", "", "132020", " 022020", "122019", "xx", "  ", "092020"]
+    valores = [
+        "1.234,56", "-10,00", "0,01", "", "1,5", "abc", "+7,25",
+        # SUM do SQLite estoura e valores que não cabem no INTEGER vão pelo Decimal
+        "90000000000000000,00", "9000000000000000,00", "99999999999999999,99",
+    ]
+    linhas = ["0000|MANAD|teste", "K050|1|0001|FULANO", ""]
+    for i in range(240):
+        linhas.append(
+            f"K300|1|1|{i}|1|{comps[i % len(comps)]}|{(i % 4) + 1}|{valores[i % len(valores)]}"
+            f"|{'PD'[i % 3 == 0]}|1|{'12'[i % 5 == 0]}"
+        )
+        if i % 17 == 0:
+            linhas.append(f"K150|1|{i % 4 + 1}|RUBRICA {i % 4 + 1}")
+        if i % 31 == 0:
+            linhas.append("")
+    return ("\r\n".join(linhas) + "\r\n").encode("latin1")
+
+
+class StoreK300Test(unittest.TestCase):
+    def _spool(self, pasta: Path) -> dict:
+        arquivo = io.BytesIO(_manad())
+        arquivo.name = "manad.txt"
+        arquivo.size = len(arquivo.getvalue())
+        state = spool_init_state()
+        while not state["done"]:
+            spool_step(state, arquivo, pasta, {"K300", "K150"}, batch_bytes=997)
+        self.assertNotIn("error", state)
+        return state
+
+    def test_store_equivale_ao_txt(self):
+        cenarios = [
+            ({"1", "2", "3", "4"}, set(), set(), False, set()),
+            ({"1", "3"}, {"P"}, {"1"}, False, set()),
+            ({"1", "2", "4"}, {"P", "D"}, {"1", "2"}, True, {"2", "4"}),
+        ]
+        with tempfile.TemporaryDirectory() as temp:
+            pasta = Path(temp)
+            state = self._spool(pasta)
+            path_store = Path(state["k300_store"])
+            path_k300 = Path(state["paths"]["K300"])
+            self.assertTrue(store_disponivel(path_store))
+            self.assertEqual(state["counts"]["K300"], 240)
+            self.assertEqual(len(path_k300.read_text(encoding="utf-8").splitlines()), 240)
+
+            for filtros in cenarios:
+                with self.subTest(filtros=filtros):
+                    esperado, amostra = agregar_k300(path_k300, *filtros, sample_size=25)
+                    totais = totais_k300(path_store, *filtros)
+                    self.assertEqual(list(totais.items()), list(esperado.items()))
+                    self.assertEqual(list(iterar_k300(path_store, *filtros, limite=25)), amostra)
+
+                    pelo_txt, pelo_store = _Planilha(), _Planilha()
+                    for ws, store in ((pelo_txt, None), (pelo_store, path_store)):
+                        _write_k300_filtrado_ordenado_com_colunas(
+                            ws, path_k300, filtros[0], filtros[1], filtros[2], {}, filtros[3], filtros[4],
+                            path_store=store,
+                        )
+                    self.assertGreater(len(pelo_store.linhas), 1)
+                    self.assertEqual(pelo_store.linhas, pelo_txt.linhas)
+
+    def test_totais_alem_de_int64(self):
+        esperado = {}
+        for linha in _manad().decode("latin1").splitlines():
+            partes = linha.split("|")
+            if partes[0] == "K300" and partes[6] == "4":
+                chave = (partes[5].strip(), "4")
+                valor, qtd = esperado.get(chave, (Decimal("0"), 0))
+                esperado[chave] = (valor + _parse_decimal_ptbr(partes[7]), qtd + 1)
+        self.assertGreater(max(abs(v) for v, _ in esperado.values()), Decimal(2 ** 63) / 100)
+        with tempfile.TemporaryDirectory() as temp:
+            state = self._spool(Path(temp))
+            self.assertEqual(totais_k300(Path(state["k300_store"]), {"4"}, set(), set()), esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,7 @@ BASE_DIR = Path(__file__).resolve().parent
 if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
 
-from manadlib.spool import spool_step, spool_init_state
+from manadlib.spool import spool_step, spool_init_state, fechar_escritor
 from manadlib.preview import gerar_previa_k300, ler_catalogo_k150, alertas_descricoes_repetidas
 from manadlib.export import gerar_excel_interno
 
@@ -39,6 +39,7 @@ def ss_init():
 
     st.session_state.setdefault("tmp_dir", None)
     st.session_state.setdefault("arquivos_evento", {})      # codigo -> str(path)
+    st.session_state.setdefault("k300_store", None)         # str(path) do K300.sqlite
     st.session_state.setdefault("contagem_linhas", {})      # codigo -> int
     st.session_state.setdefault("eventos_encontrados", [])  # list[str]
 
@@ -67,11 +68,15 @@ ss_init()
 
 
 def reset_for_new_upload(new_fp: str):
+    if st.session_state.tmp_dir:
+        fechar_escritor(Path(st.session_state.tmp_dir))
+
     st.session_state.uploaded_fingerprint = new_fp
     st.session_state.manad_processado = False
 
     st.session_state.tmp_dir = None
     st.session_state.arquivos_evento = {}
+    st.session_state.k300_store = None
     st.session_state.contagem_linhas = {}
     st.session_state.eventos_encontrados = []
 
@@ -118,6 +123,8 @@ with col2:
     st.caption("Processa em lotes (Cloud-safe) para evitar crash em arquivos grandes.")
 
 if iniciar:
+    if st.session_state.tmp_dir:
+        fechar_escritor(Path(st.session_state.tmp_dir))
     st.session_state.tmp_dir = str(Path(tempfile.mkdtemp(prefix="manad_")))
     st.session_state.manad_processado = False
     st.session_state.spool_state = spool_init_state()
@@ -141,13 +148,16 @@ if st.session_state.spool_state is not None and not st.session_state.manad_proce
 
     # ✅ segurança contra None
     counts = {}
+    mb_por_segundo = 0.0
     if isinstance(st.session_state.spool_state, dict):
         counts = st.session_state.spool_state.get("counts", {}) or {}
+        mb_por_segundo = float(st.session_state.spool_state.get("mb_por_segundo") or 0.0)
 
     st.caption(
         f"Linhas até agora — K150: {counts.get('K150', 0)}, "
         f"K300: {counts.get('K300', 0)}, "
-        f"K050: {counts.get('K050', 0)}"
+        f"K050: {counts.get('K050', 0)} — "
+        f"{mb_por_segundo:.1f} MB/s"
     )
 
     done = False
@@ -163,6 +173,7 @@ if st.session_state.spool_state is not None and not st.session_state.manad_proce
             paths = st.session_state.spool_state.get("paths", {}) or {}
 
         st.session_state.arquivos_evento = paths
+        st.session_state.k300_store = st.session_state.spool_state.get("k300_store")
         st.session_state.contagem_linhas = {k: int(v) for k, v in counts.items()}
         st.session_state.eventos_encontrados = sorted(list(st.session_state.arquivos_evento.keys()))
 
@@ -363,13 +374,13 @@ colp1, colp2 = st.columns([1, 3])
 with colp1:
     btn_previa = st.button("🔎 Gerar/Atualizar prévia", key="btn_previa")
 with colp2:
-    st.caption("A prévia faz scan no K300 linha a linha (pode demorar em arquivos grandes).")
+    st.caption("A prévia consulta o K300 indexado no processamento (ou faz scan linha a linha no TXT).")
 
 if btn_previa:
     if not st.session_state.selected_codigos:
         st.warning("Selecione ao menos uma rubrica (K150) para gerar a prévia.")
     else:
-        with st.spinner("Calculando prévia (scan no K300)..."):
+        with st.spinner("Calculando prévia do K300..."):
             st.session_state.preview_result = gerar_previa_k300(
                 path_k300=Path(p_k300),
                 selected_codigos=set(st.session_state.selected_codigos),
@@ -379,6 +390,7 @@ if btn_previa:
                 sample_size=200,
                 aplicar_regra_terco_ferias=bool(st.session_state.aplicar_regra_terco_ferias),
                 rubricas_terco_ferias=set(st.session_state.rubricas_terco_ferias),
+                path_store=Path(st.session_state.k300_store) if st.session_state.k300_store else None,
             )
 
 prev = st.session_state.preview_result
@@ -442,6 +454,7 @@ if btn_excel:
                 df_rubricas=df_rubricas,
                 aplicar_regra_terco_ferias=bool(st.session_state.aplicar_regra_terco_ferias),
                 rubricas_terco_ferias=set(st.session_state.rubricas_terco_ferias),
+                path_store=Path(st.session_state.k300_store) if st.session_state.k300_store else None,
             )
 
         st.success("✅ Excel interno gerado!")
@@ -0,0 +1,83 @@
+"""Processamento em lote de MANADs (TXT/XLSX), sem Streamlit.
+
+Aplica a mesma seleção de rubricas a todos os arquivos, um processo por arquivo,
+e grava na pasta de saída um Excel interno por MANAD (mesmo layout do app) e o
+MANAD_Consolidado.xlsx (DT_COMP x Rubricas somado, totais por arquivo e vazão).
+
+Uso:
+    python verbas_manad_lote.py pasta_manads/ --rubricas 354 355 --saida resultado/
+    python verbas_manad_lote.py a.txt b.xlsx --rubricas 354,355 --ind-rubr P D \\
+        --terco-ferias 355 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from manadlib.lote import listar_arquivos_manad, processar_lote_manad  # noqa: E402
+
+
+def _codigos(valores: list[str] | None) -> set[str]:
+    """Aceita códigos separados por espaço e/ou vírgula."""
+    return {c.strip() for v in valores or [] for c in v.split(",") if c.strip()}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entradas", nargs="+", help="arquivos MANAD ou pastas com .txt/.xlsx")
+    parser.add_argument("--rubricas", nargs="+", required=True, help="COD_RUBR selecionados")
+    parser.add_argument("--saida", default="manad_lote", help="pasta dos Excel gerados")
+    parser.add_argument("--ind-rubr", nargs="+", default=["P"], help="IND_RUBR aceitos (padrão: P)")
+    parser.add_argument("--ind-base-ps", nargs="+", default=["1", "2"], help="IND_BASE_PS aceitos (padrão: 1 2)")
+    parser.add_argument(
+        "--terco-ferias", nargs="*", default=None,
+        help="aplica a regra do 1/3 de férias (até 09/2020) às rubricas informadas",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument("--manter-temporarios", action="store_true", help="não apaga o spool de cada arquivo")
+    args = parser.parse_args(argv)
+
+    arquivos = listar_arquivos_manad(Path(e) for e in args.entradas)
+    if not arquivos:
+        parser.error("nenhum arquivo .txt/.xlsx encontrado nas entradas.")
+
+    def progresso(r: dict) -> None:
+        nome = Path(r["arquivo"]).name
+        if r["status"] == "ok":
+            print(f"  ok    {nome} — {r['bytes'] / 1_000_000:.1f} MB em {r['segundos']:.1f}s", flush=True)
+        else:
+            print(f"  ERRO  {nome} — {r['erro']}", flush=True)
+
+    print(f"Processando {len(arquivos)} arquivo(s)...", flush=True)
+    lote = processar_lote_manad(
+        arquivos=arquivos,
+        pasta_saida=Path(args.saida),
+        selected_codigos=_codigos(args.rubricas),
+        allowed_ind_rubr=_codigos(args.ind_rubr),
+        allowed_ind_base_ps=_codigos(args.ind_base_ps),
+        aplicar_regra_terco_ferias=args.terco_ferias is not None,
+        rubricas_terco_ferias=_codigos(args.terco_ferias),
+        workers=args.workers,
+        manter_temporarios=args.manter_temporarios,
+        progresso=progresso,
+    )
+
+    print()
+    print(lote["df_vazao"].drop(columns=["SAIDA"]).to_string(index=False))
+    print()
+    print(
+        f"{lote['arquivos']} arquivo(s), {lote['com_erro']} com erro — "
+        f"{lote['mb_total']:.1f} MB em {lote['segundos']:.1f}s "
+        f"({lote['mb_por_segundo']:.1f} MB/s, {lote['workers']} worker(s))"
+    )
+    print(f"Consolidado: {lote['consolidado']}")
+    return 1 if lote["com_erro"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -31,7 +31,8 @@ from modules.processador_zip import (
     organizar_fontes_carga_inicial,
     processar_fontes_esocial,
 )
-from modules.sqlite_relatorio import gerar_excel_saida_sqlite
+from modules.resultado_sqlite import ResultadoSQLite
+from modules.sqlite_relatorio import gerar_excel_saida_sqlite, gerar_pacote_colunar_sqlite
 from modules.workspace_manager import (
     abrir_workspace,
     enviar_workspace_para_lixeira,
@@ -53,7 +54,7 @@ st.caption(
 
 @st.cache_data(show_spinner=False, ttl=30)
 def _catalogo_workspaces_disponiveis():
-    return listar_workspaces_disponiveis()
+    return listar_workspaces_disponiveis(segundo_plano=True)
 
 if "modulo_ativo" not in st.session_state:
     st.session_state["modulo_ativo"] = "Relatório de Incidência CP"
@@ -573,6 +574,14 @@ def executar_processamento(fontes, progress_callback=None):
     return processar_fontes_esocial(fontes, progress_callback=progress_callback)
 
 
+def _quadro_resultado(resultado, chave: str) -> pd.DataFrame:
+    # No modo seguro as abas brutas mostram só uma página lida do SQLite.
+    if isinstance(resultado, ResultadoSQLite) and resultado.get("modo_sqlite_seguro", False):
+        if chave in resultado.categorias_sql and not resultado.materializada(chave):
+            return resultado.pagina(chave, limite=5_000)
+    return resultado.get(chave, pd.DataFrame())
+
+
 def _criar_progresso(titulo: str):
     st.markdown(f"### {titulo}")
     barra_etapa = st.progress(0, text="Etapa atual — aguardando início...")
@@ -638,8 +647,12 @@ def _criar_progresso(titulo: str):
             campos.volume_restante,
             help="Considera as fontes já descobertas. ZIPs aninhados ainda não abertos podem ampliar esse total.",
         )
+        paralelo = (
+            f" Workers ativos: {campos.workers}; {campos.ritmo_por_worker} por worker."
+            if campos.ritmo_por_worker != "—" else ""
+        )
         hud_ingestao["observacao"].caption(
-            f"Tempo decorrido nesta fonte: {campos.tempo_decorrido}. "
+            f"Tempo decorrido nesta fonte: {campos.tempo_decorrido}.{paralelo} "
             "A estimativa pode variar conforme o tamanho e a complexidade dos XMLs."
         )
 
@@ -723,9 +736,10 @@ def _rubricas_levantamento_sqlite(
     mtime_ns: int,
     tamanho: int,
     filtros: FiltrosLevantamento,
+    contagem_exata: bool = True,
 ) -> pd.DataFrame:
     contexto = WorkspaceContext.from_path(db_path, origem="cache_rubricas")
-    return consultar_rubricas(SQLiteDataSource(contexto), filtros)
+    return consultar_rubricas(SQLiteDataSource(contexto), filtros, contagem_exata)
 
 
 @st.cache_data(show_spinner=False)
@@ -735,12 +749,14 @@ def _resultado_levantamento_sqlite(
     tamanho: int,
     filtros: FiltrosLevantamento,
     chaves: tuple[str, ...],
+    contagem_exata: bool = True,
 ):
     contexto = WorkspaceContext.from_path(db_path, origem="cache_resultado")
     # A alíquota não muda o recorte nem exige nova consulta. O percentual é
     # aplicado na interface sobre os totais já agregados.
     return consultar_levantamento(
-        SQLiteDataSource(contexto), filtros, chaves, aliquota=0.0
+        SQLiteDataSource(contexto), filtros, chaves, aliquota=0.0,
+        contagem_exata=contagem_exata,
     )
 
 
@@ -820,7 +836,7 @@ if modo_entrada == "ZIP(s) do eSocial":
     resultado = st.session_state["resultado_v82"]
     df_inventario = resultado.get("inventario", pd.DataFrame())
     df_rubricas = resultado.get("rubricas", pd.DataFrame())
-    df_exclusoes = resultado.get("exclusoes", pd.DataFrame())
+    df_exclusoes = _quadro_resultado(resultado, "exclusoes")
     df_remun = resultado.get("remuneracoes", pd.DataFrame())
     df_bases_trab = resultado.get("bases_trabalhador", pd.DataFrame())
     df_bases_contrib = resultado.get("bases_contribuicao", pd.DataFrame())
@@ -846,7 +862,7 @@ elif modo_entrada in {"SQLite existente", "Workspace (SQLite existente)"}:
     resultado = st.session_state["resultado_v82"]
     df_inventario = resultado.get("inventario", pd.DataFrame())
     df_rubricas = resultado.get("rubricas", pd.DataFrame())
-    df_exclusoes = resultado.get("exclusoes", pd.DataFrame())
+    df_exclusoes = _quadro_resultado(resultado, "exclusoes")
     df_remun = resultado.get("remuneracoes", pd.DataFrame())
     df_bases_trab = resultado.get("bases_trabalhador", pd.DataFrame())
     df_bases_contrib = resultado.get("bases_contribuicao", pd.DataFrame())
@@ -1132,6 +1148,12 @@ if modulo_ativo == "Levantamento de Verbas":
         comp_lev = l5.multiselect("Competências", options=competencias, default=[], key="lev_comp")
         aliquota_lev = l6.number_input("Alíquota estimada CPP (%)", min_value=0.0, max_value=100.0, value=20.0, step=0.5, key="lev_aliquota")
         positivos_lev = l7.checkbox("Apenas valores positivos", value=True, key="lev_positivos")
+        cpfs_exatos_lev = levantamento_sqlite and l7.checkbox(
+            "Contagem exata de CPFs",
+            value=True,
+            help="Desmarque para estimar os CPFs distintos (erro típico abaixo de 2%) nos Workspaces que já têm o cubo do Levantamento.",
+            key="lev_cpfs_exatos",
+        )
 
         filtros_levantamento = FiltrosLevantamento(
             status_cp=status_lev,
@@ -1147,6 +1169,7 @@ if modulo_ativo == "Levantamento de Verbas":
                 str(Path(db_path_sqlite).resolve()),
                 *assinatura_sqlite,
                 filtros_levantamento,
+                cpfs_exatos_lev,
             )
         else:
             df_base_lev = df_movimentos_cp.copy()
@@ -1292,6 +1315,7 @@ if modulo_ativo == "Levantamento de Verbas":
                     *assinatura_sqlite,
                     filtros_levantamento,
                     tuple(sorted(chaves_selecionadas)),
+                    cpfs_exatos_lev,
                 )
                 df_levantamento = resultado_lev_sqlite.movimentos_previa
                 total_movimentos_lev = resultado_lev_sqlite.qtd_movimentos
@@ -1336,7 +1360,10 @@ if modulo_ativo == "Levantamento de Verbas":
             m1.metric("Total levantado", f"R$ {decimal_br(total_lev)}")
             m2.metric("CPP estimada", f"R$ {decimal_br(cpp_lev)}")
             m3.metric("Rubricas", f"{qtd_rubricas_lev:,}".replace(",", "."))
-            m4.metric("CPFs", f"{qtd_cpfs_lev:,}".replace(",", "."))
+            m4.metric(
+                "CPFs" if not levantamento_sqlite or resultado_lev_sqlite.cpfs_exatos else "CPFs (estimado)",
+                f"{qtd_cpfs_lev:,}".replace(",", "."),
+            )
 
             if not levantamento_sqlite:
                 df_resumo_lev = (
@@ -1394,7 +1421,7 @@ if modulo_ativo == "Levantamento de Verbas":
                     "Total levantado",
                     "CPP estimada",
                     "Quantidade de rubricas",
-                    "Quantidade de CPFs",
+                    "Quantidade de CPFs" if not levantamento_sqlite or resultado_lev_sqlite.cpfs_exatos else "Quantidade de CPFs (estimada)",
                 ],
                 "Valor": [
                     status_lev,
@@ -1689,3 +1716,25 @@ if modulo_ativo == "Relatório de Incidência CP":
                     use_container_width=True,
                     key="download_manifesto_v95",
                 )
+
+    if db_path_sqlite:
+        with st.expander("Exportação para BI (Parquet ou CSV gzip)"):
+            formato_bi = st.radio(
+                "Formato",
+                ["parquet", "csv"],
+                format_func=lambda f: "Parquet particionado por competência" if f == "parquet" else "CSV gzip por tabela",
+                horizontal=True,
+                key="formato_exportacao_bi",
+            )
+            if st.button("Exportar tabelas rel_* e dados_*", key="exportar_bi_colunar"):
+                atualizar_bi, _, status_bi = _criar_progresso("Progresso da exportação para BI")
+                pasta_bi = (
+                    Path(resultado.get("workspace_temporario", tempfile.gettempdir()))
+                    / "output" / f"bi_{formato_bi}"
+                )
+                pacote_bi = gerar_pacote_colunar_sqlite(
+                    db_path_sqlite, pasta_bi, formato=formato_bi, progress_callback=atualizar_bi,
+                )
+                status_bi.success(
+                    f"{pacote_bi['quantidade_arquivos']} arquivo(s) gravados e conferidos em {pacote_bi['pasta_saida']}."
+                )
@@ -0,0 +1,367 @@
+"""Benchmark ponta a ponta da Engine com corpus eSocial sintetico.
+
+Gera ZIPs realistas (S-1000, S-1010, S-1200, S-5001, S-5011 e S-3000, com ZIP
+aninhado e retificacoes), executa carga inicial, complemento incremental,
+rematerializacao analitica e exportacao Excel e grava por etapa tempo de parede,
+CPU, pico de RSS e eventos/s num JSON comparavel com execucoes anteriores.
+
+Uso:
+    python benchmarks/benchmark_pipeline.py --porte medio --saida atual.json
+    python benchmarks/benchmark_pipeline.py --porte medio --comparar-com base.json
+
+O tempo de CPU e o do processo principal; workers de ``ESOCIAL_V10_WORKERS``
+aparecem apenas no tempo de parede.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from modules.processador_zip import atualizar_workspace_incremental, processar_fontes_esocial  # noqa: E402
+from modules.sqlite_relatorio import (  # noqa: E402
+    carregar_pacote_resumido,
+    gerar_pacote_excel_saida_sqlite,
+    materializar_tabelas_analiticas,
+    reiniciar_materializacao_analitica,
+)
+from modules.telemetria import memoria_processo_bytes  # noqa: E402
+
+VERSAO_FORMATO = 1
+
+# Trabalhadores x competências da carga inicial. O complemento acrescenta uma
+# competência e retifica ~5% dos S-1200 da última competência.
+PORTES: dict[str, dict[str, int]] = {
+    "mini": {"trabalhadores": 5, "competencias": 2, "rubricas": 6, "itens": 3},
+    "pequeno": {"trabalhadores": 50, "competencias": 3, "rubricas": 20, "itens": 6},
+    "medio": {"trabalhadores": 400, "competencias": 6, "rubricas": 60, "itens": 10},
+    "grande": {"trabalhadores": 2_500, "competencias": 12, "rubricas": 150, "itens": 14},
+}
+
+CNPJ = "12345678000199"
+_NS = "http://www.esocial.gov.br/schema/evt/{}/v_S_01_03_00"
+
+
+def _competencias(inicio: int, quantidade: int) -> list[str]:
+    return [f"{2025 + (inicio + i) // 12}-{(inicio + i) % 12 + 1:02d}" for i in range(quantidade)]
+
+
+def _empregador() -> str:
+    return f"<ideEmpregador><tpInsc>1</tpInsc><nrInsc>{CNPJ}</nrInsc></ideEmpregador>"
+
+
+def _s1000() -> str:
+    return (
+        f'<eSocial xmlns="{_NS.format("evtInfoEmpregador")}"><evtInfoEmpregador Id="ID1000">'
+        f"<ideEvento><tpAmb>1</tpAmb></ideEvento>{_empregador()}<infoEmpregador><inclusao>"
+        "<idePeriodo><iniValid>2025-01</iniValid></idePeriodo><infoCadastro>"
+        "<nmRazao>Empresa Benchmark Ltda</nmRazao><classTrib>99</classTrib></infoCadastro>"
+        "</inclusao></infoEmpregador></evtInfoEmpregador></eSocial>"
+    )
+
+
+def _s1010(rubricas: int, sorteio: random.Random, nova_vigencia: str = "") -> str:
+    blocos = []
+    for cod in range(1, rubricas + 1):
+        cod_inc = sorteio.choice(["11", "11", "11", "00", "12", "13"])
+        blocos.append(
+            f"<inclusao><ideRubrica><codRubr>{cod}</codRubr><ideTabRubr>TAB</ideTabRubr>"
+            f"<iniValid>2025-01</iniValid></ideRubrica><dadosRubrica><dscRubr>Rubrica {cod}</dscRubr>"
+            f"<natRubr>1000</natRubr><tpRubr>{1 if cod % 7 else 2}</tpRubr><codIncCP>{cod_inc}</codIncCP>"
+            "<codIncIRRF>11</codIncIRRF><codIncFGTS>11</codIncFGTS></dadosRubrica></inclusao>"
+        )
+        if nova_vigencia and cod % 5 == 0:
+            blocos.append(
+                f"<alteracao><ideRubrica><codRubr>{cod}</codRubr><ideTabRubr>TAB</ideTabRubr>"
+                f"<iniValid>{nova_vigencia}</iniValid></ideRubrica><dadosRubrica><dscRubr>Rubrica {cod} v2"
+                "</dscRubr><natRubr>1000</natRubr><tpRubr>1</tpRubr><codIncCP>00</codIncCP>"
+                "</dadosRubrica></alteracao>"
+            )
+    return (
+        f'<eSocial xmlns="{_NS.format("evtTabRubrica")}"><evtTabRubrica Id="ID1010">'
+        f"<ideEvento><tpAmb>1</tpAmb></ideEvento>{_empregador()}<infoRubrica>{''.join(blocos)}"
+        "</infoRubrica></evtTabRubrica></eSocial>"
+    )
+
+
+def _s1200(
+    trabalhador: int, competencia: str, cfg: dict[str, int], sorteio: random.Random,
+    recibo: str, retifica: str = "",
+) -> str:
+    itens = "".join(
+        f"<itensRemun><codRubr>{sorteio.randint(1, cfg['rubricas'])}</codRubr><ideTabRubr>TAB</ideTabRubr>"
+        f"<vrRubr>{sorteio.randint(100, 900_000) / 100:.2f}</vrRubr></itensRemun>"
+        for _ in range(cfg["itens"])
+    )
+    ide_evento = (
+        f"<indRetif>2</indRetif><nrRecibo>{retifica}</nrRecibo>" if retifica else "<indRetif>1</indRetif>"
+    )
+    return (
+        f'<eSocial xmlns="{_NS.format("evtRemun")}"><evtRemun Id="ID1200{trabalhador}{competencia}">'
+        f"<ideEvento>{ide_evento}<perApur>{competencia}</perApur></ideEvento>{_empregador()}"
+        f"<ideTrabalhador><cpfTrab>{trabalhador:011d}</cpfTrab></ideTrabalhador><dmDev>"
+        f"<ideDmDev>{trabalhador}</ideDmDev><codCateg>101</codCateg><infoPerApur><ideEstabLot>"
+        f"<tpInsc>1</tpInsc><nrInsc>{CNPJ}</nrInsc><codLotacao>L{trabalhador % 4}</codLotacao>"
+        f"<remunPerApur><matricula>M{trabalhador}</matricula>{itens}</remunPerApur></ideEstabLot>"
+        f"</infoPerApur></dmDev><recibo><nrRecibo>{recibo}</nrRecibo></recibo></evtRemun></eSocial>"
+    )
+
+
+def _s5001(trabalhador: int, competencia: str, sorteio: random.Random) -> str:
+    return (
+        f'<eSocial xmlns="{_NS.format("evtBasesTrab")}"><evtBasesTrab Id="ID5001{trabalhador}{competencia}">'
+        f"<ideEvento><perApur>{competencia}</perApur></ideEvento>{_empregador()}"
+        f"<ideTrabalhador><cpfTrab>{trabalhador:011d}</cpfTrab></ideTrabalhador><infoCp><ideEstabLot>"
+        f"<tpInsc>1</tpInsc><nrInsc>{CNPJ}</nrInsc><codLotacao>L{trabalhador % 4}</codLotacao>"
+        f"<infoCategIncid><matricula>M{trabalhador}</matricula><codCateg>101</codCateg>"
+        f"<infoBaseCS><ind13>0</ind13><tpValor>11</tpValor><valor>{sorteio.randint(1_000, 2_000_000) / 100:.2f}"
+        "</valor></infoBaseCS></infoCategIncid></ideEstabLot></infoCp>"
+        f"<nrRecArqBase>B{trabalhador}-{competencia}</nrRecArqBase></evtBasesTrab></eSocial>"
+    )
+
+
+def _s5011(competencia: str, sorteio: random.Random) -> str:
+    lotacoes = "".join(
+        f"<ideLotacao><codLotacao>L{lot}</codLotacao><fpas>515</fpas><codTercs>0115</codTercs>"
+        f"<basesRemun><indIncid>1</indIncid><codCateg>101</codCateg><basesCp>"
+        f"<vrBcCp00>{sorteio.randint(10_000, 90_000_000) / 100:.2f}</vrBcCp00></basesCp></basesRemun></ideLotacao>"
+        for lot in range(4)
+    )
+    return (
+        f'<eSocial xmlns="{_NS.format("evtCS")}"><evtCS Id="ID5011{competencia}">'
+        f"<ideEvento><perApur>{competencia}</perApur></ideEvento>{_empregador()}<infoCS><ideEstab>"
+        f"<tpInsc>1</tpInsc><nrInsc>{CNPJ}</nrInsc><infoEstab><aliqRatAjust>2.5</aliqRatAjust></infoEstab>"
+        f"{lotacoes}</ideEstab></infoCS><nrRecArqBase>CS-{competencia}</nrRecArqBase></evtCS></eSocial>"
+    )
+
+
+def _s3000(recibo: str, competencia: str) -> str:
+    return (
+        f'<eSocial xmlns="{_NS.format("evtExclusao")}"><evtExclusao Id="ID3000{recibo}">'
+        f"<ideEvento><perApur>{competencia}</perApur></ideEvento>{_empregador()}"
+        f"<infoExclusao><tpEvento>S-1200</tpEvento><nrRecEvt>{recibo}</nrRecEvt></infoExclusao>"
+        "</evtExclusao></eSocial>"
+    )
+
+
+def _zip(arquivos: dict[str, str | bytes]) -> bytes:
+    memoria = io.BytesIO()
+    with zipfile.ZipFile(memoria, "w", zipfile.ZIP_DEFLATED) as zf:
+        for nome, conteudo in arquivos.items():
+            zf.writestr(nome, conteudo)
+    return memoria.getvalue()
+
+
+def gerar_corpus(porte: str, semente: int = 2026) -> dict[str, object]:
+    """Devolve as fontes da carga inicial, do complemento e a contagem de XMLs.
+
+    A carga inicial leva S-5001 num ZIP aninhado e S-3000 para ~2% dos S-1200;
+    o complemento traz nova competência, nova vigência S-1010 e retificações.
+    """
+    cfg = PORTES[porte]
+    sorteio = random.Random(semente)
+    competencias = _competencias(0, cfg["competencias"])
+    principal: dict[str, str | bytes] = {"tabelas/s1000.xml": _s1000(), "tabelas/s1010.xml": _s1010(cfg["rubricas"], sorteio)}
+    bases: dict[str, str | bytes] = {}
+    recibos_ultima: list[str] = []
+    for competencia in competencias:
+        principal[f"s5011/{competencia}.xml"] = _s5011(competencia, sorteio)
+        for trabalhador in range(1, cfg["trabalhadores"] + 1):
+            recibo = f"R{trabalhador}-{competencia}"
+            principal[f"s1200/{competencia}/{trabalhador}.xml"] = _s1200(trabalhador, competencia, cfg, sorteio, recibo)
+            bases[f"{competencia}/{trabalhador}.xml"] = _s5001(trabalhador, competencia, sorteio)
+            if competencia == competencias[-1]:
+                recibos_ultima.append(recibo)
+            elif trabalhador % 50 == 1:
+                principal[f"s3000/{recibo}.xml"] = _s3000(recibo, competencia)
+    principal["bases/s5001.zip"] = _zip(bases)
+
+    nova = _competencias(cfg["competencias"], 1)[0]
+    complemento: dict[str, str | bytes] = {"s1010_nova_vigencia.xml": _s1010(cfg["rubricas"], sorteio, nova)}
+    for trabalhador in range(1, cfg["trabalhadores"] + 1):
+        complemento[f"s1200/{nova}/{trabalhador}.xml"] = _s1200(trabalhador, nova, cfg, sorteio, f"R{trabalhador}-{nova}")
+        complemento[f"s5001/{nova}/{trabalhador}.xml"] = _s5001(trabalhador, nova, sorteio)
+    complemento[f"s5011/{nova}.xml"] = _s5011(nova, sorteio)
+    for recibo in recibos_ultima[:: 20]:
+        trabalhador = int(recibo[1:].split("-", 1)[0])
+        complemento[f"retificacoes/{recibo}.xml"] = _s1200(
+            trabalhador, competencias[-1], cfg, sorteio, f"{recibo}-RET", retifica=recibo,
+        )
+    return {
+        "inicial": [("[PRINCIPAL] benchmark.zip", _zip(principal))],
+        "complemento": [("[COMPLEMENTO] benchmark.zip", _zip(complemento))],
+        "xml_inicial": len(principal) - 1 + len(bases),
+        "xml_complemento": len(complemento),
+    }
+
+
+def _pico_rss() -> int:
+    return memoria_processo_bytes()[1]
+
+
+@contextmanager
+def _medir(etapas: dict[str, dict[str, float]], nome: str, eventos: int = 0) -> Iterator[None]:
+    inicio_parede = time.perf_counter()
+    inicio_cpu = time.process_time()
+    yield
+    parede = time.perf_counter() - inicio_parede
+    etapas[nome] = {
+        "parede_segundos": parede,
+        "cpu_segundos": time.process_time() - inicio_cpu,
+        "pico_rss_bytes": float(_pico_rss()),
+        "eventos": float(eventos),
+        "eventos_por_segundo": eventos / parede if eventos and parede > 0 else 0.0,
+    }
+
+
+def _executar_uma_vez(corpus: dict[str, object], pasta: Path) -> tuple[dict[str, dict[str, float]], dict[str, int]]:
+    etapas: dict[str, dict[str, float]] = {}
+    with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": str(pasta / "workspaces")}):
+        with _medir(etapas, "processar_fontes_esocial", int(corpus["xml_inicial"])):
+            resultado = processar_fontes_esocial(corpus["inicial"])
+        db_path = str(resultado["db_path"])
+        with _medir(etapas, "atualizar_workspace_incremental", int(corpus["xml_complemento"])):
+            atualizar_workspace_incremental(resultado["workspace_temporario"], corpus["complemento"])
+
+        conn = sqlite3.connect(db_path)
+        try:
+            eventos = int(conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0])
+            with _medir(etapas, "materializar_tabelas_analiticas", eventos):
+                reiniciar_materializacao_analitica(conn)
+                materializar_tabelas_analiticas(conn)
+                conn.commit()
+            movimentos = int(conn.execute("SELECT COUNT(*) FROM rel_movimentos_cp").fetchone()[0])
+            contagens = {
+                "eventos": eventos,
+                "movimentos_cp": movimentos,
+                "bases_trabalhador": int(conn.execute("SELECT COUNT(*) FROM dados_bases_trabalhador").fetchone()[0]),
+                "exclusoes": int(conn.execute("SELECT COUNT(*) FROM dados_exclusoes").fetchone()[0]),
+            }
+        finally:
+            conn.close()
+
+        pacote = carregar_pacote_resumido(db_path)
+        with _medir(etapas, "gerar_pacote_excel_saida_sqlite", movimentos):
+            gerar_pacote_excel_saida_sqlite(
+                db_path=db_path,
+                pasta_saida=pasta / "saida",
+                df_empresa=resultado["empresa"],
+                df_resumo_visual=pacote["resumo_visual"],
+                df_rubricas_cp=pacote["rubricas_cp"],
+            )
+    return etapas, contagens
+
+
+def executar(porte: str = "pequeno", repeticoes: int = 1, semente: int = 2026) -> dict[str, object]:
+    """Executa o pipeline ``repeticoes`` vezes e registra a mediana por etapa."""
+    corpus = gerar_corpus(porte, semente)
+    medicoes: list[dict[str, dict[str, float]]] = []
+    contagens: dict[str, int] = {}
+    for _ in range(max(1, int(repeticoes))):
+        with tempfile.TemporaryDirectory(prefix="benchmark_esocial_") as pasta:
+            etapas_execucao, contagens = _executar_uma_vez(corpus, Path(pasta))
+            medicoes.append(etapas_execucao)
+    etapas = {
+        nome: {
+            metrica: statistics.median(medicao[nome][metrica] for medicao in medicoes)
+            for metrica in medicoes[0][nome]
+        }
+        for nome in medicoes[0]
+    }
+    return {
+        "versao_formato": VERSAO_FORMATO,
+        "porte": porte,
+        "parametros": dict(PORTES[porte], semente=semente, repeticoes=len(medicoes)),
+        "xml": {"inicial": corpus["xml_inicial"], "complemento": corpus["xml_complemento"]},
+        "contagens": contagens,
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": sys.platform,
+            "processador": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count() or 0,
+            "workers": os.environ.get("ESOCIAL_V10_WORKERS", ""),
+        },
+        "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "etapas": etapas,
+        "total_parede_segundos": sum(item["parede_segundos"] for item in etapas.values()),
+    }
+
+
+def comparar(atual: dict, anterior: dict, tolerancia: float = 0.10) -> list[dict[str, object]]:
+    """Compara tempo de parede por etapa; ``regressao`` indica piora acima da tolerância."""
+    if (atual.get("porte"), atual.get("parametros", {}).get("semente")) != (
+        anterior.get("porte"), anterior.get("parametros", {}).get("semente")
+    ):
+        raise ValueError("Linha de base gerada com outro porte ou semente; comparação não é válida.")
+    linhas = []
+    for nome, medicao in atual.get("etapas", {}).items():
+        base = anterior.get("etapas", {}).get(nome)
+        if not base:
+            continue
+        antes = float(base["parede_segundos"])
+        depois = float(medicao["parede_segundos"])
+        variacao = (depois - antes) / antes if antes else 0.0
+        linhas.append({
+            "etapa": nome,
+            "anterior_segundos": antes,
+            "atual_segundos": depois,
+            "variacao_percentual": variacao * 100,
+            "regressao": variacao > tolerancia,
+        })
+    return linhas
+
+
+def _imprimir(resultado: dict, comparacao: list[dict[str, object]], escrever: Callable[[str], None] = print) -> None:
+    escrever(f"porte: {resultado['porte']} | XML: {resultado['xml']} | contagens: {resultado['contagens']}")
+    for nome, medicao in resultado["etapas"].items():
+        escrever(
+            f"{nome}: {medicao['parede_segundos']:.3f}s parede | {medicao['cpu_segundos']:.3f}s CPU | "
+            f"{medicao['pico_rss_bytes'] / 1024 ** 2:.1f} MiB pico | {medicao['eventos_por_segundo']:.1f} eventos/s"
+        )
+    for linha in comparacao:
+        marca = "REGRESSAO" if linha["regressao"] else "ok"
+        escrever(
+            f"{linha['etapa']}: {linha['anterior_segundos']:.3f}s -> {linha['atual_segundos']:.3f}s "
+            f"({linha['variacao_percentual']:+.1f}%) {marca}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--porte", choices=sorted(PORTES), default="pequeno")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--semente", type=int, default=2026)
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--comparar-com", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    resultado = executar(args.porte, args.repeticoes, args.semente)
+    comparacao: list[dict[str, object]] = []
+    if args.comparar_com:
+        anterior = json.loads(Path(args.comparar_com).read_text(encoding="utf-8"))
+        comparacao = comparar(resultado, anterior, args.tolerancia)
+        resultado["comparacao"] = comparacao
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+    _imprimir(resultado, comparacao)
+    return 1 if any(linha["regressao"] for linha in comparacao) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
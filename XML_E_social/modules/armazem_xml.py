@@ -0,0 +1,179 @@
+"""Compressão dos XMLs preservados em ``eventos.xml_zlib`` com dicionário por tipo.
+
+Cada XML comprimido isoladamente repete envelope, namespaces e marcações do
+leiaute, e o zlib nível 1 mal aproveita essa redundância. O workspace treina um
+dicionário (``zdict`` do zlib, até 32 KiB) por tipo de evento a partir das
+primeiras amostras ingeridas e comprime os XMLs seguintes em deflate bruto com
+esse dicionário pré-carregado.
+
+Formato dos blobs:
+
+- fluxo zlib comum (primeiro byte ``0x78``): formato original, ainda aceito;
+- ``b"Z"`` + id do dicionário (4 bytes, big-endian) + deflate bruto.
+
+Os dicionários ficam em ``dicionarios_xml`` e nunca são alterados depois de
+gravados; um blob sempre referencia o id com que foi comprimido.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from typing import Iterable
+
+
+DICIONARIO_XML_ENV = "ESOCIAL_XML_DICIONARIO"
+DESCARTAR_XML_ENV = "ESOCIAL_DESCARTAR_XML"
+AMOSTRAS_DICIONARIO = 32
+TAMANHO_MAX_DICIONARIO = 32 * 1024
+LOTE_RECOMPACTACAO = 500
+NIVEL_COMPRESSAO = 1
+_FORMATO_DICIONARIO = b"Z"
+_CABECALHO = struct.Struct(">cI")
+
+
+def criar_tabela_dicionarios(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS dicionarios_xml ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT NOT NULL, "
+        "dicionario BLOB NOT NULL, amostras INTEGER NOT NULL, criado_em REAL NOT NULL)"
+    )
+
+
+def treinar_dicionario(amostras: Iterable[bytes]) -> bytes:
+    """Dicionário a partir das amostras; o zlib favorece o conteúdo do fim do ``zdict``.
+
+    As amostras mais antigas ficam no início e o corte preserva os últimos 32 KiB,
+    onde estão envelope e marcações repetidas em todos os eventos do tipo.
+    """
+    return b"".join(amostras)[-TAMANHO_MAX_DICIONARIO:]
+
+
+def _dicionario_habilitado() -> bool:
+    return os.environ.get(DICIONARIO_XML_ENV, "1").strip().lower() not in {"0", "false", "nao", "não"}
+
+
+class DicionariosXML:
+    """Dicionários de um workspace, pelo id gravado no blob e pelo tipo de evento."""
+
+    def __init__(self, por_id: dict[int, tuple[str, bytes]] | None = None):
+        self.por_id: dict[int, tuple[str, bytes]] = {}
+        self.por_tipo: dict[str, tuple[int, bytes]] = {}
+        self.substituir(por_id or {})
+
+    @classmethod
+    def carregar(cls, conn: sqlite3.Connection) -> "DicionariosXML":
+        criar_tabela_dicionarios(conn)
+        return cls({
+            int(id_): (str(tipo), bytes(dicionario))
+            for id_, tipo, dicionario in conn.execute(
+                "SELECT id, tipo, dicionario FROM dicionarios_xml ORDER BY id"
+            )
+        })
+
+    def substituir(self, por_id: dict[int, tuple[str, bytes]]) -> None:
+        self.por_id.clear()
+        self.por_tipo.clear()
+        for id_, (tipo, dicionario) in sorted(por_id.items()):
+            self.registrar(id_, tipo, dicionario)
+
+    def registrar(self, id_: int, tipo: str, dicionario: bytes) -> None:
+        self.por_id[id_] = (tipo, dicionario)
+        self.por_tipo[tipo] = (id_, dicionario)
+
+    def comprimir(self, tipo: str, xml_bytes: bytes) -> bytes:
+        vigente = self.por_tipo.get(tipo)
+        if vigente is None:
+            return zlib.compress(xml_bytes, level=NIVEL_COMPRESSAO)
+        id_, dicionario = vigente
+        compressor = zlib.compressobj(NIVEL_COMPRESSAO, zlib.DEFLATED, -15, zdict=dicionario)
+        return _CABECALHO.pack(_FORMATO_DICIONARIO, id_) + compressor.compress(xml_bytes) + compressor.flush()
+
+    def descomprimir(self, blob: bytes) -> bytes:
+        if blob[:1] != _FORMATO_DICIONARIO:
+            return zlib.decompress(blob)
+        _, id_ = _CABECALHO.unpack_from(blob)
+        if id_ not in self.por_id:
+            raise ValueError(f"Dicionário de compressão {id_} ausente no workspace.")
+        descompressor = zlib.decompressobj(-15, zdict=self.por_id[id_][1])
+        return descompressor.decompress(blob[_CABECALHO.size:]) + descompressor.flush()
+
+
+def usa_dicionario(blob: bytes | None) -> bool:
+    return bool(blob) and blob[:1] == _FORMATO_DICIONARIO
+
+
+class TreinadorDicionarios:
+    """Acumula as primeiras amostras de cada tipo no escritor e grava o dicionário."""
+
+    def __init__(self, dicionarios: DicionariosXML, amostras: int = AMOSTRAS_DICIONARIO):
+        self.dicionarios = dicionarios
+        self.quantidade = max(1, int(amostras))
+        self.habilitado = _dicionario_habilitado()
+        self._amostras: dict[str, list[bytes]] = {}
+
+    def observar(self, conn: sqlite3.Connection, tipo: str, blob: bytes) -> None:
+        if not self.habilitado or tipo in self.dicionarios.por_tipo:
+            return
+        amostras = self._amostras.setdefault(tipo, [])
+        amostras.append(self.dicionarios.descomprimir(blob))
+        if len(amostras) < self.quantidade:
+            return
+        dicionario = treinar_dicionario(amostras)
+        cur = conn.execute(
+            "INSERT INTO dicionarios_xml(tipo, dicionario, amostras, criado_em) VALUES (?, ?, ?, ?)",
+            (tipo, sqlite3.Binary(dicionario), len(amostras), time.time()),
+        )
+        self.dicionarios.registrar(int(cur.lastrowid), tipo, dicionario)
+        del self._amostras[tipo]
+
+
+def recompactar_xml(conn: sqlite3.Connection, dicionarios: DicionariosXML) -> int:
+    """Regrava com dicionário os blobs ainda no formato original dos tipos treinados.
+
+    Cobre as amostras usadas no treino e, na carga com workers, os XMLs
+    comprimidos antes de o dicionário existir. É idempotente e retomável.
+    """
+    total = 0
+    for tipo in sorted(dicionarios.por_tipo):
+        ultimo_id = 0
+        while True:
+            lote = conn.execute(
+                "SELECT id, xml_zlib FROM eventos WHERE tipo=? AND id>? "
+                "AND xml_zlib IS NOT NULL AND substr(xml_zlib,1,1)<>? ORDER BY id LIMIT ?",
+                (tipo, ultimo_id, _FORMATO_DICIONARIO, LOTE_RECOMPACTACAO),
+            ).fetchall()
+            if not lote:
+                break
+            conn.executemany(
+                "UPDATE eventos SET xml_zlib=? WHERE id=?",
+                [
+                    (sqlite3.Binary(dicionarios.comprimir(tipo, dicionarios.descomprimir(blob))), evento_id)
+                    for evento_id, blob in lote
+                ],
+            )
+            conn.commit()
+            total += len(lote)
+            ultimo_id = int(lote[-1][0])
+    return total
+
+
+def descartar_xml_processados(conn: sqlite3.Connection) -> int:
+    """Libera os XMLs que o workspace não volta a ler (``ESOCIAL_DESCARTAR_XML=1``).
+
+    S-1010 já virou objeto na ingestão, S-5001/S-5011 processados já estão no
+    staging e eventos substituídos por retificação não voltam ao parser.
+    Os S-1200 ativos são mantidos: um S-1010 novo pode exigir reclassificá-los.
+    As páginas liberadas são reaproveitadas pelas tabelas analíticas.
+    """
+    if os.environ.get(DESCARTAR_XML_ENV, "0").strip() != "1":
+        return 0
+    cur = conn.execute(
+        "UPDATE eventos SET xml_zlib=NULL WHERE xml_zlib IS NOT NULL AND ("
+        "ativo=0 OR tipo='S-1010' "
+        "OR (tipo IN ('S-5001','S-5011') AND processado_segunda=1))"
+    )
+    conn.commit()
+    return int(cur.rowcount or 0)
@@ -0,0 +1,166 @@
+"""Contagem aproximada de valores distintos (HyperLogLog) para agregados SQLite.
+
+``COUNT(DISTINCT cpf)`` exige uma árvore temporária por grupo, que vai para disco
+nas empresas grandes. O esboço HyperLogLog tem tamanho limitado, pode ser gravado
+nas tabelas de resumo e unido entre células sem rever os movimentos; o erro
+padrão com ``PRECISAO_HLL = 12`` é de ~1,6%. Conjuntos pequenos ficam no
+registro esparso (poucos bytes por célula) e saem praticamente exatos.
+
+O hash é ``blake2b`` de 64 bits, estável entre processos, para que esboços
+gravados no workspace continuem combináveis em execuções futuras.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import sqlite3
+import struct
+
+
+PRECISAO_HLL = 12
+REGISTROS_HLL = 1 << PRECISAO_HLL
+_BITS_RESTO = 64 - PRECISAO_HLL
+_ESPARSO = b"S"
+_DENSO = b"D"
+_PAR = struct.Struct("<HB")
+
+
+def _registro(valor: object) -> tuple[int, int]:
+    digest = hashlib.blake2b(str(valor).encode("utf-8"), digest_size=8).digest()
+    x = int.from_bytes(digest, "big")
+    resto = x & ((1 << _BITS_RESTO) - 1)
+    return x >> _BITS_RESTO, _BITS_RESTO - resto.bit_length() + 1
+
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        anterior = z
+        z += x * y
+        y += y
+        if z == anterior:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        anterior = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == anterior:
+            return z / 3
+
+
+class EsbocoHLL:
+    """Esboço HyperLogLog com registros esparsos até ficar mais barato o denso."""
+
+    __slots__ = ("registros",)
+
+    def __init__(self):
+        self.registros: dict[int, int] = {}
+
+    def adicionar(self, valor: object) -> None:
+        if valor is None:
+            return
+        indice, rho = _registro(valor)
+        if rho > self.registros.get(indice, 0):
+            self.registros[indice] = rho
+
+    def unir(self, outro: "EsbocoHLL") -> None:
+        registros = self.registros
+        for indice, rho in outro.registros.items():
+            if rho > registros.get(indice, 0):
+                registros[indice] = rho
+
+    def estimar(self) -> int:
+        if not self.registros:
+            return 0
+        # Estimador de Ertl (2017): sem tabelas empíricas de viés e contínuo entre
+        # a faixa de contagem linear e a faixa assintótica do HyperLogLog.
+        histograma = [0] * (_BITS_RESTO + 2)
+        histograma[0] = REGISTROS_HLL - len(self.registros)
+        for rho in self.registros.values():
+            histograma[rho] += 1
+        z = REGISTROS_HLL * _tau(1 - histograma[_BITS_RESTO + 1] / REGISTROS_HLL)
+        for k in range(_BITS_RESTO, 0, -1):
+            z = 0.5 * (z + histograma[k])
+        z += REGISTROS_HLL * _sigma(histograma[0] / REGISTROS_HLL)
+        return int(round(REGISTROS_HLL * REGISTROS_HLL / (2 * math.log(2) * z)))
+
+    def serializar(self) -> bytes:
+        if len(self.registros) * _PAR.size < REGISTROS_HLL:
+            return _ESPARSO + b"".join(
+                _PAR.pack(indice, rho) for indice, rho in sorted(self.registros.items())
+            )
+        denso = bytearray(REGISTROS_HLL)
+        for indice, rho in self.registros.items():
+            denso[indice] = rho
+        return _DENSO + bytes(denso)
+
+    @classmethod
+    def desserializar(cls, blob: bytes | None) -> "EsbocoHLL":
+        esboco = cls()
+        if not blob:
+            return esboco
+        formato, corpo = blob[:1], blob[1:]
+        if formato == _ESPARSO:
+            esboco.registros = dict(_PAR.iter_unpack(corpo))
+        elif formato == _DENSO:
+            esboco.registros = {indice: rho for indice, rho in enumerate(corpo) if rho}
+        else:
+            raise ValueError("Esboço HyperLogLog em formato desconhecido.")
+        return esboco
+
+
+class _AgregadoEsboco:
+    """``hll_esboco(valor)``: esboço serializado dos valores do grupo."""
+
+    def __init__(self):
+        self.esboco = EsbocoHLL()
+
+    def step(self, valor):
+        self.esboco.adicionar(valor)
+
+    def finalize(self):
+        return self.esboco.serializar()
+
+
+class _AgregadoUniao:
+    """``hll_uniao(esboco)``: união de esboços já gravados."""
+
+    def __init__(self):
+        self.esboco = EsbocoHLL()
+
+    def step(self, blob):
+        self.esboco.unir(EsbocoHLL.desserializar(blob))
+
+    def finalize(self):
+        return self.esboco.serializar()
+
+
+class _AgregadoQuantidade(_AgregadoEsboco):
+    """``hll_qtd(valor)``: substituto aproximado de ``COUNT(DISTINCT valor)``."""
+
+    def finalize(self):
+        return self.esboco.estimar()
+
+
+class _AgregadoQuantidadeEsbocos(_AgregadoUniao):
+    """``hll_qtd_esbocos(esboco)``: distintos estimados na união dos esboços."""
+
+    def finalize(self):
+        return self.esboco.estimar()
+
+
+def registrar_funcoes_hll(conn: sqlite3.Connection) -> None:
+    conn.create_aggregate("hll_esboco", 1, _AgregadoEsboco)
+    conn.create_aggregate("hll_uniao", 1, _AgregadoUniao)
+    conn.create_aggregate("hll_qtd", 1, _AgregadoQuantidade)
+    conn.create_aggregate("hll_qtd_esbocos", 1, _AgregadoQuantidadeEsbocos)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import csv
+import os
 import sqlite3
 import zipfile
 from dataclasses import dataclass, field
@@ -8,14 +9,18 @@ from datetime import date, datetime
 from pathlib import Path
 from typing import Callable, Iterable, Iterator, Sequence
 
+import numpy as np
 import pandas as pd
 from openpyxl import Workbook, load_workbook
 
+from modules.xlsx_streaming import WorkbookStreaming
+
 
 ProgressCallback = Callable[[float, str], None]
 MAX_DADOS_ABA = 1_048_575
 CHUNK_EXPORT = 25_000
 CARACTERES_INVALIDOS_ABA = set(r"[]:*?/\\")
+BACKENDS_XLSX = ("openpyxl", "nativo")
 
 
 @dataclass(frozen=True)
@@ -69,6 +74,8 @@ def _nome_aba(nome: str, parte: int, total_partes: int, usados: set[str]) -> str
 def _valor_excel(valor: object) -> object:
     if valor is None:
         return None
+    if isinstance(valor, (np.integer, np.floating, np.bool_)):
+        valor = valor.item()
     if isinstance(valor, float) and pd.isna(valor):
         return None
     if isinstance(valor, pd.Timestamp):
@@ -78,6 +85,16 @@ def _valor_excel(valor: object) -> object:
     return str(valor)
 
 
+def _backend_xlsx(backend: str | None) -> str:
+    """Resolve o backend de escrita; ``ESOCIAL_XLSX_NATIVO=1`` ativa o nativo."""
+    if backend is None:
+        valor = os.environ.get("ESOCIAL_XLSX_NATIVO", "").strip().lower()
+        backend = "nativo" if valor in {"1", "true", "sim", "nativo"} else "openpyxl"
+    if backend not in BACKENDS_XLSX:
+        raise ValueError(f"Backend XLSX desconhecido: {backend}")
+    return backend
+
+
 def _iter_dataframe(
     dataframe: pd.DataFrame,
 ) -> tuple[list[str], int, Iterator[Sequence[object]]]:
@@ -110,7 +127,7 @@ def _total_query(conn: sqlite3.Connection, query: str, params: tuple) -> int:
 
 
 def _escrever_fonte(
-    workbook: Workbook,
+    workbook: Workbook | WorkbookStreaming,
     fonte: FontePlanilha,
     conn: sqlite3.Connection | None,
     usados: set[str],
@@ -134,6 +151,9 @@ def _escrever_fonte(
         colunas, total, linhas = _iter_dataframe(dataframe)
 
     total_partes = max(1, (total + max_dados_aba - 1) // max_dados_aba)
+    # O backend nativo serializa cada tipo diretamente; só o openpyxl precisa
+    # da normalização célula a célula.
+    nativo = isinstance(workbook, WorkbookStreaming)
     controles: list[ControleAba] = []
     planilha = None
     exportadas_parte = 0
@@ -167,7 +187,7 @@ def _escrever_fonte(
     for linha in linhas:
         if exportadas_parte >= max_dados_aba:
             nova_planilha()
-        planilha.append([_valor_excel(valor) for valor in linha])
+        planilha.append(linha if nativo else [_valor_excel(valor) for valor in linha])
         exportadas_parte += 1
         exportadas_total += 1
         if exportadas_total % chunk == 0:
@@ -199,7 +219,7 @@ def _escrever_fonte(
 
 
 def _escrever_controle(
-    workbook: Workbook, controles: Iterable[ControleAba], usados: set[str]
+    workbook: Workbook | WorkbookStreaming, controles: Iterable[ControleAba], usados: set[str]
 ) -> None:
     ws = workbook.create_sheet(
         _nome_aba("controle_integridade", 1, 1, usados)
@@ -294,33 +314,48 @@ def gerar_workbook(
     validacao_completa: bool = False,
     max_dados_aba: int = MAX_DADOS_ABA,
     chunk: int = CHUNK_EXPORT,
+    backend: str | None = None,
 ) -> ResultadoWorkbook:
+    """Gera o workbook consolidado com abas divididas e controle de integridade.
+
+    ``backend="nativo"`` grava o XML das abas direto no ZIP em streaming
+    (``modules.xlsx_streaming``); o padrão segue ``ESOCIAL_XLSX_NATIVO``.
+    """
     destino = Path(caminho_saida).expanduser().resolve()
     destino.parent.mkdir(parents=True, exist_ok=True)
     parcial = destino.with_name(f"{destino.stem}.parcial{destino.suffix}")
-    workbook = Workbook(write_only=True)
+    if _backend_xlsx(backend) == "nativo":
+        workbook: Workbook | WorkbookStreaming = WorkbookStreaming(parcial)
+    else:
+        workbook = Workbook(write_only=True)
     usados: set[str] = set()
     controles: list[ControleAba] = []
     total_fontes = max(len(fontes), 1)
 
     _progresso(progress_callback, 0.01, "Preparando workbook consolidado...")
-    for indice, fonte in enumerate(fontes):
-        inicio = 0.02 + 0.90 * indice / total_fontes
-        fim = 0.02 + 0.90 * (indice + 1) / total_fontes
-        controles.extend(
-            _escrever_fonte(
-                workbook,
-                fonte,
-                conexao,
-                usados,
-                progress_callback,
-                inicio,
-                fim,
-                max_dados_aba,
-                chunk,
+    try:
+        for indice, fonte in enumerate(fontes):
+            inicio = 0.02 + 0.90 * indice / total_fontes
+            fim = 0.02 + 0.90 * (indice + 1) / total_fontes
+            controles.extend(
+                _escrever_fonte(
+                    workbook,
+                    fonte,
+                    conexao,
+                    usados,
+                    progress_callback,
+                    inicio,
+                    fim,
+                    max_dados_aba,
+                    chunk,
+                )
             )
-        )
-    _escrever_controle(workbook, controles, usados)
+        _escrever_controle(workbook, controles, usados)
+    except BaseException:
+        if isinstance(workbook, WorkbookStreaming):
+            workbook.close()
+            parcial.unlink(missing_ok=True)
+        raise
     _progresso(progress_callback, 0.94, "Salvando workbook consolidado...")
     workbook.save(parcial)
     _progresso(progress_callback, 0.97, "Validando workbook e integridade...")
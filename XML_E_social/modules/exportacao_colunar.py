@@ -0,0 +1,394 @@
+"""Exportação colunar (Parquet particionado ou CSV gzip) para BI.
+
+Cada fonte é lida do SQLite em lotes de tamanho fixo e gravada sem montar o
+conjunto inteiro em memória. Em Parquet, fontes com ``per_apur`` são
+particionadas no estilo Hive (``tabela/per_apur=2026-01/part-00000.parquet``);
+em CSV cada fonte vira um ``tabela.csv.gz``. Ao final é gravado o manifesto de
+integridade no mesmo formato de ``rel_controle_integridade`` (tabela,
+quantidade, soma_valores), conferido com o banco, e a lista de arquivos.
+
+O Parquet depende de ``pyarrow`` (opcional); o CSV usa apenas a biblioteca padrão.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, Sequence
+
+import pandas as pd
+
+
+ProgressCallback = Callable[[float, str], None]
+FORMATOS_COLUNARES = ("parquet", "csv")
+LOTE_EXPORTACAO_COLUNAR = 50_000
+PARTICAO_PADRAO = "per_apur"
+PARTICAO_VAZIA = "__HIVE_DEFAULT_PARTITION__"
+TOLERANCIA_SOMA = 0.01
+
+# Mesma coluna somada por ``rel_controle_integridade`` para cada tabela.
+COLUNAS_SOMA_INTEGRIDADE = {
+    "rel_movimentos_cp": "vr_rubr",
+    "dados_bases_trabalhador": "valor",
+    "dados_bases_contribuicao": "vr_bc_cp",
+}
+
+
+@dataclass(frozen=True)
+class FonteColunar:
+    nome: str
+    query: str | None = None
+    params: tuple = ()
+    dataframe: pd.DataFrame | None = None
+    particao: str = PARTICAO_PADRAO
+    coluna_soma: str = ""
+
+
+@dataclass
+class ControleColunar:
+    tabela: str
+    quantidade: int
+    soma_valores: float
+    quantidade_banco: int
+    soma_valores_banco: float
+    status: str
+
+
+@dataclass
+class ResultadoColunar:
+    pasta: str
+    formato: str
+    controles: list[ControleColunar] = field(default_factory=list)
+    arquivos: list[dict] = field(default_factory=list)
+    manifesto: str = ""
+    manifesto_arquivos: str = ""
+
+
+def _progresso(callback: ProgressCallback | None, valor: float, mensagem: str) -> None:
+    if callback:
+        callback(max(0.0, min(1.0, valor)), mensagem)
+
+
+def _nome_seguro(valor: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]", "_", valor) or "fonte"
+
+
+def _q(nome: str) -> str:
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+def _numero(valor: object) -> float:
+    """Equivalente a ``CAST(valor AS REAL)`` usado no controle do banco."""
+    if valor is None:
+        return 0.0
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _tipos_query(conn: sqlite3.Connection, query: str, params: tuple, colunas: list[str]) -> list[str]:
+    """Descobre o tipo efetivo de cada coluna com uma única varredura ``typeof``.
+
+    O SQLite tem tipagem dinâmica e as tabelas ``rel_*`` criadas por ``CREATE
+    TABLE AS`` não declaram tipo; o schema do Parquet precisa ser fixo.
+    """
+    if not colunas:
+        return []
+    agregados = ",".join(
+        f"MAX(typeof({_q(c)}) IN ('text','blob')),MAX(typeof({_q(c)})='real'),MAX(typeof({_q(c)})='integer')"
+        for c in colunas
+    )
+    linha = conn.execute(f"SELECT {agregados} FROM ({query}) AS fonte_colunar", params).fetchone()
+    tipos = []
+    for posicao in range(len(colunas)):
+        texto, real, inteiro = (linha[posicao * 3 : posicao * 3 + 3] if linha else (None, None, None))
+        if texto or not (real or inteiro):
+            tipos.append("texto")
+        elif real:
+            tipos.append("real")
+        else:
+            tipos.append("inteiro")
+    return tipos
+
+
+def _tipos_dataframe(dataframe: pd.DataFrame) -> list[str]:
+    tipos = []
+    for dtype in dataframe.dtypes:
+        if pd.api.types.is_bool_dtype(dtype):
+            tipos.append("booleano")
+        elif pd.api.types.is_integer_dtype(dtype):
+            tipos.append("inteiro")
+        elif pd.api.types.is_float_dtype(dtype):
+            tipos.append("real")
+        else:
+            tipos.append("texto")
+    return tipos
+
+
+def _texto(valor: object) -> str | None:
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return bytes(valor).hex()
+    return valor if isinstance(valor, str) else str(valor)
+
+
+def _lotes_fonte(
+    conn: sqlite3.Connection | None, fonte: FonteColunar, lote: int, particionar: bool
+) -> tuple[list[str], list[str], int, Iterator[list[tuple]]]:
+    """Devolve colunas, tipos, total esperado e o iterador de lotes da fonte."""
+    if fonte.query is None:
+        dataframe = fonte.dataframe if fonte.dataframe is not None else pd.DataFrame()
+        colunas = [str(c) for c in dataframe.columns]
+        if particionar:
+            dataframe = dataframe.sort_values(fonte.particao, kind="stable", na_position="first")
+
+        def lotes_dataframe() -> Iterator[list[tuple]]:
+            for inicio in range(0, len(dataframe), lote):
+                parte = dataframe.iloc[inicio : inicio + lote]
+                parte = parte.astype(object).where(parte.notna(), None)
+                yield list(parte.itertuples(index=False, name=None))
+
+        return colunas, _tipos_dataframe(dataframe), len(dataframe), lotes_dataframe()
+
+    if conn is None:
+        raise ValueError(f"A fonte '{fonte.nome}' exige uma conexao SQLite.")
+    sql = f"SELECT * FROM ({fonte.query}) AS fonte_colunar"
+    if particionar:
+        sql += f" ORDER BY {_q(fonte.particao)}"
+    total = int(conn.execute(f"SELECT COUNT(*) FROM ({fonte.query}) AS fonte_colunar", fonte.params).fetchone()[0])
+    cursor = conn.execute(sql, fonte.params)
+    colunas = [str(d[0]) for d in cursor.description]
+    tipos = _tipos_query(conn, fonte.query, fonte.params, colunas)
+
+    def lotes_query() -> Iterator[list[tuple]]:
+        try:
+            while True:
+                bloco = cursor.fetchmany(lote)
+                if not bloco:
+                    return
+                yield bloco
+        finally:
+            cursor.close()
+
+    return colunas, tipos, total, lotes_query()
+
+
+class _EscritorParquet:
+    """Mantém um ``ParquetWriter`` por partição, fechado ao mudar de partição."""
+
+    def __init__(
+        self, destino: Path, colunas: list[str], tipos: list[str], particao: int | None, nome_particao: str = "",
+    ):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self.destino = destino
+        self.particao = particao
+        self.nome_particao = nome_particao
+        tipos_arrow = {"texto": pa.string(), "real": pa.float64(), "inteiro": pa.int64(), "booleano": pa.bool_()}
+        self._indices = [i for i in range(len(colunas)) if i != particao]
+        self._conversores = [
+            _texto if tipos[i] == "texto" else (lambda v: None if v is None or v != v else v)
+            for i in self._indices
+        ]
+        self.schema = pa.schema([(colunas[i], tipos_arrow[tipos[i]]) for i in self._indices])
+        self._writer = None
+        self._valor_atual: object = object()
+        self._sequencia = 0
+        self.arquivos: list[dict] = []
+
+    def _abrir(self, valor: object, particionado: bool = True) -> None:
+        self.fechar()
+        pasta = self.destino
+        rotulo = ""
+        if self.particao is not None and particionado:
+            rotulo = _texto(valor) or ""
+            pasta = pasta / f"{self.nome_particao}={_nome_seguro(rotulo) if rotulo else PARTICAO_VAZIA}"
+        pasta.mkdir(parents=True, exist_ok=True)
+        caminho = pasta / f"part-{self._sequencia:05d}.parquet"
+        self._sequencia += 1
+        self._writer = self._pq.ParquetWriter(caminho, self.schema)
+        self.arquivos.append({"arquivo": caminho, "particao": rotulo, "linhas": 0})
+        self._valor_atual = valor
+
+    def escrever(self, linhas: Sequence[tuple]) -> None:
+        if self.particao is None:
+            if self._writer is None:
+                self._abrir(None)
+            self._gravar(linhas)
+            return
+        inicio = 0
+        for posicao, linha in enumerate(linhas):
+            valor = linha[self.particao]
+            if self._writer is None or valor != self._valor_atual:
+                if posicao > inicio and self._writer is not None:
+                    self._gravar(linhas[inicio:posicao])
+                self._abrir(valor)
+                inicio = posicao
+        if len(linhas) > inicio:
+            self._gravar(linhas[inicio:])
+
+    def _gravar(self, linhas: Sequence[tuple]) -> None:
+        colunas = [
+            self._pa.array([conversor(linha[i]) for linha in linhas], type=campo.type)
+            for i, conversor, campo in zip(self._indices, self._conversores, self.schema)
+        ]
+        self._writer.write_batch(self._pa.record_batch(colunas, schema=self.schema))
+        self.arquivos[-1]["linhas"] += len(linhas)
+
+    def garantir_arquivo(self) -> None:
+        """Fonte vazia: grava um arquivo sem linhas para preservar o schema."""
+        if not self.arquivos:
+            self._abrir(None, particionado=False)
+
+    def fechar(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _exportar_fonte(
+    conn: sqlite3.Connection | None,
+    fonte: FonteColunar,
+    pasta: Path,
+    formato: str,
+    lote: int,
+) -> tuple[int, float, int, list[dict]]:
+    """Grava uma fonte e devolve ``(linhas, soma, total_esperado, arquivos)``."""
+    particionar = False
+    if formato == "parquet" and fonte.particao:
+        if fonte.query is not None and conn is not None:
+            colunas_fonte = [d[0] for d in conn.execute(f"SELECT * FROM ({fonte.query}) AS fonte_colunar LIMIT 0", fonte.params).description]
+        else:
+            colunas_fonte = [str(c) for c in (fonte.dataframe.columns if fonte.dataframe is not None else [])]
+        particionar = fonte.particao in colunas_fonte
+    colunas, tipos, total, lotes = _lotes_fonte(conn, fonte, lote, particionar)
+    indice_soma = colunas.index(fonte.coluna_soma) if fonte.coluna_soma in colunas else None
+    linhas_total = 0
+    soma = 0.0
+
+    if formato == "parquet":
+        escritor = _EscritorParquet(
+            pasta / _nome_seguro(fonte.nome), colunas, tipos,
+            colunas.index(fonte.particao) if particionar else None, fonte.particao,
+        )
+        try:
+            for bloco in lotes:
+                escritor.escrever(bloco)
+                linhas_total += len(bloco)
+                if indice_soma is not None:
+                    soma += sum(_numero(linha[indice_soma]) for linha in bloco)
+            escritor.garantir_arquivo()
+        finally:
+            escritor.fechar()
+        arquivos = escritor.arquivos
+    else:
+        caminho = pasta / f"{_nome_seguro(fonte.nome)}.csv.gz"
+        with gzip.open(caminho, "wt", encoding="utf-8-sig", newline="", compresslevel=6) as arquivo:
+            writer = csv.writer(arquivo, delimiter=";")
+            writer.writerow(colunas)
+            for bloco in lotes:
+                writer.writerows(bloco)
+                linhas_total += len(bloco)
+                if indice_soma is not None:
+                    soma += sum(_numero(linha[indice_soma]) for linha in bloco)
+        arquivos = [{"arquivo": caminho, "particao": "", "linhas": linhas_total}]
+    return linhas_total, soma, total, arquivos
+
+
+def _controle_banco(conn: sqlite3.Connection | None) -> dict[str, tuple[int, float]]:
+    if conn is None:
+        return {}
+    try:
+        return {
+            str(tabela): (int(quantidade or 0), float(soma or 0.0))
+            for tabela, quantidade, soma in conn.execute(
+                "SELECT tabela,quantidade,soma_valores FROM rel_controle_integridade"
+            )
+        }
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _gravar_csv(caminho: Path, linhas: list[dict], campos: list[str]) -> None:
+    with caminho.open("w", newline="", encoding="utf-8-sig") as arquivo:
+        writer = csv.DictWriter(arquivo, fieldnames=campos, delimiter=";")
+        writer.writeheader()
+        writer.writerows(linhas)
+
+
+def exportar_fontes_colunares(
+    pasta_saida: str | Path,
+    fontes: Sequence[FonteColunar],
+    *,
+    conexao: sqlite3.Connection | None = None,
+    formato: str = "parquet",
+    lote: int = LOTE_EXPORTACAO_COLUNAR,
+    progress_callback: ProgressCallback | None = None,
+) -> ResultadoColunar:
+    """Exporta as fontes e grava ``manifesto_integridade.csv`` e ``manifesto_arquivos.csv``.
+
+    A quantidade exportada de cada fonte é conferida com o ``COUNT(*)`` da
+    consulta e, quando a tabela consta de ``rel_controle_integridade``, também
+    quantidade e soma com o banco; divergência interrompe a exportação.
+    """
+    if formato not in FORMATOS_COLUNARES:
+        raise ValueError(f"Formato colunar desconhecido: {formato}")
+    if formato == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError(
+                "A exportação Parquet exige o pacote pyarrow. Instale-o ou use o formato csv."
+            ) from exc
+    pasta = Path(pasta_saida).expanduser().resolve()
+    pasta.mkdir(parents=True, exist_ok=True)
+    banco = _controle_banco(conexao)
+    resultado = ResultadoColunar(pasta=str(pasta), formato=formato)
+    total_fontes = max(len(fontes), 1)
+
+    for indice, fonte in enumerate(fontes):
+        _progresso(
+            progress_callback, 0.02 + 0.93 * indice / total_fontes,
+            f"Exportando {fonte.nome} ({formato})...",
+        )
+        linhas, soma, esperado, arquivos = _exportar_fonte(conexao, fonte, pasta, formato, lote)
+        quantidade_banco, soma_banco = banco.get(fonte.nome, (esperado, soma))
+        status = (
+            "OK"
+            if linhas == esperado == quantidade_banco and abs(soma - soma_banco) <= TOLERANCIA_SOMA
+            else "REVISAR"
+        )
+        resultado.controles.append(
+            ControleColunar(fonte.nome, linhas, round(soma, 2), quantidade_banco, round(soma_banco, 2), status)
+        )
+        for item in arquivos:
+            caminho = Path(item["arquivo"])
+            resultado.arquivos.append({
+                "tabela": fonte.nome,
+                "arquivo": caminho.relative_to(pasta).as_posix(),
+                "particao": item["particao"],
+                "linhas": item["linhas"],
+                "bytes": caminho.stat().st_size,
+            })
+        if status != "OK":
+            raise RuntimeError(
+                f"Integridade de '{fonte.nome}': esperado={esperado}, banco={quantidade_banco}, "
+                f"exportado={linhas}, soma={soma:.2f}, soma_banco={soma_banco:.2f}."
+            )
+
+    manifesto = pasta / "manifesto_integridade.csv"
+    _gravar_csv(manifesto, [vars(c) for c in resultado.controles], list(ControleColunar.__dataclass_fields__))
+    manifesto_arquivos = pasta / "manifesto_arquivos.csv"
+    _gravar_csv(manifesto_arquivos, resultado.arquivos, ["tabela", "arquivo", "particao", "linhas", "bytes"])
+    resultado.manifesto = str(manifesto)
+    resultado.manifesto_arquivos = str(manifesto_arquivos)
+    _progresso(progress_callback, 1.0, f"Exportação {formato} concluída e conferida.")
+    return resultado
@@ -20,6 +20,8 @@ class DadosHUDIngestao:
     fontes_com_erro: str = "—"
     volume_restante: str = "—"
     tempo_decorrido: str = "—"
+    workers: str = "—"
+    ritmo_por_worker: str = "—"
 
 
 def _capturar(texto: str, padrao: str, valor_padrao: str = "—") -> str:
@@ -63,4 +65,6 @@ def extrair_hud_ingestao(detalhes: str, mensagem: str = "") -> DadosHUDIngestao:
         fontes_com_erro=_capturar(texto, r"com erro\s+([\d.,]+)"),
         volume_restante=_capturar(texto, r"restante conhecido\s+([^|]+?)(?:\s*\||\.$|$)"),
         tempo_decorrido=_capturar(texto, r"decorrido\s+([^|]+?)(?:\s*\||\.$|$)"),
+        workers=_capturar(texto, r"workers\s+([\d.,]+\s*/\s*[\d.,]+)").replace("/", " de "),
+        ritmo_por_worker=_capturar(texto, r"([\d.,]+\s+itens/s)\s+por worker"),
     )
@@ -0,0 +1,268 @@
+"""Leitura de ZIPs aninhados no próprio arquivo de origem e leitura antecipada.
+
+Um ZIP interno gravado sem compressão (``ZIP_STORED``) é aberto diretamente por
+``SubArquivo``, uma janela somente leitura sobre os bytes do membro no arquivo
+externo: nenhum byte é copiado. Um ZIP interno comprimido precisa de acesso
+aleatório ao diretório central. ``materializar_cadeia`` o descomprime uma única
+vez para disco, e essa cópia é compartilhada pelo escritor, pelos workers e
+pela leitura antecipada. ``abrir_zip_fonte`` sem cópia prévia descomprime em
+memória até ``ESOCIAL_ZIP_ANINHADO_MEMORIA_MB``; acima disso o
+``SpooledTemporaryFile`` transborda para o temporário do sistema.
+
+``LeituraAntecipada`` descomprime os próximos membros XML em uma thread enquanto
+o escritor interpreta o atual; a descompressão do zlib libera o GIL.
+"""
+from __future__ import annotations
+
+import io
+import os
+import queue
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Iterator, Sequence
+
+
+MEMORIA_ZIP_ANINHADO_ENV = "ESOCIAL_ZIP_ANINHADO_MEMORIA_MB"
+LEITURA_ANTECIPADA_ENV = "ESOCIAL_LEITURA_ANTECIPADA"
+MEMORIA_ZIP_ANINHADO_PADRAO_MB = 256
+MEMBROS_LEITURA_ANTECIPADA = 32
+BYTES_LEITURA_ANTECIPADA = 64 * 1024 * 1024
+_CABECALHO_LOCAL = struct.Struct("<4s22xHH")
+_ASSINATURA_LOCAL = b"PK\x03\x04"
+
+
+class SubArquivo(io.RawIOBase):
+    """Janela ``[inicio, inicio + tamanho)`` de um arquivo aberto, somente leitura."""
+
+    def __init__(self, base, inicio: int, tamanho: int):
+        super().__init__()
+        self._base = base
+        self._inicio = int(inicio)
+        self._tamanho = int(tamanho)
+        self._posicao = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def seek(self, deslocamento: int, origem: int = io.SEEK_SET) -> int:
+        if origem == io.SEEK_SET:
+            posicao = deslocamento
+        elif origem == io.SEEK_CUR:
+            posicao = self._posicao + deslocamento
+        elif origem == io.SEEK_END:
+            posicao = self._tamanho + deslocamento
+        else:
+            raise ValueError(f"Origem de seek inválida: {origem}")
+        if posicao < 0:
+            raise ValueError("Posição negativa em SubArquivo")
+        self._posicao = posicao
+        return posicao
+
+    def readinto(self, destino) -> int:
+        restante = self._tamanho - self._posicao
+        if restante <= 0:
+            return 0
+        quantidade = min(len(destino), restante)
+        self._base.seek(self._inicio + self._posicao)
+        lidos = self._base.readinto(memoryview(destino)[:quantidade])
+        self._posicao += lidos or 0
+        return lidos or 0
+
+
+def _limite_memoria_aninhado() -> int:
+    try:
+        megas = int(os.environ.get(MEMORIA_ZIP_ANINHADO_ENV, str(MEMORIA_ZIP_ANINHADO_PADRAO_MB)))
+    except ValueError:
+        megas = MEMORIA_ZIP_ANINHADO_PADRAO_MB
+    return max(0, megas) * 1024 * 1024
+
+
+def leitura_antecipada_habilitada() -> bool:
+    return os.environ.get(LEITURA_ANTECIPADA_ENV, "1").strip().lower() not in {"0", "false", "nao", "não"}
+
+
+def _inicio_dados(base, info: zipfile.ZipInfo) -> int:
+    base.seek(info.header_offset)
+    cabecalho = base.read(_CABECALHO_LOCAL.size)
+    assinatura, nome, extra = _CABECALHO_LOCAL.unpack(cabecalho)
+    if assinatura != _ASSINATURA_LOCAL:
+        raise zipfile.BadZipFile(f"Cabeçalho local inválido em {info.filename}")
+    return info.header_offset + _CABECALHO_LOCAL.size + nome + extra
+
+
+def _legivel_no_lugar(info: zipfile.ZipInfo) -> bool:
+    return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+
+
+def abrir_membro_zip(pilha: ExitStack, zf: zipfile.ZipFile, base, nome_membro: str):
+    """Arquivo com acesso aleatório para um ZIP interno, sem copiá-lo para o workspace."""
+    info = zf.getinfo(nome_membro)
+    if _legivel_no_lugar(info):
+        return io.BufferedReader(SubArquivo(base, _inicio_dados(base, info), info.file_size), 1024 * 1024)
+    temporario = pilha.enter_context(tempfile.SpooledTemporaryFile(max_size=_limite_memoria_aninhado()))
+    with zf.open(info, "r") as origem:
+        shutil.copyfileobj(origem, temporario, length=1024 * 1024)
+    temporario.seek(0)
+    return temporario
+
+
+def abrir_zip_fonte(pilha: ExitStack, caminho: Path | str, membros: Sequence[str] = ()) -> zipfile.ZipFile:
+    """Abre ``caminho`` e desce pela cadeia de ZIPs internos ``membros``.
+
+    Todos os arquivos intermediários ficam registrados em ``pilha`` e são
+    fechados junto com ela.
+    """
+    base = pilha.enter_context(open(caminho, "rb"))
+    zf = pilha.enter_context(zipfile.ZipFile(base, "r"))
+    for nome_membro in membros:
+        base = abrir_membro_zip(pilha, zf, base, nome_membro)
+        zf = pilha.enter_context(zipfile.ZipFile(base, "r"))
+    return zf
+
+
+def materializar_cadeia(
+    caminho: Path | str, membros: Sequence[str], pasta: Path, nome: str,
+) -> tuple[Path, tuple[str, ...]]:
+    """Raiz e cadeia restante para abrir ``membros`` sem repetir descompressões.
+
+    Cada ZIP comprimido da cadeia é descomprimido uma única vez para
+    ``pasta/<nome>_<nível>.zip``; os membros ``ZIP_STORED`` seguem lidos no
+    lugar. Devolve ``(raiz, membros_restantes)``, que ``abrir_zip_fonte`` abre
+    sem nova descompressão. Se ``raiz`` não for ``caminho``, ela é uma cópia que
+    o chamador apaga ao terminar a fonte; cópias intermediárias já são apagadas aqui.
+    """
+    membros = tuple(membros)
+    raiz, inicio = Path(caminho), 0
+    copias: list[Path] = []
+    try:
+        with ExitStack() as pilha:
+            base = pilha.enter_context(open(caminho, "rb"))
+            zf = pilha.enter_context(zipfile.ZipFile(base, "r"))
+            for posicao, nome_membro in enumerate(membros):
+                info = zf.getinfo(nome_membro)
+                if _legivel_no_lugar(info):
+                    base = io.BufferedReader(SubArquivo(base, _inicio_dados(base, info), info.file_size), 1024 * 1024)
+                else:
+                    pasta.mkdir(parents=True, exist_ok=True)
+                    destino = pasta / f"{nome}_{posicao}.zip"
+                    copias.append(destino)
+                    with zf.open(info, "r") as origem, open(destino, "wb") as saida:
+                        shutil.copyfileobj(origem, saida, length=1024 * 1024)
+                    raiz, inicio = destino, posicao + 1
+                    base = pilha.enter_context(open(destino, "rb"))
+                zf = pilha.enter_context(zipfile.ZipFile(base, "r"))
+    except BaseException:
+        for copia in copias:
+            remover_copia(copia)
+        raise
+    for copia in copias[:-1]:
+        remover_copia(copia)
+    return raiz, membros[inicio:]
+
+
+def remover_copia(caminho: Path) -> None:
+    try:
+        Path(caminho).unlink(missing_ok=True)
+    except OSError:
+        # No Windows um worker pode ainda manter a cópia aberta; a pasta é
+        # removida ao fim da ingestão.
+        pass
+
+
+class LeituraAntecipada:
+    """Lê em uma thread os membros ``indices`` na ordem, com fila limitada.
+
+    ``abrir`` devolve um ``ZipFile`` próprio da thread (o do escritor não é
+    compartilhado). Cada item é ``(indice, conteudo, erro)``; ``conteudo`` é
+    ``None`` quando a leitura falhou.
+    """
+
+    _FIM = object()
+
+    def __init__(
+        self,
+        abrir: Callable[[ExitStack], zipfile.ZipFile],
+        indices: Sequence[int],
+        limite_leitura: int,
+        membros: int = MEMBROS_LEITURA_ANTECIPADA,
+        limite_bytes: int = BYTES_LEITURA_ANTECIPADA,
+    ):
+        self._abrir = abrir
+        self._indices = list(indices)
+        self._limite_leitura = int(limite_leitura)
+        self._fila: queue.Queue = queue.Queue(maxsize=max(1, int(membros)))
+        self._limite_bytes = max(1, int(limite_bytes))
+        self._bytes_em_fila = 0
+        self._condicao = threading.Condition()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._produzir, name="leitura-antecipada-zip", daemon=True)
+        self._thread.start()
+
+    def _reservar(self, tamanho: int) -> bool:
+        # Um membro maior que o limite passa sozinho, com a fila vazia.
+        with self._condicao:
+            while not self._parar.is_set():
+                if not self._bytes_em_fila or self._bytes_em_fila + tamanho <= self._limite_bytes:
+                    self._bytes_em_fila += tamanho
+                    return True
+                self._condicao.wait(timeout=0.1)
+        return False
+
+    def _colocar(self, item) -> bool:
+        while not self._parar.is_set():
+            try:
+                self._fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produzir(self) -> None:
+        try:
+            with ExitStack() as pilha:
+                zf = self._abrir(pilha)
+                infos = zf.infolist()
+                for indice in self._indices:
+                    if self._parar.is_set():
+                        return
+                    try:
+                        with zf.open(infos[indice], "r") as fp:
+                            item = (indice, fp.read(self._limite_leitura), "")
+                    except Exception as exc:
+                        item = (indice, None, str(exc))
+                    if not self._reservar(len(item[1] or b"")) or not self._colocar(item):
+                        return
+        except Exception as exc:
+            self._colocar((-1, None, f"Leitura antecipada interrompida: {exc}"))
+        finally:
+            self._colocar(self._FIM)
+
+    def __iter__(self) -> Iterator[tuple[int, bytes | None, str]]:
+        while True:
+            item = self._fila.get()
+            if item is self._FIM:
+                return
+            with self._condicao:
+                self._bytes_em_fila -= len(item[1] or b"")
+                self._condicao.notify()
+            yield item
+
+    def fechar(self) -> None:
+        self._parar.set()
+        while True:
+            try:
+                self._fila.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=5)
@@ -0,0 +1,442 @@
+"""Levantamento de verbas sobre vários Workspaces ao mesmo tempo.
+
+Cada Workspace continua consultado pelas funções de ``levantamento_sqlite``,
+em conexões somente leitura próprias, em paralelo numa ``ThreadPoolExecutor``
+(o SQLite libera o GIL durante a consulta). Não se usa ``ATTACH`` para as
+consultas: o SQLite aceita no máximo 10 bancos anexados por conexão e uma
+carteira de clientes passa disso com facilidade.
+
+Os resultados são combinados e identificados por Workspace, CNPJ e empresa.
+Uma chave de rubrica ``"workspace::cod||ide"`` vale só para aquele Workspace;
+uma chave ``"cod||ide"`` vale para todos. CPFs são contados por empresa e
+somados: o mesmo trabalhador em dois empregadores conta como dois vínculos.
+
+A exportação consolidada copia os movimentos do recorte, um Workspace anexado
+de cada vez, para um SQLite temporário ao lado do arquivo de saída, e grava a
+partir dele o mesmo layout do levantamento individual.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Sequence, TypeVar
+
+import pandas as pd
+
+from modules.data_source import SQLiteDataSource, WorkspaceContext
+from modules.excel_builder import FontePlanilha, ResultadoWorkbook, gerar_workbook
+from modules.exportacao_colunar import FonteColunar, ResultadoColunar, exportar_fontes_colunares
+from modules.levantamento_sqlite import (
+    FiltrosLevantamento,
+    ResultadoLevantamentoSQLite,
+    _base_selecionada_sql,
+    _preparar_selecao,
+    consultar_levantamento,
+    consultar_rubricas,
+)
+from modules.workspace_manager import formatar_cnpj
+
+
+SEPARADOR_WORKSPACE = "::"
+MAX_WORKERS_FEDERADO = 8
+COLUNAS_IDENTIFICACAO = ["workspace", "cnpj", "nome_empresa"]
+COLUNAS_MOVIMENTOS_FEDERADOS = COLUNAS_IDENTIFICACAO + [
+    "cod_rubr", "ide_tab_rubr", "dsc_rubr", "nat_rubr", "cod_inc_cp", "status_cp",
+    "carater_verba", "tipo_verba", "per_apur", "cpf", "vr_rubr",
+]
+
+_T = TypeVar("_T")
+
+
+@dataclass(frozen=True)
+class WorkspaceFederado:
+    nome: str
+    cnpj: str
+    nome_empresa: str
+    fonte: SQLiteDataSource
+
+    @property
+    def rotulo(self) -> str:
+        return f"{self.cnpj} - {self.nome_empresa}".strip(" -") or self.nome
+
+
+@dataclass
+class ResultadoLevantamentoFederado(ResultadoLevantamentoSQLite):
+    por_workspace: pd.DataFrame = field(default_factory=pd.DataFrame)
+    falhas: dict[str, str] = field(default_factory=dict)
+
+
+def _identificar_empresa(fonte: SQLiteDataSource) -> tuple[str, str]:
+    conn = fonte.conectar()
+    try:
+        row = conn.execute(
+            "SELECT nome_empresa,cnpj_empregador FROM dados_empresa "
+            "ORDER BY TRIM(COALESCE(nome_empresa,''))='' LIMIT 1"
+        ).fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    if not row:
+        return "Não identificado", "Não identificado"
+    return (
+        str(row[0] or "").strip() or "Não identificado",
+        formatar_cnpj(row[1]) or "Não identificado",
+    )
+
+
+class FonteFederada:
+    """Conjunto de Workspaces consultados como um único levantamento."""
+
+    def __init__(
+        self,
+        workspaces: Sequence[WorkspaceFederado],
+        ignorados: dict[str, str] | None = None,
+    ):
+        nomes = [workspace.nome for workspace in workspaces]
+        if len(set(nomes)) != len(nomes):
+            raise ValueError("Workspaces federados precisam ter nomes distintos.")
+        self.workspaces = list(workspaces)
+        self.ignorados = dict(ignorados or {})
+
+    @classmethod
+    def de_caminhos(
+        cls,
+        caminhos: Iterable[str | Path],
+        *,
+        exigir_concluido: bool = True,
+    ) -> "FonteFederada":
+        """Abre os Workspaces informados; os inválidos ficam em ``ignorados``."""
+        workspaces: list[WorkspaceFederado] = []
+        ignorados: dict[str, str] = {}
+        vistos: set[Path] = set()
+        for caminho in caminhos:
+            try:
+                contexto = WorkspaceContext.from_path(
+                    caminho, origem="federado", exigir_concluido=exigir_concluido
+                )
+            except (OSError, ValueError, sqlite3.Error) as exc:
+                ignorados[str(caminho)] = str(exc)
+                continue
+            if contexto.db_path in vistos:
+                continue
+            vistos.add(contexto.db_path)
+            fonte = SQLiteDataSource(contexto)
+            nome = contexto.workspace_path.name
+            usados = {workspace.nome for workspace in workspaces}
+            sufixo = 2
+            while nome in usados:
+                nome = f"{contexto.workspace_path.name}#{sufixo}"
+                sufixo += 1
+            nome_empresa, cnpj = _identificar_empresa(fonte)
+            workspaces.append(WorkspaceFederado(nome, cnpj, nome_empresa, fonte))
+        return cls(workspaces, ignorados)
+
+    def __len__(self) -> int:
+        return len(self.workspaces)
+
+    def __iter__(self) -> Iterator[WorkspaceFederado]:
+        return iter(self.workspaces)
+
+
+def _executar(
+    fonte: FonteFederada,
+    consulta: Callable[[WorkspaceFederado], _T],
+    max_workers: int | None,
+) -> tuple[list[tuple[WorkspaceFederado, _T]], dict[str, str]]:
+    """Roda ``consulta`` em cada Workspace; a ordem do resultado é a da fonte."""
+    if not fonte.workspaces:
+        return [], {}
+    workers = max_workers or min(MAX_WORKERS_FEDERADO, os.cpu_count() or 1)
+    workers = max(1, min(int(workers), len(fonte.workspaces)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="levantamento-federado") as executor:
+        futuros = [(workspace, executor.submit(consulta, workspace)) for workspace in fonte.workspaces]
+    resultados: list[tuple[WorkspaceFederado, _T]] = []
+    falhas: dict[str, str] = {}
+    for workspace, futuro in futuros:
+        exc = futuro.exception()
+        if exc is None:
+            resultados.append((workspace, futuro.result()))
+        elif isinstance(exc, (sqlite3.Error, OSError)):
+            falhas[workspace.nome] = str(exc)
+        else:
+            raise exc
+    return resultados, falhas
+
+
+def _identificar(df: pd.DataFrame, workspace: WorkspaceFederado) -> pd.DataFrame:
+    df = df.copy()
+    for posicao, (coluna, valor) in enumerate(
+        zip(COLUNAS_IDENTIFICACAO, (workspace.nome, workspace.cnpj, workspace.nome_empresa))
+    ):
+        df.insert(posicao, coluna, valor)
+    return df
+
+
+def _concatenar(partes: list[pd.DataFrame]) -> pd.DataFrame:
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_IDENTIFICACAO)
+    return pd.concat(partes, ignore_index=True)
+
+
+def chaves_do_workspace(chaves: Iterable[str], workspace: str) -> list[str]:
+    """Chaves ``cod||ide`` aplicáveis ao Workspace: as prefixadas com ele e as sem prefixo."""
+    selecionadas = []
+    for chave in chaves:
+        chave = str(chave)
+        if SEPARADOR_WORKSPACE in chave:
+            dono, _, chave = chave.partition(SEPARADOR_WORKSPACE)
+            if dono != workspace:
+                continue
+        selecionadas.append(chave)
+    return selecionadas
+
+
+def consultar_rubricas_federado(
+    fonte: FonteFederada,
+    filtros: FiltrosLevantamento,
+    contagem_exata: bool = True,
+    max_workers: int | None = None,
+) -> tuple[pd.DataFrame, dict[str, str]]:
+    """Rubricas de todos os Workspaces, com ``chave_federada`` para a seleção.
+
+    Workspaces sem leitura ficam de fora da tabela e voltam em ``falhas``,
+    como em ``consultar_levantamento_federado``.
+    """
+    resultados, falhas = _executar(
+        fonte, lambda workspace: consultar_rubricas(workspace.fonte, filtros, contagem_exata), max_workers
+    )
+    df = _concatenar([_identificar(rubricas, workspace) for workspace, rubricas in resultados])
+    if not df.empty:
+        df["chave_federada"] = df["workspace"] + SEPARADOR_WORKSPACE + df["chave_rubrica"]
+    return df, falhas
+
+
+def consultar_levantamento_federado(
+    fonte: FonteFederada,
+    filtros: FiltrosLevantamento,
+    chaves: Iterable[str],
+    aliquota: float,
+    limite_previa: int = 5_000,
+    contagem_exata: bool = True,
+    max_workers: int | None = None,
+) -> ResultadoLevantamentoFederado:
+    """Levantamento consolidado; Workspaces sem leitura ficam em ``falhas``.
+
+    ``resumo_competencia`` traz uma coluna por empresa (CNPJ - nome), além de
+    ``Total`` e ``CPP estimada``; a prévia segue a ordem dos Workspaces até
+    ``limite_previa`` linhas no total.
+    """
+    chaves = list(chaves)
+
+    def consultar(workspace: WorkspaceFederado) -> ResultadoLevantamentoSQLite | None:
+        selecionadas = chaves_do_workspace(chaves, workspace.nome)
+        if not selecionadas:
+            return None
+        return consultar_levantamento(
+            workspace.fonte, filtros, selecionadas, aliquota, limite_previa, contagem_exata
+        )
+
+    resultados, falhas = _executar(fonte, consultar, max_workers)
+    resultados = [(workspace, resultado) for workspace, resultado in resultados if resultado is not None]
+    fator = float(aliquota) / 100.0
+
+    por_workspace = pd.DataFrame(
+        [
+            {
+                "workspace": workspace.nome,
+                "cnpj": workspace.cnpj,
+                "nome_empresa": workspace.nome_empresa,
+                "valor_total": resultado.total,
+                "cpp_estimado": resultado.cpp,
+                "qtd_lancamentos": resultado.qtd_movimentos,
+                "qtd_rubricas": resultado.qtd_rubricas,
+                "qtd_cpfs": resultado.qtd_cpfs,
+            }
+            for workspace, resultado in resultados
+        ],
+        columns=COLUNAS_IDENTIFICACAO + [
+            "valor_total", "cpp_estimado", "qtd_lancamentos", "qtd_rubricas", "qtd_cpfs",
+        ],
+    )
+    resumo_rubricas = _concatenar(
+        [_identificar(resultado.resumo_rubricas, workspace) for workspace, resultado in resultados]
+    )
+    if not resumo_rubricas.empty:
+        resumo_rubricas = resumo_rubricas.sort_values("valor_total", ascending=False, ignore_index=True)
+    resumo_comp_rubr = _concatenar(
+        [_identificar(resultado.resumo_competencia_rubrica, workspace) for workspace, resultado in resultados]
+    )
+    if not resumo_comp_rubr.empty:
+        resumo_comp_rubr = resumo_comp_rubr.sort_values(
+            ["per_apur", "valor_total"], ascending=[True, False], ignore_index=True
+        )
+
+    if resumo_comp_rubr.empty:
+        matriz = pd.DataFrame(columns=["Periodo de apuracao", "Total", "CPP estimada"])
+    else:
+        rotulos = {workspace.nome: workspace.rotulo for workspace, _ in resultados}
+        base_matriz = resumo_comp_rubr.assign(empresa=resumo_comp_rubr["workspace"].map(rotulos))
+        matriz = (
+            base_matriz.pivot_table(
+                index="per_apur", columns="empresa", values="valor_total", aggfunc="sum", fill_value=0
+            )
+            .reset_index()
+            .rename(columns={"per_apur": "Periodo de apuracao"})
+        )
+        matriz.columns.name = None
+        colunas = [c for c in matriz.columns if c != "Periodo de apuracao"]
+        matriz["Total"] = matriz[colunas].sum(axis=1)
+        matriz["CPP estimada"] = matriz["Total"] * fator
+        matriz = matriz.sort_values("Periodo de apuracao", ignore_index=True)
+
+    previas: list[pd.DataFrame] = []
+    restante = int(limite_previa)
+    for workspace, resultado in resultados:
+        if restante <= 0:
+            break
+        previa = resultado.movimentos_previa.head(restante)
+        previas.append(_identificar(previa, workspace))
+        restante -= len(previa)
+
+    total = float(por_workspace["valor_total"].sum())
+    return ResultadoLevantamentoFederado(
+        total=total,
+        cpp=total * fator,
+        qtd_movimentos=int(por_workspace["qtd_lancamentos"].sum()),
+        qtd_rubricas=int(por_workspace["qtd_rubricas"].sum()),
+        qtd_cpfs=int(por_workspace["qtd_cpfs"].sum()),
+        resumo_rubricas=resumo_rubricas,
+        resumo_competencia_rubrica=resumo_comp_rubr,
+        resumo_competencia=matriz,
+        movimentos_previa=_concatenar(previas),
+        cpfs_exatos=all(resultado.cpfs_exatos for _, resultado in resultados),
+        por_workspace=por_workspace,
+        falhas=falhas,
+    )
+
+
+@contextmanager
+def _movimentos_consolidados(
+    fonte: FonteFederada,
+    filtros: FiltrosLevantamento,
+    chaves: Iterable[str],
+    pasta: Path,
+) -> Iterator[sqlite3.Connection]:
+    """SQLite temporário com a tabela ``movimentos`` de todos os Workspaces do recorte."""
+    chaves = list(chaves)
+    colunas = ",".join(COLUNAS_MOVIMENTOS_FEDERADOS)
+    campos = ",".join(f"m.{c}" for c in COLUNAS_MOVIMENTOS_FEDERADOS[len(COLUNAS_IDENTIFICACAO):])
+    with tempfile.TemporaryDirectory(prefix="levantamento_federado_", dir=pasta) as temp:
+        destino = Path(temp) / "movimentos.db"
+        conn = sqlite3.connect(f"file:{destino.as_posix()}", uri=True)
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute(f"CREATE TABLE movimentos({colunas})")
+            for workspace in fonte.workspaces:
+                selecionadas = chaves_do_workspace(chaves, workspace.nome)
+                if not selecionadas:
+                    continue
+                conn.execute(
+                    "ATTACH DATABASE ? AS ws", (f"file:{workspace.fonte.db_path.as_posix()}?mode=ro",)
+                )
+                try:
+                    _preparar_selecao(conn, selecionadas)
+                    base_sql, params = _base_selecionada_sql(filtros, "ws.rel_movimentos_cp")
+                    conn.execute(
+                        f"INSERT INTO movimentos({colunas}) SELECT ?,?,?,{campos} FROM ("
+                        + base_sql
+                        + ") m",
+                        (workspace.nome, workspace.cnpj, workspace.nome_empresa) + params,
+                    )
+                    conn.commit()
+                finally:
+                    conn.execute("DETACH DATABASE ws")
+            yield conn
+        finally:
+            conn.close()
+
+
+def gerar_excel_levantamento_federado(
+    fonte: FonteFederada,
+    caminho_saida: str | Path,
+    filtros: FiltrosLevantamento,
+    chaves: Iterable[str],
+    resultado: ResultadoLevantamentoFederado,
+    df_parametros: pd.DataFrame,
+    incluir_movimentos: bool,
+    progress_callback=None,
+) -> ResultadoWorkbook:
+    caminho_saida = Path(caminho_saida)
+    abas_resumo = [
+        FontePlanilha("00_empresas", dataframe=resultado.por_workspace),
+        FontePlanilha("01_resumo", dataframe=df_parametros),
+        FontePlanilha("02_resumo_rubricas", dataframe=resultado.resumo_rubricas),
+    ]
+    abas_competencia = [
+        FontePlanilha("04_resumo_competencia", dataframe=resultado.resumo_competencia),
+        FontePlanilha("05_competencia_rubrica", dataframe=resultado.resumo_competencia_rubrica),
+    ]
+    if not incluir_movimentos:
+        aviso = FontePlanilha(
+            "03_movimentos",
+            dataframe=pd.DataFrame(
+                {
+                    "Informação": ["A aba detalhada 03_movimentos não foi incluída nesta exportação."],
+                    "Valor": [
+                        f"Movimentos detalhados disponíveis no recorte: {resultado.qtd_movimentos:,}".replace(",", ".")
+                    ],
+                }
+            ),
+        )
+        return gerar_workbook(
+            caminho_saida, abas_resumo + [aviso] + abas_competencia, progress_callback=progress_callback
+        )
+    with _movimentos_consolidados(fonte, filtros, chaves, caminho_saida.parent) as conn:
+        return gerar_workbook(
+            caminho_saida,
+            abas_resumo
+            + [FontePlanilha("03_movimentos", query="SELECT * FROM movimentos ORDER BY rowid")]
+            + abas_competencia,
+            conexao=conn,
+            progress_callback=progress_callback,
+        )
+
+
+def gerar_levantamento_colunar_federado(
+    fonte: FonteFederada,
+    pasta_saida: str | Path,
+    filtros: FiltrosLevantamento,
+    chaves: Iterable[str],
+    resultado: ResultadoLevantamentoFederado,
+    df_parametros: pd.DataFrame,
+    formato: str = "parquet",
+    progress_callback=None,
+) -> ResultadoColunar:
+    """Versão Parquet/CSV gzip do levantamento consolidado, com todos os movimentos."""
+    pasta_saida = Path(pasta_saida)
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    with _movimentos_consolidados(fonte, filtros, chaves, pasta_saida.parent) as conn:
+        return exportar_fontes_colunares(
+            pasta_saida,
+            [
+                FonteColunar("00_empresas", dataframe=resultado.por_workspace),
+                FonteColunar("01_resumo", dataframe=df_parametros),
+                FonteColunar("02_resumo_rubricas", dataframe=resultado.resumo_rubricas),
+                FonteColunar(
+                    "03_movimentos", query="SELECT * FROM movimentos ORDER BY rowid", coluna_soma="vr_rubr"
+                ),
+                FonteColunar("04_resumo_competencia", dataframe=resultado.resumo_competencia),
+                FonteColunar("05_competencia_rubrica", dataframe=resultado.resumo_competencia_rubrica),
+            ],
+            conexao=conn,
+            formato=formato,
+            progress_callback=progress_callback,
+        )
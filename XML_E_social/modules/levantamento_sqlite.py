@@ -9,6 +9,11 @@ import pandas as pd
 
 from modules.data_source import SQLiteDataSource
 from modules.excel_builder import FontePlanilha, ResultadoWorkbook, gerar_workbook
+from modules.exportacao_colunar import FonteColunar, ResultadoColunar, exportar_fontes_colunares
+from modules.sqlite_relatorio import registrar_funcoes_cubo
+
+
+TABELA_CUBO = "rel_levantamento_cubo"
 
 
 @dataclass(frozen=True)
@@ -32,9 +37,12 @@ class ResultadoLevantamentoSQLite:
     resumo_competencia_rubrica: pd.DataFrame
     resumo_competencia: pd.DataFrame
     movimentos_previa: pd.DataFrame
+    cpfs_exatos: bool = True
 
 
-def _where_filtros(filtros: FiltrosLevantamento, alias: str = "m") -> tuple[str, tuple]:
+def _where_filtros(
+    filtros: FiltrosLevantamento, alias: str = "m", cubo: bool = False
+) -> tuple[str, tuple]:
     prefixo = f"{alias}." if alias else ""
     condicoes: list[str] = []
     params: list[object] = []
@@ -58,7 +66,7 @@ def _where_filtros(filtros: FiltrosLevantamento, alias: str = "m") -> tuple[str,
         condicoes.append(f"{prefixo}per_apur IN ({marcas})")
         params.extend(filtros.competencias)
     if filtros.apenas_positivos:
-        condicoes.append(f"CAST({prefixo}vr_rubr AS REAL)>0")
+        condicoes.append(f"{prefixo}positivo=1" if cubo else f"CAST({prefixo}vr_rubr AS REAL)>0")
     return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), tuple(params)
 
 
@@ -81,10 +89,38 @@ def _preparar_selecao(
     )
 
 
-def _base_selecionada_sql(filtros: FiltrosLevantamento) -> tuple[str, tuple]:
-    where, params = _where_filtros(filtros, "m")
+def _conectar_cubo(fonte: SQLiteDataSource) -> tuple[sqlite3.Connection, bool]:
+    """Abre a fonte e informa se o workspace já tem o cubo do Levantamento.
+
+    Workspaces consolidados antes do cubo (ou do esboço de CPFs) continuam
+    atendidos pelos movimentos.
+    """
+    conn = fonte.conectar()
+    registrar_funcoes_cubo(conn)
+    colunas = {
+        str(row[1]) for row in conn.execute(f"PRAGMA table_info({TABELA_CUBO})")
+    }
+    return conn, "esboco_cpfs" in colunas
+
+
+def _cpfs_estimados(usar_cubo: bool, contagem_exata: bool) -> bool:
+    # Sem o cubo, hll_qtd(cpf) roda em Python linha a linha e perde para o
+    # COUNT(DISTINCT cpf); a estimativa só vale sobre os esboços já gravados.
+    return usar_cubo and not contagem_exata
+
+
+def _expressao_qtd_cpfs(usar_cubo: bool, contagem_exata: bool) -> str:
+    if _cpfs_estimados(usar_cubo, contagem_exata):
+        return "hll_qtd_esbocos(esboco_cpfs)"
+    return "lev_qtd_cpfs(cpfs)" if usar_cubo else "COUNT(DISTINCT cpf)"
+
+
+def _base_selecionada_sql(
+    filtros: FiltrosLevantamento, tabela: str = "rel_movimentos_cp"
+) -> tuple[str, tuple]:
+    where, params = _where_filtros(filtros, "m", cubo=tabela == TABELA_CUBO)
     sql = (
-        "SELECT m.* FROM rel_movimentos_cp m "
+        f"SELECT m.* FROM {tabela} m "
         "JOIN temp.lev_rubricas_selecionadas s "
         "ON m.cod_rubr=s.cod_rubr "
         "AND m.ide_tab_rubr=s.ide_tab_rubr"
@@ -94,20 +130,21 @@ def _base_selecionada_sql(filtros: FiltrosLevantamento) -> tuple[str, tuple]:
 
 
 def obter_opcoes_filtros(fonte: SQLiteDataSource) -> dict[str, list[str]]:
-    conn = fonte.conectar()
+    conn, usar_cubo = _conectar_cubo(fonte)
+    tabela = TABELA_CUBO if usar_cubo else "rel_movimentos_cp"
     try:
         def distintos(campo: str) -> list[str]:
             return [
                 str(row[0])
                 for row in conn.execute(
-                    f"SELECT DISTINCT CAST({campo} AS TEXT) FROM rel_movimentos_cp "
+                    f"SELECT DISTINCT CAST({campo} AS TEXT) FROM {tabela} "
                     f"WHERE COALESCE(CAST({campo} AS TEXT),'')<>'' ORDER BY 1"
                 )
             ]
 
         codigos = distintos("cod_inc_cp")
         sem_s1010 = conn.execute(
-            "SELECT 1 FROM rel_movimentos_cp WHERE COALESCE(cod_inc_cp,'')='' LIMIT 1"
+            f"SELECT 1 FROM {tabela} WHERE COALESCE(cod_inc_cp,'')='' LIMIT 1"
         ).fetchone()
         if sem_s1010:
             codigos.append("Sem S-1010")
@@ -123,22 +160,28 @@ def obter_opcoes_filtros(fonte: SQLiteDataSource) -> dict[str, list[str]]:
 
 
 def consultar_rubricas(
-    fonte: SQLiteDataSource, filtros: FiltrosLevantamento
+    fonte: SQLiteDataSource,
+    filtros: FiltrosLevantamento,
+    contagem_exata: bool = True,
 ) -> pd.DataFrame:
-    where, params = _where_filtros(filtros, "m")
-    sql = """
+    """Rubricas do recorte; ``contagem_exata=False`` estima ``qtd_cpfs`` pelo esboço do cubo."""
+    conn, usar_cubo = _conectar_cubo(fonte)
+    where, params = _where_filtros(filtros, "m", cubo=usar_cubo)
+    qtd_cpfs = _expressao_qtd_cpfs(usar_cubo, contagem_exata)
+    if usar_cubo:
+        medidas = f"SUM(valor_total) valor_total, SUM(qtd_lancamentos) qtd_lancamentos, {qtd_cpfs} qtd_cpfs"
+    else:
+        medidas = f"SUM(CAST(vr_rubr AS REAL)) valor_total, COUNT(*) qtd_lancamentos, {qtd_cpfs} qtd_cpfs"
+    sql = f"""
         SELECT cod_rubr,ide_tab_rubr,dsc_rubr,cod_inc_cp,status_cp,
                carater_verba,tipo_verba,
-               SUM(CAST(vr_rubr AS REAL)) valor_total,
-               COUNT(*) qtd_lancamentos,
-               COUNT(DISTINCT cpf) qtd_cpfs
-        FROM rel_movimentos_cp m
+               {medidas}
+        FROM {TABELA_CUBO if usar_cubo else "rel_movimentos_cp"} m
     """ + where + """
         GROUP BY cod_rubr,ide_tab_rubr,dsc_rubr,cod_inc_cp,status_cp,
                  carater_verba,tipo_verba
         ORDER BY dsc_rubr,cod_rubr
     """
-    conn = fonte.conectar()
     try:
         df = pd.read_sql_query(sql, conn, params=params)
     finally:
@@ -158,39 +201,53 @@ def consultar_levantamento(
     chaves: Iterable[str],
     aliquota: float,
     limite_previa: int = 5_000,
+    contagem_exata: bool = True,
 ) -> ResultadoLevantamentoSQLite:
-    conn = fonte.conectar()
+    """Métricas e resumos do recorte.
+
+    As contagens de CPFs são exatas; com ``contagem_exata=False`` e o cubo
+    presente, saem do esboço HyperLogLog (erro padrão ~1,6%).
+    """
+    conn, usar_cubo = _conectar_cubo(fonte)
     try:
         _preparar_selecao(conn, chaves)
-        base_sql, params = _base_selecionada_sql(filtros)
+        # Métricas e resumos saem do cubo; só a prévia lê os movimentos.
+        cpfs = _expressao_qtd_cpfs(usar_cubo, contagem_exata)
+        if usar_cubo:
+            agregado_sql, params = _base_selecionada_sql(filtros, TABELA_CUBO)
+            valor, quantidade = "SUM(valor_total)", "SUM(qtd_lancamentos)"
+        else:
+            agregado_sql, params = _base_selecionada_sql(filtros)
+            valor, quantidade = "SUM(CAST(vr_rubr AS REAL))", "COUNT(*)"
         metricas = conn.execute(
-            "SELECT COALESCE(SUM(CAST(vr_rubr AS REAL)),0),COUNT(*),"
-            "COUNT(DISTINCT cod_rubr),COUNT(DISTINCT cpf) FROM ("
-            + base_sql
+            f"SELECT COALESCE({valor},0),COALESCE({quantidade},0),"
+            f"COUNT(DISTINCT cod_rubr),{cpfs} FROM ("
+            + agregado_sql
             + ") base",
             params,
         ).fetchone()
         resumo_rubricas = pd.read_sql_query(
             "SELECT cod_rubr,dsc_rubr,nat_rubr,cod_inc_cp,status_cp,"
-            "carater_verba,tipo_verba,SUM(CAST(vr_rubr AS REAL)) valor_total,"
-            "COUNT(*) qtd_lancamentos,COUNT(DISTINCT cpf) qtd_cpfs,"
+            f"carater_verba,tipo_verba,{valor} valor_total,"
+            f"{quantidade} qtd_lancamentos,{cpfs} qtd_cpfs,"
             "MIN(per_apur) primeira_competencia,MAX(per_apur) ultima_competencia "
-            "FROM (" + base_sql + ") base GROUP BY cod_rubr,dsc_rubr,nat_rubr,"
+            "FROM (" + agregado_sql + ") base GROUP BY cod_rubr,dsc_rubr,nat_rubr,"
             "cod_inc_cp,status_cp,carater_verba,tipo_verba ORDER BY valor_total DESC",
             conn,
             params=params,
         )
         resumo_comp_rubr = pd.read_sql_query(
             "SELECT per_apur,cod_rubr,dsc_rubr,cod_inc_cp,status_cp,carater_verba,"
-            "tipo_verba,SUM(CAST(vr_rubr AS REAL)) valor_total,COUNT(*) qtd_lancamentos,"
-            "COUNT(DISTINCT cpf) qtd_cpfs FROM (" + base_sql + ") base "
+            f"tipo_verba,{valor} valor_total,{quantidade} qtd_lancamentos,"
+            f"{cpfs} qtd_cpfs FROM (" + agregado_sql + ") base "
             "GROUP BY per_apur,cod_rubr,dsc_rubr,cod_inc_cp,status_cp,carater_verba,"
             "tipo_verba ORDER BY per_apur,valor_total DESC",
             conn,
             params=params,
         )
+        base_sql, params_base = _base_selecionada_sql(filtros)
         previa = pd.read_sql_query(
-            base_sql + " LIMIT ?", conn, params=params + (int(limite_previa),)
+            base_sql + " LIMIT ?", conn, params=params_base + (int(limite_previa),)
         )
     finally:
         conn.close()
@@ -235,6 +292,7 @@ def consultar_levantamento(
         resumo_competencia_rubrica=resumo_comp_rubr,
         resumo_competencia=matriz,
         movimentos_previa=previa,
+        cpfs_exatos=not _cpfs_estimados(usar_cubo, contagem_exata),
     )
 
 
@@ -291,3 +349,35 @@ def gerar_excel_levantamento_sqlite(
         )
     finally:
         conn.close()
+
+
+def gerar_levantamento_colunar_sqlite(
+    fonte: SQLiteDataSource,
+    pasta_saida: str | Path,
+    filtros: FiltrosLevantamento,
+    chaves: Iterable[str],
+    resultado: ResultadoLevantamentoSQLite,
+    df_parametros: pd.DataFrame,
+    formato: str = "parquet",
+    progress_callback=None,
+) -> ResultadoColunar:
+    """Versão Parquet/CSV gzip do levantamento, com os movimentos completos do recorte."""
+    conn = fonte.conectar()
+    try:
+        _preparar_selecao(conn, chaves)
+        base_sql, params = _base_selecionada_sql(filtros)
+        return exportar_fontes_colunares(
+            pasta_saida,
+            [
+                FonteColunar("01_resumo", dataframe=df_parametros),
+                FonteColunar("02_resumo_rubricas", dataframe=resultado.resumo_rubricas),
+                FonteColunar("03_movimentos", query=base_sql, params=params, coluna_soma="vr_rubr"),
+                FonteColunar("04_resumo_competencia", dataframe=resultado.resumo_competencia),
+                FonteColunar("05_competencia_rubrica", dataframe=resultado.resumo_competencia_rubrica),
+            ],
+            conexao=conn,
+            formato=formato,
+            progress_callback=progress_callback,
+        )
+    finally:
+        conn.close()
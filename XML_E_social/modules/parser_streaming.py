@@ -0,0 +1,356 @@
+"""Parsers V10 de S-1200/S-5001/S-5011 em passagem única por ``iterparse``.
+
+Os parsers legados de ``parser_xml`` chamam ``first_text_by_localname`` e
+``all_elements_by_localname`` para cada bloco, reescaneando subárvores. Aqui cada
+bloco relevante vira um escopo aberto durante a leitura; o texto de cada folha é
+entregue uma única vez a todos os escopos abertos que o procuram, preservando a
+regra legada de "primeiro texto não vazio da subárvore". A montagem dos
+dataclasses acontece no fim, na mesma ordem de iteração dos parsers legados.
+
+Ficam atrás de ``ESOCIAL_V10_PARSER_S1200`` e ``ESOCIAL_V10_PARSER_BASES`` e
+rodam em modo sombra contra o parser legado (ver ``processador_zip``).
+"""
+
+from __future__ import annotations
+
+import io
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from modules.parser_xml import (
+    BaseContribuicao,
+    BaseTrabalhador,
+    RubricaInfo,
+    RubricaPagamento,
+    montar_rubrica_pagamento,
+)
+from utils.helpers import localname, only_digits, safe_float
+
+
+class _Escopo:
+    """Bloco XML aberto: guarda o primeiro texto de cada campo e seus sub-blocos."""
+
+    __slots__ = ("tipo", "campos", "valores", "filhos")
+
+    def __init__(self, tipo: str, campos: frozenset[str]):
+        self.tipo = tipo
+        self.campos = campos
+        self.valores: Dict[str, str] = {}
+        self.filhos: Dict[str, List["_Escopo"]] = {}
+
+    def texto(self, nome: str) -> Optional[str]:
+        return self.valores.get(nome)
+
+    def anexar(self, tipo: str, escopo: "_Escopo") -> "_Escopo":
+        self.filhos.setdefault(tipo, []).append(escopo)
+        return escopo
+
+    def lista(self, tipo: str) -> List["_Escopo"]:
+        return self.filhos.get(tipo, [])
+
+
+def _mais_proximo(abertos: List[_Escopo], *tipos: str) -> Optional[_Escopo]:
+    for escopo in reversed(abertos):
+        if escopo.tipo in tipos:
+            return escopo
+    return None
+
+
+def _eventos(xml_bytes: bytes) -> Iterator[Tuple[str, str, ET.Element]]:
+    """Gera ``(evento, nome_local, elemento)`` resolvendo cada namespace uma vez."""
+    nomes: Dict[str, str] = {}
+    for evento, elemento in ET.iterparse(io.BytesIO(xml_bytes), events=("start", "end")):
+        tag = elemento.tag
+        nome = nomes.get(tag)
+        if nome is None:
+            nome = nomes[tag] = localname(tag)
+        yield evento, nome, elemento
+
+
+def _varrer(xml_bytes: bytes, documento: _Escopo, abrir) -> None:
+    """Percorre o XML uma vez; ``abrir(nome, escopo_pai, abertos, nivel)`` cria escopos."""
+    pilha: List[Tuple[str, Optional[_Escopo]]] = []
+    abertos: List[_Escopo] = [documento]
+    for evento, nome, elemento in _eventos(xml_bytes):
+        if evento == "start":
+            escopo_pai = pilha[-1][1] if pilha else None
+            escopo = abrir(nome, escopo_pai, abertos, len(pilha))
+            pilha.append((nome, escopo))
+            if escopo is not None:
+                abertos.append(escopo)
+            continue
+        _, escopo = pilha.pop()
+        if escopo is not None:
+            abertos.pop()
+        texto = elemento.text
+        if texto is not None:
+            texto = texto.strip()
+            if texto:
+                for aberto in abertos:
+                    if nome in aberto.campos and nome not in aberto.valores:
+                        aberto.valores[nome] = texto
+        elemento.clear()
+
+
+_CAMPOS_DOC_S1200 = frozenset({"cpfTrab", "perApur", "nrRecibo", "nrRecArqBase", "nrProtEntr"})
+_CAMPOS_DMDEV = frozenset({"codCateg", "matricula", "perRef"})
+_CAMPOS_PERIODO = frozenset({"perRef"})
+# O próprio ideEstabLot serve de bloco de remuneração quando não há remunPerApur/Ant.
+_CAMPOS_ESTAB_LOT = frozenset({"tpInsc", "nrInsc", "codLotacao", "matricula", "perRef"})
+_CAMPOS_REMUN = frozenset({"matricula", "perRef"})
+_CAMPOS_ITEM = frozenset({"codRubr", "ideTabRubr", "vrRubr"})
+
+
+def parse_s1200_streaming(
+    xml_bytes: bytes, rubricas_map: Dict[Tuple[str, str], List[RubricaInfo]], arquivo: str
+) -> List[RubricaPagamento]:
+    documento = _Escopo("documento", _CAMPOS_DOC_S1200)
+
+    def abrir(nome, _pai, abertos, _nivel):
+        if nome == "dmDev":
+            return documento.anexar("dmDev", _Escopo("dmDev", _CAMPOS_DMDEV))
+        if nome in ("infoPerApur", "infoPerAnt"):
+            dm_dev = _mais_proximo(abertos, "dmDev")
+            return dm_dev.anexar(nome, _Escopo("periodo", _CAMPOS_PERIODO)) if dm_dev else None
+        if nome == "ideEstabLot":
+            bloco = _mais_proximo(abertos, "periodo", "dmDev")
+            return bloco.anexar(nome, _Escopo("estab", _CAMPOS_ESTAB_LOT)) if bloco else None
+        if nome in ("remunPerApur", "remunPerAnt"):
+            estab = _mais_proximo(abertos, "estab")
+            return estab.anexar(nome, _Escopo("remun", _CAMPOS_REMUN)) if estab else None
+        if nome == "itensRemun":
+            remun = _mais_proximo(abertos, "remun", "estab")
+            return remun.anexar(nome, _Escopo("item", _CAMPOS_ITEM)) if remun else None
+        return None
+
+    _varrer(xml_bytes, documento, abrir)
+
+    cpf = only_digits(documento.texto("cpfTrab"))
+    per_apur = documento.texto("perApur") or ""
+    nr_recibo_evento = (
+        documento.texto("nrRecibo") or documento.texto("nrRecArqBase") or documento.texto("nrProtEntr") or ""
+    )
+    saida: List[RubricaPagamento] = []
+    for dm_dev in documento.lista("dmDev"):
+        cod_categ = dm_dev.texto("codCateg") or ""
+        blocos_periodo = dm_dev.lista("infoPerApur") + dm_dev.lista("infoPerAnt") or [dm_dev]
+        for bloco_periodo in blocos_periodo:
+            for estab in bloco_periodo.lista("ideEstabLot"):
+                tp_insc_estab = estab.texto("tpInsc") or ""
+                nr_insc_estab = estab.texto("nrInsc") or ""
+                cod_lotacao = estab.texto("codLotacao") or ""
+                blocos_remun = estab.lista("remunPerApur") + estab.lista("remunPerAnt") or [estab]
+                for remun in blocos_remun:
+                    matricula = remun.texto("matricula") or dm_dev.texto("matricula") or ""
+                    competencia = remun.texto("perRef") or bloco_periodo.texto("perRef") or per_apur
+                    for item in remun.lista("itensRemun"):
+                        cod_rubr = item.texto("codRubr") or ""
+                        if cod_rubr:
+                            saida.append(
+                                montar_rubrica_pagamento(
+                                    rubricas_map,
+                                    arquivo=arquivo,
+                                    cpf=cpf,
+                                    matricula=matricula,
+                                    competencia=competencia,
+                                    cod_categ=cod_categ,
+                                    tp_insc_estab=tp_insc_estab,
+                                    nr_insc_estab=nr_insc_estab,
+                                    cod_lotacao=cod_lotacao,
+                                    cod_rubr=cod_rubr,
+                                    ide_tab_rubr=item.texto("ideTabRubr") or "",
+                                    vr_rubr=safe_float(item.texto("vrRubr")),
+                                    nr_recibo_evento=nr_recibo_evento,
+                                )
+                            )
+    return saida
+
+
+_CAMPOS_DOC_BASES = frozenset({"perApur", "nrRecArqBase", "cpfTrab"})
+_CAMPOS_IDE_TRAB = frozenset({"cpfTrab"})
+_CAMPOS_ESTAB_S5001 = frozenset({"tpInsc", "nrInsc", "codLotacao"})
+_CAMPOS_CATEG = frozenset({"matricula", "codCateg"})
+_CAMPOS_BASE_CS = frozenset({"ind13", "tpValor", "valor"})
+_CAMPOS_PER_REF = frozenset({"perRef"})
+_CAMPOS_DET_PER_REF = frozenset({"ind13", "tpValor", "vrPerRef"})
+
+
+def parse_s5001_streaming(xml_bytes: bytes, arquivo: str) -> List[BaseTrabalhador]:
+    documento = _Escopo("documento", _CAMPOS_DOC_BASES)
+    # ideTrabalhador é o filho direto do primeiro evtBasesTrab; sem ele, da raiz.
+    estado: Dict[str, Optional[_Escopo]] = {"evento": None, "ide_evento": None, "ide_raiz": None}
+
+    def abrir(nome, pai, abertos, nivel):
+        if nome == "evtBasesTrab" and estado["evento"] is None:
+            estado["evento"] = _Escopo("evento", frozenset())
+            return estado["evento"]
+        if nome == "ideTrabalhador":
+            if pai is not None and pai is estado["evento"] and estado["ide_evento"] is None:
+                estado["ide_evento"] = _Escopo("ide_trab", _CAMPOS_IDE_TRAB)
+                return estado["ide_evento"]
+            if nivel == 1 and estado["ide_raiz"] is None:
+                estado["ide_raiz"] = _Escopo("ide_trab", _CAMPOS_IDE_TRAB)
+                return estado["ide_raiz"]
+            return None
+        if nome == "ideEstabLot":
+            return documento.anexar(nome, _Escopo("estab", _CAMPOS_ESTAB_S5001))
+        if nome == "infoCategIncid":
+            estab = _mais_proximo(abertos, "estab")
+            return estab.anexar(nome, _Escopo("categ", _CAMPOS_CATEG)) if estab else None
+        if pai is None:
+            return None
+        if nome == "infoBaseCS" and pai.tipo == "categ":
+            return pai.anexar(nome, _Escopo("base_cs", _CAMPOS_BASE_CS))
+        if nome == "infoPerRef" and pai.tipo == "categ":
+            return pai.anexar(nome, _Escopo("per_ref", _CAMPOS_PER_REF))
+        if nome == "detInfoPerRef" and pai.tipo == "per_ref":
+            return pai.anexar(nome, _Escopo("det", _CAMPOS_DET_PER_REF))
+        return None
+
+    _varrer(xml_bytes, documento, abrir)
+
+    per_apur = documento.texto("perApur") or ""
+    nr_recibo_base = documento.texto("nrRecArqBase") or ""
+    ide_trab = estado["ide_evento"] if estado["evento"] is not None else estado["ide_raiz"]
+    cpf = only_digits(ide_trab.texto("cpfTrab") if ide_trab is not None else documento.texto("cpfTrab"))
+
+    saida: List[BaseTrabalhador] = []
+    for estab in documento.lista("ideEstabLot"):
+        tp_insc_estab = estab.texto("tpInsc") or ""
+        nr_insc_estab = estab.texto("nrInsc") or ""
+        cod_lotacao = estab.texto("codLotacao") or ""
+        for info_cat in estab.lista("infoCategIncid"):
+            matricula = info_cat.texto("matricula") or ""
+            cod_categ = info_cat.texto("codCateg") or ""
+            for info_base in info_cat.lista("infoBaseCS"):
+                saida.append(
+                    BaseTrabalhador(
+                        arquivo=arquivo,
+                        cpf=cpf,
+                        matricula=matricula,
+                        per_apur=per_apur,
+                        per_ref=per_apur,
+                        cod_categ=cod_categ,
+                        tp_insc_estab=tp_insc_estab,
+                        nr_insc_estab=nr_insc_estab,
+                        cod_lotacao=cod_lotacao,
+                        ind13=info_base.texto("ind13") or "",
+                        tp_valor=info_base.texto("tpValor") or "",
+                        valor=safe_float(info_base.texto("valor")),
+                        origem_valor="infoBaseCS",
+                        nr_recibo_base=nr_recibo_base,
+                    )
+                )
+            for info_per_ref in info_cat.lista("infoPerRef"):
+                per_ref = info_per_ref.texto("perRef") or per_apur
+                for det in info_per_ref.lista("detInfoPerRef"):
+                    saida.append(
+                        BaseTrabalhador(
+                            arquivo=arquivo,
+                            cpf=cpf,
+                            matricula=matricula,
+                            per_apur=per_apur,
+                            per_ref=per_ref,
+                            cod_categ=cod_categ,
+                            tp_insc_estab=tp_insc_estab,
+                            nr_insc_estab=nr_insc_estab,
+                            cod_lotacao=cod_lotacao,
+                            ind13=det.texto("ind13") or "",
+                            tp_valor=det.texto("tpValor") or "",
+                            valor=safe_float(det.texto("vrPerRef")),
+                            origem_valor="detInfoPerRef",
+                            nr_recibo_base=nr_recibo_base,
+                        )
+                    )
+
+    if not saida and cpf:
+        saida.append(
+            BaseTrabalhador(
+                arquivo=arquivo,
+                cpf=cpf,
+                matricula="",
+                per_apur=per_apur,
+                per_ref=per_apur,
+                cod_categ="",
+                tp_insc_estab="",
+                nr_insc_estab="",
+                cod_lotacao="",
+                ind13="",
+                tp_valor="",
+                valor=0.0,
+                origem_valor="sem_infoBaseCS",
+                nr_recibo_base=nr_recibo_base,
+            )
+        )
+    return saida
+
+
+_CAMPOS_DOC_S5011 = frozenset({"perApur", "nrRecArqBase"})
+_CAMPOS_VR_BC_CP = frozenset({"vrBcCp00", "vrBcCp15", "vrBcCp20", "vrBcCp25"})
+_CAMPOS_ESTAB_S5011 = frozenset({"tpInsc", "nrInsc", "aliqRatAjust"})
+_CAMPOS_INFO_ESTAB = frozenset({"aliqRatAjust"})
+_CAMPOS_LOTACAO = frozenset({"codLotacao", "fpas", "codTercs"})
+# Sem basesCp, os valores são buscados no próprio basesRemun (regra legada).
+_CAMPOS_BASES_REMUN = frozenset({"indIncid", "codCateg"}) | _CAMPOS_VR_BC_CP
+
+
+def parse_s5011_streaming(xml_bytes: bytes, arquivo: str) -> List[BaseContribuicao]:
+    documento = _Escopo("documento", _CAMPOS_DOC_S5011)
+
+    def abrir(nome, pai, abertos, _nivel):
+        if nome == "ideEstab":
+            return documento.anexar(nome, _Escopo("estab", _CAMPOS_ESTAB_S5011))
+        if nome == "basesRemun":
+            lotacao = _mais_proximo(abertos, "lotacao")
+            return lotacao.anexar(nome, _Escopo("bases_remun", _CAMPOS_BASES_REMUN)) if lotacao else None
+        if pai is None:
+            return None
+        if nome == "infoEstab" and pai.tipo == "estab" and not pai.lista(nome):
+            return pai.anexar(nome, _Escopo("info_estab", _CAMPOS_INFO_ESTAB))
+        if nome == "ideLotacao" and pai.tipo == "estab":
+            return pai.anexar(nome, _Escopo("lotacao", _CAMPOS_LOTACAO))
+        if nome == "basesCp" and pai.tipo == "bases_remun" and not pai.lista(nome):
+            return pai.anexar(nome, _Escopo("bases_cp", _CAMPOS_VR_BC_CP))
+        return None
+
+    _varrer(xml_bytes, documento, abrir)
+
+    per_apur = documento.texto("perApur") or ""
+    nr_recibo_base = documento.texto("nrRecArqBase") or ""
+    saida: List[BaseContribuicao] = []
+    for estab in documento.lista("ideEstab"):
+        tp_insc_estab = estab.texto("tpInsc") or ""
+        nr_insc_estab = estab.texto("nrInsc") or ""
+        info_estab = (estab.lista("infoEstab") or [estab])[0]
+        aliq_rat_ajust = safe_float(info_estab.texto("aliqRatAjust"))
+        for lotacao in estab.lista("ideLotacao"):
+            cod_lotacao = lotacao.texto("codLotacao") or ""
+            fpas = lotacao.texto("fpas") or ""
+            cod_tercs = lotacao.texto("codTercs") or ""
+            for bases_remun in lotacao.lista("basesRemun"):
+                bases_cp = (bases_remun.lista("basesCp") or [bases_remun])[0]
+                vr_bc_cp_00 = safe_float(bases_cp.texto("vrBcCp00"))
+                vr_bc_cp_15 = safe_float(bases_cp.texto("vrBcCp15"))
+                vr_bc_cp_20 = safe_float(bases_cp.texto("vrBcCp20"))
+                vr_bc_cp_25 = safe_float(bases_cp.texto("vrBcCp25"))
+                saida.append(
+                    BaseContribuicao(
+                        arquivo=arquivo,
+                        per_apur=per_apur,
+                        tp_insc_estab=tp_insc_estab,
+                        nr_insc_estab=nr_insc_estab,
+                        cod_lotacao=cod_lotacao,
+                        cod_categ=bases_remun.texto("codCateg") or "",
+                        ind_incid=bases_remun.texto("indIncid") or "",
+                        fpas=fpas,
+                        cod_tercs=cod_tercs,
+                        aliq_rat_ajust=aliq_rat_ajust,
+                        vr_bc_cp=vr_bc_cp_00 + vr_bc_cp_15 + vr_bc_cp_20 + vr_bc_cp_25,
+                        vr_bc_cp_00=vr_bc_cp_00,
+                        vr_bc_cp_15=vr_bc_cp_15,
+                        vr_bc_cp_20=vr_bc_cp_20,
+                        vr_bc_cp_25=vr_bc_cp_25,
+                        nr_recibo_base=nr_recibo_base,
+                    )
+                )
+    return saida
@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Sequence, Optional
 import xml.etree.ElementTree as ET
@@ -337,6 +338,142 @@ def _historico_compativel(rubricas: Sequence[RubricaInfo]) -> bool:
     return len(_valores_unicos_nao_vazios(rubricas, "cod_inc_cp")) == 1
 
 
+def _selecao_vigente(rubrica: RubricaInfo, por_tabela: bool) -> RubricaSelecionada:
+    if por_tabela:
+        return RubricaSelecionada(
+            rubrica=rubrica,
+            criterio="codRubr+ideTabRubr+validade",
+            origem_validacao="S-1010 válido",
+            nivel_confianca="Alto",
+            status_auditoria="S1010_VALIDO",
+            observacao_validacao="Rubrica localizada na tabela S-1010 com tabela e vigência compatíveis com a competência do movimento.",
+            usar_incidencia=True,
+        )
+    return RubricaSelecionada(
+        rubrica=rubrica,
+        criterio="codRubr+validade",
+        origem_validacao="S-1010 válido por código",
+        nivel_confianca="Médio",
+        status_auditoria="S1010_VALIDO_POR_CODIGO",
+        observacao_validacao="Rubrica localizada por código e vigência, mas com ideTabRubr diferente/vazio. Conferir tabela de rubricas.",
+        usar_incidencia=True,
+    )
+
+
+def _selecao_historica(rubrica_ref: RubricaInfo, compativel: bool, por_tabela: bool) -> RubricaSelecionada:
+    if compativel:
+        criterio = "codRubr+ideTabRubr_historico_compativel" if por_tabela else "codRubr_historico_compativel"
+        return RubricaSelecionada(
+            rubrica=rubrica_ref,
+            criterio=criterio,
+            origem_validacao="S-1010 histórico compatível",
+            nivel_confianca="Médio",
+            status_auditoria="S1010_HISTORICO_COMPATIVEL",
+            observacao_validacao="Não havia vigência compatível, mas todas as versões conhecidas do mesmo codRubr possuem a mesma incidência CP. Usado como referência auditável.",
+            usar_incidencia=True,
+        )
+    return RubricaSelecionada(
+        rubrica=rubrica_ref,
+        criterio="codRubr_historico_divergente",
+        origem_validacao="S-1010 histórico divergente",
+        nivel_confianca="Revisar",
+        status_auditoria="S1010_HISTORICO_DIVERGENTE",
+        observacao_validacao="Existe S-1010 para o mesmo codRubr, mas as versões conhecidas possuem incidências diferentes ou incompletas. Não foi assumida incidência CP.",
+        usar_incidencia=False,
+    )
+
+
+def _selecao_sem_s1010() -> RubricaSelecionada:
+    return RubricaSelecionada(
+        rubrica=None,
+        criterio="sem_correspondencia",
+        origem_validacao="Sem S-1010",
+        nivel_confianca="Baixo",
+        status_auditoria="SEM_S1010",
+        observacao_validacao="Código de rubrica não localizado na tabela S-1010 carregada.",
+        usar_incidencia=False,
+    )
+
+
+class IndiceRubricas(dict):
+    """Mapa ``(codRubr, ideTabRubr) -> versões S-1010`` com consulta pré-compilada.
+
+    Continua sendo o mesmo dicionário montado por ``_montar_indice_rubricas``, mas
+    cada chave é compilada uma única vez (deduplicada e ordenada por vigência) e a
+    competência é localizada por bissecção. O veredito de histórico compatível por
+    codRubr e a seleção de cada ``(cod, tab, competência)`` ficam memorizados.
+
+    As versões não devem ser alteradas depois da primeira consulta; ``clear()``
+    descarta também as estruturas compiladas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compilados: Dict[Tuple[str, str], Tuple[List[RubricaInfo], List[str], List[str]]] = {}
+        self._historico: Dict[str, bool] = {}
+        self._selecoes: Dict[Tuple[str, str, str], RubricaSelecionada] = {}
+
+    def __reduce__(self):
+        # Workers recebem só as versões; a compilação é refeita sob demanda.
+        return (self.__class__, (dict(self),))
+
+    def clear(self) -> None:
+        super().clear()
+        self._compilados.clear()
+        self._historico.clear()
+        self._selecoes.clear()
+
+    def _compilar(self, chave: Tuple[str, str]) -> Tuple[List[RubricaInfo], List[str], List[str]]:
+        compilado = self._compilados.get(chave)
+        if compilado is None:
+            candidatos = _deduplicar_rubricas(self.get(chave, []))
+            fins = [_competencia_para_chave(r.fim_valid) for r in candidatos]
+            inis = sorted(_competencia_para_chave(r.ini_valid) for r in candidatos)
+            compilado = self._compilados[chave] = (candidatos, fins, inis)
+        return compilado
+
+    def _vigente(self, chave: Tuple[str, str], comp: str) -> Tuple[Optional[RubricaInfo], List[RubricaInfo]]:
+        candidatos, fins, inis = self._compilar(chave)
+        if not comp:
+            return (candidatos[0] if candidatos else None), candidatos
+        # Os candidatos estão em ordem decrescente de iniValid: os que iniciam
+        # depois da competência formam um prefixo cujo tamanho sai da bissecção.
+        for posicao in range(len(inis) - bisect_right(inis, comp), len(candidatos)):
+            if not fins[posicao] or comp <= fins[posicao]:
+                return candidatos[posicao], candidatos
+        return None, candidatos
+
+    def historico_compativel(self, cod: str) -> bool:
+        veredito = self._historico.get(cod)
+        if veredito is None:
+            veredito = self._historico[cod] = _historico_compativel(self._compilar((cod, ""))[0])
+        return veredito
+
+    def selecionar(self, cod_rubr: str, ide_tab_rubr: str, competencia: str) -> RubricaSelecionada:
+        cod = _normalizar_chave(cod_rubr)
+        tab = _normalizar_chave(ide_tab_rubr)
+        comp = _competencia_para_chave(competencia)
+        chave = (cod, tab, comp)
+        selecao = self._selecoes.get(chave)
+        if selecao is None:
+            selecao = self._selecoes[chave] = self._selecionar(cod, tab, comp)
+        return selecao
+
+    def _selecionar(self, cod: str, tab: str, comp: str) -> RubricaSelecionada:
+        candidatos_exatos: List[RubricaInfo] = []
+        if tab:
+            vigente, candidatos_exatos = self._vigente((cod, tab), comp)
+            if vigente is not None:
+                return _selecao_vigente(vigente, por_tabela=True)
+        vigente, candidatos_codigo = self._vigente((cod, ""), comp)
+        if vigente is not None:
+            return _selecao_vigente(vigente, por_tabela=False)
+        if candidatos_codigo:
+            rubrica_ref = candidatos_exatos[0] if candidatos_exatos else candidatos_codigo[0]
+            return _selecao_historica(rubrica_ref, self.historico_compativel(cod), bool(candidatos_exatos))
+        return _selecao_sem_s1010()
+
+
 def selecionar_rubrica_vigente(
     rubricas_map: Dict[Tuple[str, str], List[RubricaInfo]],
     cod_rubr: str,
@@ -351,7 +488,12 @@ def selecionar_rubrica_vigente(
       3) S-1010 histórico compatível: mesmo codRubr em outra vigência/tabela e mesma incidência CP conhecida.
       4) S-1010 histórico divergente: mesmo codRubr, mas com incidências diferentes entre versões.
       5) Sem S-1010.
+
+    Com um ``IndiceRubricas`` a mesma hierarquia é resolvida pelo índice compilado.
     """
+    if isinstance(rubricas_map, IndiceRubricas):
+        return rubricas_map.selecionar(cod_rubr, ide_tab_rubr, competencia)
+
     cod = _normalizar_chave(cod_rubr)
     tab = _normalizar_chave(ide_tab_rubr)
 
@@ -360,61 +502,67 @@ def selecionar_rubrica_vigente(
 
     for rubrica in candidatos_exatos:
         if _rubrica_valida_na_competencia(rubrica, competencia):
-            return RubricaSelecionada(
-                rubrica=rubrica,
-                criterio="codRubr+ideTabRubr+validade",
-                origem_validacao="S-1010 válido",
-                nivel_confianca="Alto",
-                status_auditoria="S1010_VALIDO",
-                observacao_validacao="Rubrica localizada na tabela S-1010 com tabela e vigência compatíveis com a competência do movimento.",
-                usar_incidencia=True,
-            )
+            return _selecao_vigente(rubrica, por_tabela=True)
 
     for rubrica in candidatos_codigo:
         if _rubrica_valida_na_competencia(rubrica, competencia):
-            return RubricaSelecionada(
-                rubrica=rubrica,
-                criterio="codRubr+validade",
-                origem_validacao="S-1010 válido por código",
-                nivel_confianca="Médio",
-                status_auditoria="S1010_VALIDO_POR_CODIGO",
-                observacao_validacao="Rubrica localizada por código e vigência, mas com ideTabRubr diferente/vazio. Conferir tabela de rubricas.",
-                usar_incidencia=True,
-            )
+            return _selecao_vigente(rubrica, por_tabela=False)
 
     # Quando não há vigência compatível, avalia se as versões conhecidas do mesmo código
     # têm a mesma incidência. Isso reduz falso Sem S-1010 sem mascarar a origem da validação.
     if candidatos_codigo:
         rubrica_ref = candidatos_exatos[0] if candidatos_exatos else candidatos_codigo[0]
-        if _historico_compativel(candidatos_codigo):
-            criterio = "codRubr+ideTabRubr_historico_compativel" if candidatos_exatos else "codRubr_historico_compativel"
-            return RubricaSelecionada(
-                rubrica=rubrica_ref,
-                criterio=criterio,
-                origem_validacao="S-1010 histórico compatível",
-                nivel_confianca="Médio",
-                status_auditoria="S1010_HISTORICO_COMPATIVEL",
-                observacao_validacao="Não havia vigência compatível, mas todas as versões conhecidas do mesmo codRubr possuem a mesma incidência CP. Usado como referência auditável.",
-                usar_incidencia=True,
-            )
-        return RubricaSelecionada(
-            rubrica=rubrica_ref,
-            criterio="codRubr_historico_divergente",
-            origem_validacao="S-1010 histórico divergente",
-            nivel_confianca="Revisar",
-            status_auditoria="S1010_HISTORICO_DIVERGENTE",
-            observacao_validacao="Existe S-1010 para o mesmo codRubr, mas as versões conhecidas possuem incidências diferentes ou incompletas. Não foi assumida incidência CP.",
-            usar_incidencia=False,
-        )
+        return _selecao_historica(rubrica_ref, _historico_compativel(candidatos_codigo), bool(candidatos_exatos))
 
-    return RubricaSelecionada(
-        rubrica=None,
-        criterio="sem_correspondencia",
-        origem_validacao="Sem S-1010",
-        nivel_confianca="Baixo",
-        status_auditoria="SEM_S1010",
-        observacao_validacao="Código de rubrica não localizado na tabela S-1010 carregada.",
-        usar_incidencia=False,
+    return _selecao_sem_s1010()
+
+
+def montar_rubrica_pagamento(
+    rubricas_map: Dict[Tuple[str, str], List[RubricaInfo]],
+    *,
+    arquivo: str,
+    cpf: str,
+    matricula: str,
+    competencia: str,
+    cod_categ: str,
+    tp_insc_estab: str,
+    nr_insc_estab: str,
+    cod_lotacao: str,
+    cod_rubr: str,
+    ide_tab_rubr: str,
+    vr_rubr: float,
+    nr_recibo_evento: str,
+) -> RubricaPagamento:
+    """Cruza um item de S-1200 com o S-1010 vigente; comum aos parsers legado e V10."""
+    selecao = selecionar_rubrica_vigente(rubricas_map, cod_rubr, ide_tab_rubr, competencia)
+    rubr = selecao.rubrica
+    return RubricaPagamento(
+        arquivo=arquivo,
+        cpf=cpf,
+        matricula=matricula,
+        per_apur=competencia,
+        cod_categ=cod_categ,
+        tp_insc_estab=tp_insc_estab,
+        nr_insc_estab=nr_insc_estab,
+        cod_lotacao=cod_lotacao,
+        cod_rubr=cod_rubr,
+        ide_tab_rubr=ide_tab_rubr,
+        vr_rubr=vr_rubr,
+        nat_rubr=rubr.nat_rubr if rubr else "",
+        cod_inc_cp=(rubr.cod_inc_cp if (rubr and selecao.usar_incidencia) else ""),
+        dsc_rubr=rubr.dsc_rubr if rubr else "",
+        tp_rubr=rubr.tp_rubr if rubr else "",
+        ini_valid=rubr.ini_valid if rubr else "",
+        fim_valid=rubr.fim_valid if rubr else "",
+        origem_bloco_s1010=rubr.origem_bloco if rubr else "",
+        fonte_s1010=rubr.fonte_dados if rubr else "",
+        arquivo_s1010=rubr.arquivo_origem if rubr else "",
+        criterio_cruzamento_s1010=selecao.criterio,
+        origem_validacao=selecao.origem_validacao,
+        nivel_confianca=selecao.nivel_confianca,
+        status_auditoria=selecao.status_auditoria,
+        observacao_validacao=selecao.observacao_validacao,
+        nr_recibo_evento=nr_recibo_evento,
     )
 
 
@@ -453,50 +601,21 @@ def parse_s1200(root: ET.Element, rubricas_map: Dict[Tuple[str, str], List[Rubri
 
                     for item in all_elements_by_localname(remun, "itensRemun"):
                         cod_rubr = first_text_by_localname(item, "codRubr") or ""
-                        ide_tab_rubr = first_text_by_localname(item, "ideTabRubr") or ""
-                        vr_rubr = safe_float(first_text_by_localname(item, "vrRubr"))
-
-                        selecao = selecionar_rubrica_vigente(rubricas_map, cod_rubr, ide_tab_rubr, competencia_movimento)
-                        rubr = selecao.rubrica
-                        nat_rubr = rubr.nat_rubr if rubr else ""
-                        cod_inc_cp = (rubr.cod_inc_cp if (rubr and selecao.usar_incidencia) else "")
-                        dsc_rubr = rubr.dsc_rubr if rubr else ""
-                        tp_rubr = rubr.tp_rubr if rubr else ""
-                        ini_valid = rubr.ini_valid if rubr else ""
-                        fim_valid = rubr.fim_valid if rubr else ""
-                        origem_bloco_s1010 = rubr.origem_bloco if rubr else ""
-                        fonte_s1010 = rubr.fonte_dados if rubr else ""
-                        arquivo_s1010 = rubr.arquivo_origem if rubr else ""
-                        criterio_cruzamento_s1010 = selecao.criterio
-
                         if cod_rubr:
                             saida.append(
-                                RubricaPagamento(
+                                montar_rubrica_pagamento(
+                                    rubricas_map,
                                     arquivo=arquivo,
                                     cpf=cpf,
                                     matricula=matricula,
-                                    per_apur=competencia_movimento,
+                                    competencia=competencia_movimento,
                                     cod_categ=cod_categ,
                                     tp_insc_estab=tp_insc_estab,
                                     nr_insc_estab=nr_insc_estab,
                                     cod_lotacao=cod_lotacao,
                                     cod_rubr=cod_rubr,
-                                    ide_tab_rubr=ide_tab_rubr,
-                                    vr_rubr=vr_rubr,
-                                    nat_rubr=nat_rubr,
-                                    cod_inc_cp=cod_inc_cp,
-                                    dsc_rubr=dsc_rubr,
-                                    tp_rubr=tp_rubr,
-                                    ini_valid=ini_valid,
-                                    fim_valid=fim_valid,
-                                    origem_bloco_s1010=origem_bloco_s1010,
-                                    fonte_s1010=fonte_s1010,
-                                    arquivo_s1010=arquivo_s1010,
-                                    criterio_cruzamento_s1010=criterio_cruzamento_s1010,
-                                    origem_validacao=selecao.origem_validacao,
-                                    nivel_confianca=selecao.nivel_confianca,
-                                    status_auditoria=selecao.status_auditoria,
-                                    observacao_validacao=selecao.observacao_validacao,
+                                    ide_tab_rubr=first_text_by_localname(item, "ideTabRubr") or "",
+                                    vr_rubr=safe_float(first_text_by_localname(item, "vrRubr")),
                                     nr_recibo_evento=nr_recibo_evento,
                                 )
                             )
@@ -12,7 +12,10 @@ import time
 import uuid
 import zipfile
 import zlib
-from dataclasses import asdict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import astuple, dataclass, field, replace
 from pathlib import Path
 from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
 import xml.etree.ElementTree as ET
@@ -20,19 +23,48 @@ import xml.etree.ElementTree as ET
 import pandas as pd
 
 from modules.parser_xml import (
-    BaseContribuicao, BaseTrabalhador, RubricaInfo, RubricaPagamento,
+    BaseContribuicao, BaseTrabalhador, IndiceRubricas, RubricaInfo, RubricaPagamento,
     parse_s1010, parse_s1200, parse_s3000, parse_s5001, parse_s5011,
     obter_recibo_principal,
 )
 from utils.helpers import localname
 from modules.sqlite_relatorio import (
+    TABELAS_STAGING,
+    colunas_staging,
+    criar_tabelas_staging,
+    descartar_remuneracoes_eventos,
+    ler_staging,
+    linhas_staging,
     materializar_tabelas_analiticas,
     carregar_pacote_resumido,
     reiniciar_materializacao_analitica,
+    remover_staging_eventos,
+    salvar_staging,
+)
+from modules.parser_streaming import (
+    parse_s1200_streaming,
+    parse_s5001_streaming,
+    parse_s5011_streaming,
 )
 from modules.progresso import emitir_progresso
-from modules.event_metadata import identificar_evento_rapido, inspecionar_evento
-from modules.telemetria import TelemetriaCarga
+from modules.leitor_zip import (
+    LeituraAntecipada,
+    abrir_zip_fonte,
+    leitura_antecipada_habilitada,
+    materializar_cadeia,
+    remover_copia,
+)
+from modules.armazem_xml import (
+    DicionariosXML,
+    TreinadorDicionarios,
+    criar_tabela_dicionarios,
+    descartar_xml_processados,
+    recompactar_xml,
+)
+from modules.event_metadata import EventMetadata, identificar_evento_rapido, inspecionar_evento
+from modules.resultado_sqlite import ResultadoSQLite
+from modules.telemetria import TelemetriaCarga, perfil_etapa
+from modules.workspace_manager import atualizar_catalogo_workspace
 
 Fonte = Tuple[str, Union[bytes, bytearray, memoryview, str, os.PathLike]]
 ProgressCallback = Callable[[float, str], None]
@@ -42,7 +74,9 @@ EVENTOS_SEGUNDA_PASSAGEM = {"S-1200", "S-5001", "S-5011"}
 CHECKPOINT_INTERVALO = 500
 BATCH_SEGUNDA_PASSAGEM = 250
 MAX_BYTES_LOTE_SEGUNDA_PASSAGEM = 32 * 1024 * 1024
+LOTE_MEMBROS_WORKER = 64
 MAX_NIVEL_ZIP = 8
+PASTA_FONTES_ANINHADAS = "fontes_aninhadas"
 MAX_XML_INDIVIDUAL = 256 * 1024 * 1024
 ARQUIVO_BLOQUEIO_WORKSPACE = ".processamento.lock"
 
@@ -106,18 +140,25 @@ def _nome_fonte_para_hud(nome: object) -> str:
     return texto.lstrip("./")
 
 
+def _linhas_fontes(conn: sqlite3.Connection, id_carga: int | None = None) -> list[tuple]:
+    filtro = " WHERE id_carga=?" if id_carga is not None else ""
+    params = (id_carga,) if id_carga is not None else ()
+    return conn.execute(
+        "SELECT id,status,MAX(COALESCE(tamanho_bytes,0),1) FROM fontes" + filtro,
+        params,
+    ).fetchall()
+
+
 def _resumo_fontes_descobertas(
     conn: sqlite3.Connection,
     fonte_atual: int | None = None,
     fracao_atual: float = 0.0,
     id_carga: int | None = None,
+    linhas: list[tuple] | None = None,
 ) -> dict[str, int | float]:
-    filtro = " WHERE id_carga=?" if id_carga is not None else ""
-    params = (id_carga,) if id_carga is not None else ()
-    linhas = conn.execute(
-        "SELECT id,status,MAX(COALESCE(tamanho_bytes,0),1) FROM fontes" + filtro,
-        params,
-    ).fetchall()
+    """Resumo das fontes; ``linhas`` reaproveita uma leitura de ``_linhas_fontes``."""
+    if linhas is None:
+        linhas = _linhas_fontes(conn, id_carga)
     resumo: dict[str, int | float] = {
         "descobertas": len(linhas),
         "concluidas": 0,
@@ -288,6 +329,7 @@ def _criar_schema(conn: sqlite3.Connection) -> None:
         ultimo_indice INTEGER NOT NULL DEFAULT -1,
         total_membros INTEGER NOT NULL DEFAULT 0,
         tamanho_bytes INTEGER NOT NULL DEFAULT 0,
+        membros_aninhados TEXT NOT NULL DEFAULT '',
         UNIQUE(caminho, prefixo)
     );
     CREATE TABLE IF NOT EXISTS eventos (
@@ -317,6 +359,20 @@ def _criar_schema(conn: sqlite3.Connection) -> None:
         arquivo TEXT NOT NULL,
         erro TEXT NOT NULL
     );
+    CREATE TABLE IF NOT EXISTS divergencias_parser (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        evento_id INTEGER,
+        arquivo TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        detalhe TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS dependencias_rubricas (
+        cod_rubr TEXT NOT NULL,
+        ide_tab_rubr TEXT NOT NULL DEFAULT '',
+        evento_id INTEGER NOT NULL,
+        PRIMARY KEY(cod_rubr, ide_tab_rubr, evento_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_dependencias_rubricas_evento ON dependencias_rubricas(evento_id);
     CREATE TABLE IF NOT EXISTS historico_cargas (
         id_carga INTEGER PRIMARY KEY AUTOINCREMENT,
         workspace_id TEXT NOT NULL,
@@ -370,6 +426,8 @@ def _criar_schema(conn: sqlite3.Connection) -> None:
     col_fontes = {r[1] for r in conn.execute("PRAGMA table_info(fontes)")}
     if "id_carga" not in col_fontes:
         conn.execute("ALTER TABLE fontes ADD COLUMN id_carga INTEGER")
+    if "membros_aninhados" not in col_fontes:
+        conn.execute("ALTER TABLE fontes ADD COLUMN membros_aninhados TEXT NOT NULL DEFAULT ''")
     conn.execute(
         "CREATE UNIQUE INDEX IF NOT EXISTS ux_eventos_hash_conteudo "
         "ON eventos(hash_conteudo) WHERE hash_conteudo IS NOT NULL AND hash_conteudo<>''"
@@ -380,12 +438,14 @@ def _criar_schema(conn: sqlite3.Connection) -> None:
     # Workspaces anteriores só permitem retropreencher eventos cujo XML foi
     # preservado para a segunda passagem. O filtro e essencial: depois da
     # migracao, reabrir um Workspace nao pode descompactar novamente seu acervo.
+    criar_tabela_dicionarios(conn)
+    dicionarios = DicionariosXML.carregar(conn)
     for evento_id, xml_zlib, hash_atual, recibo_atual in conn.execute(
         "SELECT id,xml_zlib,hash_conteudo,recibo_evento FROM eventos "
         "WHERE xml_zlib IS NOT NULL AND COALESCE(hash_conteudo,'')=''"
     ):
         try:
-            xml_bruto = zlib.decompress(xml_zlib)
+            xml_bruto = dicionarios.descomprimir(xml_zlib)
             if not hash_atual:
                 digest = hashlib.sha256(xml_bruto).hexdigest()
                 conn.execute(
@@ -402,6 +462,7 @@ def _criar_schema(conn: sqlite3.Connection) -> None:
                 )
         except Exception:
             pass
+    criar_tabelas_staging(conn)
     conn.commit()
 
 
@@ -433,6 +494,8 @@ def _ler_objetos(conn: sqlite3.Connection, categoria: str) -> list:
             saida.extend(obj)
         else:
             saida.append(obj)
+    if categoria in TABELAS_STAGING:
+        saida.extend(ler_staging(conn, categoria))
     return saida
 
 
@@ -440,7 +503,7 @@ def _eh_retorno_evento_completo(root: ET.Element) -> bool:
     return localname(root.tag) == "retornoEventoCompleto" or any(localname(el.tag) == "recibo" for el in root.iter())
 
 
-def _montar_indice_rubricas(rubricas: List[RubricaInfo]):
+def _montar_indice_rubricas(rubricas: List[RubricaInfo]) -> IndiceRubricas:
     # Eventos de tabela são sequenciais. Uma exclusão remove a versão de mesma
     # chave/vigência; inclusão/alteração posterior substitui a versão anterior.
     # Assim uma exclusão nunca vira um cadastro vazio elegível para o S-1200.
@@ -456,7 +519,7 @@ def _montar_indice_rubricas(rubricas: List[RubricaInfo]):
         else:
             versoes[chave_versao] = rubrica
 
-    mapa = {}
+    mapa = IndiceRubricas()
     ordenadas = sorted(
         versoes.values(),
         key=lambda r: (0 if r.fonte_dados == "Download principal" else 1, r.ini_valid, r.fim_valid),
@@ -503,12 +566,71 @@ def _materializar_fontes(
     conn.commit()
 
 
-def _registrar_contagem(conn: sqlite3.Connection, tipo: str) -> None:
-    conn.execute(
-        "INSERT INTO contagem_eventos(tipo, quantidade) VALUES(?, 1) "
-        "ON CONFLICT(tipo) DO UPDATE SET quantidade=quantidade+1",
-        (tipo,),
-    )
+@dataclass
+class ContadoresIngestao:
+    """Contagens da ingestão acumuladas em memória e gravadas antes de cada commit.
+
+    Substitui o upsert em ``contagem_eventos`` e os ``UPDATE historico_cargas``
+    por XML; como ``descarregar`` roda na mesma transação do checkpoint, a
+    retomada continua vendo contagens coerentes com ``fontes.ultimo_indice``.
+    """
+
+    id_carga: int | None = None
+    eventos_gravados: int = 0
+    tipos: dict[str, int] = field(default_factory=dict)
+    carga: dict[str, int] = field(default_factory=dict)
+    periodo_minimo: str = ""
+    periodo_maximo: str = ""
+
+    @classmethod
+    def carregar(cls, conn: sqlite3.Connection, id_carga: int | None = None) -> "ContadoresIngestao":
+        gravados = conn.execute("SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos").fetchone()[0]
+        return cls(id_carga, int(gravados))
+
+    @property
+    def total_eventos(self) -> int:
+        return self.eventos_gravados + sum(self.tipos.values())
+
+    def somar_carga(self, coluna: str, quantidade: int = 1) -> None:
+        if self.id_carga is not None:
+            self.carga[coluna] = self.carga.get(coluna, 0) + quantidade
+
+    def evento_novo(self, tipo: str, periodo: str) -> None:
+        self.tipos[tipo] = self.tipos.get(tipo, 0) + 1
+        self.somar_carga("quantidade_xml_novos")
+        if periodo and self.id_carga is not None:
+            if not self.periodo_minimo or periodo < self.periodo_minimo:
+                self.periodo_minimo = periodo
+            if not self.periodo_maximo or periodo > self.periodo_maximo:
+                self.periodo_maximo = periodo
+
+    def descarregar(self, conn: sqlite3.Connection) -> None:
+        if self.tipos:
+            conn.executemany(
+                "INSERT INTO contagem_eventos(tipo, quantidade) VALUES(?, ?) "
+                "ON CONFLICT(tipo) DO UPDATE SET quantidade=quantidade+excluded.quantidade",
+                sorted(self.tipos.items()),
+            )
+            self.eventos_gravados += sum(self.tipos.values())
+            self.tipos.clear()
+        if self.id_carga is not None and (self.carga or self.periodo_minimo):
+            colunas = sorted(self.carga)
+            atribuicoes = [f"{coluna}={coluna}+?" for coluna in colunas]
+            params: list[object] = [self.carga[coluna] for coluna in colunas]
+            if self.periodo_minimo:
+                atribuicoes += [
+                    "periodo_minimo_adicionado=CASE WHEN periodo_minimo_adicionado='' "
+                    "OR ?<periodo_minimo_adicionado THEN ? ELSE periodo_minimo_adicionado END",
+                    "periodo_maximo_adicionado=CASE WHEN periodo_maximo_adicionado='' "
+                    "OR ?>periodo_maximo_adicionado THEN ? ELSE periodo_maximo_adicionado END",
+                ]
+                params += [self.periodo_minimo] * 2 + [self.periodo_maximo] * 2
+            conn.execute(
+                f"UPDATE historico_cargas SET {','.join(atribuicoes)} WHERE id_carga=?",
+                (*params, self.id_carga),
+            )
+            self.carga.clear()
+            self.periodo_minimo = self.periodo_maximo = ""
 
 
 def _registrar_duracao(
@@ -518,6 +640,21 @@ def _registrar_duracao(
     _meta_set(conn, f"tempo_{chave}_segundos", f"{time.perf_counter() - inicio:.3f}")
 
 
+def _linhas_etapa(conn: sqlite3.Connection, etapa: str) -> int:
+    """Volume acumulado usado para calcular linhas/s de cada etapa."""
+    if etapa == "ingestao":
+        sql = "SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos"
+    elif etapa == "segunda_passagem":
+        sql = "SELECT COUNT(*) FROM eventos WHERE processado_segunda=1"
+    else:
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='rel_controle_integridade'"
+        ).fetchone():
+            return 0
+        sql = "SELECT COALESCE(SUM(quantidade),0) FROM rel_controle_integridade"
+    return int(conn.execute(sql).fetchone()[0])
+
+
 def _metadados_retificacao(root: ET.Element) -> tuple[str, str, str, str]:
     evento = next(
         (el for el in root.iter() if localname(el.tag).startswith("evt")), None
@@ -546,6 +683,114 @@ def _metadados_retificacao(root: ET.Element) -> tuple[str, str, str, str]:
     return id_evento, ind_retif, recibo_evento, recibo_referencia
 
 
+@dataclass
+class XmlPreparado:
+    """Resultado compacto da analise de um XML, sem acesso ao SQLite.
+
+    Produzido no processo principal ou em um worker; somente o escritor unico
+    aplica deduplicacao, retificacao, contagens e checkpoints.
+    """
+
+    arquivo: str
+    tamanho: int
+    hash_conteudo: str
+    metadados: EventMetadata | None = None
+    xml_zlib: bytes | None = None
+    objetos: list[tuple[str, object]] = field(default_factory=list)
+    erro: str = ""
+    tempos: dict[str, float] = field(default_factory=dict)
+
+
+# Dicionarios de compressao do workspace em processamento. No processo
+# principal sao carregados por etapa; nos workers chegam pelo initializer.
+_DICIONARIOS_XML = DicionariosXML()
+_TREINADOR_XML: TreinadorDicionarios | None = None
+
+
+def _inicializar_worker_ingestao(dicionarios: dict[int, tuple[str, bytes]]) -> None:
+    _DICIONARIOS_XML.substituir(dicionarios)
+
+
+def _preparar_xml_ingestao(
+    arquivo: str,
+    xml_bytes: bytes,
+    tamanho: int,
+    hash_conteudo: str | None = None,
+) -> XmlPreparado:
+    """Executa hash, identificacao, parse, S-1010/S-3000 e compressao."""
+    tempos: dict[str, float] = {}
+    if hash_conteudo is None:
+        inicio = time.perf_counter()
+        hash_conteudo = hashlib.sha256(xml_bytes).hexdigest()
+        tempos["hash"] = time.perf_counter() - inicio
+    preparado = XmlPreparado(arquivo, int(tamanho), hash_conteudo, tempos=tempos)
+    if tamanho > MAX_XML_INDIVIDUAL:
+        preparado.erro = "XML acima do limite individual de segurança"
+        return preparado
+    try:
+        inicio = time.perf_counter()
+        pista = identificar_evento_rapido(xml_bytes)
+        root = ET.fromstring(xml_bytes)
+        tempos["parse_xml"] = time.perf_counter() - inicio
+    except Exception as exc:
+        preparado.erro = f"XML inválido ou ilegível: {exc}"
+        return preparado
+
+    inicio = time.perf_counter()
+    metadados = inspecionar_evento(root, pista)
+    tempos["inspecao"] = time.perf_counter() - inicio
+    preparado.metadados = metadados
+    tipo = metadados.tipo
+    if tipo in EVENTOS_SEGUNDA_PASSAGEM or tipo == "S-1010":
+        inicio = time.perf_counter()
+        preparado.xml_zlib = _DICIONARIOS_XML.comprimir(tipo, xml_bytes)
+        tempos["compressao"] = time.perf_counter() - inicio
+    if tipo in EVENTOS_SUPORTADOS:
+        preparado.objetos.append(("empresa", {
+            "arquivo_origem": arquivo,
+            "tp_insc_empregador": metadados.tp_insc_empregador,
+            "cnpj_empregador": metadados.cnpj_empregador,
+            "nome_empresa": metadados.nome_empresa,
+        }))
+    if tipo == "S-1010":
+        itens = parse_s1010(
+            root,
+            arquivo=arquivo,
+            fonte_dados=(
+                "Recibo S-1010" if metadados.envelope_recibo
+                else "Download principal"
+            ),
+        )
+        preparado.objetos.append(("rubricas", itens))
+    elif tipo == "S-3000":
+        item = parse_s3000(root)
+        item["arquivo_origem"] = arquivo
+        preparado.objetos.append(("exclusoes", item))
+    root.clear()
+    return preparado
+
+
+def _consultar_duplicado_incremental(
+    conn: sqlite3.Connection,
+    hash_conteudo: str,
+    id_carga: int | None,
+    telemetria: TelemetriaCarga | None,
+) -> tuple | None:
+    # Carga inicial e dominada por XMLs novos: a restricao UNIQUE resolve a rara
+    # colisao no INSERT. Cargas incrementais preservam a consulta antecipada,
+    # pois nelas duplicatas sao frequentes e S-1010 pode exigir reprocessamento.
+    if id_carga is None:
+        return None
+    inicio = time.perf_counter()
+    evento_existente = conn.execute(
+        "SELECT id,arquivo,tipo,envelope_recibo FROM eventos "
+        "WHERE hash_conteudo=? LIMIT 1", (hash_conteudo,)
+    ).fetchone()
+    if telemetria:
+        telemetria.tempo("consulta_duplicidade", time.perf_counter() - inicio)
+    return evento_existente
+
+
 def _processar_xml_ingestao(
     conn: sqlite3.Connection,
     arquivo: str,
@@ -553,44 +798,81 @@ def _processar_xml_ingestao(
     tamanho: int,
     id_carga: int | None = None,
     telemetria: TelemetriaCarga | None = None,
+    contadores: ContadoresIngestao | None = None,
 ) -> str:
     inicio_xml = time.perf_counter()
     inicio = time.perf_counter()
     hash_conteudo = hashlib.sha256(xml_bytes).hexdigest()
     if telemetria:
         telemetria.tempo("hash", time.perf_counter() - inicio)
-    # Carga inicial e dominada por XMLs novos: a restricao UNIQUE resolve a rara
-    # colisao no INSERT. Cargas incrementais preservam a consulta antecipada,
-    # pois nelas duplicatas sao frequentes e S-1010 pode exigir reprocessamento.
-    evento_existente = None
-    if id_carga is not None:
-        inicio = time.perf_counter()
-        evento_existente = conn.execute(
-            "SELECT id,arquivo,tipo,envelope_recibo FROM eventos "
-            "WHERE hash_conteudo=? LIMIT 1", (hash_conteudo,)
-        ).fetchone()
-        if telemetria:
-            telemetria.tempo("consulta_duplicidade", time.perf_counter() - inicio)
+    evento_existente = _consultar_duplicado_incremental(
+        conn, hash_conteudo, id_carga, telemetria,
+    )
+    if evento_existente and evento_existente[2] != "S-1010":
+        # Duplicata comum dispensa a arvore XML; somente o S-1010 e reanalisado.
+        preparado = XmlPreparado(arquivo, int(tamanho), hash_conteudo)
+    else:
+        preparado = _preparar_xml_ingestao(
+            arquivo, xml_bytes, tamanho, hash_conteudo,
+        )
+    return _gravar_xml_preparado(
+        conn, preparado, id_carga, telemetria, evento_existente, inicio_xml, contadores,
+    )
+
+
+def _gravar_xml_preparado(
+    conn: sqlite3.Connection,
+    preparado: XmlPreparado,
+    id_carga: int | None = None,
+    telemetria: TelemetriaCarga | None = None,
+    evento_existente: tuple | None = None,
+    inicio_xml: float | None = None,
+    contadores: ContadoresIngestao | None = None,
+) -> str:
+    """Aplica no SQLite um XML ja analisado; unico ponto de escrita por XML.
+
+    Sem ``contadores`` (chamada avulsa) as contagens sao gravadas na hora.
+    """
+    if contadores is None:
+        contadores = ContadoresIngestao(id_carga)
+        try:
+            return _gravar_xml_preparado(
+                conn, preparado, id_carga, telemetria, evento_existente, inicio_xml, contadores,
+            )
+        finally:
+            contadores.descarregar(conn)
+    if inicio_xml is None:
+        inicio_xml = time.perf_counter()
+    if telemetria:
+        for chave, segundos in preparado.tempos.items():
+            telemetria.tempo(chave, segundos)
+    arquivo = preparado.arquivo
+    tamanho = preparado.tamanho
+    hash_conteudo = preparado.hash_conteudo
     if evento_existente:
         if id_carga is not None:
-            conn.execute(
-                "UPDATE historico_cargas SET quantidade_duplicados=quantidade_duplicados+1,"
-                "quantidade_xml_localizados=quantidade_xml_localizados+1 WHERE id_carga=?",
-                (id_carga,),
-            )
+            contadores.somar_carga("quantidade_duplicados")
+            contadores.somar_carga("quantidade_xml_localizados")
             if evento_existente[2] == "S-1010":
                 # Permite aplicar correções de parser em Workspace existente ao
                 # reenviar o mesmo recibo, sem duplicar fisicamente o evento.
                 try:
-                    root_existente = ET.fromstring(xml_bytes)
-                    itens = parse_s1010(
-                        root_existente,
-                        arquivo=str(evento_existente[1]),
-                        fonte_dados=(
-                            "Recibo S-1010" if evento_existente[3]
-                            else "Download principal"
-                        ),
+                    if preparado.erro:
+                        raise ValueError(preparado.erro)
+                    fonte_dados = (
+                        "Recibo S-1010" if evento_existente[3]
+                        else "Download principal"
                     )
+                    itens = [
+                        replace(
+                            item,
+                            arquivo_origem=str(evento_existente[1]),
+                            fonte_dados=fonte_dados,
+                        )
+                        for categoria, bloco in preparado.objetos
+                        if categoria == "rubricas"
+                        for item in bloco
+                    ]
                     conn.execute(
                         "DELETE FROM objetos WHERE categoria='rubricas' AND evento_id=?",
                         (int(evento_existente[0]),),
@@ -599,7 +881,6 @@ def _processar_xml_ingestao(
                         conn, "rubricas", int(evento_existente[0]), itens
                     )
                     _meta_set(conn, f"carga_{id_carga}_reprocessou_s1010", 1)
-                    root_existente.clear()
                 except Exception as exc:
                     conn.execute(
                         "INSERT INTO erros(arquivo,erro) VALUES(?,?)",
@@ -609,62 +890,33 @@ def _processar_xml_ingestao(
             telemetria.somar("duplicados")
             telemetria.evento("DUPLICADO", tamanho, time.perf_counter() - inicio_xml)
         return "duplicado"
-    if id_carga is not None:
+    contadores.somar_carga("quantidade_xml_localizados")
+    if preparado.erro or preparado.metadados is None:
         conn.execute(
-            "UPDATE historico_cargas SET quantidade_xml_localizados=quantidade_xml_localizados+1 "
-            "WHERE id_carga=?", (id_carga,),
+            "INSERT INTO erros(arquivo, erro) VALUES (?, ?)",
+            (arquivo, preparado.erro or "XML inválido ou ilegível"),
         )
-    if tamanho > MAX_XML_INDIVIDUAL:
-        conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (arquivo, "XML acima do limite individual de segurança"))
         conn.execute(
             "INSERT OR IGNORE INTO eventos(arquivo, tipo, tamanho_bytes, hash_conteudo, id_carga) "
             "VALUES (?, 'XML_INVALIDO', ?, ?, ?)",
             (arquivo, tamanho, hash_conteudo, id_carga),
         )
-        if id_carga is not None:
-            conn.execute("UPDATE historico_cargas SET quantidade_erros=quantidade_erros+1 WHERE id_carga=?", (id_carga,))
-        return "erro"
-    try:
-        inicio = time.perf_counter()
-        pista = identificar_evento_rapido(xml_bytes)
-        root = ET.fromstring(xml_bytes)
-        if telemetria:
-            telemetria.tempo("parse_xml", time.perf_counter() - inicio)
-    except Exception as exc:
-        conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (arquivo, f"XML inválido ou ilegível: {exc}"))
-        conn.execute(
-            "INSERT OR IGNORE INTO eventos(arquivo, tipo, tamanho_bytes, hash_conteudo, id_carga) "
-            "VALUES (?, 'XML_INVALIDO', ?, ?, ?)",
-            (arquivo, tamanho, hash_conteudo, id_carga),
-        )
-        if id_carga is not None:
-            conn.execute("UPDATE historico_cargas SET quantidade_erros=quantidade_erros+1 WHERE id_carga=?", (id_carga,))
+        contadores.somar_carga("quantidade_erros")
         return "erro"
 
-    inicio = time.perf_counter()
-    metadados = inspecionar_evento(root, pista)
-    if telemetria:
-        telemetria.tempo("inspecao", time.perf_counter() - inicio)
+    metadados = preparado.metadados
     tipo = metadados.tipo
-    recibo = metadados.envelope_recibo
-    id_evento = metadados.id_evento_esocial
     ind_retif = metadados.ind_retif
-    recibo_evento = metadados.recibo_evento
     recibo_referencia = metadados.recibo_referencia
-    blob = None
-    if tipo in EVENTOS_SEGUNDA_PASSAGEM or tipo == "S-1010":
-        inicio = time.perf_counter()
-        blob = sqlite3.Binary(zlib.compress(xml_bytes, level=1))
-        if telemetria:
-            telemetria.tempo("compressao", time.perf_counter() - inicio)
+    blob = sqlite3.Binary(preparado.xml_zlib) if preparado.xml_zlib is not None else None
     inicio = time.perf_counter()
     cur = conn.execute(
         "INSERT OR IGNORE INTO eventos(arquivo, tipo, tamanho_bytes, envelope_recibo, xml_zlib, hash_conteudo, id_carga,"
         "id_evento_esocial,ind_retif,recibo_evento,recibo_referencia,namespace_xml,versao_layout,identificacao_parser,"
         "versao_desconhecida,divergencia_identificacao) "
         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (arquivo, tipo, tamanho, int(recibo), blob, hash_conteudo, id_carga,
-         id_evento, ind_retif, recibo_evento, recibo_referencia,
+        (arquivo, tipo, tamanho, int(metadados.envelope_recibo), blob, hash_conteudo, id_carga,
+         metadados.id_evento_esocial, ind_retif, metadados.recibo_evento, recibo_referencia,
          metadados.namespace_xml, metadados.versao_layout,
          metadados.identificacao_parser, int(metadados.versao_desconhecida),
          int(metadados.divergencia_identificacao)),
@@ -672,17 +924,14 @@ def _processar_xml_ingestao(
     if telemetria:
         telemetria.tempo("escrita_sqlite", time.perf_counter() - inicio)
     if cur.rowcount == 0:
-        if id_carga is not None:
-            conn.execute(
-                "UPDATE historico_cargas SET quantidade_duplicados=quantidade_duplicados+1 WHERE id_carga=?",
-                (id_carga,),
-            )
-        root.clear()
+        contadores.somar_carga("quantidade_duplicados")
         if telemetria:
             telemetria.somar("duplicados")
             telemetria.evento("DUPLICADO", tamanho, time.perf_counter() - inicio_xml)
         return "duplicado"
     evento_id = int(cur.lastrowid)
+    if preparado.xml_zlib is not None and _TREINADOR_XML is not None:
+        _TREINADOR_XML.observar(conn, tipo, preparado.xml_zlib)
     if ind_retif == "2" and recibo_referencia:
         substituidos = [
             int(row[0])
@@ -699,38 +948,11 @@ def _processar_xml_ingestao(
             conn.execute(
                 f"DELETE FROM objetos WHERE evento_id IN ({marcas})", substituidos
             )
-    _registrar_contagem(conn, tipo)
-    if id_carga is not None:
-        periodo = metadados.periodo
-        conn.execute(
-            "UPDATE historico_cargas SET quantidade_xml_novos=quantidade_xml_novos+1,"
-            "periodo_minimo_adicionado=CASE WHEN ?<>'' AND (periodo_minimo_adicionado='' OR ?<periodo_minimo_adicionado) THEN ? ELSE periodo_minimo_adicionado END,"
-            "periodo_maximo_adicionado=CASE WHEN ?<>'' AND (periodo_maximo_adicionado='' OR ?>periodo_maximo_adicionado) THEN ? ELSE periodo_maximo_adicionado END "
-            "WHERE id_carga=?",
-            (periodo, periodo, periodo, periodo, periodo, periodo, id_carga),
-        )
+            remover_staging_eventos(conn, substituidos)
+    contadores.evento_novo(tipo, metadados.periodo)
 
-    if tipo in EVENTOS_SUPORTADOS:
-        empresa = {
-            "arquivo_origem": arquivo,
-            "tp_insc_empregador": metadados.tp_insc_empregador,
-            "cnpj_empregador": metadados.cnpj_empregador,
-            "nome_empresa": metadados.nome_empresa,
-        }
-        _salvar_objetos(conn, "empresa", evento_id, empresa)
-
-    if tipo == "S-1010":
-        itens = parse_s1010(
-            root,
-            arquivo=arquivo,
-            fonte_dados="Recibo S-1010" if recibo else "Download principal",
-        )
-        _salvar_objetos(conn, "rubricas", evento_id, itens)
-    elif tipo == "S-3000":
-        item = parse_s3000(root)
-        item["arquivo_origem"] = arquivo
-        _salvar_objetos(conn, "exclusoes", evento_id, item)
-    root.clear()
+    for categoria, objetos in preparado.objetos:
+        _salvar_objetos(conn, categoria, evento_id, objetos)
     if telemetria:
         telemetria.somar("xml_processados")
         telemetria.somar("bytes_processados", tamanho)
@@ -744,29 +966,120 @@ def _processar_xml_ingestao(
 
 def _adicionar_zip_aninhado(
     conn: sqlite3.Connection,
-    workspace: Path,
-    fonte_id: int,
-    indice: int,
+    caminho: Path,
+    membros_pai: list[str],
     prefixo: str,
     nome_membro: str,
-    origem_stream,
     tamanho: int,
     nivel: int,
     id_carga: int | None = None,
 ) -> None:
+    """Registra o ZIP interno como fonte lida no proprio arquivo externo.
+
+    A fonte guarda o caminho do arquivo mais externo e a cadeia de membros ate
+    o ZIP interno; nada e copiado para o workspace.
+    """
     if nivel > MAX_NIVEL_ZIP:
         return
-    pasta = workspace / "fontes_aninhadas"
-    pasta.mkdir(parents=True, exist_ok=True)
-    destino = pasta / f"{fonte_id:06d}_{indice:09d}_{_nome_seguro(Path(nome_membro).name)}"
-    if not destino.exists():
-        with destino.open("wb") as fp:
-            shutil.copyfileobj(origem_stream, fp, length=1024 * 1024)
     caminho_logico = f"{prefixo}::{nome_membro}"
     conn.execute(
-        "INSERT OR IGNORE INTO fontes(nome, caminho, nivel, prefixo, tamanho_bytes, id_carga) VALUES (?, ?, ?, ?, ?, ?)",
-        (nome_membro, str(destino), nivel, caminho_logico, int(tamanho), id_carga),
+        "INSERT OR IGNORE INTO fontes(nome, caminho, nivel, prefixo, tamanho_bytes, id_carga, membros_aninhados) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (nome_membro, str(caminho), nivel, caminho_logico, int(tamanho), id_carga,
+         json.dumps([*membros_pai, nome_membro], ensure_ascii=False)),
+    )
+
+
+def _workers_ingestao() -> int:
+    """Le a feature flag ``ESOCIAL_V10_WORKERS``; 0 ou 1 mantem o modo sequencial."""
+    try:
+        return max(0, int(os.environ.get("ESOCIAL_V10_WORKERS", "0") or 0))
+    except ValueError:
+        return 0
+
+
+# Cada worker reabre o ZIP uma unica vez e reaproveita a lista de membros.
+_ZIPS_WORKER: dict[tuple[str, tuple[str, ...]], tuple[ExitStack, zipfile.ZipFile, list[zipfile.ZipInfo]]] = {}
+
+
+def _analisar_lote_zip(
+    caminho: str, prefixo: str, indices: list[int], membros: tuple[str, ...] = ()
+) -> tuple[int, list[tuple[int, XmlPreparado | None, str]]]:
+    """Worker: le e analisa membros XML sem qualquer acesso ao SQLite."""
+    chave = (caminho, tuple(membros))
+    if chave not in _ZIPS_WORKER:
+        for pilha_antiga, _, _ in _ZIPS_WORKER.values():
+            pilha_antiga.close()
+        _ZIPS_WORKER.clear()
+        pilha = ExitStack()
+        try:
+            zf = abrir_zip_fonte(pilha, caminho, membros)
+        except BaseException:
+            pilha.close()
+            raise
+        _ZIPS_WORKER[chave] = (pilha, zf, zf.infolist())
+    _, zf, infos = _ZIPS_WORKER[chave]
+    saida: list[tuple[int, XmlPreparado | None, str]] = []
+    for indice in indices:
+        info = infos[indice]
+        try:
+            with zf.open(info, "r") as fp:
+                conteudo = fp.read(MAX_XML_INDIVIDUAL + 1)
+            preparado = _preparar_xml_ingestao(
+                f"{prefixo}::{info.filename}", conteudo, info.file_size,
+            )
+            saida.append((indice, preparado, ""))
+        except Exception as exc:
+            saida.append((indice, None, str(exc)))
+    return os.getpid(), saida
+
+
+def _indices_xml(infos: list[zipfile.ZipInfo], inicio: int) -> list[int]:
+    return [
+        indice for indice in range(inicio, len(infos))
+        if not infos[indice].is_dir()
+        and Path(infos[indice].filename).suffix.lower() == ".xml"
+    ]
+
+
+def _resultados_paralelos(
+    executor: ProcessPoolExecutor,
+    workers: int,
+    caminho: Path,
+    prefixo: str,
+    infos: list[zipfile.ZipInfo],
+    inicio: int,
+    contagem_workers: dict[int, int],
+    membros: tuple[str, ...] = (),
+) -> Iterator[tuple[int, XmlPreparado | None, str]]:
+    """Distribui lotes de membros XML e devolve os resultados na ordem do ZIP.
+
+    A janela de lotes em voo e limitada para manter a memoria estavel; a ordem
+    preserva a semantica de ``fontes.ultimo_indice`` no escritor unico.
+    """
+    indices = _indices_xml(infos, inicio)
+    lotes = (
+        indices[pos:pos + LOTE_MEMBROS_WORKER]
+        for pos in range(0, len(indices), LOTE_MEMBROS_WORKER)
     )
+    pendentes: deque = deque()
+    try:
+        for lote in lotes:
+            pendentes.append(
+                executor.submit(_analisar_lote_zip, str(caminho), str(prefixo), lote, membros)
+            )
+            if len(pendentes) < workers * 2:
+                continue
+            pid, resultados = pendentes.popleft().result()
+            contagem_workers[pid] = contagem_workers.get(pid, 0) + len(resultados)
+            yield from resultados
+        while pendentes:
+            pid, resultados = pendentes.popleft().result()
+            contagem_workers[pid] = contagem_workers.get(pid, 0) + len(resultados)
+            yield from resultados
+    finally:
+        for futuro in pendentes:
+            futuro.cancel()
 
 
 def _ingerir_fontes(
@@ -774,12 +1087,56 @@ def _ingerir_fontes(
     workspace: Path,
     progress_callback: ProgressCallback | None,
     id_carga: int | None = None,
+    workers: int | None = None,
 ) -> None:
+    global _TREINADOR_XML
     inicio_ingestao = time.perf_counter()
     telemetria = TelemetriaCarga()
-    xml_inicio = int(conn.execute(
-        "SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos"
-    ).fetchone()[0])
+    workers = _workers_ingestao() if workers is None else max(0, int(workers))
+    _DICIONARIOS_XML.substituir(DicionariosXML.carregar(conn).por_id)
+    _TREINADOR_XML = TreinadorDicionarios(_DICIONARIOS_XML)
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_inicializar_worker_ingestao,
+            initargs=(dict(_DICIONARIOS_XML.por_id),),
+        )
+        if workers > 1 else None
+    )
+    if executor is not None:
+        telemetria.somar("workers_ingestao", workers)
+    contadores = ContadoresIngestao.carregar(conn, id_carga)
+    try:
+        _ingerir_fontes_pendentes(
+            conn, workspace, progress_callback, id_carga, telemetria,
+            inicio_ingestao, executor, workers, contadores,
+        )
+        # Amostras do treino e XMLs comprimidos pelos workers antes de o
+        # dicionario existir passam ao formato com dicionario.
+        conn.commit()
+        recompactar_xml(conn, _DICIONARIOS_XML)
+    finally:
+        # Em falha, o que ja foi escrito nesta transacao leva suas contagens.
+        contadores.descarregar(conn)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(workspace / PASTA_FONTES_ANINHADAS, ignore_errors=True)
+        _TREINADOR_XML = None
+        _DICIONARIOS_XML.substituir({})
+
+
+def _ingerir_fontes_pendentes(
+    conn: sqlite3.Connection,
+    workspace: Path,
+    progress_callback: ProgressCallback | None,
+    id_carga: int | None,
+    telemetria: TelemetriaCarga,
+    inicio_ingestao: float,
+    executor: ProcessPoolExecutor | None,
+    workers: int,
+    contadores: ContadoresIngestao,
+) -> None:
+    xml_inicio = contadores.total_eventos
     _progresso(
         progress_callback, "ingestao",
         _fracao_ingestao_descoberta(conn, id_carga=id_carga),
@@ -791,30 +1148,33 @@ def _ingerir_fontes(
         filtro_carga = " AND id_carga=?" if id_carga is not None else ""
         params = (id_carga,) if id_carga is not None else ()
         fonte = conn.execute(
-            "SELECT id, nome, caminho, nivel, prefixo, ultimo_indice FROM fontes "
+            "SELECT id, nome, caminho, nivel, prefixo, ultimo_indice, membros_aninhados FROM fontes "
             "WHERE status IN ('pendente','processando')" + filtro_carga + " ORDER BY id LIMIT 1",
             params,
         ).fetchone()
         if not fonte:
             break
-        fonte_id, nome, caminho_txt, nivel, prefixo, ultimo_indice = fonte
+        fonte_id, nome, caminho_txt, nivel, prefixo, ultimo_indice, membros_txt = fonte
         caminho = Path(caminho_txt)
+        membros = tuple(json.loads(membros_txt)) if membros_txt else ()
         if not caminho.exists():
             conn.execute("UPDATE fontes SET status='erro' WHERE id=?", (fonte_id,))
             conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (str(prefixo), "Fonte não localizada para retomada"))
             conn.commit()
             continue
 
-        if caminho.suffix.lower() == ".xml":
+        if caminho.suffix.lower() == ".xml" and not membros:
             if ultimo_indice < 0:
-                _processar_xml_ingestao(conn, str(prefixo), caminho.read_bytes(), caminho.stat().st_size, id_carga, telemetria)
+                _processar_xml_ingestao(
+                    conn, str(prefixo), caminho.read_bytes(), caminho.stat().st_size,
+                    id_carga, telemetria, contadores,
+                )
                 conn.execute("UPDATE fontes SET ultimo_indice=0, total_membros=1, status='concluida' WHERE id=?", (fonte_id,))
+                contadores.descarregar(conn)
                 conn.commit()
-                fracao = _fracao_ingestao_descoberta(conn, id_carga=id_carga)
                 resumo_fontes = _resumo_fontes_descobertas(conn, id_carga=id_carga)
-                total_eventos = int(conn.execute(
-                    "SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos"
-                ).fetchone()[0])
+                fracao = float(resumo_fontes["fracao"])
+                total_eventos = contadores.total_eventos
                 _progresso(
                     progress_callback, "ingestao", fracao,
                     f"XML individual catalogado: {nome}",
@@ -826,34 +1186,108 @@ def _ingerir_fontes(
             continue
 
         try:
-            with zipfile.ZipFile(caminho, "r") as zf:
+            with ExitStack() as pilha:
+                raiz, cadeia = caminho, membros
+                if membros:
+                    # ZIPs internos comprimidos sao descomprimidos uma unica vez;
+                    # a copia serve ao escritor, aos workers e a leitura antecipada.
+                    raiz, cadeia = materializar_cadeia(
+                        caminho, membros, workspace / PASTA_FONTES_ANINHADAS, f"{fonte_id:06d}",
+                    )
+                    if raiz != caminho:
+                        pilha.callback(remover_copia, raiz)
+                zf = abrir_zip_fonte(pilha, raiz, cadeia)
+                # ``infolist()`` devolve a propria lista do ZipFile, montada ao
+                # abrir o diretorio central (necessario ao acesso aleatorio); os
+                # totais de bytes saem de uma unica passada sobre ela.
                 infos = zf.infolist()
                 total = len(infos)
                 conn.execute("UPDATE fontes SET total_membros=?, status='processando' WHERE id=?", (total, fonte_id))
                 conn.commit()
                 inicio = max(int(ultimo_indice) + 1, 0)
-                total_bytes = sum(max(0, int(info.file_size)) for info in infos)
-                bytes_concluidos = sum(max(0, int(info.file_size)) for info in infos[:inicio])
+                total_bytes = bytes_concluidos = 0
+                for posicao, info in enumerate(infos):
+                    tamanho_membro = max(0, int(info.file_size))
+                    total_bytes += tamanho_membro
+                    if posicao < inicio:
+                        bytes_concluidos += tamanho_membro
                 bytes_inicio = bytes_concluidos
                 inicio_fonte = time.perf_counter()
                 ultima_atualizacao_visual = 0.0
+                # Releitura de ``fontes`` so depois de um ZIP interno novo.
+                linhas_fontes: list[tuple] | None = None
+                contagem_workers: dict[int, int] = {}
+                resultados = (
+                    _resultados_paralelos(
+                        executor, workers, raiz, prefixo, infos, inicio,
+                        contagem_workers, cadeia,
+                    )
+                    if executor is not None else None
+                )
+                antecipados = None
+                if resultados is None and leitura_antecipada_habilitada():
+                    # Sem workers, uma thread descomprime os proximos XMLs
+                    # enquanto o escritor interpreta e grava o atual.
+                    leitura = LeituraAntecipada(
+                        lambda pilha_leitura: abrir_zip_fonte(pilha_leitura, raiz, cadeia),
+                        _indices_xml(infos, inicio),
+                        MAX_XML_INDIVIDUAL + 1,
+                    )
+                    pilha.callback(leitura.fechar)
+                    antecipados = iter(leitura)
                 for indice in range(inicio, total):
                     info = infos[indice]
                     if not info.is_dir():
                         ext = Path(info.filename).suffix.lower()
                         if ext in {".xml", ".zip"}:
                             caminho_logico = f"{prefixo}::{info.filename}"
+                            if ext == ".xml" and resultados is not None:
+                                # Falha do pool interrompe a carga; o checkpoint
+                                # anterior permanece valido para a retomada.
+                                indice_worker, preparado, erro = next(resultados)
+                                if indice_worker != indice:
+                                    raise RuntimeError(
+                                        f"Resultado de worker fora de ordem: {indice_worker} != {indice}"
+                                    )
+                            elif ext == ".xml" and antecipados is not None:
+                                indice_lido, conteudo, erro = next(
+                                    antecipados, (-1, None, "Leitura antecipada encerrada antes do fim da fonte"),
+                                )
+                                if indice_lido != indice:
+                                    # Falha da thread vale para a fonte inteira: ela
+                                    # fica com status 'erro' e o checkpoint anterior
+                                    # continua valido, sem interromper as demais.
+                                    raise OSError(
+                                        erro or f"Leitura antecipada fora de ordem: {indice_lido} != {indice}"
+                                    )
                             try:
-                                if ext == ".xml":
-                                    with zf.open(info, "r") as fp:
-                                        conteudo = fp.read(MAX_XML_INDIVIDUAL + 1)
-                                    _processar_xml_ingestao(conn, caminho_logico, conteudo, info.file_size, id_carga, telemetria)
+                                if ext == ".xml" and resultados is not None:
+                                    if preparado is None:
+                                        raise RuntimeError(erro)
+                                    _gravar_xml_preparado(
+                                        conn, preparado, id_carga, telemetria,
+                                        _consultar_duplicado_incremental(
+                                            conn, preparado.hash_conteudo,
+                                            id_carga, telemetria,
+                                        ),
+                                        contadores=contadores,
+                                    )
+                                elif ext == ".xml":
+                                    if antecipados is None:
+                                        with zf.open(info, "r") as fp:
+                                            conteudo = fp.read(MAX_XML_INDIVIDUAL + 1)
+                                    elif conteudo is None:
+                                        raise RuntimeError(erro)
+                                    _processar_xml_ingestao(
+                                        conn, caminho_logico, conteudo, info.file_size,
+                                        id_carga, telemetria, contadores,
+                                    )
                                 else:
-                                    with zf.open(info, "r") as fp:
-                                        _adicionar_zip_aninhado(
-                                            conn, workspace, fonte_id, indice, prefixo,
-                                            info.filename, fp, info.file_size, int(nivel) + 1, id_carga,
-                                        )
+                                    _adicionar_zip_aninhado(
+                                        conn, caminho, list(membros), prefixo,
+                                        info.filename, info.file_size, int(nivel) + 1, id_carga,
+                                    )
+                                    linhas_fontes = None
                             except Exception as exc:
                                 conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (caminho_logico, str(exc)))
                     bytes_concluidos += max(0, int(info.file_size))
@@ -863,16 +1297,19 @@ def _ingerir_fontes(
                         conn.execute("UPDATE fontes SET ultimo_indice=? WHERE id=?", (indice, fonte_id))
                         _meta_set(conn, "fase", "ingestao")
                         _meta_set(conn, "atualizado_em", time.time())
+                        contadores.descarregar(conn)
                         inicio_commit = time.perf_counter()
                         conn.commit()
                         telemetria.somar("commits")
                         telemetria.tempo("commits", time.perf_counter() - inicio_commit)
                     if checkpoint or agora_visual - ultima_atualizacao_visual >= 1.0:
                         ultima_atualizacao_visual = agora_visual
-                        total_eventos = conn.execute("SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos").fetchone()[0]
+                        total_eventos = contadores.total_eventos
                         fracao_fonte = (indice + 1) / max(total, 1)
+                        if linhas_fontes is None:
+                            linhas_fontes = _linhas_fontes(conn, id_carga)
                         resumo_fontes = _resumo_fontes_descobertas(
-                            conn, fonte_id, fracao_fonte, id_carga,
+                            conn, fonte_id, fracao_fonte, id_carga, linhas_fontes,
                         )
                         fracao_ingestao = float(resumo_fontes["fracao"])
                         decorrido_fonte = max(agora_visual - inicio_fonte, 0.001)
@@ -883,12 +1320,21 @@ def _ingerir_fontes(
                         velocidade_bytes = bytes_feitos / decorrido_fonte
                         restantes = max(total - indice - 1, 0)
                         eta = restantes / velocidade_itens if velocidade_itens > 0 else None
+                        ritmo_workers = ""
+                        if executor is not None:
+                            ativos = max(len(contagem_workers), 1)
+                            por_worker = sum(contagem_workers.values()) / ativos / decorrido_fonte
+                            ritmo_workers = (
+                                f"workers {ativos:,}/{workers:,} | "
+                                f"{por_worker:,.1f} itens/s por worker | "
+                            )
                         detalhes = (
                             f"Fonte: {_nome_fonte_para_hud(nome)} | "
                             f"itens {indice + 1:,}/{total:,} | "
                             f"{_formatar_bytes(bytes_concluidos)}/{_formatar_bytes(total_bytes)} | "
                             f"{int(total_eventos):,} XMLs catalogados | "
                             f"{velocidade_itens:,.1f} itens/s | {_formatar_bytes(velocidade_bytes)}/s | "
+                            f"{ritmo_workers}"
                             f"decorrido {_formatar_tempo(decorrido_total)} | ETA da fonte {_formatar_tempo(eta)} | "
                             f"{_texto_resumo_fontes(resumo_fontes)}"
                         ).replace(",", ".")
@@ -898,14 +1344,15 @@ def _ingerir_fontes(
                             detalhes,
                         )
                 conn.execute("UPDATE fontes SET status='concluida' WHERE id=?", (fonte_id,))
+                contadores.descarregar(conn)
                 conn.commit()
-        except (zipfile.BadZipFile, PermissionError, OSError) as exc:
+        except (zipfile.BadZipFile, KeyError, PermissionError, OSError) as exc:
             conn.execute("UPDATE fontes SET status='erro' WHERE id=?", (fonte_id,))
             conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (str(prefixo), f"ZIP inválido ou inacessível: {exc}"))
+            contadores.descarregar(conn)
             conn.commit()
-    total_eventos = int(conn.execute(
-        "SELECT COALESCE(SUM(quantidade),0) FROM contagem_eventos"
-    ).fetchone()[0])
+    contadores.descarregar(conn)
+    total_eventos = contadores.total_eventos
     resumo_final = _resumo_fontes_descobertas(conn, id_carga=id_carga)
     telemetria.tempo("ingestao", time.perf_counter() - inicio_ingestao)
     db_row = conn.execute("PRAGMA database_list").fetchone()
@@ -923,9 +1370,295 @@ def _ingerir_fontes(
     )
 
 
-def _segunda_passagem(conn: sqlite3.Connection, progress_callback: ProgressCallback | None) -> None:
+# Indice de rubricas e modos dos parsers V10 recebidos uma unica vez por
+# processo worker (initializer).
+_RUBRICAS_WORKER: IndiceRubricas = IndiceRubricas()
+_MODOS_PARSER_WORKER: dict[str, str] = {}
+
+_CATEGORIAS_SEGUNDA_PASSAGEM = {
+    "S-1200": "remuneracoes",
+    "S-5001": "bases_trabalhador",
+    "S-5011": "bases_contribuicao",
+}
+
+
+def _modos_parser_v10() -> dict[str, str]:
+    """Le ``ESOCIAL_V10_PARSER_S1200``/``ESOCIAL_V10_PARSER_BASES``.
+
+    Vazio ou 0 mantem o parser legado; ``sombra`` roda os dois e grava o legado;
+    ``1`` grava o V10, voltando ao legado se ele falhar.
+    """
+    def modo(flag: str) -> str:
+        valor = os.environ.get(flag, "").strip().lower()
+        if valor == "sombra":
+            return "sombra"
+        return "ativo" if valor in {"1", "true", "sim", "ativo"} else ""
+
+    bases = modo("ESOCIAL_V10_PARSER_BASES")
+    return {"S-1200": modo("ESOCIAL_V10_PARSER_S1200"), "S-5001": bases, "S-5011": bases}
+
+
+def _parse_legado(tipo: str, xml_bytes: bytes, rubricas_map: dict, arquivo: str) -> list:
+    root = ET.fromstring(xml_bytes)
+    try:
+        if tipo == "S-1200":
+            return parse_s1200(root, rubricas_map, arquivo)
+        if tipo == "S-5001":
+            return parse_s5001(root, arquivo)
+        return parse_s5011(root, arquivo)
+    finally:
+        root.clear()
+
+
+def _parse_v10(tipo: str, xml_bytes: bytes, rubricas_map: dict, arquivo: str) -> list:
+    if tipo == "S-1200":
+        return parse_s1200_streaming(xml_bytes, rubricas_map, arquivo)
+    if tipo == "S-5001":
+        return parse_s5001_streaming(xml_bytes, arquivo)
+    return parse_s5011_streaming(xml_bytes, arquivo)
+
+
+def _descrever_divergencia(categoria: str, legado: list[tuple], v10: list[tuple]) -> str:
+    if legado == v10:
+        return ""
+    if len(legado) != len(v10):
+        return f"Legado gerou {len(legado)} linha(s); V10 gerou {len(v10)}."
+    colunas = colunas_staging(categoria)
+    for posicao, (linha_legado, linha_v10) in enumerate(zip(legado, v10), start=1):
+        if linha_legado != linha_v10:
+            campos = [
+                f"{coluna}: {antes!r} x {depois!r}"
+                for coluna, antes, depois in zip(colunas, linha_legado, linha_v10)
+                if antes != depois
+            ]
+            return f"Linha {posicao}: " + "; ".join(campos)[:1500]
+    return ""
+
+
+def _analisar_evento_segunda(
+    arquivo: str,
+    tipo: str,
+    xml_zlib: bytes,
+    rubricas_map: dict,
+    modos: dict[str, str] | None = None,
+) -> tuple[list[tuple], str]:
+    """Interpreta um evento e devolve ``(linhas_staging, divergencia_v10)``.
+
+    Em modo sombra o resultado gravado e sempre o do parser legado; qualquer
+    diferenca do parser V10 apenas e descrita para auditoria.
+    """
+    xml_bytes = _DICIONARIOS_XML.descomprimir(xml_zlib)
+    categoria = _CATEGORIAS_SEGUNDA_PASSAGEM[tipo]
+    modo = (modos or {}).get(tipo, "")
+    if modo == "ativo":
+        try:
+            return linhas_staging(categoria, _parse_v10(tipo, xml_bytes, rubricas_map, arquivo)), ""
+        except Exception as exc:
+            legado = linhas_staging(categoria, _parse_legado(tipo, xml_bytes, rubricas_map, arquivo))
+            return legado, f"Parser V10 falhou; usado o legado: {exc}"
+    legado = linhas_staging(categoria, _parse_legado(tipo, xml_bytes, rubricas_map, arquivo))
+    if modo != "sombra":
+        return legado, ""
+    try:
+        v10 = linhas_staging(categoria, _parse_v10(tipo, xml_bytes, rubricas_map, arquivo))
+    except Exception as exc:
+        return legado, f"Parser V10 falhou: {exc}"
+    return legado, _descrever_divergencia(categoria, legado, v10)
+
+
+def _inicializar_worker_segunda(
+    rubricas_map: dict,
+    modos: dict[str, str],
+    dicionarios: dict[int, tuple[str, bytes]] | None = None,
+) -> None:
+    _DICIONARIOS_XML.substituir(dicionarios or {})
+    _RUBRICAS_WORKER.clear()
+    _RUBRICAS_WORKER.update(rubricas_map)
+    _MODOS_PARSER_WORKER.clear()
+    _MODOS_PARSER_WORKER.update(modos)
+
+
+def _analisar_lote_segunda(
+    lote: list[tuple[int, str, str, bytes]]
+) -> list[tuple[int, list[tuple] | None, str, str]]:
+    """Worker: descomprime e interpreta eventos da segunda passagem sem SQLite."""
+    saida: list[tuple[int, list[tuple] | None, str, str]] = []
+    for evento_id, arquivo, tipo, xml_zlib in lote:
+        try:
+            linhas, divergencia = _analisar_evento_segunda(
+                arquivo, tipo, xml_zlib, _RUBRICAS_WORKER, _MODOS_PARSER_WORKER,
+            )
+            saida.append((evento_id, linhas, "", divergencia))
+        except Exception as exc:
+            saida.append((evento_id, None, str(exc), ""))
+    return saida
+
+
+def _resultados_segunda_passagem(
+    lote: list[tuple[int, str, str, bytes]],
+    rubricas_map: dict,
+    modos: dict[str, str],
+    executor: ProcessPoolExecutor | None,
+    workers: int,
+) -> Iterator[tuple[int, list[tuple] | None, str, str]]:
+    """Devolve ``(evento_id, linhas, erro, divergencia)`` na ordem do lote lido do SQLite."""
+    if executor is None:
+        for evento_id, arquivo, tipo, xml_zlib in lote:
+            try:
+                linhas, divergencia = _analisar_evento_segunda(arquivo, tipo, xml_zlib, rubricas_map, modos)
+                yield evento_id, linhas, "", divergencia
+            except Exception as exc:
+                yield evento_id, None, str(exc), ""
+        return
+    tamanho = max(1, -(-len(lote) // workers))
+    partes = [lote[pos:pos + tamanho] for pos in range(0, len(lote), tamanho)]
+    for resultados in executor.map(_analisar_lote_segunda, partes):
+        yield from resultados
+
+
+_POSICOES_RUBRICA_STAGING = (
+    colunas_staging("remuneracoes").index("cod_rubr"),
+    colunas_staging("remuneracoes").index("ide_tab_rubr"),
+)
+
+
+def _registrar_dependencias_rubricas(
+    conn: sqlite3.Connection, evento_id: int, linhas: list[tuple]
+) -> None:
+    """Guarda as chaves (codRubr, ideTabRubr) citadas por um S-1200."""
+    if not linhas:
+        return
+    pos_cod, pos_tab = _POSICOES_RUBRICA_STAGING
+    conn.executemany(
+        "INSERT OR IGNORE INTO dependencias_rubricas(cod_rubr, ide_tab_rubr, evento_id) VALUES (?, ?, ?)",
+        {
+            (str(linha[pos_cod] or "").strip(), str(linha[pos_tab] or "").strip(), evento_id)
+            for linha in linhas
+        },
+    )
+
+
+def _garantir_dependencias_rubricas(conn: sqlite3.Connection) -> None:
+    """Completa as dependências de S-1200 interpretados antes da tabela existir."""
+    if _meta_get(conn, "dependencias_rubricas_completas") == "1":
+        return
+    criar_tabelas_staging(conn)
+    cursor = conn.execute(
+        "SELECT DISTINCT cod_rubr, ide_tab_rubr, evento_id FROM stg_remuneracoes WHERE evento_id IS NOT NULL"
+    )
+    while True:
+        lote = cursor.fetchmany(10_000)
+        if not lote:
+            break
+        conn.executemany(
+            "INSERT OR IGNORE INTO dependencias_rubricas(cod_rubr, ide_tab_rubr, evento_id) VALUES (?, ?, ?)",
+            [(str(cod or "").strip(), str(tab or "").strip(), evento_id) for cod, tab, evento_id in lote],
+        )
+    _meta_set(conn, "dependencias_rubricas_completas", 1)
+
+
+def _assinaturas_rubricas(conn: sqlite3.Connection) -> dict[str, str]:
+    """Resumo por codRubr de todas as versões S-1010 conhecidas.
+
+    A seleção de rubrica de um item S-1200 depende de todas as versões do mesmo
+    código (vigência por tabela, por código e histórico compatível); duas
+    assinaturas iguais garantem a mesma classificação.
+    """
+    versoes: dict[str, list[str]] = {}
+    for rubrica in _ler_objetos(conn, "rubricas"):
+        versoes.setdefault(str(rubrica.cod_rubr or "").strip(), []).append(repr(astuple(rubrica)))
+    return {
+        cod: hashlib.sha256("\n".join(sorted(itens)).encode("utf-8")).hexdigest()
+        for cod, itens in versoes.items()
+    }
+
+
+def _rubricas_alteradas(conn: sqlite3.Connection, id_carga: int) -> set[str] | None:
+    """Códigos cuja S-1010 mudou nesta carga; ``None`` exige reclassificação total.
+
+    A reclassificação dirigida é desligada com ``ESOCIAL_RECLASSIFICACAO_DIRIGIDA=0``
+    e não se aplica a Workspaces com remunerações legadas em ``objetos``.
+    """
+    if os.environ.get("ESOCIAL_RECLASSIFICACAO_DIRIGIDA", "1").strip().lower() in {"0", "false", "nao", "não"}:
+        return None
+    anteriores = _meta_get(conn, f"carga_{id_carga}_assinaturas_s1010")
+    if not anteriores:
+        return None
+    if conn.execute("SELECT 1 FROM objetos WHERE categoria='remuneracoes' LIMIT 1").fetchone():
+        return None
+    antes = json.loads(anteriores)
+    depois = _assinaturas_rubricas(conn)
+    return {cod for cod in antes.keys() | depois.keys() if antes.get(cod) != depois.get(cod)}
+
+
+def _reclassificar_s1200_dirigido(
+    conn: sqlite3.Connection, alteradas: set[str], reprocessou_s1010: bool
+) -> int:
+    """Devolve à segunda passagem só os S-1200 que citam rubricas alteradas."""
+    _garantir_dependencias_rubricas(conn)
+    conn.execute("DROP TABLE IF EXISTS temp.rubricas_alteradas")
+    conn.execute("CREATE TEMP TABLE rubricas_alteradas(cod_rubr TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO temp.rubricas_alteradas VALUES(?)", [(cod,) for cod in alteradas])
+    conn.execute("DROP TABLE IF EXISTS temp.s1200_reclassificar")
+    conn.execute("CREATE TEMP TABLE s1200_reclassificar(id INTEGER PRIMARY KEY)")
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.s1200_reclassificar "
+        "SELECT d.evento_id FROM dependencias_rubricas d JOIN eventos e ON e.id=d.evento_id "
+        "WHERE e.tipo='S-1200' AND e.ativo=1 AND e.processado_segunda=1 "
+        "AND d.cod_rubr IN (SELECT cod_rubr FROM temp.rubricas_alteradas)"
+    )
+    eventos_sql = "SELECT id FROM temp.s1200_reclassificar"
+    quantidade = int(conn.execute("SELECT COUNT(*) FROM temp.s1200_reclassificar").fetchone()[0])
+    if quantidade:
+        descartar_remuneracoes_eventos(conn, eventos_sql)
+        conn.execute(f"DELETE FROM dependencias_rubricas WHERE evento_id IN ({eventos_sql})")
+        conn.execute(f"UPDATE eventos SET processado_segunda=0 WHERE id IN ({eventos_sql})")
+    if reprocessou_s1010:
+        # O S-1010 reenviado regrava seus objetos com ids novos; dados_rubricas
+        # é pequena e é refeita para não duplicar as versões.
+        conn.execute("DROP TABLE IF EXISTS dados_rubricas")
+        conn.execute("DELETE FROM meta WHERE chave='materializado_rubricas_ate'")
+    conn.execute("DROP TABLE temp.rubricas_alteradas")
+    conn.execute("DROP TABLE temp.s1200_reclassificar")
+    return quantidade
+
+
+def _segunda_passagem(
+    conn: sqlite3.Connection,
+    progress_callback: ProgressCallback | None,
+    workers: int | None = None,
+) -> None:
+    criar_tabelas_staging(conn)
     rubricas = _ler_objetos(conn, "rubricas")
     rubricas_map = _montar_indice_rubricas(rubricas)
+    modos = _modos_parser_v10()
+    workers = _workers_ingestao() if workers is None else max(0, int(workers))
+    _DICIONARIOS_XML.substituir(DicionariosXML.carregar(conn).por_id)
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_inicializar_worker_segunda,
+            initargs=(rubricas_map, modos, dict(_DICIONARIOS_XML.por_id)),
+        )
+        if workers > 1 else None
+    )
+    try:
+        _segunda_passagem_pendente(conn, progress_callback, rubricas_map, modos, executor, workers)
+        descartar_xml_processados(conn)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        _DICIONARIOS_XML.substituir({})
+
+
+def _segunda_passagem_pendente(
+    conn: sqlite3.Connection,
+    progress_callback: ProgressCallback | None,
+    rubricas_map: dict,
+    modos: dict[str, str],
+    executor: ProcessPoolExecutor | None,
+    workers: int,
+) -> None:
     total = conn.execute(
         "SELECT COUNT(*) FROM eventos WHERE ativo=1 AND tipo IN ('S-1200','S-5001','S-5011')"
     ).fetchone()[0]
@@ -965,21 +1698,23 @@ def _segunda_passagem(conn: sqlite3.Connection, progress_callback: ProgressCallb
         if not lote:
             break
 
-        for evento_id, arquivo, tipo, xml_zlib in lote:
-            try:
-                root = ET.fromstring(zlib.decompress(xml_zlib))
+        # Workers apenas interpretam; gravacao e checkpoint seguem no escritor
+        # unico e na ordem de ``id``, preservando a retomada por processado_segunda.
+        registros = {evento_id: (arquivo, tipo) for evento_id, arquivo, tipo, _ in lote}
+        resultados = _resultados_segunda_passagem(lote, rubricas_map, modos, executor, workers)
+        for evento_id, linhas, erro, divergencia in resultados:
+            arquivo, tipo = registros[evento_id]
+            if linhas is None:
+                conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (arquivo, f"Falha na segunda passagem: {erro}"))
+            else:
+                salvar_staging(conn, _CATEGORIAS_SEGUNDA_PASSAGEM[tipo], evento_id, linhas)
                 if tipo == "S-1200":
-                    itens = parse_s1200(root, rubricas_map, arquivo)
-                    _salvar_objetos(conn, "remuneracoes", evento_id, itens)
-                elif tipo == "S-5001":
-                    itens = parse_s5001(root, arquivo)
-                    _salvar_objetos(conn, "bases_trabalhador", evento_id, itens)
-                elif tipo == "S-5011":
-                    itens = parse_s5011(root, arquivo)
-                    _salvar_objetos(conn, "bases_contribuicao", evento_id, itens)
-                root.clear()
-            except Exception as exc:
-                conn.execute("INSERT INTO erros(arquivo, erro) VALUES (?, ?)", (arquivo, f"Falha na segunda passagem: {exc}"))
+                    _registrar_dependencias_rubricas(conn, evento_id, linhas)
+            if divergencia:
+                conn.execute(
+                    "INSERT INTO divergencias_parser(evento_id, arquivo, tipo, detalhe) VALUES (?, ?, ?, ?)",
+                    (evento_id, arquivo, tipo, divergencia),
+                )
             conn.execute("UPDATE eventos SET processado_segunda=1 WHERE id=?", (evento_id,))
             concluidos += 1
 
@@ -991,7 +1726,8 @@ def _segunda_passagem(conn: sqlite3.Connection, progress_callback: ProgressCallb
             f"Segunda passagem SQLite: {concluidos:,} de {total:,} eventos relevantes".replace(",", "."),
             (
                 f"{concluidos:,}/{total:,} eventos | "
-                f"decorrido {_formatar_tempo(time.perf_counter() - inicio_etapa)}"
+                + (f"workers {workers} | " if executor is not None else "")
+                + f"decorrido {_formatar_tempo(time.perf_counter() - inicio_etapa)}"
             ).replace(",", "."),
         )
     _progresso(
@@ -1001,75 +1737,6 @@ def _segunda_passagem(conn: sqlite3.Connection, progress_callback: ProgressCallb
     )
 
 
-def _dataframe_objetos(conn: sqlite3.Connection, categoria: str, dataclass_obj: bool = True) -> pd.DataFrame:
-    itens = _ler_objetos(conn, categoria)
-    if dataclass_obj:
-        itens = [asdict(x) if hasattr(x, "__dataclass_fields__") else x for x in itens]
-    return pd.DataFrame(itens)
-
-
-def _finalizar_resultado(conn: sqlite3.Connection, workspace: Path) -> Dict[str, object]:
-    rubricas = _ler_objetos(conn, "rubricas")
-    exclusoes = _ler_objetos(conn, "exclusoes")
-    remuneracoes = _ler_objetos(conn, "remuneracoes")
-    bases_trabalhador = _ler_objetos(conn, "bases_trabalhador")
-    bases_contribuicao = _ler_objetos(conn, "bases_contribuicao")
-    empresas = _ler_objetos(conn, "empresa")
-
-    recibos_excluidos = {x.get("nrRecEvt", "") for x in exclusoes if isinstance(x, dict) and x.get("nrRecEvt")}
-    remuneracoes = [r for r in remuneracoes if getattr(r, "nr_recibo_evento", "") not in recibos_excluidos]
-    bases_trabalhador = [b for b in bases_trabalhador if getattr(b, "nr_recibo_base", "") not in recibos_excluidos]
-    bases_contribuicao = [b for b in bases_contribuicao if getattr(b, "nr_recibo_base", "") not in recibos_excluidos]
-
-    inventario = pd.read_sql_query(
-        "SELECT arquivo, tipo, tamanho_bytes, "
-        "CASE WHEN tipo IN ('S-1000','S-1005','S-1010','S-1020','S-1200','S-3000','S-5001','S-5011') THEN 1 ELSE 0 END AS parseado, "
-        "CASE envelope_recibo WHEN 1 THEN 'Sim' ELSE 'Não' END AS envelope_recibo "
-        "FROM eventos ORDER BY id",
-        conn,
-    )
-    erros = pd.read_sql_query("SELECT arquivo, erro FROM erros ORDER BY id", conn)
-    contagem = pd.read_sql_query(
-        "SELECT tipo, quantidade AS xml_localizados FROM contagem_eventos "
-        "WHERE tipo IN ('S-1000','S-1005','S-1010','S-1020','S-1200','S-3000','S-5001','S-5011') ORDER BY tipo",
-        conn,
-    )
-    parseados = pd.DataFrame([
-        {"tipo": "S-1010", "xml_parseados": int(contagem.loc[contagem["tipo"].eq("S-1010"), "xml_localizados"].sum()) if not contagem.empty else 0},
-        {"tipo": "S-1200", "xml_parseados": conn.execute("SELECT COUNT(*) FROM eventos WHERE tipo='S-1200' AND processado_segunda=1").fetchone()[0]},
-        {"tipo": "S-5001", "xml_parseados": conn.execute("SELECT COUNT(*) FROM eventos WHERE tipo='S-5001' AND processado_segunda=1").fetchone()[0]},
-        {"tipo": "S-5011", "xml_parseados": conn.execute("SELECT COUNT(*) FROM eventos WHERE tipo='S-5011' AND processado_segunda=1").fetchone()[0]},
-        {"tipo": "S-3000", "xml_parseados": len(exclusoes)},
-    ])
-    layout = contagem.merge(parseados, on="tipo", how="outer").fillna(0)
-    if not layout.empty:
-        layout[["xml_localizados", "xml_parseados"]] = layout[["xml_localizados", "xml_parseados"]].astype(int)
-        layout["nao_parseados"] = layout["xml_localizados"] - layout["xml_parseados"]
-
-    df_empresa = pd.DataFrame(empresas)
-    if not df_empresa.empty:
-        df_empresa = df_empresa.drop_duplicates().copy()
-        df_empresa["tem_nome"] = df_empresa["nome_empresa"].fillna("").astype(str).str.strip().ne("")
-        df_empresa = df_empresa.sort_values(["tem_nome", "cnpj_empregador"], ascending=[False, True]).drop(columns=["tem_nome"])
-
-    return {
-        "inventario": inventario,
-        "rubricas": pd.DataFrame([asdict(x) for x in rubricas]),
-        "exclusoes": pd.DataFrame(exclusoes),
-        "remuneracoes": pd.DataFrame([asdict(x) for x in remuneracoes]),
-        "bases_trabalhador": pd.DataFrame([asdict(x) for x in bases_trabalhador]),
-        "bases_contribuicao": pd.DataFrame([asdict(x) for x in bases_contribuicao]),
-        "erros_xml": erros,
-        "layout_check": layout,
-        "empresa": df_empresa,
-        "recibos_excluidos": recibos_excluidos,
-        "workspace_temporario": str(workspace),
-        "quantidade_xml_spool": int(conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]),
-        "workspace_removido": False,
-        "engine": "V3 SQLite + checkpoint",
-    }
-
-
 def listar_processamentos_interrompidos() -> list[dict]:
     saida = []
     for pasta in _base_workspaces().glob("esocial_v3_*"):
@@ -1102,6 +1769,7 @@ def descartar_processamento(workspace_id: str) -> bool:
     pasta = _base_workspaces() / Path(workspace_id).name
     if pasta.exists() and pasta.name.startswith("esocial_v3_"):
         shutil.rmtree(pasta, ignore_errors=True)
+        atualizar_catalogo_workspace(pasta)
     return not pasta.exists()
 
 
@@ -1255,7 +1923,7 @@ def atualizar_workspace_incremental(
     fontes: Iterable[Fonte] | None,
     progress_callback: ProgressCallback | None = None,
     origem: str = "Complementos",
-) -> Dict[str, object]:
+) -> ResultadoSQLite:
     """Adiciona XMLs ao mesmo Workspace, com SHA-256, histórico e retomada."""
     workspace, db_path = _resolver_workspace_existente(workspace_ou_db)
     bloqueio = _adquirir_bloqueio_workspace(workspace)
@@ -1295,6 +1963,10 @@ def atualizar_workspace_incremental(
                 (workspace.name, time.time(), origem, assinatura, len(fontes_lista)),
             )
             id_carga = int(cur.lastrowid)
+            _meta_set(
+                conn, f"carga_{id_carga}_assinaturas_s1010",
+                json.dumps(_assinaturas_rubricas(conn)),
+            )
             _materializar_fontes(conn, workspace, fontes_lista, id_carga=id_carga)
         _meta_set(conn, "status", "processando")
         _meta_set(conn, "fase", "carga_incremental_ingestao")
@@ -1307,19 +1979,39 @@ def atualizar_workspace_incremental(
             else "Iniciando carga incremental no Workspace existente...",
         )
         inicio_etapa = time.perf_counter()
-        _ingerir_fontes(conn, workspace, progress_callback, id_carga=id_carga)
+        linhas_antes = _linhas_etapa(conn, "ingestao")
+        with perfil_etapa("ingestao_incremental", conn, workspace / "perfis") as perfil:
+            _ingerir_fontes(conn, workspace, progress_callback, id_carga=id_carga)
+            perfil.linhas = _linhas_etapa(conn, "ingestao") - linhas_antes
         _registrar_duracao(conn, "ingestao_incremental", inicio_etapa)
 
         novos_s1010 = int(conn.execute(
             "SELECT COUNT(*) FROM eventos WHERE id_carga=? AND tipo='S-1010'", (id_carga,)
         ).fetchone()[0])
-        novos_s1010 += int(
+        reprocessou_s1010 = int(
             _meta_get(conn, f"carga_{id_carga}_reprocessou_s1010", "0") or 0
         )
+        novos_s1010 += reprocessou_s1010
         novas_retificacoes = int(conn.execute(
             "SELECT COUNT(*) FROM eventos WHERE id_carga=? AND ind_retif='2'", (id_carga,)
         ).fetchone()[0])
-        if novos_s1010:
+        # Retificações já exigem reconstrução completa das projeções.
+        alteradas = (
+            _rubricas_alteradas(conn, id_carga) if novos_s1010 and not novas_retificacoes else None
+        )
+        if alteradas is not None:
+            reclassificados = _reclassificar_s1200_dirigido(conn, alteradas, bool(reprocessou_s1010))
+            _meta_set(conn, f"carga_{id_carga}_s1200_reclassificados", reclassificados)
+            conn.commit()
+            _progresso(
+                progress_callback, "segunda_passagem", 0.0,
+                "Reaplicando vigências S-1010 às rubricas alteradas...",
+                (
+                    f"{len(alteradas):,} rubricas alteradas; "
+                    f"{reclassificados:,} S-1200 voltam à segunda passagem."
+                ).replace(",", "."),
+            )
+        elif novos_s1010:
             _progresso(
                 progress_callback, "segunda_passagem", 0.0,
                 "Reaplicando vigências S-1010 à base acumulada...",
@@ -1328,16 +2020,24 @@ def atualizar_workspace_incremental(
                 "DELETE FROM objetos WHERE categoria='remuneracoes' AND evento_id IN "
                 "(SELECT id FROM eventos WHERE tipo='S-1200')"
             )
+            conn.execute(
+                "DELETE FROM stg_remuneracoes WHERE evento_id IN "
+                "(SELECT id FROM eventos WHERE tipo='S-1200')"
+            )
+            conn.execute("DELETE FROM dependencias_rubricas")
             conn.execute("UPDATE eventos SET processado_segunda=0 WHERE tipo='S-1200' AND ativo=1")
             conn.commit()
 
         _meta_set(conn, "fase", "carga_incremental_segunda_passagem")
         conn.commit()
         inicio_etapa = time.perf_counter()
-        _segunda_passagem(conn, progress_callback)
+        linhas_antes = _linhas_etapa(conn, "segunda_passagem")
+        with perfil_etapa("segunda_passagem_incremental", conn, workspace / "perfis") as perfil:
+            _segunda_passagem(conn, progress_callback)
+            perfil.linhas = _linhas_etapa(conn, "segunda_passagem") - linhas_antes
         _registrar_duracao(conn, "segunda_passagem_incremental", inicio_etapa)
 
-        if novos_s1010 or novas_retificacoes:
+        if novas_retificacoes or (novos_s1010 and alteradas is None):
             reiniciar_materializacao_analitica(conn)
         _meta_set(conn, "fase", "carga_incremental_consolidacao")
         conn.commit()
@@ -1346,7 +2046,9 @@ def atualizar_workspace_incremental(
             "Recalculando consolidações da base acumulada...",
         )
         inicio_etapa = time.perf_counter()
-        materializar_tabelas_analiticas(conn, progress_callback=progress_callback)
+        with perfil_etapa("consolidacao_incremental", conn, workspace / "perfis") as perfil:
+            materializar_tabelas_analiticas(conn, progress_callback=progress_callback)
+            perfil.linhas = _linhas_etapa(conn, "consolidacao")
         _registrar_duracao(conn, "consolidacao_incremental", inicio_etapa)
         agora = time.time()
         conn.execute(
@@ -1373,6 +2075,7 @@ def atualizar_workspace_incremental(
     finally:
         conn.close()
         _liberar_bloqueio_workspace(bloqueio)
+        atualizar_catalogo_workspace(workspace)
 
     resultado = carregar_resultado_sqlite_existente(db_path)
     resultado["carga_incremental"] = obter_resumo_carga_incremental(db_path, id_carga)
@@ -1394,11 +2097,83 @@ def obter_resumo_carga_incremental(
         conn.close()
 
 
+_CONSULTA_INVENTARIO = (
+    "SELECT arquivo,tipo,tamanho_bytes,CASE WHEN tipo IN ('S-1000','S-1005','S-1010','S-1020','S-1200','S-3000','S-5001','S-5011') "
+    "THEN 1 ELSE 0 END parseado,CASE envelope_recibo WHEN 1 THEN 'Sim' ELSE 'Não' END envelope_recibo FROM eventos ORDER BY id LIMIT 5000"
+)
+
+
+def _montar_resultado_sqlite(
+    conn: sqlite3.Connection,
+    db_path: Path,
+    workspace: Path,
+    pacote: dict,
+    df_empresa: pd.DataFrame,
+    modo_sqlite_seguro: bool,
+    engine: str,
+) -> ResultadoSQLite:
+    """Resultado para a interface: as categorias tabulares ficam como consultas no SQLite.
+
+    Nada além do pacote resumido e da empresa é lido aqui; ``rel_movimentos_cp`` e as
+    bases só são materializadas se a interface pedir (modo integral) e, no modo seguro,
+    apontam para as prévias do pacote.
+    """
+    existentes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    consultas = {
+        "inventario": _CONSULTA_INVENTARIO,
+        "rubricas": "SELECT * FROM dados_rubricas",
+        "exclusoes": "SELECT * FROM dados_exclusoes",
+        "erros_xml": "SELECT arquivo, erro FROM erros ORDER BY id LIMIT 5000",
+        "layout_check": "SELECT tipo, quantidade AS xml_localizados FROM contagem_eventos ORDER BY tipo",
+    }
+    tabelas = {
+        "inventario": "eventos",
+        "rubricas": "dados_rubricas",
+        "exclusoes": "dados_exclusoes",
+        "erros_xml": "erros",
+        "layout_check": "contagem_eventos",
+    }
+    valores: dict[str, object] = {}
+    if modo_sqlite_seguro:
+        valores.update({
+            "remuneracoes": pacote["movimentos_cp"],
+            "bases_trabalhador": pacote["s5001_resumo"],
+            "bases_contribuicao": pd.DataFrame(),
+        })
+    else:
+        consultas.update({
+            "remuneracoes": "SELECT * FROM rel_movimentos_cp",
+            "bases_trabalhador": "SELECT * FROM dados_bases_trabalhador",
+            "bases_contribuicao": "SELECT * FROM dados_bases_contribuicao",
+        })
+        tabelas.update({
+            "remuneracoes": "rel_movimentos_cp",
+            "bases_trabalhador": "dados_bases_trabalhador",
+            "bases_contribuicao": "dados_bases_contribuicao",
+        })
+    for chave, tabela in tabelas.items():
+        if tabela not in existentes:
+            consultas.pop(chave, None)
+            valores[chave] = pd.DataFrame()
+    valores.update({
+        "empresa": df_empresa,
+        "recibos_excluidos": set(),
+        "workspace_temporario": str(workspace),
+        "db_path": str(db_path),
+        "modo_sqlite_seguro": modo_sqlite_seguro,
+        "pacote_sqlite": pacote,
+        "quantidade_xml_spool": int(conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]),
+        "workspace_removido": False,
+        "engine": engine,
+    })
+    return ResultadoSQLite(db_path, consultas, valores)
+
+
 def processar_fontes_esocial(
     fontes: Iterable[Fonte] | None,
     progress_callback: ProgressCallback | None = None,
     workspace_id: str | None = None,
-) -> Dict[str, object]:
+) -> ResultadoSQLite:
     """Engine V3: SQLite persistente, checkpoint e retomada após interrupções."""
     retomando = False
     fontes_lista: list[Fonte] = []
@@ -1449,13 +2224,19 @@ def processar_fontes_esocial(
         fase = _meta_get(conn, "fase", "preparacao")
         if fase in {"preparacao", "ingestao"}:
             inicio_etapa = time.perf_counter()
-            _ingerir_fontes(conn, workspace, progress_callback)
+            linhas_antes = _linhas_etapa(conn, "ingestao")
+            with perfil_etapa("ingestao", conn, workspace / "perfis") as perfil:
+                _ingerir_fontes(conn, workspace, progress_callback)
+                perfil.linhas = _linhas_etapa(conn, "ingestao") - linhas_antes
             _registrar_duracao(conn, "ingestao", inicio_etapa)
             _meta_set(conn, "fase", "segunda_passagem")
             conn.commit()
 
         inicio_etapa = time.perf_counter()
-        _segunda_passagem(conn, progress_callback)
+        linhas_antes = _linhas_etapa(conn, "segunda_passagem")
+        with perfil_etapa("segunda_passagem", conn, workspace / "perfis") as perfil:
+            _segunda_passagem(conn, progress_callback)
+            perfil.linhas = _linhas_etapa(conn, "segunda_passagem") - linhas_antes
         _registrar_duracao(conn, "segunda_passagem", inicio_etapa)
 
         _meta_set(conn, "fase", "consolidacao_sqlite")
@@ -1465,14 +2246,17 @@ def processar_fontes_esocial(
             "Consolidando o relatório no SQLite sem carregar bases gigantes na memória...",
         )
         inicio_etapa = time.perf_counter()
-        materializar_tabelas_analiticas(conn, progress_callback=progress_callback)
+        with perfil_etapa("consolidacao", conn, workspace / "perfis") as perfil:
+            materializar_tabelas_analiticas(conn, progress_callback=progress_callback)
+            perfil.linhas = _linhas_etapa(conn, "consolidacao")
         _registrar_duracao(conn, "consolidacao", inicio_etapa)
         _registrar_carga_inicial_se_necessario(
             conn, workspace, _meta_get(conn, "assinatura_fontes", assinatura)
         )
         _atualizar_metadados_workspace(conn)
         inicio_etapa = time.perf_counter()
-        pacote = carregar_pacote_resumido(db_path)
+        with perfil_etapa("resumo", conn, workspace / "perfis"):
+            pacote = carregar_pacote_resumido(db_path)
         _registrar_duracao(conn, "resumo", inicio_etapa)
 
         # Apenas conjuntos pequenos e prévias seguem para a interface. As bases completas
@@ -1483,42 +2267,13 @@ def processar_fontes_esocial(
             df_empresa = df_empresa.drop_duplicates().copy()
             df_empresa["tem_nome"] = df_empresa["nome_empresa"].fillna("").astype(str).str.strip().ne("")
             df_empresa = df_empresa.sort_values(["tem_nome", "cnpj_empregador"], ascending=[False, True]).drop(columns=["tem_nome"])
-        df_rubricas = pd.read_sql_query("SELECT * FROM dados_rubricas", conn)
-        df_exclusoes = pd.read_sql_query("SELECT * FROM dados_exclusoes", conn)
-        df_erros = pd.read_sql_query("SELECT arquivo, erro FROM erros ORDER BY id LIMIT 5000", conn)
-        df_inventario = pd.read_sql_query("SELECT arquivo,tipo,tamanho_bytes,CASE WHEN tipo IN ('S-1000','S-1005','S-1010','S-1020','S-1200','S-3000','S-5001','S-5011') THEN 1 ELSE 0 END parseado,CASE envelope_recibo WHEN 1 THEN 'Sim' ELSE 'Não' END envelope_recibo FROM eventos ORDER BY id LIMIT 5000", conn)
-        df_layout = pd.read_sql_query("SELECT tipo, quantidade AS xml_localizados FROM contagem_eventos ORDER BY tipo", conn)
         total_movimentos = int(pacote.get("total_movimentos_cp", 0))
         limite_dataframe_integral = int(os.environ.get("ESOCIAL_LIMITE_DATAFRAME_INTEGRAL", "300000"))
-        modo_sqlite_seguro = total_movimentos > limite_dataframe_integral
-        if modo_sqlite_seguro:
-            df_remuneracoes_saida = pacote["movimentos_cp"]
-            df_bases_trabalhador_saida = pacote["s5001_resumo"]
-            df_bases_contribuicao_saida = pd.DataFrame()
-        else:
-            df_remuneracoes_saida = pd.read_sql_query("SELECT * FROM rel_movimentos_cp", conn)
-            df_bases_trabalhador_saida = pd.read_sql_query("SELECT * FROM dados_bases_trabalhador", conn)
-            df_bases_contribuicao_saida = pd.read_sql_query("SELECT * FROM dados_bases_contribuicao", conn)
-
-        resultado = {
-            "inventario": df_inventario,
-            "rubricas": df_rubricas,
-            "exclusoes": df_exclusoes,
-            "remuneracoes": df_remuneracoes_saida,
-            "bases_trabalhador": df_bases_trabalhador_saida,
-            "bases_contribuicao": df_bases_contribuicao_saida,
-            "erros_xml": df_erros,
-            "layout_check": df_layout,
-            "empresa": df_empresa,
-            "recibos_excluidos": set(),
-            "workspace_temporario": str(workspace),
-            "db_path": str(db_path),
-            "modo_sqlite_seguro": modo_sqlite_seguro,
-            "pacote_sqlite": pacote,
-            "quantidade_xml_spool": int(conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]),
-            "workspace_removido": False,
-            "engine": "V3 SQLite + checkpoint + relatório streaming",
-        }
+        resultado = _montar_resultado_sqlite(
+            conn, db_path, workspace, pacote, df_empresa,
+            modo_sqlite_seguro=total_movimentos > limite_dataframe_integral,
+            engine="V3 SQLite + checkpoint + relatório streaming",
+        )
         _meta_set(conn, "fase", "concluido")
         _meta_set(conn, "status", "concluido")
         _meta_set(conn, "atualizado_em", time.time())
@@ -1536,14 +2291,15 @@ def processar_fontes_esocial(
     finally:
         conn.close()
         _liberar_bloqueio_workspace(bloqueio)
+        atualizar_catalogo_workspace(workspace)
 
 
 def processar_zip_esocial(zip_bytes: bytes, progress_callback: ProgressCallback | None = None) -> Dict[str, object]:
     return processar_fontes_esocial([("upload.zip", zip_bytes)], progress_callback=progress_callback)
 
 
-def carregar_resultado_sqlite_existente(db_path: str | os.PathLike) -> Dict[str, object]:
-    """Carrega um processamento.db já concluído sem reler os XMLs."""
+def carregar_resultado_sqlite_existente(db_path: str | os.PathLike) -> ResultadoSQLite:
+    """Carrega um processamento.db já concluído sem reler os XMLs nem materializar as bases."""
     db_path = Path(db_path).expanduser().resolve()
     if not db_path.is_file():
         raise FileNotFoundError(f"Banco SQLite não localizado: {db_path}")
@@ -1559,32 +2315,10 @@ def carregar_resultado_sqlite_existente(db_path: str | os.PathLike) -> Dict[str,
         df_empresa = pd.read_sql_query("SELECT * FROM dados_empresa", conn) if "dados_empresa" in existentes else pd.DataFrame()
         if not df_empresa.empty:
             df_empresa = df_empresa.drop_duplicates().copy()
-        df_rubricas = pd.read_sql_query("SELECT * FROM dados_rubricas", conn) if "dados_rubricas" in existentes else pd.DataFrame()
-        df_exclusoes = pd.read_sql_query("SELECT * FROM dados_exclusoes", conn) if "dados_exclusoes" in existentes else pd.DataFrame()
-        df_erros = pd.read_sql_query("SELECT arquivo, erro FROM erros ORDER BY id LIMIT 5000", conn) if "erros" in existentes else pd.DataFrame()
-        df_inventario = pd.read_sql_query(
-            "SELECT arquivo,tipo,tamanho_bytes,CASE WHEN tipo IN ('S-1000','S-1005','S-1010','S-1020','S-1200','S-3000','S-5001','S-5011') THEN 1 ELSE 0 END parseado,CASE envelope_recibo WHEN 1 THEN 'Sim' ELSE 'Não' END envelope_recibo FROM eventos ORDER BY id LIMIT 5000",
-            conn,
+        return _montar_resultado_sqlite(
+            conn, db_path, db_path.parent, pacote, df_empresa,
+            modo_sqlite_seguro=True,
+            engine="V3 SQLite existente",
         )
-        df_layout = pd.read_sql_query("SELECT tipo, quantidade AS xml_localizados FROM contagem_eventos ORDER BY tipo", conn) if "contagem_eventos" in existentes else pd.DataFrame()
-        return {
-            "inventario": df_inventario,
-            "rubricas": df_rubricas,
-            "exclusoes": df_exclusoes,
-            "remuneracoes": pacote["movimentos_cp"],
-            "bases_trabalhador": pacote["s5001_resumo"],
-            "bases_contribuicao": pd.DataFrame(),
-            "erros_xml": df_erros,
-            "layout_check": df_layout,
-            "empresa": df_empresa,
-            "recibos_excluidos": set(),
-            "workspace_temporario": str(db_path.parent),
-            "db_path": str(db_path),
-            "modo_sqlite_seguro": True,
-            "pacote_sqlite": pacote,
-            "quantidade_xml_spool": int(conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]),
-            "workspace_removido": False,
-            "engine": "V3 SQLite existente",
-        }
     finally:
         conn.close()
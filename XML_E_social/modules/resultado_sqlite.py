@@ -0,0 +1,153 @@
+"""Resultado de processamento apoiado no SQLite do workspace.
+
+``ResultadoSQLite`` substitui o dicionário de DataFrames devolvido por
+``processar_fontes_esocial`` e ``carregar_resultado_sqlite_existente``. Valores
+pequenos (metadados, pacote resumido) ficam em memória; as categorias tabulares
+são apenas consultas SQL, materializadas na primeira leitura e mantidas em cache
+até ``liberar()``. ``pagina()`` lê um trecho com projeção de colunas sem
+materializar a categoria inteira.
+
+A interface de ``dict`` (``get``, ``[]``, ``in``, atribuição) é preservada para
+que ``app.py`` e os testes continuem tratando o resultado como antes.
+"""
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+
+def _conectar_leitura(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{db_path.as_posix()}?mode=ro", uri=True, timeout=120)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA busy_timeout = 120000")
+    return conn
+
+
+def _identificador(coluna: str) -> str:
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+class ResultadoSQLite(MutableMapping):
+    """Mapeamento de resultado cujas categorias tabulares vêm do SQLite sob demanda."""
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        consultas: dict[str, str] | None = None,
+        valores: dict[str, object] | None = None,
+    ):
+        self.db_path = Path(db_path)
+        self._consultas: dict[str, str] = dict(consultas or {})
+        self._valores: dict[str, object] = dict(valores or {})
+        self._cache: dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, chave: str) -> object:
+        if chave in self._valores:
+            return self._valores[chave]
+        if chave in self._cache:
+            return self._cache[chave]
+        if chave not in self._consultas:
+            raise KeyError(chave)
+        conn = _conectar_leitura(self.db_path)
+        try:
+            quadro = pd.read_sql_query(self._consultas[chave], conn)
+        finally:
+            conn.close()
+        self._cache[chave] = quadro
+        return quadro
+
+    def __setitem__(self, chave: str, valor: object) -> None:
+        self._consultas.pop(chave, None)
+        self._cache.pop(chave, None)
+        self._valores[chave] = valor
+
+    def __delitem__(self, chave: str) -> None:
+        if chave not in self._valores and chave not in self._consultas:
+            raise KeyError(chave)
+        self._valores.pop(chave, None)
+        self._consultas.pop(chave, None)
+        self._cache.pop(chave, None)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._valores
+        yield from (chave for chave in self._consultas if chave not in self._valores)
+
+    def __len__(self) -> int:
+        return len(self._valores.keys() | self._consultas.keys())
+
+    def __repr__(self) -> str:
+        return (
+            f"ResultadoSQLite(db_path={str(self.db_path)!r}, "
+            f"categorias={sorted(self._consultas)!r}, materializadas={sorted(self._cache)!r})"
+        )
+
+    @property
+    def categorias_sql(self) -> list[str]:
+        return list(self._consultas)
+
+    def materializada(self, chave: str) -> bool:
+        return chave in self._cache
+
+    def liberar(self, chave: str | None = None) -> None:
+        """Descarta DataFrames já materializados; a próxima leitura volta ao SQLite."""
+        if chave is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(chave, None)
+
+    def colunas(self, chave: str) -> list[str]:
+        if chave not in self._consultas:
+            valor = self[chave]
+            return list(valor.columns) if isinstance(valor, pd.DataFrame) else []
+        conn = _conectar_leitura(self.db_path)
+        try:
+            cursor = conn.execute(f"SELECT * FROM ({self._consultas[chave]}) LIMIT 0")
+            return [descricao[0] for descricao in cursor.description]
+        finally:
+            conn.close()
+
+    def contar(self, chave: str) -> int:
+        if chave in self._cache or chave not in self._consultas:
+            valor = self[chave]
+            return len(valor) if isinstance(valor, pd.DataFrame) else 0
+        conn = _conectar_leitura(self.db_path)
+        try:
+            return int(conn.execute(f"SELECT COUNT(*) FROM ({self._consultas[chave]})").fetchone()[0])
+        finally:
+            conn.close()
+
+    def pagina(
+        self,
+        chave: str,
+        limite: int = 5_000,
+        deslocamento: int = 0,
+        colunas: Iterable[str] | None = None,
+    ) -> pd.DataFrame:
+        """Lê ``limite`` linhas a partir de ``deslocamento``, opcionalmente só com ``colunas``."""
+        limite = max(int(limite), 0)
+        deslocamento = max(int(deslocamento), 0)
+        selecionadas = list(colunas) if colunas is not None else None
+        if selecionadas is not None:
+            ausentes = sorted(set(selecionadas) - set(self.colunas(chave)))
+            if ausentes:
+                raise KeyError(f"Colunas inexistentes em {chave}: {', '.join(ausentes)}")
+        if chave in self._cache or chave not in self._consultas:
+            valor = self[chave]
+            if not isinstance(valor, pd.DataFrame):
+                raise TypeError(f"{chave} não é uma categoria tabular")
+            trecho = valor.iloc[deslocamento:deslocamento + limite]
+            return (trecho[selecionadas] if selecionadas is not None else trecho).reset_index(drop=True)
+        projecao = ", ".join(_identificador(c) for c in selecionadas) if selecionadas else "*"
+        conn = _conectar_leitura(self.db_path)
+        try:
+            return pd.read_sql_query(
+                f"SELECT {projecao} FROM ({self._consultas[chave]}) LIMIT ? OFFSET ?",
+                conn,
+                params=(limite, deslocamento),
+            )
+        finally:
+            conn.close()
@@ -3,12 +3,15 @@ from __future__ import annotations
 import math
 import os
 import pickle
+import re
 import shutil
 import tempfile
 import sqlite3
 import time
 import zlib
-from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields
+from operator import attrgetter
 from pathlib import Path
 from typing import Callable, Iterable
 
@@ -24,12 +27,22 @@ from modules.auditoria import (
     classificar_tipo_verba,
     entra_base_cp,
 )
+from modules.contagem_distinta import registrar_funcoes_hll
 from modules.excel_builder import FontePlanilha, gerar_workbook
+from modules.exportacao_colunar import (
+    COLUNAS_SOMA_INTEGRIDADE,
+    LOTE_EXPORTACAO_COLUNAR,
+    FonteColunar,
+    exportar_fontes_colunares,
+)
+from modules.parser_xml import BaseContribuicao, BaseTrabalhador, RubricaPagamento
 from modules.progresso import emitir_progresso
+from modules.telemetria import perfil_etapa
 
 ProgressCallback = Callable[[float, str], None]
 MAX_DADOS_ABA = 1_048_575
 CHUNK_EXPORT = 25_000
+LOTE_MATERIALIZACAO_STAGING = 50_000
 
 
 SCHEMAS_PADRAO = {
@@ -41,6 +54,18 @@ SCHEMAS_PADRAO = {
     "dados_empresa": {"nome_empresa":"", "cnpj_empregador":""},
 }
 
+# Staging tipado da segunda passagem: uma linha por item interpretado, na ordem
+# dos campos da dataclass, sem pickle. As demais categorias seguem em objetos.
+TABELAS_STAGING = {
+    "remuneracoes": ("stg_remuneracoes", RubricaPagamento),
+    "bases_trabalhador": ("stg_bases_trabalhador", BaseTrabalhador),
+    "bases_contribuicao": ("stg_bases_contribuicao", BaseContribuicao),
+}
+_EXTRATORES_STAGING = {
+    categoria: attrgetter(*(campo.name for campo in fields(classe)))
+    for categoria, (_, classe) in TABELAS_STAGING.items()
+}
+
 
 def _progresso(cb: ProgressCallback | None, valor: float, msg: str) -> None:
     if cb:
@@ -74,6 +99,61 @@ def _iter_payloads(conn: sqlite3.Connection, categoria: str, apos_id: int = 0):
         yield int(obj_id), itens
 
 
+def colunas_staging(categoria: str) -> list[str]:
+    return [campo.name for campo in fields(TABELAS_STAGING[categoria][1])]
+
+
+def criar_tabelas_staging(conn: sqlite3.Connection) -> None:
+    for categoria, (tabela, classe) in TABELAS_STAGING.items():
+        defs = ", ".join(
+            f"{_q(campo.name)} {'REAL' if campo.type in (float, 'float') else 'TEXT'}"
+            for campo in fields(classe)
+        )
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_q(tabela)} "
+            f"(id INTEGER PRIMARY KEY AUTOINCREMENT, evento_id INTEGER, {defs})"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {_q('idx_' + tabela + '_evento')} ON {_q(tabela)}(evento_id)"
+        )
+
+
+def linhas_staging(categoria: str, itens: Iterable[object]) -> list[tuple]:
+    """Converte dataclasses da segunda passagem em tuplas na ordem do staging."""
+    extrator = _EXTRATORES_STAGING[categoria]
+    return [extrator(item) for item in itens]
+
+
+def salvar_staging(
+    conn: sqlite3.Connection, categoria: str, evento_id: int | None, linhas: list[tuple]
+) -> None:
+    if not linhas:
+        return
+    tabela = TABELAS_STAGING[categoria][0]
+    colunas = ["evento_id", *colunas_staging(categoria)]
+    conn.executemany(
+        f"INSERT INTO {_q(tabela)} ({','.join(_q(c) for c in colunas)}) "
+        f"VALUES ({','.join('?' for _ in colunas)})",
+        ((evento_id, *linha) for linha in linhas),
+    )
+
+
+def remover_staging_eventos(conn: sqlite3.Connection, evento_ids: list[int]) -> None:
+    if not evento_ids:
+        return
+    marcas = ",".join("?" for _ in evento_ids)
+    for tabela, _ in TABELAS_STAGING.values():
+        conn.execute(f"DELETE FROM {_q(tabela)} WHERE evento_id IN ({marcas})", evento_ids)
+
+
+def ler_staging(conn: sqlite3.Connection, categoria: str) -> list:
+    tabela, classe = TABELAS_STAGING[categoria]
+    if not _colunas_tabela(conn, tabela):
+        return []
+    colunas = ",".join(_q(c) for c in colunas_staging(categoria))
+    return [classe(*linha) for linha in conn.execute(f"SELECT {colunas} FROM {_q(tabela)} ORDER BY id")]
+
+
 def _criar_tabela_por_amostra(conn: sqlite3.Connection, tabela: str, amostra: dict) -> list[str]:
     colunas = list(amostra.keys())
     defs = ", ".join(f"{_q(c)} {_sql_type(amostra[c])}" for c in colunas)
@@ -91,6 +171,8 @@ def materializar_tabelas_analiticas(
 ) -> None:
     """Converte os BLOBs por evento em tabelas relacionais sem carregar tudo na RAM.
 
+    Remunerações e bases da segunda passagem chegam pelo staging tipado e são
+    copiadas com INSERT ... SELECT; BLOBs legados dessas categorias ainda são lidos.
     A operação é retomável: o último id de payload processado é salvo em meta.
     """
     categorias = [
@@ -104,12 +186,15 @@ def materializar_tabelas_analiticas(
     for tabela, amostra in SCHEMAS_PADRAO.items():
         if not _colunas_tabela(conn, tabela):
             _criar_tabela_por_amostra(conn, tabela, amostra)
+    criar_tabelas_staging(conn)
     conn.commit()
 
     totais = {
         cat: int(conn.execute("SELECT COUNT(*) FROM objetos WHERE categoria=?", (cat,)).fetchone()[0])
         for cat, _ in categorias
     }
+    for cat, (tabela_stg, _) in TABELAS_STAGING.items():
+        totais[cat] += int(conn.execute(f"SELECT COUNT(*) FROM {_q(tabela_stg)}").fetchone()[0])
     total_payloads = max(sum(totais.values()), 1)
     feitos_global = 0
     emitir_progresso(
@@ -181,6 +266,10 @@ def materializar_tabelas_analiticas(
                 (chave, str(obj_id)),
             )
             conn.commit()
+        if categoria in TABELAS_STAGING:
+            feitos_global = _materializar_staging(
+                conn, categoria, tabela, progress_callback, feitos_global, total_payloads,
+            )
 
     emitir_progresso(
         progress_callback, "materializacao", 0.98,
@@ -194,6 +283,103 @@ def materializar_tabelas_analiticas(
     _criar_tabelas_relatorio(conn, progress_callback)
 
 
+def _preparar_classificacoes_remuneracoes(conn: sqlite3.Connection, apos_id: int) -> None:
+    """Classifica cada combinação distinta uma única vez, fora do caminho por linha."""
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS classificacao_cp("
+        "cod_inc_cp TEXT PRIMARY KEY, status_cp TEXT, considerado_cp TEXT)"
+    )
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS classificacao_verba("
+        "dsc_rubr TEXT, nat_rubr TEXT, tp_rubr TEXT, tipo_verba TEXT, carater_verba TEXT, "
+        "PRIMARY KEY(dsc_rubr, nat_rubr, tp_rubr))"
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO temp.classificacao_cp VALUES(?,?,?)",
+        [
+            (cod, classificar_status_cp(cod), "Sim" if entra_base_cp(cod) else "Não")
+            for (cod,) in conn.execute(
+                "SELECT DISTINCT cod_inc_cp FROM stg_remuneracoes WHERE id>?", (apos_id,)
+            ).fetchall()
+        ],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO temp.classificacao_verba VALUES(?,?,?,?,?)",
+        [
+            (dsc, nat, tp, classificar_tipo_verba(dsc, nat, tp), classificar_carater(dsc, nat, tp))
+            for dsc, nat, tp in conn.execute(
+                "SELECT DISTINCT dsc_rubr, nat_rubr, tp_rubr FROM stg_remuneracoes WHERE id>?",
+                (apos_id,),
+            ).fetchall()
+        ],
+    )
+
+
+def _materializar_staging(
+    conn: sqlite3.Connection,
+    categoria: str,
+    tabela: str,
+    progress_callback: ProgressCallback | None,
+    feitos_global: int,
+    total_payloads: int,
+) -> int:
+    """Copia o staging tipado para ``dados_*`` com INSERT ... SELECT em faixas de id."""
+    tabela_stg = TABELAS_STAGING[categoria][0]
+    chave = f"materializado_stg_{categoria}_ate"
+    row = conn.execute("SELECT valor FROM meta WHERE chave=?", (chave,)).fetchone()
+    ultimo = int(row[0]) if row and str(row[0]).isdigit() else 0
+    feitos_global += int(conn.execute(
+        f"SELECT COUNT(*) FROM {_q(tabela_stg)} WHERE id<=?", (ultimo,)
+    ).fetchone()[0])
+    maximo = int(conn.execute(f"SELECT COALESCE(MAX(id),0) FROM {_q(tabela_stg)}").fetchone()[0])
+    if maximo <= ultimo:
+        return feitos_global
+
+    origem = [f"s.{_q(c)}" for c in colunas_staging(categoria)]
+    destino = colunas_staging(categoria)
+    juncoes = ""
+    if categoria == "remuneracoes":
+        _preparar_classificacoes_remuneracoes(conn, ultimo)
+        destino += ["status_cp", "considerado_cp", "tipo_verba", "carater_verba"]
+        origem += ["cp.status_cp", "cp.considerado_cp", "v.tipo_verba", "v.carater_verba"]
+        juncoes = (
+            " LEFT JOIN temp.classificacao_cp cp ON cp.cod_inc_cp IS s.cod_inc_cp"
+            " LEFT JOIN temp.classificacao_verba v ON v.dsc_rubr IS s.dsc_rubr"
+            " AND v.nat_rubr IS s.nat_rubr AND v.tp_rubr IS s.tp_rubr"
+        )
+    colunas = _colunas_tabela(conn, tabela)
+    amostra = SCHEMAS_PADRAO.get(tabela, {})
+    # Compatibilidade com campos novos sem quebrar workspaces antigos.
+    for c in destino:
+        if c not in colunas:
+            conn.execute(f"ALTER TABLE {_q(tabela)} ADD COLUMN {_q(c)} {_sql_type(amostra.get(c, ''))}")
+            colunas.append(c)
+    sql = (
+        f"INSERT INTO {_q(tabela)} ({','.join(_q(c) for c in destino)}) "
+        f"SELECT {','.join(origem)} FROM {_q(tabela_stg)} s{juncoes} "
+        "WHERE s.id>? AND s.id<=? ORDER BY s.id"
+    )
+    while ultimo < maximo:
+        limite = min(ultimo + LOTE_MATERIALIZACAO_STAGING, maximo)
+        feitos_global += conn.execute(sql, (ultimo, limite)).rowcount
+        conn.execute(
+            "INSERT INTO meta(chave,valor) VALUES(?,?) ON CONFLICT(chave) DO UPDATE SET valor=excluded.valor",
+            (chave, str(limite)),
+        )
+        conn.execute(
+            "INSERT INTO meta(chave,valor) VALUES('atualizado_em',?) ON CONFLICT(chave) DO UPDATE SET valor=excluded.valor",
+            (str(time.time()),),
+        )
+        conn.commit()
+        ultimo = limite
+        emitir_progresso(
+            progress_callback, "materializacao", feitos_global / total_payloads,
+            f"Materialização segura: {categoria} — {feitos_global:,} blocos persistidos".replace(",", "."),
+            f"{feitos_global:,} de {total_payloads:,} blocos persistidos".replace(",", "."),
+        )
+    return feitos_global
+
+
 def reiniciar_materializacao_analitica(conn: sqlite3.Connection) -> None:
     """Descarta somente projeções derivadas para reconstrução a partir de objetos.
 
@@ -204,11 +390,13 @@ def reiniciar_materializacao_analitica(conn: sqlite3.Connection) -> None:
         "dados_rubricas", "dados_exclusoes", "dados_remuneracoes",
         "dados_bases_trabalhador", "dados_bases_contribuicao", "dados_empresa",
         "rel_movimentos_cp", "rel_rubricas_cp_base", "rel_sem_s1010",
-        "rel_s5001_resumo", "rel_base_trabalhador", "rel_controle_integridade",
+        "rel_s5001_resumo", "rel_base_trabalhador", "rel_levantamento_cubo",
+        "rel_controle_integridade",
     ]
     for tabela in tabelas:
         conn.execute(f"DROP TABLE IF EXISTS {_q(tabela)}")
     conn.execute("DELETE FROM meta WHERE chave LIKE 'materializado_%_ate'")
+    conn.execute("DELETE FROM meta WHERE chave LIKE 'relatorio_%_ate'")
     conn.commit()
 
 
@@ -231,59 +419,49 @@ def _criar_indices(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def _criar_tabelas_relatorio(conn: sqlite3.Connection, cb: ProgressCallback | None) -> None:
-    emitir_progresso(
-        cb, "consolidacao", 0.0,
-        "Consolidando rubricas e totais diretamente no SQLite...",
-    )
-    conn.executescript("""
-    DROP TABLE IF EXISTS rel_movimentos_cp;
-    CREATE TABLE rel_movimentos_cp AS
+# Consultas das tabelas rel_* com o filtro de competência/rubrica em ``{filtro}``:
+# a reconstrução completa usa ``1=1`` e a manutenção incremental restringe às
+# competências afetadas pela carga, reaproveitando exatamente o mesmo SELECT.
+_EXCLUSOES_ATIVAS = (
+    "SELECT COALESCE(nrRecEvt,'') FROM dados_exclusoes WHERE COALESCE(nrRecEvt,'')<>''"
+)
+_SQL_REL_MOVIMENTOS = f"""
     SELECT r.*
     FROM dados_remuneracoes r
-    WHERE COALESCE(r.nr_recibo_evento,'') NOT IN (
-        SELECT COALESCE(nrRecEvt,'') FROM dados_exclusoes WHERE COALESCE(nrRecEvt,'')<>''
-    );
-    CREATE INDEX idx_rel_mov_cp ON rel_movimentos_cp(cod_inc_cp);
-    CREATE INDEX idx_rel_mov_rubr ON rel_movimentos_cp(cod_rubr, ide_tab_rubr);
-    CREATE INDEX idx_rel_mov_trab ON rel_movimentos_cp(per_apur, cpf, matricula);
-
-    DROP TABLE IF EXISTS rel_rubricas_cp_base;
-    CREATE TABLE rel_rubricas_cp_base AS
+    WHERE COALESCE(r.nr_recibo_evento,'') NOT IN ({_EXCLUSOES_ATIVAS}) AND {{filtro}}
+"""
+_SQL_REL_RUBRICAS = """
     SELECT cod_rubr, ide_tab_rubr, dsc_rubr, nat_rubr, tp_rubr, cod_inc_cp,
            ini_valid, fim_valid, origem_bloco_s1010, criterio_cruzamento_s1010,
            origem_validacao, nivel_confianca, status_auditoria,
            status_cp, considerado_cp, tipo_verba, carater_verba,
            SUM(CAST(vr_rubr AS REAL)) valor_total,
            COUNT(*) qtd_lancamentos,
-           COUNT(DISTINCT cpf) qtd_cpfs,
+           {qtd_cpfs} qtd_cpfs,
            MIN(per_apur) primeira_competencia,
            MAX(per_apur) ultima_competencia
     FROM rel_movimentos_cp
+    WHERE {filtro}
     GROUP BY cod_rubr, ide_tab_rubr, dsc_rubr, nat_rubr, tp_rubr, cod_inc_cp,
              ini_valid, fim_valid, origem_bloco_s1010, criterio_cruzamento_s1010,
              origem_validacao, nivel_confianca, status_auditoria,
-             status_cp, considerado_cp, tipo_verba, carater_verba;
-
-    DROP TABLE IF EXISTS rel_sem_s1010;
-    CREATE TABLE rel_sem_s1010 AS
+             status_cp, considerado_cp, tipo_verba, carater_verba
+"""
+_SQL_REL_SEM_S1010 = """
     SELECT per_apur, cpf, matricula, cod_rubr, ide_tab_rubr, dsc_rubr,
            SUM(CAST(vr_rubr AS REAL)) valor_rubrica, COUNT(*) qtd_lancamentos
-    FROM rel_movimentos_cp WHERE status_cp='Sem S-1010'
-    GROUP BY per_apur, cpf, matricula, cod_rubr, ide_tab_rubr, dsc_rubr;
-
-    DROP TABLE IF EXISTS rel_s5001_resumo;
-    CREATE TABLE rel_s5001_resumo AS
+    FROM rel_movimentos_cp WHERE status_cp='Sem S-1010' AND {filtro}
+    GROUP BY per_apur, cpf, matricula, cod_rubr, ide_tab_rubr, dsc_rubr
+"""
+_SQL_REL_S5001 = f"""
     SELECT cpf, matricula, per_apur, cod_categ, tp_insc_estab, nr_insc_estab,
            cod_lotacao, tp_valor, SUM(CAST(valor AS REAL)) valor_s5001, COUNT(*) qtd_linhas_s5001
     FROM dados_bases_trabalhador
-    WHERE origem_valor='infoBaseCS' AND COALESCE(nr_recibo_base,'') NOT IN (
-        SELECT COALESCE(nrRecEvt,'') FROM dados_exclusoes WHERE COALESCE(nrRecEvt,'')<>''
-    )
-    GROUP BY cpf, matricula, per_apur, cod_categ, tp_insc_estab, nr_insc_estab, cod_lotacao, tp_valor;
-
-    DROP TABLE IF EXISTS rel_base_trabalhador;
-    CREATE TABLE rel_base_trabalhador AS
+    WHERE origem_valor='infoBaseCS' AND COALESCE(nr_recibo_base,'') NOT IN ({_EXCLUSOES_ATIVAS})
+      AND {{filtro}}
+    GROUP BY cpf, matricula, per_apur, cod_categ, tp_insc_estab, nr_insc_estab, cod_lotacao, tp_valor
+"""
+_SQL_REL_BASE_TRABALHADOR = """
     WITH teorica AS (
       SELECT per_apur, cpf, matricula, cod_categ, cod_lotacao,
              SUM(CAST(vr_rubr AS REAL)) total_s1200,
@@ -291,11 +469,11 @@ def _criar_tabelas_relatorio(conn: sqlite3.Connection, cb: ProgressCallback | No
              SUM(CASE WHEN status_cp='Não incide CP' THEN CAST(vr_rubr AS REAL) ELSE 0 END) total_nao_incide_cp,
              COUNT(*) qtd_rubricas,
              SUM(CASE WHEN status_cp='Sem S-1010' THEN 1 ELSE 0 END) qtd_rubricas_sem_s1010
-      FROM rel_movimentos_cp GROUP BY per_apur, cpf, matricula, cod_categ, cod_lotacao
+      FROM rel_movimentos_cp WHERE {filtro} GROUP BY per_apur, cpf, matricula, cod_categ, cod_lotacao
     ), oficial AS (
       SELECT per_apur, cpf, matricula, cod_categ, cod_lotacao,
              SUM(valor_s5001) total_s5001_infoBaseCS
-      FROM rel_s5001_resumo GROUP BY per_apur, cpf, matricula, cod_categ, cod_lotacao
+      FROM rel_s5001_resumo WHERE {filtro} GROUP BY per_apur, cpf, matricula, cod_categ, cod_lotacao
     )
     SELECT t.*, COALESCE(o.total_s5001_infoBaseCS,0) total_s5001_infoBaseCS,
            t.total_incide_cp-COALESCE(o.total_s5001_infoBaseCS,0) diferenca_incide_cp_vs_s5001,
@@ -306,12 +484,291 @@ def _criar_tabelas_relatorio(conn: sqlite3.Connection, cb: ProgressCallback | No
            0,0,0,0,0,o.total_s5001_infoBaseCS,-o.total_s5001_infoBaseCS,
            CASE WHEN ABS(o.total_s5001_infoBaseCS)<=0.05 THEN 'OK' ELSE 'Revisar' END
     FROM oficial o LEFT JOIN teorica t USING(per_apur,cpf,matricula,cod_categ,cod_lotacao)
-    WHERE t.cpf IS NULL;
+    WHERE t.cpf IS NULL
+"""
+# Cubo do Levantamento: uma linha por combinação dos filtros da tela, com o sinal
+# do valor separado para atender ``apenas_positivos`` sem voltar aos movimentos.
+# ``cpfs`` guarda o conjunto exato de CPFs da célula (ver ``_CPFsCompactos``) e
+# ``esboco_cpfs`` o esboço HyperLogLog usado nas contagens interativas.
+DIMENSOES_CUBO_LEVANTAMENTO = (
+    "per_apur", "cod_rubr", "ide_tab_rubr", "dsc_rubr", "nat_rubr",
+    "cod_inc_cp", "status_cp", "carater_verba", "tipo_verba",
+)
+_SQL_REL_LEVANTAMENTO_CUBO = f"""
+    SELECT {", ".join(DIMENSOES_CUBO_LEVANTAMENTO)},
+           CASE WHEN CAST(vr_rubr AS REAL)>0 THEN 1 ELSE 0 END positivo,
+           SUM(CAST(vr_rubr AS REAL)) valor_total,
+           COUNT(*) qtd_lancamentos,
+           lev_cpfs(cpf) cpfs,
+           hll_esboco(cpf) esboco_cpfs
+    FROM rel_movimentos_cp WHERE {{filtro}}
+    GROUP BY {", ".join(DIMENSOES_CUBO_LEVANTAMENTO)}, positivo
+"""
+TABELAS_RELATORIO = (
+    "rel_movimentos_cp", "rel_rubricas_cp_base", "rel_sem_s1010",
+    "rel_s5001_resumo", "rel_base_trabalhador", "rel_levantamento_cubo",
+)
+# Marcas d'água (rowid) das tabelas dados_* já refletidas nas tabelas rel_*.
+_ORIGENS_RELATORIO = ("dados_remuneracoes", "dados_bases_trabalhador", "dados_exclusoes")
+
+
+# Competências cujas linhas de origem foram removidas fora do fluxo de marcas
+# d'água (reclassificação dirigida de S-1200); consumidas na próxima consolidação.
+TABELA_COMPETENCIAS_PENDENTES = "competencias_pendentes_relatorio"
+
+
+def _criar_competencias_pendentes(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {TABELA_COMPETENCIAS_PENDENTES}(per_apur TEXT PRIMARY KEY)"
+    )
+
+
+def descartar_remuneracoes_eventos(conn: sqlite3.Connection, eventos_sql: str) -> int:
+    """Remove staging e ``dados_remuneracoes`` dos S-1200 listados por ``eventos_sql``.
+
+    ``eventos_sql`` é um SELECT de ids de ``eventos``. As competências removidas
+    ficam pendentes para a consolidação incremental: as linhas reinseridas podem
+    reaproveitar rowids abaixo da marca d'água e passariam despercebidas.
+    """
+    _criar_competencias_pendentes(conn)
+    removidas = 0
+    if _colunas_tabela(conn, "dados_remuneracoes"):
+        arquivos = f"SELECT arquivo FROM eventos WHERE id IN ({eventos_sql})"
+        conn.execute(
+            f"INSERT OR IGNORE INTO {TABELA_COMPETENCIAS_PENDENTES} "
+            f"SELECT DISTINCT per_apur FROM dados_remuneracoes WHERE arquivo IN ({arquivos})"
+        )
+        removidas = conn.execute(
+            f"DELETE FROM dados_remuneracoes WHERE arquivo IN ({arquivos})"
+        ).rowcount
+    conn.execute(f"DELETE FROM stg_remuneracoes WHERE evento_id IN ({eventos_sql})")
+    return removidas
+
+
+def _compactar_cpfs(cpfs: Iterable[str]) -> bytes:
+    return zlib.compress("\n".join(sorted(cpfs)).encode("utf-8"), 1)
+
+
+def _descompactar_cpfs(blob: bytes | None) -> list[str]:
+    if not blob:
+        return []
+    texto = zlib.decompress(blob).decode("utf-8")
+    return texto.split("\n") if texto else []
+
+
+class _CPFsCompactos:
+    """Agregado ``lev_cpfs(cpf)``: conjunto ordenado de CPFs, compactado em BLOB."""
+
+    def __init__(self):
+        self.cpfs: set[str] = set()
+
+    def step(self, cpf):
+        if cpf is not None:
+            self.cpfs.add(str(cpf))
+
+    def finalize(self):
+        return _compactar_cpfs(self.cpfs)
+
+
+class _UniaoCPFs:
+    """Agregado ``lev_qtd_cpfs(cpfs)``: CPFs distintos na união das células do cubo."""
+
+    def __init__(self):
+        self.cpfs: set[str] = set()
+
+    def step(self, blob):
+        self.cpfs.update(_descompactar_cpfs(blob))
+
+    def finalize(self):
+        return len(self.cpfs)
+
+
+def registrar_funcoes_cubo(conn: sqlite3.Connection) -> None:
+    conn.create_aggregate("lev_cpfs", 1, _CPFsCompactos)
+    conn.create_aggregate("lev_qtd_cpfs", 1, _UniaoCPFs)
+    registrar_funcoes_hll(conn)
+
+
+# ``aproximada`` troca o COUNT(DISTINCT cpf) de rel_rubricas_cp_base pelo
+# HyperLogLog; o padrão continua exato porque a tabela segue para o relatório final.
+CONTAGEM_CPFS_ENV = "ESOCIAL_CONTAGEM_CPFS"
+
+
+def _expressao_qtd_cpfs() -> str:
+    if os.environ.get(CONTAGEM_CPFS_ENV, "exata").strip().lower() == "aproximada":
+        return "hll_qtd(cpf)"
+    return "COUNT(DISTINCT cpf)"
+
+
+def _marcas_relatorio(conn: sqlite3.Connection) -> dict[str, int]:
+    return {
+        tabela: int(conn.execute(f"SELECT COALESCE(MAX(rowid),0) FROM {_q(tabela)}").fetchone()[0])
+        for tabela in _ORIGENS_RELATORIO
+    }
+
+
+def _marcas_relatorio_gravadas(conn: sqlite3.Connection) -> dict[str, int] | None:
+    marcas = {}
+    for tabela in _ORIGENS_RELATORIO:
+        row = conn.execute("SELECT valor FROM meta WHERE chave=?", (f"relatorio_{tabela}_ate",)).fetchone()
+        if not row or not str(row[0]).isdigit():
+            return None
+        marcas[tabela] = int(row[0])
+    return marcas
+
+
+def _relatorio_admite_incremento(conn: sqlite3.Connection, anteriores: dict[str, int] | None) -> bool:
+    if anteriores is None:
+        return False
+    if any(not _colunas_tabela(conn, tabela) for tabela in TABELAS_RELATORIO):
+        return False
+    if "esboco_cpfs" not in _colunas_tabela(conn, "rel_levantamento_cubo"):
+        return False
+    # rel_movimentos_cp é uma cópia de r.*: colunas novas em dados_remuneracoes
+    # exigem reconstrução para manter o mesmo layout.
+    return _colunas_tabela(conn, "rel_movimentos_cp") == _colunas_tabela(conn, "dados_remuneracoes")
+
+
+def _reconstruir_tabelas_relatorio(conn: sqlite3.Connection) -> None:
+    todos = "1=1"
+    registrar_funcoes_cubo(conn)
+    conn.executescript(f"""
+    DROP TABLE IF EXISTS rel_movimentos_cp;
+    CREATE TABLE rel_movimentos_cp AS {_SQL_REL_MOVIMENTOS.format(filtro=todos)};
+    CREATE INDEX idx_rel_mov_cp ON rel_movimentos_cp(cod_inc_cp);
+    CREATE INDEX idx_rel_mov_rubr ON rel_movimentos_cp(cod_rubr, ide_tab_rubr);
+    CREATE INDEX idx_rel_mov_trab ON rel_movimentos_cp(per_apur, cpf, matricula);
+
+    DROP TABLE IF EXISTS rel_rubricas_cp_base;
+    CREATE TABLE rel_rubricas_cp_base AS {_SQL_REL_RUBRICAS.format(filtro=todos, qtd_cpfs=_expressao_qtd_cpfs())};
+    CREATE INDEX idx_rel_rubricas_chave ON rel_rubricas_cp_base(cod_rubr, ide_tab_rubr);
+
+    DROP TABLE IF EXISTS rel_sem_s1010;
+    CREATE TABLE rel_sem_s1010 AS {_SQL_REL_SEM_S1010.format(filtro=todos)};
+    CREATE INDEX idx_rel_sem_s1010_per ON rel_sem_s1010(per_apur);
+
+    DROP TABLE IF EXISTS rel_s5001_resumo;
+    CREATE TABLE rel_s5001_resumo AS {_SQL_REL_S5001.format(filtro=todos)};
+    CREATE INDEX idx_rel_s5001_per ON rel_s5001_resumo(per_apur);
+
+    DROP TABLE IF EXISTS rel_base_trabalhador;
+    CREATE TABLE rel_base_trabalhador AS {_SQL_REL_BASE_TRABALHADOR.format(filtro=todos)};
+    CREATE INDEX idx_rel_base_trab_per ON rel_base_trabalhador(per_apur);
+
+    DROP TABLE IF EXISTS rel_levantamento_cubo;
+    CREATE TABLE rel_levantamento_cubo AS {_SQL_REL_LEVANTAMENTO_CUBO.format(filtro=todos)};
+    CREATE INDEX idx_rel_lev_cubo_rubr ON rel_levantamento_cubo(cod_rubr, ide_tab_rubr);
+    CREATE INDEX idx_rel_lev_cubo_per ON rel_levantamento_cubo(per_apur);
     """)
+
+
+def _atualizar_tabelas_relatorio(conn: sqlite3.Connection, anteriores: dict[str, int]) -> int:
+    """Recalcula só as competências tocadas desde as marcas d'água anteriores.
+
+    Afetadas são as competências das linhas novas em ``dados_*``, as das linhas
+    cujo recibo aparece em exclusões novas e as marcadas como pendentes por
+    ``descartar_remuneracoes_eventos``. ``rel_rubricas_cp_base`` não é por
+    competência: suas rubricas presentes nessas competências são reagregadas.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.competencias_afetadas")
+    conn.execute("CREATE TEMP TABLE competencias_afetadas(per_apur TEXT PRIMARY KEY)")
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.competencias_afetadas "
+        f"SELECT per_apur FROM {TABELA_COMPETENCIAS_PENDENTES}"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.competencias_afetadas "
+        "SELECT per_apur FROM dados_remuneracoes WHERE rowid>?",
+        (anteriores["dados_remuneracoes"],),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.competencias_afetadas "
+        "SELECT per_apur FROM dados_bases_trabalhador WHERE rowid>?",
+        (anteriores["dados_bases_trabalhador"],),
+    )
+    exclusoes_novas = (
+        "SELECT nrRecEvt FROM dados_exclusoes WHERE rowid>? AND COALESCE(nrRecEvt,'')<>''"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.competencias_afetadas "
+        f"SELECT per_apur FROM dados_remuneracoes WHERE nr_recibo_evento IN ({exclusoes_novas})",
+        (anteriores["dados_exclusoes"],),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.competencias_afetadas "
+        f"SELECT per_apur FROM dados_bases_trabalhador WHERE nr_recibo_base IN ({exclusoes_novas})",
+        (anteriores["dados_exclusoes"],),
+    )
+    afetadas = int(conn.execute("SELECT COUNT(*) FROM temp.competencias_afetadas").fetchone()[0])
+    if not afetadas:
+        return 0
+
+    por_competencia = "per_apur IN (SELECT per_apur FROM temp.competencias_afetadas)"
+    conn.execute("DROP TABLE IF EXISTS temp.rubricas_afetadas")
+    conn.execute(
+        "CREATE TEMP TABLE rubricas_afetadas(cod_rubr TEXT, ide_tab_rubr TEXT, "
+        "PRIMARY KEY(cod_rubr, ide_tab_rubr))"
+    )
+    # Antes e depois da troca: rubricas que saem e que entram nas competências.
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.rubricas_afetadas "
+        f"SELECT DISTINCT cod_rubr, ide_tab_rubr FROM rel_movimentos_cp WHERE {por_competencia}"
+    )
+    conn.execute(f"DELETE FROM rel_movimentos_cp WHERE {por_competencia}")
+    conn.execute(
+        "INSERT INTO rel_movimentos_cp "
+        + _SQL_REL_MOVIMENTOS.format(filtro="r." + por_competencia)
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO temp.rubricas_afetadas "
+        f"SELECT DISTINCT cod_rubr, ide_tab_rubr FROM rel_movimentos_cp WHERE {por_competencia}"
+    )
+
+    por_rubrica = "(cod_rubr, ide_tab_rubr) IN (SELECT cod_rubr, ide_tab_rubr FROM temp.rubricas_afetadas)"
+    conn.execute(f"DELETE FROM rel_rubricas_cp_base WHERE {por_rubrica}")
+    registrar_funcoes_cubo(conn)
+    conn.execute(
+        "INSERT INTO rel_rubricas_cp_base "
+        + _SQL_REL_RUBRICAS.format(filtro=por_rubrica, qtd_cpfs=_expressao_qtd_cpfs())
+    )
+    for tabela, sql in (
+        ("rel_sem_s1010", _SQL_REL_SEM_S1010),
+        ("rel_s5001_resumo", _SQL_REL_S5001),
+        ("rel_base_trabalhador", _SQL_REL_BASE_TRABALHADOR),
+        ("rel_levantamento_cubo", _SQL_REL_LEVANTAMENTO_CUBO),
+    ):
+        conn.execute(f"DELETE FROM {tabela} WHERE {por_competencia}")
+        conn.execute(f"INSERT INTO {tabela} " + sql.format(filtro=por_competencia))
+    conn.execute("DROP TABLE temp.competencias_afetadas")
+    conn.execute("DROP TABLE temp.rubricas_afetadas")
+    return afetadas
+
+
+def _criar_tabelas_relatorio(conn: sqlite3.Connection, cb: ProgressCallback | None) -> None:
+    emitir_progresso(
+        cb, "consolidacao", 0.0,
+        "Consolidando rubricas e totais diretamente no SQLite...",
+    )
+    _criar_competencias_pendentes(conn)
+    anteriores = _marcas_relatorio_gravadas(conn)
+    marcas = _marcas_relatorio(conn)
+    if _relatorio_admite_incremento(conn, anteriores):
+        afetadas = _atualizar_tabelas_relatorio(conn, anteriores)
+        detalhe = f"{afetadas:,} competências recalculadas de forma incremental.".replace(",", ".")
+    else:
+        _reconstruir_tabelas_relatorio(conn)
+        detalhe = "Tabelas de relatório reconstruídas por completo."
+    for tabela, valor in marcas.items():
+        conn.execute(
+            "INSERT INTO meta(chave,valor) VALUES(?,?) ON CONFLICT(chave) DO UPDATE SET valor=excluded.valor",
+            (f"relatorio_{tabela}_ate", str(valor)),
+        )
+    conn.execute(f"DELETE FROM {TABELA_COMPETENCIAS_PENDENTES}")
     conn.commit()
     emitir_progresso(
         cb, "consolidacao", 1.0,
         "Consolidações dos relatórios concluídas.",
+        detalhe,
     )
     emitir_progresso(
         cb, "integridade", 0.0,
@@ -545,16 +1002,81 @@ def gerar_excel_saida_sqlite(
         ]
         banco_df = pd.read_sql_query("SELECT * FROM rel_controle_integridade", conn)
         fontes.append(FontePlanilha("controle_banco", dataframe=banco_df))
-        resultado = gerar_workbook(
-            destino,
-            fontes,
-            conexao=conn,
-            progress_callback=progress_callback,
-            gerar_manifesto=gerar_manifesto,
-        )
-        return resultado.caminho
+        with perfil_etapa("exportacao_excel", pasta_perfis=Path(db_path).parent / "perfis") as perfil:
+            resultado = gerar_workbook(
+                destino,
+                fontes,
+                conexao=conn,
+                progress_callback=progress_callback,
+                gerar_manifesto=gerar_manifesto,
+            )
+            perfil.linhas = sum(controle.linhas_exportadas for controle in resultado.controles)
+            perfil.bytes = Path(resultado.caminho).stat().st_size
+    finally:
+        conn.close()
+    perfil.persistir_no_banco(db_path)
+    return resultado.caminho
+
+
+def gerar_pacote_colunar_sqlite(
+    db_path: str | Path,
+    pasta_saida: str | Path,
+    formato: str = "parquet",
+    lote: int = LOTE_EXPORTACAO_COLUNAR,
+    progress_callback: ProgressCallback | None = None,
+) -> dict:
+    """Exporta todas as tabelas ``rel_*`` e ``dados_*`` em Parquet ou CSV gzip.
+
+    Alternativa ao Excel para BI: as tabelas são lidas em lotes fixos, o
+    Parquet é particionado por ``per_apur`` e o manifesto confere quantidades e
+    somas com ``rel_controle_integridade``.
+    """
+    conn = sqlite3.connect(
+        f"file:{Path(db_path).resolve().as_posix()}?mode=ro",
+        uri=True,
+        timeout=120,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA busy_timeout = 120000")
+    conn.execute("PRAGMA temp_store = FILE")
+    try:
+        tabelas = [
+            str(row[0])
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' "
+                "AND (name LIKE 'rel\\_%' ESCAPE '\\' OR name LIKE 'dados\\_%' ESCAPE '\\') ORDER BY name"
+            )
+        ]
+        fontes = [
+            FonteColunar(
+                tabela,
+                query=f"SELECT * FROM {_q(tabela)}",
+                coluna_soma=COLUNAS_SOMA_INTEGRIDADE.get(tabela, ""),
+            )
+            for tabela in tabelas
+        ]
+        with perfil_etapa("exportacao_colunar", pasta_perfis=Path(db_path).parent / "perfis") as perfil:
+            resultado = exportar_fontes_colunares(
+                pasta_saida,
+                fontes,
+                conexao=conn,
+                formato=formato,
+                lote=lote,
+                progress_callback=progress_callback,
+            )
+            perfil.linhas = sum(controle.quantidade for controle in resultado.controles)
+            perfil.bytes = sum(int(item["bytes"]) for item in resultado.arquivos)
     finally:
         conn.close()
+    perfil.persistir_no_banco(db_path)
+    return {
+        "pasta_saida": resultado.pasta,
+        "arquivos": [str(Path(resultado.pasta) / item["arquivo"]) for item in resultado.arquivos],
+        "manifesto": resultado.manifesto,
+        "manifesto_arquivos": resultado.manifesto_arquivos,
+        "quantidade_arquivos": len(resultado.arquivos),
+        "controles": resultado.controles,
+    }
 
 
 # ============================================================
@@ -615,6 +1137,169 @@ def _salvar_workbook_isolado(
         _definir_temp_ativo(pasta_temp_sqlite)
 
 
+def _conectar_exportacao(banco: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        f"file:{banco.as_posix()}?mode=ro",
+        uri=True,
+        timeout=120,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA busy_timeout = 120000")
+    conn.execute("PRAGMA temp_store = FILE")
+    conn.execute("PRAGMA cache_size = -262144")
+    return conn
+
+
+# Consultas ``SELECT * FROM tabela [WHERE ...]`` são paginadas por rowid; as
+# demais (ORDER BY/GROUP BY/LIMIT...) são lidas por um único cursor ao longo das
+# partes. O filtro não pode conter essas cláusulas: viraria ``WHERE (... ORDER BY x)``.
+_CONSULTA_TABELA_SIMPLES = re.compile(
+    r"^\s*SELECT\s+\*\s+FROM\s+(\w+)"
+    r"(?:\s+WHERE\s+((?:(?!\b(?:ORDER\s+BY|GROUP\s+BY|HAVING|LIMIT|OFFSET|UNION|EXCEPT|INTERSECT|WINDOW)\b).)+?))?"
+    r"\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@dataclass(frozen=True)
+class SegmentoExportacao:
+    """Uma ou mais partes consecutivas de um conjunto, lidas por um só cursor."""
+
+    prefixo_arquivo: str
+    nome_aba: str
+    query: str
+    params: tuple
+    parte_inicial: int
+    quantidade_partes: int
+    total_partes: int
+    total: int
+
+
+def _planejar_segmentos(
+    conn: sqlite3.Connection,
+    prefixo_arquivo: str,
+    nome_aba: str,
+    query: str,
+    params: tuple,
+    linhas_por_arquivo: int,
+) -> list[SegmentoExportacao]:
+    """Divide o conjunto em partes sem ``OFFSET``.
+
+    Em tabelas simples cada parte vira uma faixa de rowid, obtida numa única
+    varredura com ``ROW_NUMBER()``; as partes são independentes e podem ser
+    gravadas em paralelo. Nas demais consultas há um só segmento sequencial.
+    """
+    resultado = conn.execute(f"SELECT COUNT(*) FROM ({query}) AS q", params).fetchone()
+    total = int(resultado[0] if resultado else 0)
+    linhas_por_arquivo = max(1, linhas_por_arquivo)
+    partes = max(1, math.ceil(total / linhas_por_arquivo))
+    simples = _CONSULTA_TABELA_SIMPLES.match(query)
+    if simples is None or partes == 1:
+        return [SegmentoExportacao(
+            prefixo_arquivo, nome_aba, query, params, 1, partes, partes, total,
+        )]
+
+    tabela, filtro = simples.group(1), simples.group(2)
+    where = f" WHERE {filtro}" if filtro else ""
+    inicios = [
+        int(row[0])
+        for row in conn.execute(
+            f"SELECT rid FROM (SELECT rowid rid, ROW_NUMBER() OVER (ORDER BY rowid) n "
+            f"FROM {_q(tabela)}{where}) WHERE (n - 1) % ? = 0 ORDER BY rid",
+            params + (linhas_por_arquivo,),
+        )
+    ]
+    base = f"SELECT * FROM {_q(tabela)} WHERE " + (f"({filtro}) AND " if filtro else "")
+    segmentos = []
+    for indice, inicio in enumerate(inicios):
+        if indice + 1 < len(inicios):
+            sql, faixa = base + "rowid >= ? AND rowid < ? ORDER BY rowid", (inicio, inicios[indice + 1])
+        else:
+            sql, faixa = base + "rowid >= ? ORDER BY rowid", (inicio,)
+        segmentos.append(SegmentoExportacao(
+            prefixo_arquivo, nome_aba, sql, params + faixa, indice + 1, 1, partes, total,
+        ))
+    return segmentos
+
+
+def _exportar_segmento(
+    conn: sqlite3.Connection,
+    pasta_saida: Path,
+    pasta_temp_sqlite: Path,
+    segmento: SegmentoExportacao,
+    linhas_por_arquivo: int,
+    ao_exportar: Callable[[int], None] | None = None,
+) -> list[dict]:
+    _definir_temp_ativo(pasta_temp_sqlite)
+    prefixo_arquivo = segmento.prefixo_arquivo
+    cur = conn.execute(segmento.query, segmento.params)
+    cols = [d[0] for d in cur.description]
+    controles: list[dict] = []
+    try:
+        for parte in range(segmento.parte_inicial, segmento.parte_inicial + segmento.quantidade_partes):
+            offset = (parte - 1) * linhas_por_arquivo
+            esperado = min(linhas_por_arquivo, max(segmento.total - offset, 0))
+            nome_arq = (
+                f"{prefixo_arquivo}_parte_{parte:03d}.xlsx"
+                if segmento.total_partes > 1
+                else f"{prefixo_arquivo}.xlsx"
+            )
+            pasta_temp_openpyxl = (
+                pasta_saida / ".openpyxl_temp" / f"{prefixo_arquivo}_{parte:03d}"
+            )
+            wb = _novo_workbook_em_temp(pasta_temp_openpyxl)
+            ws = wb.create_sheet(_nome_aba(segmento.nome_aba))
+            ws.append(cols)
+            _definir_temp_ativo(pasta_temp_sqlite)
+
+            qtd_parte = 0
+            while qtd_parte < linhas_por_arquivo:
+                rows = cur.fetchmany(min(CHUNK_EXPORT, linhas_por_arquivo - qtd_parte))
+                if not rows:
+                    break
+                for row in rows:
+                    ws.append(list(row))
+                qtd_parte += len(rows)
+                if ao_exportar:
+                    ao_exportar(len(rows))
+
+            _salvar_workbook_isolado(
+                wb,
+                pasta_saida / nome_arq,
+                pasta_temp_openpyxl,
+                pasta_temp_sqlite,
+            )
+            controles.append(
+                {
+                    "arquivo": nome_arq,
+                    "conjunto": prefixo_arquivo,
+                    "parte": parte,
+                    "quantidade_sqlite": segmento.total,
+                    "quantidade_exportada_parte": qtd_parte,
+                    "offset_inicial": offset,
+                    "status": "OK" if qtd_parte == esperado else "REVISAR",
+                }
+            )
+    finally:
+        cur.close()
+    return controles
+
+
+def _exportar_segmento_processo(
+    banco: Path,
+    pasta_saida: Path,
+    pasta_temp_sqlite: Path,
+    segmento: SegmentoExportacao,
+    linhas_por_arquivo: int,
+) -> list[dict]:
+    """Entrada do worker: conexão somente leitura própria para o segmento."""
+    conn = _conectar_exportacao(banco)
+    try:
+        return _exportar_segmento(conn, pasta_saida, pasta_temp_sqlite, segmento, linhas_por_arquivo)
+    finally:
+        conn.close()
+
+
 def _exportar_query_segmentada(
     conn: sqlite3.Connection,
     pasta_saida: Path,
@@ -627,84 +1312,63 @@ def _exportar_query_segmentada(
     progress_callback: ProgressCallback | None = None,
     inicio: float = 0.0,
     fim: float = 1.0,
+    executor: ProcessPoolExecutor | None = None,
+    banco: Path | None = None,
 ) -> list[dict]:
+    """Grava o conjunto em XLSX de até ``linhas_por_arquivo`` linhas.
+
+    Com ``executor`` e ``banco`` as partes independentes são gravadas em
+    processos separados; o manifesto sai na ordem das partes.
+    """
     _definir_temp_ativo(pasta_temp_sqlite)
     try:
-        resultado = conn.execute(
-            f"SELECT COUNT(*) FROM ({query}) AS q",
-            params,
-        ).fetchone()
-        total = int(resultado[0] if resultado else 0)
+        segmentos = _planejar_segmentos(
+            conn, prefixo_arquivo, nome_aba, query, params, linhas_por_arquivo,
+        )
     except sqlite3.OperationalError as exc:
         raise sqlite3.OperationalError(
             f"Falha ao consultar o conjunto '{prefixo_arquivo}'. "
             f"Banco: {conn.execute('PRAGMA database_list').fetchone()[2]}. "
             f"TEMP ativa: {pasta_temp_sqlite}. Erro original: {exc}"
         ) from exc
-
-    partes = max(1, math.ceil(total / max(1, linhas_por_arquivo)))
+    total = segmentos[0].total
     exportados = 0
-    controles: list[dict] = []
 
-    for parte in range(1, partes + 1):
-        offset = (parte - 1) * linhas_por_arquivo
-        limite = min(linhas_por_arquivo, max(total - offset, 0))
-        nome_arq = (
-            f"{prefixo_arquivo}_parte_{parte:03d}.xlsx"
-            if partes > 1
-            else f"{prefixo_arquivo}.xlsx"
-        )
-        destino = pasta_saida / nome_arq
-        pasta_temp_openpyxl = (
-            pasta_saida / ".openpyxl_temp" / f"{prefixo_arquivo}_{parte:03d}"
-        )
-
-        wb = _novo_workbook_em_temp(pasta_temp_openpyxl)
-        ws = wb.create_sheet(_nome_aba(nome_aba))
-
-        _definir_temp_ativo(pasta_temp_sqlite)
-        cur = conn.execute(
-            query + " LIMIT ? OFFSET ?",
-            params + (limite, offset),
+    def ao_exportar(quantidade: int) -> None:
+        nonlocal exportados
+        exportados += quantidade
+        _progresso(
+            progress_callback,
+            inicio + (fim - inicio) * exportados / max(total, 1),
+            f"Exportando {prefixo_arquivo}: {exportados:,} de {total:,}".replace(",", "."),
         )
-        cols = [d[0] for d in cur.description]
-        ws.append(cols)
-
-        qtd_parte = 0
-        while True:
-            rows = cur.fetchmany(CHUNK_EXPORT)
-            if not rows:
-                break
-            for row in rows:
-                ws.append(list(row))
-            qtd_parte += len(rows)
-            exportados += len(rows)
-            _progresso(
-                progress_callback,
-                inicio + (fim - inicio) * exportados / max(total, 1),
-                f"Exportando {prefixo_arquivo}: {exportados:,} de {total:,}".replace(",", "."),
-            )
 
-        cur.close()
-        _salvar_workbook_isolado(
-            wb,
-            destino,
-            pasta_temp_openpyxl,
-            pasta_temp_sqlite,
-        )
-        controles.append(
-            {
-                "arquivo": nome_arq,
-                "conjunto": prefixo_arquivo,
-                "parte": parte,
-                "quantidade_sqlite": total,
-                "quantidade_exportada_parte": qtd_parte,
-                "offset_inicial": offset,
-                "status": "OK",
-            }
+    if executor is None or banco is None or len(segmentos) == 1:
+        controles: list[dict] = []
+        for segmento in segmentos:
+            controles.extend(_exportar_segmento(
+                conn, pasta_saida, pasta_temp_sqlite, segmento, linhas_por_arquivo, ao_exportar,
+            ))
+        return controles
+
+    futuros = [
+        executor.submit(
+            _exportar_segmento_processo,
+            banco, pasta_saida, pasta_temp_sqlite, segmento, linhas_por_arquivo,
         )
-
-    return controles
+        for segmento in segmentos
+    ]
+    por_parte: dict[int, dict] = {}
+    try:
+        for futuro in as_completed(futuros):
+            for controle in futuro.result():
+                por_parte[controle["parte"]] = controle
+                ao_exportar(int(controle["quantidade_exportada_parte"]))
+    except BaseException:
+        for futuro in futuros:
+            futuro.cancel()
+        raise
+    return [por_parte[parte] for parte in sorted(por_parte)]
 
 
 def gerar_pacote_excel_saida_sqlite(
@@ -718,8 +1382,21 @@ def gerar_pacote_excel_saida_sqlite(
     linhas_por_arquivo: int = MAX_LINHAS_ARQUIVO_SEGMENTADO,
     progress_callback: ProgressCallback | None = None,
     gerar_manifesto: bool = False,
+    segmentado: bool = False,
+    workers: int = 0,
 ) -> dict:
-    """Compatibilidade V9.4: entrega agora um unico workbook consolidado V9.5."""
+    """Compatibilidade V9.4: entrega agora um unico workbook consolidado V9.5.
+
+    ``segmentado=True`` mantém o pacote V9.4 em vários XLSX de até
+    ``linhas_por_arquivo`` linhas; com ``workers > 1`` as partes são gravadas
+    em processos com conexões somente leitura independentes.
+    """
+    if segmentado:
+        return _gerar_pacote_segmentado(
+            db_path, pasta_saida, df_empresa, df_resumo_visual, df_rubricas_cp,
+            df_levantamento, modo_exportacao_movimentos_cp, linhas_por_arquivo,
+            progress_callback, workers,
+        )
     saida_compat = Path(pasta_saida).expanduser().resolve()
     caminho_unico = saida_compat / "relatorio_incidencia_cp_esocial_v9_5.xlsx"
     caminho = gerar_excel_saida_sqlite(
@@ -741,8 +1418,19 @@ def gerar_pacote_excel_saida_sqlite(
         "quantidade_arquivos": 1,
     }
 
-    # Implementacao segmentada V9.4 mantida abaixo apenas como referencia
-    # temporaria de compatibilidade; nao e mais alcancavel nem usada pela V9.5.
+
+def _gerar_pacote_segmentado(
+    db_path: str | Path,
+    pasta_saida: str | Path,
+    df_empresa: pd.DataFrame,
+    df_resumo_visual: pd.DataFrame,
+    df_rubricas_cp: pd.DataFrame,
+    df_levantamento: pd.DataFrame | None,
+    modo_exportacao_movimentos_cp: str,
+    linhas_por_arquivo: int,
+    progress_callback: ProgressCallback | None,
+    workers: int,
+) -> dict:
     saida = Path(str(pasta_saida).strip().strip('"').strip("'")).expanduser().resolve()
     saida.mkdir(parents=True, exist_ok=True)
 
@@ -752,17 +1440,13 @@ def gerar_pacote_excel_saida_sqlite(
     if not banco.is_file():
         raise ValueError(f"O caminho informado não é um arquivo SQLite: {banco}")
 
+    # A TEMP isolada vale só durante a exportação; a do processo é restaurada.
+    temp_anterior = {chave: os.environ.get(chave) for chave in ("TMP", "TEMP", "TMPDIR")}
+    tempdir_anterior = tempfile.tempdir
     pasta_temp_sqlite = _preparar_temp_sqlite(saida)
 
-    conn = sqlite3.connect(
-        f"file:{banco.as_posix()}?mode=ro",
-        uri=True,
-        timeout=120,
-    )
-    conn.execute("PRAGMA query_only = ON")
-    conn.execute("PRAGMA busy_timeout = 120000")
-    conn.execute("PRAGMA temp_store = FILE")
-    conn.execute("PRAGMA cache_size = -262144")
+    conn = _conectar_exportacao(banco)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
 
     controles: list[dict] = []
     try:
@@ -829,6 +1513,8 @@ def gerar_pacote_excel_saida_sqlite(
                     progress_callback=progress_callback,
                     inicio=ini,
                     fim=fim,
+                    executor=executor,
+                    banco=banco,
                 )
             )
 
@@ -866,6 +1552,13 @@ def gerar_pacote_excel_saida_sqlite(
             "quantidade_arquivos": len(controles),
         }
     finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
         conn.close()
         _limpar_temp_openpyxl(saida / ".openpyxl_temp")
-
+        for chave, valor in temp_anterior.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+        tempfile.tempdir = tempdir_anterior
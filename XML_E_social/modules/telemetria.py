@@ -1,12 +1,35 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 import os
+from pathlib import Path
 import platform
 import sqlite3
 import sys
 import time
+from typing import Iterator
+
+
+# ``cprofile`` grava um .prof e o top de funcoes por etapa em <workspace>/perfis;
+# ativa, as exportacoes tambem gravam suas etapas na telemetria do workspace.
+PERFIL_ETAPAS_ENV = "ESOCIAL_PERFIL_ETAPAS"
+PERFIL_TOP_FUNCOES = 40
+
+
+def _ler_proc(caminho: str) -> dict[str, int]:
+    valores: dict[str, int] = {}
+    try:
+        with open(caminho, "r", encoding="ascii", errors="ignore") as arquivo:
+            for linha in arquivo:
+                chave, _, resto = linha.partition(":")
+                partes = resto.split()
+                if partes and partes[0].isdigit():
+                    valores[chave.strip()] = int(partes[0])
+    except OSError:
+        pass
+    return valores
 
 
 def memoria_processo_bytes() -> tuple[int, int]:
@@ -30,7 +53,29 @@ def memoria_processo_bytes() -> tuple[int, int]:
             return int(pmc.WorkingSetSize), int(pmc.PeakWorkingSetSize)
         except Exception:
             pass
-    return 0, 0
+        return 0, 0
+    status = _ler_proc("/proc/self/status")
+    if "VmRSS" in status:
+        # VmRSS/VmHWM vem em kB.
+        return status["VmRSS"] * 1024, status.get("VmHWM", status["VmRSS"]) * 1024
+    try:
+        import resource
+
+        pico = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        # ru_maxrss e KiB no Linux e bytes no macOS.
+        return 0, pico if sys.platform == "darwin" else pico * 1024
+    except Exception:
+        return 0, 0
+
+
+def io_processo_bytes() -> tuple[int, int, int]:
+    """Leitura logica, leitura em disco e escrita em disco (``/proc/self/io``).
+
+    A diferenca entre leitura logica e leitura em disco aproxima o quanto o
+    cache de paginas (SQLite + sistema operacional) atendeu a etapa.
+    """
+    io = _ler_proc("/proc/self/io")
+    return io.get("rchar", 0), io.get("read_bytes", 0), io.get("write_bytes", 0)
 
 
 @dataclass
@@ -93,3 +138,149 @@ class TelemetriaCarga:
                 "ON CONFLICT(tipo) DO UPDATE SET quantidade=excluded.quantidade,bytes=excluded.bytes,tempo_segundos=excluded.tempo_segundos,media_ms=excluded.media_ms",
                 (tipo, quantidade, int(item["bytes"]), segundos, segundos * 1000 / max(quantidade, 1)),
             )
+
+
+@dataclass
+class PerfilEtapa:
+    """Medicao de uma etapa do pipeline, persistida em ``telemetria``.
+
+    ``linhas`` e ``bytes`` sao informados pela etapa ao terminar; sem ``bytes``
+    a vazao usa a leitura logica do processo.
+    """
+
+    etapa: str
+    linhas: int = 0
+    bytes: int = 0
+    parede_segundos: float = 0.0
+    cpu_segundos: float = 0.0
+    memoria_atual_bytes: int = 0
+    memoria_pico_bytes: int = 0
+    io_leitura_logica_bytes: int = 0
+    io_leitura_disco_bytes: int = 0
+    io_escrita_disco_bytes: int = 0
+    arquivo_perfil: str = ""
+
+    def metricas(self) -> dict[str, tuple[object, str]]:
+        parede = max(self.parede_segundos, 1e-9)
+        volume = self.bytes or self.io_leitura_logica_bytes
+        prefixo = f"etapa_{self.etapa}"
+        metricas: dict[str, tuple[object, str]] = {
+            f"{prefixo}_parede_segundos": (round(self.parede_segundos, 6), "s"),
+            f"{prefixo}_cpu_segundos": (round(self.cpu_segundos, 6), "s"),
+            f"{prefixo}_memoria_atual_bytes": (self.memoria_atual_bytes, "bytes"),
+            f"{prefixo}_memoria_pico_bytes": (self.memoria_pico_bytes, "bytes"),
+            f"{prefixo}_io_leitura_logica_bytes": (self.io_leitura_logica_bytes, "bytes"),
+            f"{prefixo}_io_leitura_disco_bytes": (self.io_leitura_disco_bytes, "bytes"),
+            f"{prefixo}_io_escrita_disco_bytes": (self.io_escrita_disco_bytes, "bytes"),
+            f"{prefixo}_linhas": (self.linhas, "quantidade"),
+            f"{prefixo}_linhas_por_segundo": (round(self.linhas / parede, 3), "linhas/s"),
+            f"{prefixo}_bytes_por_segundo": (round(volume / parede, 3), "bytes/s"),
+        }
+        if self.arquivo_perfil:
+            metricas[f"{prefixo}_arquivo_perfil"] = (self.arquivo_perfil, "texto")
+        return metricas
+
+    def persistir(self, conn: sqlite3.Connection) -> None:
+        agora = time.time()
+        for chave, (valor, unidade) in self.metricas().items():
+            conn.execute(
+                "INSERT INTO telemetria(chave,valor,unidade,atualizado_em) VALUES(?,?,?,?) "
+                "ON CONFLICT(chave) DO UPDATE SET valor=excluded.valor,unidade=excluded.unidade,atualizado_em=excluded.atualizado_em",
+                (chave, str(valor), unidade, agora),
+            )
+        # Em telemetria_eventos a etapa aparece ao lado dos tipos de evento,
+        # com o mesmo formato quantidade/bytes/tempo.
+        conn.execute(
+            "INSERT INTO telemetria_eventos(tipo,quantidade,bytes,tempo_segundos,media_ms) VALUES(?,?,?,?,?) "
+            "ON CONFLICT(tipo) DO UPDATE SET quantidade=excluded.quantidade,bytes=excluded.bytes,tempo_segundos=excluded.tempo_segundos,media_ms=excluded.media_ms",
+            (
+                f"etapa:{self.etapa}",
+                int(self.linhas),
+                int(self.bytes or self.io_leitura_logica_bytes),
+                float(self.parede_segundos),
+                self.parede_segundos * 1000 / max(int(self.linhas), 1),
+            ),
+        )
+
+    def persistir_no_banco(self, db_path: str | os.PathLike) -> None:
+        """Grava a etapa num workspace aberto somente para leitura (exportacoes).
+
+        So com ``ESOCIAL_PERFIL_ETAPAS`` ativo: a gravacao muda o mtime do
+        processamento.db e invalida o catalogo de Workspaces.
+        """
+        if not _perfil_cprofile_ativo():
+            return
+        try:
+            conn = sqlite3.connect(str(db_path), timeout=5)
+        except sqlite3.Error:
+            return
+        try:
+            self.persistir(conn)
+            conn.commit()
+        except sqlite3.Error:
+            # Telemetria nunca interrompe a entrega: base sem schema de
+            # telemetria ou bloqueada pelo processamento apenas fica sem a etapa.
+            conn.rollback()
+        finally:
+            conn.close()
+
+
+def _perfil_cprofile_ativo() -> bool:
+    return os.environ.get(PERFIL_ETAPAS_ENV, "").strip().lower() in {"cprofile", "1", "true", "sim"}
+
+
+def _gravar_cprofile(perfilador, pasta: Path, etapa: str) -> str:
+    import io
+    import pstats
+
+    pasta.mkdir(parents=True, exist_ok=True)
+    base = pasta / f"{etapa}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    perfilador.dump_stats(str(base.with_suffix(".prof")))
+    resumo = io.StringIO()
+    pstats.Stats(perfilador, stream=resumo).sort_stats("cumulative").print_stats(PERFIL_TOP_FUNCOES)
+    base.with_suffix(".txt").write_text(resumo.getvalue(), encoding="utf-8")
+    return str(base.with_suffix(".prof"))
+
+
+@contextmanager
+def perfil_etapa(
+    etapa: str,
+    conn: sqlite3.Connection | None = None,
+    pasta_perfis: str | os.PathLike | None = None,
+) -> Iterator[PerfilEtapa]:
+    """Mede tempo, CPU, memoria e I/O de ``etapa``.
+
+    Com ``conn`` a medicao e persistida ao final (sem commit; a etapa chamadora
+    confirma junto com o proprio checkpoint). Se a etapa falhar nada e gravado.
+    Com ``ESOCIAL_PERFIL_ETAPAS=cprofile`` e ``pasta_perfis`` o processo
+    principal e perfilado; workers do pool nao entram no perfil.
+    """
+    perfil = PerfilEtapa(etapa)
+    perfilador = None
+    if pasta_perfis is not None and _perfil_cprofile_ativo():
+        import cProfile
+
+        perfilador = cProfile.Profile()
+    io_inicio = io_processo_bytes()
+    inicio_cpu = time.process_time()
+    inicio_parede = time.perf_counter()
+    if perfilador is not None:
+        perfilador.enable()
+    try:
+        yield perfil
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+    perfil.parede_segundos = time.perf_counter() - inicio_parede
+    perfil.cpu_segundos = time.process_time() - inicio_cpu
+    perfil.memoria_atual_bytes, perfil.memoria_pico_bytes = memoria_processo_bytes()
+    io_fim = io_processo_bytes()
+    (
+        perfil.io_leitura_logica_bytes,
+        perfil.io_leitura_disco_bytes,
+        perfil.io_escrita_disco_bytes,
+    ) = (max(fim - ini, 0) for fim, ini in zip(io_fim, io_inicio))
+    if perfilador is not None:
+        perfil.arquivo_perfil = _gravar_cprofile(perfilador, Path(pasta_perfis), etapa)
+    if conn is not None:
+        perfil.persistir(conn)
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import json
 import os
 import sqlite3
 import subprocess
 import sys
-from dataclasses import dataclass
+import threading
+from dataclasses import asdict, dataclass
 from pathlib import Path
 from typing import Mapping
 
 from send2trash import send2trash
 
 
+# Catálogo persistente na pasta base: um item por Workspace, validado pela
+# assinatura (mtime/tamanho) do processamento.db e do -wal.
+ARQUIVO_CATALOGO = "catalogo_workspaces.json"
+VERSAO_CATALOGO = 1
+_TRAVA_CATALOGO = threading.Lock()
+_ATUALIZACAO_SEGUNDO_PLANO: dict[Path, threading.Thread] = {}
+
+
 @dataclass(frozen=True)
 class WorkspaceInfo:
     nome_empresa: str
@@ -201,9 +211,155 @@ def _catalogar_workspace(caminho: Path) -> WorkspaceCatalogItem | None:
             conn.close()
 
 
+def _assinatura_workspace(caminho: Path) -> list[int] | None:
+    """``[mtime_ns, tamanho]`` do banco e do WAL; ``None`` sem processamento.db."""
+    try:
+        db = (caminho / "processamento.db").stat()
+    except OSError:
+        return None
+    try:
+        wal = (caminho / "processamento.db-wal").stat()
+        extra = [wal.st_mtime_ns, wal.st_size]
+    except OSError:
+        extra = [0, 0]
+    return [db.st_mtime_ns, db.st_size, *extra]
+
+
+def _item_para_json(item: WorkspaceCatalogItem) -> dict:
+    dados = asdict(item)
+    dados["caminho"] = str(item.caminho)
+    dados["db_path"] = str(item.db_path)
+    return dados
+
+
+def _item_de_json(dados: dict) -> WorkspaceCatalogItem:
+    return WorkspaceCatalogItem(**{
+        **dados, "caminho": Path(dados["caminho"]), "db_path": Path(dados["db_path"]),
+    })
+
+
+def _ler_catalogo(base: Path) -> dict[str, dict]:
+    try:
+        conteudo = json.loads((base / ARQUIVO_CATALOGO).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(conteudo, dict) or conteudo.get("versao") != VERSAO_CATALOGO:
+        return {}
+    itens = conteudo.get("workspaces")
+    return itens if isinstance(itens, dict) else {}
+
+
+def _gravar_catalogo(base: Path, entradas: dict[str, dict]) -> None:
+    """Grava em arquivo temporário e troca com ``os.replace`` (atômico)."""
+    destino = base / ARQUIVO_CATALOGO
+    temporario = base / f".{ARQUIVO_CATALOGO}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        temporario.write_text(
+            json.dumps(
+                {"versao": VERSAO_CATALOGO, "workspaces": entradas},
+                ensure_ascii=False, sort_keys=True,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(temporario, destino)
+    except OSError:
+        temporario.unlink(missing_ok=True)
+
+
+def _entrada_catalogo(caminho: Path, assinatura: list[int] | None) -> dict | None:
+    item = _catalogar_workspace(caminho)
+    if item is None:
+        return None
+    return {"assinatura": assinatura, "item": _item_para_json(item)}
+
+
+def _item_catalogado(entrada: object, caminho: Path) -> WorkspaceCatalogItem | None:
+    """Item gravado para ``caminho``, se a entrada estiver íntegra."""
+    if not isinstance(entrada, dict) or not isinstance(entrada.get("item"), dict):
+        return None
+    if entrada["item"].get("caminho") != str(caminho.resolve()):
+        return None
+    try:
+        return _item_de_json(entrada["item"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def atualizar_catalogo_workspace(caminho: str | Path) -> None:
+    """Recataloga um Workspace (fim de processamento, carga ou exclusão).
+
+    Nunca interrompe quem chamou: o catálogo é apenas um atalho e uma entrada
+    perdida é refeita na próxima listagem pela assinatura.
+    """
+    pasta = Path(caminho).expanduser().resolve()
+    base = pasta.parent
+    try:
+        with _TRAVA_CATALOGO:
+            entradas = _ler_catalogo(base)
+            entrada = _entrada_catalogo(pasta, _assinatura_workspace(pasta))
+            if entrada is None:
+                entradas.pop(pasta.name, None)
+            else:
+                entradas[pasta.name] = entrada
+            _gravar_catalogo(base, entradas)
+    except (OSError, ValueError, TypeError):
+        pass
+
+
+def _recatalogar(pendentes: list[tuple[Path, list[int] | None]]) -> dict[str, dict | None]:
+    return {caminho.name: _entrada_catalogo(caminho, assinatura) for caminho, assinatura in pendentes}
+
+
+def _atualizar_catalogo(base: Path, novas: dict[str, dict | None]) -> None:
+    with _TRAVA_CATALOGO:
+        entradas = _ler_catalogo(base)
+        existentes = {caminho.name for caminho in base.iterdir()} if base.is_dir() else set()
+        entradas = {nome: entrada for nome, entrada in entradas.items() if nome in existentes}
+        for nome, entrada in novas.items():
+            if entrada is None:
+                entradas.pop(nome, None)
+            else:
+                entradas[nome] = entrada
+        _gravar_catalogo(base, entradas)
+
+
+def atualizar_catalogo_em_segundo_plano(
+    pasta_base: str | Path | None = None,
+    pendentes: list[tuple[Path, list[int] | None]] | None = None,
+) -> threading.Thread:
+    """Revalida o catálogo em uma thread; no máximo uma por pasta base."""
+    base = (
+        Path(pasta_base).expanduser().resolve()
+        if pasta_base is not None
+        else pasta_padrao_workspaces()
+    )
+    with _TRAVA_CATALOGO:
+        ativa = _ATUALIZACAO_SEGUNDO_PLANO.get(base)
+        if ativa is not None and ativa.is_alive():
+            return ativa
+
+        def _executar() -> None:
+            if pendentes is None:
+                listar_workspaces_disponiveis(base)
+            else:
+                _atualizar_catalogo(base, _recatalogar(pendentes))
+
+        thread = threading.Thread(target=_executar, name="catalogo-workspaces", daemon=True)
+        _ATUALIZACAO_SEGUNDO_PLANO[base] = thread
+        thread.start()
+        return thread
+
+
 def listar_workspaces_disponiveis(
     pasta_base: str | Path | None = None,
+    segundo_plano: bool = False,
 ) -> list[WorkspaceCatalogItem]:
+    """Lista os Workspaces pelo catálogo, abrindo só os SQLite alterados.
+
+    Com ``segundo_plano=True`` os Workspaces já catalogados que mudaram são
+    revalidados em uma thread e a lista volta na hora com a versão anterior
+    deles; Workspaces ainda desconhecidos são sempre catalogados na chamada.
+    """
     base = (
         Path(pasta_base).expanduser().resolve()
         if pasta_base is not None
@@ -211,11 +367,34 @@ def listar_workspaces_disponiveis(
     )
     if not base.is_dir():
         return []
-    itens = []
+    entradas = _ler_catalogo(base)
+    itens: list[WorkspaceCatalogItem] = []
+    pendentes: list[tuple[Path, list[int] | None]] = []
+    novas: dict[str, dict | None] = {}
     for caminho in base.iterdir():
-        item = _catalogar_workspace(caminho)
-        if item is not None:
-            itens.append(item)
+        if not caminho.is_dir():
+            continue
+        assinatura = _assinatura_workspace(caminho)
+        entrada = entradas.get(caminho.name)
+        anterior = _item_catalogado(entrada, caminho)
+        if anterior is not None and entrada.get("assinatura") == assinatura:
+            itens.append(anterior)
+            continue
+        if assinatura is None and entrada is None:
+            continue
+        if segundo_plano and anterior is not None and assinatura is not None:
+            pendentes.append((caminho, assinatura))
+            itens.append(anterior)
+            continue
+        novas[caminho.name] = _entrada_catalogo(caminho, assinatura)
+        if novas[caminho.name] is not None:
+            itens.append(_item_de_json(novas[caminho.name]["item"]))
+    obsoletas = entradas.keys() - {caminho.name for caminho in base.iterdir()}
+    # Novas e obsoletas já estão resolvidas; só as pendentes ficam para a thread.
+    if novas or obsoletas:
+        _atualizar_catalogo(base, novas)
+    if pendentes:
+        atualizar_catalogo_em_segundo_plano(base, pendentes)
     return sorted(
         itens,
         key=lambda item: (item.atualizado_em, item.nome_empresa.lower()),
@@ -343,3 +522,4 @@ def enviar_workspace_para_lixeira(caminho: str | Path) -> None:
     if not (pasta / "processamento.db").is_file():
         raise ValueError("O Workspace não contém processamento.db.")
     send2trash(str(pasta))
+    atualizar_catalogo_workspace(pasta)
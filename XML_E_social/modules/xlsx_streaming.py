@@ -0,0 +1,272 @@
+"""Escritor XLSX nativo em streaming para workbooks de grande volume.
+
+Grava cada aba diretamente como XML dentro do container ZIP, sem objetos de
+célula do openpyxl. Os estilos são fixos e pré-calculados (padrão, data/hora e
+data) e cada tipo Python tem um serializador próprio, escolhido por
+``type(valor)``. Textos vão como ``inlineStr`` para não manter tabela de strings
+compartilhadas em memória.
+
+A interface imita o subconjunto do ``openpyxl.Workbook(write_only=True)`` usado
+por ``excel_builder``: ``create_sheet(titulo).append(linha)`` e ``save(caminho)``.
+As abas são escritas em sequência; criar uma nova aba encerra a anterior.
+"""
+from __future__ import annotations
+
+import re
+import zipfile
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterable
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+
+LINHAS_POR_BLOCO = 2_000
+MAX_CARACTERES_CELULA = 32_767
+_EPOCH_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_ILEGAIS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_ESTILO_DATA_HORA = 1
+_ESTILO_DATA = 2
+
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<styleSheet xmlns="{_NS_MAIN}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd h:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+
+def _coluna_excel(indice: int) -> str:
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _texto(ref: str, valor: str) -> str:
+    if _CARACTERES_ILEGAIS.search(valor):
+        valor = _CARACTERES_ILEGAIS.sub("", valor)
+    valor = escape(valor[:MAX_CARACTERES_CELULA])
+    if valor[:1].isspace() or valor[-1:].isspace():
+        return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{valor}</t></is></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{valor}</t></is></c>'
+
+
+def _inteiro(ref: str, valor: int) -> str:
+    return f'<c r="{ref}"><v>{valor}</v></c>'
+
+
+def _decimal(ref: str, valor: float) -> str:
+    if valor != valor:
+        return ""
+    if valor in (float("inf"), float("-inf")):
+        return _texto(ref, str(valor))
+    # repr de np.float64 é "np.float64(2.25)" no NumPy 2; float() normaliza.
+    return f'<c r="{ref}"><v>{float(valor)!r}</v></c>'
+
+
+def _booleano(ref: str, valor: bool) -> str:
+    return f'<c r="{ref}" t="b"><v>{int(valor)}</v></c>'
+
+
+def _data_hora(ref: str, valor: datetime) -> str:
+    serial = (valor.replace(tzinfo=None) - _EPOCH_EXCEL).total_seconds() / 86_400
+    return f'<c r="{ref}" s="{_ESTILO_DATA_HORA}"><v>{serial!r}</v></c>'
+
+
+def _data(ref: str, valor: date) -> str:
+    return f'<c r="{ref}" s="{_ESTILO_DATA}"><v>{(valor - _EPOCH_EXCEL.date()).days}</v></c>'
+
+
+def _timestamp(ref: str, valor: pd.Timestamp) -> str:
+    return _data_hora(ref, valor.to_pydatetime())
+
+
+def _vazio(ref: str, valor: object) -> str:
+    return ""
+
+
+def _generico(ref: str, valor: object) -> str:
+    # Subclasses e tipos não previstos seguem a mesma regra do backend openpyxl
+    # (``_valor_excel``): o que não é número, data ou texto vira texto.
+    if valor is None or valor is pd.NaT:
+        return ""
+    if isinstance(valor, (bool, np.bool_)):
+        return _booleano(ref, bool(valor))
+    if isinstance(valor, (float, np.floating)):
+        return _decimal(ref, float(valor))
+    if isinstance(valor, pd.Timestamp):
+        return _timestamp(ref, valor)
+    if isinstance(valor, datetime):
+        return _data_hora(ref, valor)
+    if isinstance(valor, date):
+        return _data(ref, valor)
+    if isinstance(valor, (int, np.integer)):
+        return _inteiro(ref, int(valor))
+    if isinstance(valor, str):
+        return _texto(ref, valor)
+    return _texto(ref, str(valor))
+
+
+_SERIALIZADORES: dict[type, Callable[[str, object], str]] = {
+    str: _texto,
+    int: _inteiro,
+    float: _decimal,
+    bool: _booleano,
+    type(None): _vazio,
+    datetime: _data_hora,
+    date: _data,
+    pd.Timestamp: _timestamp,
+}
+
+
+class PlanilhaStreaming:
+    """Aba aberta para escrita; as linhas são serializadas e gravadas em blocos."""
+
+    def __init__(self, pacote: zipfile.ZipFile, caminho_zip: str, titulo: str):
+        self.title = titulo
+        self._fluxo = pacote.open(caminho_zip, "w", force_zip64=True)
+        self._fluxo.write(
+            (
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<worksheet xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheetData>'
+            ).encode("utf-8")
+        )
+        self._colunas: list[str] = []
+        self._bloco: list[str] = []
+        self._linha = 0
+
+    def append(self, valores: Iterable[object]) -> None:
+        self._linha += 1
+        numero = str(self._linha)
+        valores = list(valores)
+        if len(valores) > len(self._colunas):
+            self._colunas.extend(_coluna_excel(i) for i in range(len(self._colunas), len(valores)))
+        serializadores = _SERIALIZADORES
+        celulas = [
+            serializadores.get(type(valor), _generico)(coluna + numero, valor)
+            for coluna, valor in zip(self._colunas, valores)
+        ]
+        self._bloco.append(f'<row r="{numero}">{"".join(celulas)}</row>')
+        if len(self._bloco) >= LINHAS_POR_BLOCO:
+            self._descarregar()
+
+    def _descarregar(self) -> None:
+        if self._bloco:
+            self._fluxo.write("".join(self._bloco).encode("utf-8"))
+            self._bloco.clear()
+
+    def fechar(self) -> None:
+        if self._fluxo is None:
+            return
+        self._descarregar()
+        self._fluxo.write(b"</sheetData></worksheet>")
+        self._fluxo.close()
+        self._fluxo = None
+
+
+class WorkbookStreaming:
+    """Workbook XLSX gravado diretamente em ``caminho`` à medida que as abas crescem."""
+
+    def __init__(self, caminho: str | Path, compresslevel: int | None = None):
+        self.caminho = Path(caminho)
+        self._pacote = zipfile.ZipFile(
+            self.caminho, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel,
+        )
+        self._abas: list[PlanilhaStreaming] = []
+
+    @property
+    def sheetnames(self) -> list[str]:
+        return [aba.title for aba in self._abas]
+
+    def create_sheet(self, titulo: str) -> PlanilhaStreaming:
+        if self._abas:
+            self._abas[-1].fechar()
+        aba = PlanilhaStreaming(self._pacote, f"xl/worksheets/sheet{len(self._abas) + 1}.xml", titulo)
+        self._abas.append(aba)
+        return aba
+
+    def save(self, caminho: str | Path | None = None) -> None:
+        """Fecha a última aba e grava as partes de estrutura do pacote."""
+        if self._abas:
+            self._abas[-1].fechar()
+        quantidade = len(self._abas)
+        planilhas = "".join(
+            f'<sheet name={quoteattr(aba.title)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, aba in enumerate(self._abas, start=1)
+        )
+        relacoes = "".join(
+            f'<Relationship Id="rId{i}" Type="{_NS_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, quantidade + 1)
+        )
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, quantidade + 1)
+        )
+        cabecalho = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        partes = {
+            "xl/workbook.xml": (
+                f'{cabecalho}<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}">'
+                f"<sheets>{planilhas}</sheets></workbook>"
+            ),
+            "xl/_rels/workbook.xml.rels": (
+                f'{cabecalho}<Relationships xmlns="{_NS_PKG_REL}">{relacoes}'
+                f'<Relationship Id="rId{quantidade + 1}" Type="{_NS_REL}/styles" Target="styles.xml"/>'
+                "</Relationships>"
+            ),
+            "xl/styles.xml": _STYLES_XML,
+            "docProps/app.xml": (
+                f"{cabecalho}<Properties xmlns=\"http://schemas.openxmlformats.org/officeDocument/2006/extended-properties\">"
+                "<Application>XML_E_social</Application></Properties>"
+            ),
+            "_rels/.rels": (
+                f'{cabecalho}<Relationships xmlns="{_NS_PKG_REL}">'
+                f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+                f'<Relationship Id="rId2" Type="{_NS_REL}/extended-properties" Target="docProps/app.xml"/>'
+                "</Relationships>"
+            ),
+            "[Content_Types].xml": (
+                f'{cabecalho}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>'
+                '<Override PartName="/xl/workbook.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                '<Override PartName="/xl/styles.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                '<Override PartName="/docProps/app.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
+                f"{overrides}</Types>"
+            ),
+        }
+        for nome, conteudo in partes.items():
+            self._pacote.writestr(nome, conteudo)
+        self._pacote.close()
+        if caminho is not None and Path(caminho) != self.caminho:
+            self.caminho.replace(caminho)
+            self.caminho = Path(caminho)
+
+    def close(self) -> None:
+        """Descarta um workbook incompleto (ex.: falha de integridade)."""
+        if self._pacote.fp is not None:
+            if self._abas:
+                self._abas[-1].fechar()
+            self._pacote.close()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import zlib
+from unittest.mock import patch
+
+import pandas as pd
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.armazem_xml import DicionariosXML, TreinadorDicionarios, criar_tabela_dicionarios, usa_dicionario
+from modules.processador_zip import processar_fontes_esocial
+
+
+def _xml(indice: int) -> bytes:
+    return (
+        '<eSocial xmlns="http://www.esocial.gov.br/schema/evt/evtRemun/v_S_01_02_00">'
+        f'<evtRemun Id="ID{indice:020d}"><ideTrabalhador><cpfTrab>{indice:011d}</cpfTrab>'
+        f'</ideTrabalhador><itensRemun><codRubr>R{indice % 7}</codRubr>'
+        f'<vrRubr>{indice * 3.5:.2f}</vrRubr></itensRemun></evtRemun></eSocial>'
+    ).encode()
+
+
+class ArmazemXMLTest(unittest.TestCase):
+    def test_treino_grava_dicionario_e_blobs_antigos_continuam_legiveis(self):
+        conn = sqlite3.connect(":memory:")
+        try:
+            criar_tabela_dicionarios(conn)
+            dicionarios = DicionariosXML()
+            treinador = TreinadorDicionarios(dicionarios, amostras=4)
+            legados = [dicionarios.comprimir("S-1200", _xml(i)) for i in range(4)]
+            for blob in legados:
+                treinador.observar(conn, "S-1200", blob)
+            self.assertIn("S-1200", dicionarios.por_tipo)
+
+            novo = dicionarios.comprimir("S-1200", _xml(99))
+            self.assertTrue(usa_dicionario(novo))
+            self.assertFalse(usa_dicionario(legados[0]))
+            self.assertLess(len(novo), len(zlib.compress(_xml(99), level=1)))
+
+            recarregados = DicionariosXML.carregar(conn)
+            self.assertEqual(recarregados.descomprimir(novo), _xml(99))
+            self.assertEqual(recarregados.descomprimir(legados[0]), _xml(0))
+            with self.assertRaises(ValueError):
+                DicionariosXML().descomprimir(novo)
+        finally:
+            conn.close()
+
+    def _processar(self, ambiente: dict[str, str]) -> tuple[pd.DataFrame, list[tuple]]:
+        with tempfile.TemporaryDirectory() as temp, patch.dict(
+            os.environ, {"ESOCIAL_WORKSPACES_DIR": temp, **ambiente}
+        ):
+            resultado = processar_fontes_esocial(gerar_corpus("pequeno")["inicial"])
+            conn = sqlite3.connect(resultado["db_path"])
+            try:
+                movimentos = pd.read_sql_query(
+                    "SELECT * FROM rel_movimentos_cp ORDER BY cpf, per_apur, cod_rubr, vr_rubr", conn
+                )
+                blobs = conn.execute(
+                    "SELECT tipo, COUNT(xml_zlib), SUM(substr(xml_zlib,1,1)=x'5A'), SUM(length(xml_zlib)) "
+                    "FROM eventos WHERE tipo IN ('S-1010','S-1200','S-5001') GROUP BY tipo ORDER BY tipo"
+                ).fetchall()
+            finally:
+                conn.close()
+        return movimentos, blobs
+
+    def test_pipeline_com_dicionario_preserva_resultado(self):
+        original, blobs_originais = self._processar({"ESOCIAL_XML_DICIONARIO": "0"})
+        self.assertTrue(all(com_dicionario == 0 for _, _, com_dicionario, _ in blobs_originais))
+        for workers in ("0", "2"):
+            with self.subTest(workers=workers):
+                movimentos, blobs = self._processar({"ESOCIAL_V10_WORKERS": workers})
+                pd.testing.assert_frame_equal(movimentos, original)
+                por_tipo = {tipo: (qtd, com_dicionario, tamanho) for tipo, qtd, com_dicionario, tamanho in blobs}
+                antes = {tipo: tamanho for tipo, _, _, tamanho in blobs_originais}
+                qtd, com_dicionario, tamanho = por_tipo["S-1200"]
+                self.assertEqual(com_dicionario, qtd)
+                self.assertLess(tamanho, antes["S-1200"] / 2)
+
+    def test_descarte_mantem_apenas_os_s1200_ativos(self):
+        original, _ = self._processar({})
+        movimentos, blobs = self._processar({"ESOCIAL_DESCARTAR_XML": "1"})
+        pd.testing.assert_frame_equal(movimentos, original)
+        preservados = {tipo: qtd for tipo, qtd, _, _ in blobs}
+        self.assertEqual(preservados["S-1010"], 0)
+        self.assertEqual(preservados["S-5001"], 0)
+        self.assertGreater(preservados["S-1200"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from benchmarks.benchmark_pipeline import comparar, executar
+
+
+class BenchmarkPipelineTest(unittest.TestCase):
+    def test_porte_mini_executa_todas_as_etapas_e_compara_com_linha_de_base(self):
+        resultado = executar("mini")
+        self.assertEqual(
+            list(resultado["etapas"]),
+            [
+                "processar_fontes_esocial",
+                "atualizar_workspace_incremental",
+                "materializar_tabelas_analiticas",
+                "gerar_pacote_excel_saida_sqlite",
+            ],
+        )
+        self.assertGreater(resultado["contagens"]["movimentos_cp"], 0)
+        self.assertGreater(resultado["contagens"]["exclusoes"], 0)
+        for medicao in resultado["etapas"].values():
+            self.assertGreater(medicao["parede_segundos"], 0)
+            self.assertGreater(medicao["eventos_por_segundo"], 0)
+
+        lenta = {**resultado, "etapas": {
+            nome: {**medicao, "parede_segundos": medicao["parede_segundos"] * 2}
+            for nome, medicao in resultado["etapas"].items()
+        }}
+        self.assertTrue(all(linha["regressao"] for linha in comparar(lenta, resultado)))
+        self.assertFalse(any(linha["regressao"] for linha in comparar(resultado, lenta)))
+        with self.assertRaises(ValueError):
+            comparar(resultado, {**resultado, "porte": "grande"})
+
+
+if __name__ == "__main__":
+    unittest.main()
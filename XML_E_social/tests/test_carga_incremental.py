@@ -22,7 +22,11 @@ from modules.processador_zip import (
     organizar_fontes_carga_inicial,
     processar_fontes_esocial,
 )
-from modules.sqlite_relatorio import gerar_excel_saida_sqlite
+from modules.sqlite_relatorio import (
+    TABELAS_RELATORIO,
+    _reconstruir_tabelas_relatorio,
+    gerar_excel_saida_sqlite,
+)
 
 
 def zip_xmls(**arquivos: str) -> bytes:
@@ -239,6 +243,119 @@ class CargaIncrementalTest(unittest.TestCase):
         self.assertEqual(atualizado["carga_incremental"]["status"], "concluida")
         self.assertEqual(atualizado["carga_incremental"]["quantidade_xml_novos"], 1)
 
+    def test_complemento_mensal_recalcula_so_competencias_afetadas(self):
+        outro_cpf = S1200.replace("12345678901", "98765432100").replace(
+            "<nrRecibo>R1</nrRecibo></recibo>", "<nrRecibo>R9</nrRecibo></recibo>"
+        )
+        inicial = processar_fontes_esocial([("inicial.zip", zip_xmls(**{
+            "s1010.xml": S1010, "s1200.xml": S1200, "outro.xml": outro_cpf,
+        }))])
+        workspace = Path(inicial["workspace_temporario"])
+        fevereiro = S1200.replace("<perApur>2026-01</perApur>", "<perApur>2026-02</perApur>").replace(
+            "<nrRecibo>R1</nrRecibo></recibo>", "<nrRecibo>R3</nrRecibo></recibo>"
+        )
+        exclusao = S3000.replace("<nrRecEvt>R1</nrRecEvt>", "<nrRecEvt>R9</nrRecEvt>")
+        with patch(
+            "modules.sqlite_relatorio._reconstruir_tabelas_relatorio",
+            side_effect=AssertionError("reconstrução completa inesperada"),
+        ):
+            atualizar_workspace_incremental(
+                workspace, [("fev.zip", zip_xmls(**{"fev.xml": fevereiro, "s3000.xml": exclusao}))]
+            )
+
+        def retrato(conn):
+            return {
+                tabela: sorted(conn.execute(f"SELECT * FROM {tabela}").fetchall(), key=repr)
+                for tabela in TABELAS_RELATORIO
+            }
+
+        conn = sqlite3.connect(workspace / "processamento.db")
+        try:
+            incremental = retrato(conn)
+            _reconstruir_tabelas_relatorio(conn)
+            completo = retrato(conn)
+        finally:
+            conn.close()
+        self.assertEqual(incremental, completo)
+        self.assertEqual(
+            sorted((r[0], r[1]) for r in incremental["rel_base_trabalhador"]),
+            [("2026-01", "12345678901"), ("2026-02", "12345678901")],
+        )
+        self.assertEqual([r[18:] for r in incremental["rel_rubricas_cp_base"]], [(2, 1, "2026-01", "2026-02")])
+
+    def _inicial_duas_rubricas(self):
+        rubrica_200 = S1200.replace("12345678901", "98765432100").replace(
+            "<codRubr>100</codRubr>", "<codRubr>200</codRubr>"
+        ).replace("<nrRecibo>R1</nrRecibo></recibo>", "<nrRecibo>R9</nrRecibo></recibo>")
+        inicial = processar_fontes_esocial([("inicial.zip", zip_xmls(**{
+            "s1010.xml": S1010, "s1200.xml": S1200, "s1200_200.xml": rubrica_200,
+        }))])
+        return Path(inicial["workspace_temporario"])
+
+    def _complemento_rubrica_200(self, workspace):
+        s1010_200 = S1010.replace("<codRubr>100</codRubr>", "<codRubr>200</codRubr>").replace(
+            "<codIncCP>11</codIncCP>", "<codIncCP>00</codIncCP>"
+        )
+        return atualizar_workspace_incremental(
+            workspace, [("rubrica_200.zip", zip_xmls(**{"s1010_200.xml": s1010_200}))]
+        )
+
+    def test_s1010_novo_reclassifica_somente_s1200_dependentes(self):
+        workspace = self._inicial_duas_rubricas()
+        conn = sqlite3.connect(workspace / "processamento.db")
+        try:
+            stg_100 = conn.execute("SELECT id FROM stg_remuneracoes WHERE cod_rubr='100'").fetchone()
+        finally:
+            conn.close()
+        with patch(
+            "modules.processador_zip.reiniciar_materializacao_analitica",
+            side_effect=AssertionError("reconstrução completa inesperada"),
+        ):
+            atualizado = self._complemento_rubrica_200(workspace)
+
+        conn = sqlite3.connect(workspace / "processamento.db")
+        try:
+            id_carga = atualizado["carga_incremental"]["id_carga"]
+            reclassificados = conn.execute(
+                "SELECT valor FROM meta WHERE chave=?", (f"carga_{id_carga}_s1200_reclassificados",)
+            ).fetchone()[0]
+            status = dict(conn.execute("SELECT cod_rubr, status_cp FROM rel_movimentos_cp"))
+            self.assertEqual(
+                conn.execute("SELECT id FROM stg_remuneracoes WHERE cod_rubr='100'").fetchone(), stg_100
+            )
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM dados_remuneracoes").fetchone()[0], 2)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM dados_rubricas").fetchone()[0], 2)
+            incremental = {
+                tabela: sorted(conn.execute(f"SELECT * FROM {tabela}").fetchall(), key=repr)
+                for tabela in TABELAS_RELATORIO
+            }
+            _reconstruir_tabelas_relatorio(conn)
+            completo = {
+                tabela: sorted(conn.execute(f"SELECT * FROM {tabela}").fetchall(), key=repr)
+                for tabela in TABELAS_RELATORIO
+            }
+        finally:
+            conn.close()
+        self.assertEqual(reclassificados, "1")
+        self.assertEqual(status, {"100": "Incide CP", "200": "Não incide CP"})
+        self.assertEqual(incremental, completo)
+
+    def test_reclassificacao_dirigida_pode_ser_desligada(self):
+        workspace = self._inicial_duas_rubricas()
+        with patch.dict(os.environ, {"ESOCIAL_RECLASSIFICACAO_DIRIGIDA": "0"}):
+            atualizado = self._complemento_rubrica_200(workspace)
+        conn = sqlite3.connect(workspace / "processamento.db")
+        try:
+            id_carga = atualizado["carga_incremental"]["id_carga"]
+            marca = conn.execute(
+                "SELECT valor FROM meta WHERE chave=?", (f"carga_{id_carga}_s1200_reclassificados",)
+            ).fetchone()
+            status = dict(conn.execute("SELECT cod_rubr, status_cp FROM rel_movimentos_cp"))
+        finally:
+            conn.close()
+        self.assertIsNone(marca)
+        self.assertEqual(status, {"100": "Incide CP", "200": "Não incide CP"})
+
 
 if __name__ == "__main__":
     unittest.main()
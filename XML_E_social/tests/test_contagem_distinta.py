@@ -0,0 +1,66 @@
+import sqlite3
+import unittest
+
+from modules.contagem_distinta import EsbocoHLL, registrar_funcoes_hll
+
+
+class ContagemDistintaTest(unittest.TestCase):
+    def _esboco(self, valores):
+        esboco = EsbocoHLL()
+        for valor in valores:
+            esboco.adicionar(valor)
+        return esboco
+
+    def test_conjuntos_pequenos_saem_exatos_e_grandes_dentro_do_erro(self):
+        for quantidade in (0, 1, 7, 40):
+            with self.subTest(quantidade=quantidade):
+                cpfs = [f"{i:011d}" for i in range(quantidade)]
+                self.assertEqual(self._esboco(cpfs + cpfs).estimar(), quantidade)
+        grande = self._esboco(f"{i * 7919:011d}" for i in range(50_000))
+        self.assertAlmostEqual(grande.estimar() / 50_000, 1.0, delta=0.05)
+
+    def test_uniao_equivale_ao_esboco_do_conjunto_unido(self):
+        a = [f"{i:011d}" for i in range(0, 6_000)]
+        b = [f"{i:011d}" for i in range(4_000, 9_000)]
+        unido = self._esboco(a)
+        unido.unir(self._esboco(b))
+        self.assertEqual(unido.registros, self._esboco(a + b).registros)
+
+    def test_serializacao_esparsa_e_densa(self):
+        for quantidade in (3, 20_000):
+            with self.subTest(quantidade=quantidade):
+                esboco = self._esboco(str(i) for i in range(quantidade))
+                blob = esboco.serializar()
+                self.assertEqual(blob[:1], b"S" if quantidade == 3 else b"D")
+                self.assertEqual(EsbocoHLL.desserializar(blob).registros, esboco.registros)
+        with self.assertRaises(ValueError):
+            EsbocoHLL.desserializar(b"X123")
+
+    def test_agregados_sqlite_combinam_esbocos_por_grupo(self):
+        conn = sqlite3.connect(":memory:")
+        try:
+            registrar_funcoes_hll(conn)
+            conn.execute("CREATE TABLE mov(per_apur TEXT, cpf TEXT)")
+            conn.executemany(
+                "INSERT INTO mov VALUES(?,?)",
+                [("2026-01", f"{i:011d}") for i in range(30)]
+                + [("2026-02", f"{i:011d}") for i in range(20, 45)]
+                + [("2026-02", None)],
+            )
+            por_competencia = dict(conn.execute(
+                "SELECT per_apur, hll_qtd(cpf) FROM mov GROUP BY per_apur"
+            ))
+            conn.execute(
+                "CREATE TABLE cubo AS SELECT per_apur, hll_esboco(cpf) esboco FROM mov GROUP BY per_apur"
+            )
+            total, = conn.execute("SELECT hll_qtd_esbocos(esboco) FROM cubo").fetchone()
+            uniao, = conn.execute("SELECT hll_uniao(esboco) FROM cubo").fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(por_competencia, {"2026-01": 30, "2026-02": 25})
+        self.assertEqual(total, 45)
+        self.assertEqual(EsbocoHLL.desserializar(uniao).estimar(), 45)
+
+
+if __name__ == "__main__":
+    unittest.main()
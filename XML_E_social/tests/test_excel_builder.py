@@ -1,9 +1,12 @@
+import os
 import sqlite3
 import tempfile
 import unittest
+from datetime import date, datetime
 from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 
@@ -172,6 +175,86 @@ class ExcelBuilderTest(unittest.TestCase):
                 conexao.close()
             self.assertEqual(resultado.controles[0].linhas_exportadas, 3)
 
+    def test_backend_nativo_equivale_ao_openpyxl_e_divide_abas(self):
+        dataframe = pd.DataFrame({
+            "texto": ["a & <b>", "  espaço ", "linha\nquebra", None, "ç"],
+            "inteiro": [1, -2, 3, 4, 10**12],
+            "valor": [1.5, float("nan"), -0.1, 1e-7, 2.0],
+            "flag": [True, False, True, False, True],
+            "data": [date(2026, 1, 31), datetime(2025, 12, 1, 8, 30), pd.Timestamp("2024-02-29 23:59:59"), None, date(1900, 3, 1)],
+        })
+        conexao = sqlite3.connect(":memory:")
+        conexao.execute("CREATE TABLE movimentos(id INTEGER, cpf TEXT, valor REAL, blob BLOB)")
+        conexao.executemany(
+            "INSERT INTO movimentos VALUES(?,?,?,?)",
+            [(i, f"{i:011d}", i / 3, b"x" if i % 2 else None) for i in range(7)],
+        )
+        fontes = [
+            FontePlanilha("dados", dataframe=dataframe),
+            FontePlanilha("03_movimentos_cp", query="SELECT * FROM movimentos ORDER BY id"),
+        ]
+        lidos = {}
+        try:
+            with tempfile.TemporaryDirectory() as pasta:
+                for backend in ("openpyxl", "nativo"):
+                    destino = Path(pasta) / f"{backend}.xlsx"
+                    resultado = gerar_workbook(
+                        destino, fontes, conexao=conexao, max_dados_aba=3,
+                        backend=backend, validacao_completa=True,
+                    )
+                    lidos[backend] = (
+                        [vars(c) for c in resultado.controles],
+                        pd.read_excel(destino, sheet_name=None),
+                    )
+        finally:
+            conexao.close()
+
+        controles, abas = lidos["nativo"]
+        self.assertEqual(controles, lidos["openpyxl"][0])
+        self.assertEqual(
+            list(abas),
+            ["dados_1", "dados_2", "03_movimentos_cp_1", "03_movimentos_cp_2",
+             "03_movimentos_cp_3", "controle_integridade"],
+        )
+        for aba, esperado in lidos["openpyxl"][1].items():
+            pd.testing.assert_frame_equal(abas[aba], esperado, check_dtype=False)
+
+    def test_backend_nativo_aceita_escalares_numpy_em_coluna_object(self):
+        dataframe = pd.DataFrame({
+            "Parametro": ["aliquota", "qtd", "vazio", "ativo", "float32"],
+            "Valor": pd.Series(
+                [np.float64(2.25), np.int64(7), np.float64("nan"), np.bool_(True), np.float32(0.5)],
+                dtype=object,
+            ),
+        })
+        with tempfile.TemporaryDirectory() as pasta:
+            lidos = {}
+            for backend in ("openpyxl", "nativo"):
+                destino = Path(pasta) / f"{backend}.xlsx"
+                gerar_workbook(destino, [FontePlanilha("parametros", dataframe=dataframe)], backend=backend)
+                workbook = load_workbook(destino)
+                lidos[backend] = list(workbook["parametros"].iter_rows(values_only=True))
+
+        self.assertEqual(
+            lidos["nativo"],
+            [("Parametro", "Valor"), ("aliquota", 2.25), ("qtd", 7), ("vazio", None), ("ativo", True), ("float32", 0.5)],
+        )
+        self.assertEqual(lidos["nativo"], lidos["openpyxl"])
+
+    def test_backend_nativo_por_flag(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = Path(pasta) / "flag.xlsx"
+            with patch.dict(os.environ, {"ESOCIAL_XLSX_NATIVO": "1"}), patch(
+                "modules.excel_builder.Workbook",
+                side_effect=AssertionError("openpyxl nao deveria escrever"),
+            ):
+                resultado = gerar_workbook(
+                    destino, [FontePlanilha("dados", dataframe=pd.DataFrame({"id": [1, 2]}))]
+                )
+            self.assertEqual(resultado.abas, ["dados", "controle_integridade"])
+            with self.assertRaises(ValueError):
+                gerar_workbook(destino, [], backend="xlsxwriter")
+
 
 if __name__ == "__main__":
     unittest.main()
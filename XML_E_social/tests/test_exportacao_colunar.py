@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.exportacao_colunar import FonteColunar, exportar_fontes_colunares
+from modules.processador_zip import processar_fontes_esocial
+from modules.sqlite_relatorio import gerar_pacote_colunar_sqlite
+
+PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class ExportacaoColunarTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": cls.temp.name}):
+            cls.db_path = processar_fontes_esocial(gerar_corpus("mini")["inicial"])["db_path"]
+        conn = sqlite3.connect(cls.db_path)
+        try:
+            cls.tabelas = {
+                nome: conn.execute(f"SELECT COUNT(*) FROM {nome}").fetchone()[0]
+                for (nome,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' "
+                    "AND (name LIKE 'rel%' OR name LIKE 'dados%')"
+                )
+            }
+            cls.soma_movimentos = conn.execute("SELECT SUM(vr_rubr) FROM rel_movimentos_cp").fetchone()[0]
+        finally:
+            conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp.cleanup()
+
+    @unittest.skipUnless(PYARROW, "pyarrow não instalado")
+    def test_parquet_particionado_por_competencia_com_manifesto(self):
+        import pyarrow.dataset as ds
+
+        with tempfile.TemporaryDirectory() as pasta:
+            pacote = gerar_pacote_colunar_sqlite(self.db_path, pasta, formato="parquet", lote=7)
+            self.assertTrue(all(c.status == "OK" for c in pacote["controles"]))
+            self.assertEqual({c.tabela: c.quantidade for c in pacote["controles"]}, self.tabelas)
+
+            movimentos = ds.dataset(Path(pasta) / "rel_movimentos_cp", partitioning="hive").to_table()
+            self.assertEqual(movimentos.num_rows, self.tabelas["rel_movimentos_cp"])
+            self.assertAlmostEqual(sum(movimentos.column("vr_rubr").to_pylist()), self.soma_movimentos, places=6)
+            self.assertEqual(
+                sorted(p.name for p in (Path(pasta) / "rel_movimentos_cp").iterdir()),
+                ["per_apur=2025-01", "per_apur=2025-02"],
+            )
+
+            manifesto = pd.read_csv(pacote["manifesto"], sep=";", encoding="utf-8-sig")
+            self.assertEqual(list(manifesto.columns), [
+                "tabela", "quantidade", "soma_valores", "quantidade_banco", "soma_valores_banco", "status",
+            ])
+            arquivos = pd.read_csv(pacote["manifesto_arquivos"], sep=";", encoding="utf-8-sig")
+            self.assertEqual(int(arquivos["linhas"].sum()), sum(self.tabelas.values()))
+
+    def test_csv_gzip_por_tabela(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            pacote = gerar_pacote_colunar_sqlite(self.db_path, pasta, formato="csv", lote=5)
+            self.assertEqual(pacote["quantidade_arquivos"], len(self.tabelas))
+            movimentos = pd.read_csv(
+                Path(pasta) / "rel_movimentos_cp.csv.gz", sep=";", encoding="utf-8-sig", dtype={"cpf": str}
+            )
+            self.assertEqual(len(movimentos), self.tabelas["rel_movimentos_cp"])
+            self.assertAlmostEqual(movimentos["vr_rubr"].sum(), self.soma_movimentos, places=6)
+            self.assertTrue(movimentos["cpf"].str.len().eq(11).all())
+
+    def test_divergencia_com_controle_do_banco_interrompe(self):
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE TABLE rel_movimentos_cp(per_apur TEXT, vr_rubr REAL)")
+            conn.executemany("INSERT INTO rel_movimentos_cp VALUES(?,?)", [("2026-01", 1.0), ("2026-02", 2.0)])
+            conn.execute("CREATE TABLE rel_controle_integridade AS SELECT 'rel_movimentos_cp' tabela, 3 quantidade, 3.0 soma_valores")
+            with tempfile.TemporaryDirectory() as pasta, self.assertRaises(RuntimeError):
+                exportar_fontes_colunares(
+                    pasta,
+                    [FonteColunar("rel_movimentos_cp", query="SELECT * FROM rel_movimentos_cp", coluna_soma="vr_rubr")],
+                    conexao=conn,
+                    formato="csv",
+                )
+        finally:
+            conn.close()
+
+    def test_formato_desconhecido(self):
+        with tempfile.TemporaryDirectory() as pasta, self.assertRaises(ValueError):
+            exportar_fontes_colunares(pasta, [], formato="xlsx")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.processador_zip import processar_fontes_esocial
+from modules.sqlite_relatorio import _planejar_segmentos, gerar_pacote_excel_saida_sqlite
+
+
+class ExportacaoSegmentadaTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": cls.temp.name}):
+            cls.resultado = processar_fontes_esocial(gerar_corpus("mini")["inicial"])
+        conn = sqlite3.connect(cls.resultado["db_path"])
+        try:
+            cls.movimentos = conn.execute("SELECT * FROM rel_movimentos_cp ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp.cleanup()
+
+    def _pacote(self, pasta, workers):
+        pacote = self.resultado["pacote_sqlite"]
+        return gerar_pacote_excel_saida_sqlite(
+            self.resultado["db_path"], pasta, self.resultado["empresa"],
+            pacote["resumo_visual"], pacote["rubricas_cp"],
+            linhas_por_arquivo=7, segmentado=True, workers=workers,
+        )
+
+    def _linhas(self, pasta, conjunto):
+        linhas = []
+        for arquivo in sorted(Path(pasta).glob(f"{conjunto}_parte_*.xlsx")):
+            wb = load_workbook(arquivo, read_only=True)
+            try:
+                linhas.extend(list(wb.worksheets[0].iter_rows(values_only=True))[1:])
+            finally:
+                wb.close()
+        return linhas
+
+    def test_partes_por_faixa_de_rowid_sem_offset(self):
+        conn = sqlite3.connect(self.resultado["db_path"])
+        consultas = []
+        conn.set_trace_callback(consultas.append)
+        try:
+            segmentos = _planejar_segmentos(
+                conn, "03_movimentos_cp", "03_movimentos_cp",
+                "SELECT * FROM rel_movimentos_cp", (), 7,
+            )
+            lidas = [conn.execute(s.query, s.params).fetchall() for s in segmentos]
+        finally:
+            conn.close()
+        self.assertEqual(len(segmentos), -(-len(self.movimentos) // 7))
+        self.assertTrue(all(len(parte) == 7 for parte in lidas[:-1]))
+        self.assertEqual([linha for parte in lidas for linha in parte], self.movimentos)
+        self.assertFalse(any("OFFSET" in sql.upper() for sql in consultas))
+
+    def test_filtro_com_ordenacao_ou_limite_usa_cursor_unico(self):
+        conn = sqlite3.connect(self.resultado["db_path"])
+        try:
+            for query in (
+                "SELECT * FROM rel_movimentos_cp WHERE vr_rubr > 0 ORDER BY cpf",
+                "SELECT * FROM rel_movimentos_cp WHERE vr_rubr > 0\nLIMIT 10",
+                "SELECT * FROM rel_movimentos_cp WHERE cpf IS NOT NULL group by cpf",
+            ):
+                with self.subTest(query=query):
+                    segmentos = _planejar_segmentos(conn, "m", "m", query, (), 3)
+                    self.assertEqual(len(segmentos), 1)
+                    self.assertEqual(segmentos[0].query, query)
+                    conn.execute(segmentos[0].query, segmentos[0].params).fetchall()
+            filtrado = _planejar_segmentos(
+                conn, "m", "m", "SELECT * FROM rel_movimentos_cp WHERE vr_rubr > 0 AND cpf <> 'ORDERLY'", (), 3,
+            )
+            self.assertGreater(len(filtrado), 1)
+            self.assertTrue(all("rowid >=" in segmento.query for segmento in filtrado))
+        finally:
+            conn.close()
+
+    def test_paralelo_gera_mesmo_manifesto_e_conteudo(self):
+        with tempfile.TemporaryDirectory() as sequencial, tempfile.TemporaryDirectory() as paralelo:
+            um = self._pacote(sequencial, 0)
+            dois = self._pacote(paralelo, 2)
+            manifesto_um = pd.read_csv(um["manifesto"], sep=";", encoding="utf-8-sig")
+            manifesto_dois = pd.read_csv(dois["manifesto"], sep=";", encoding="utf-8-sig")
+            pd.testing.assert_frame_equal(manifesto_um, manifesto_dois)
+            self.assertEqual(
+                list(manifesto_um.columns),
+                ["arquivo", "conjunto", "parte", "quantidade_exportada_parte", "status",
+                 "quantidade_sqlite", "offset_inicial"],
+            )
+            self.assertTrue(manifesto_um["status"].eq("OK").all())
+            movimentos = manifesto_um[manifesto_um["conjunto"].eq("03_movimentos_cp")]
+            self.assertEqual(list(movimentos["offset_inicial"]), [7 * i for i in range(len(movimentos))])
+            self.assertEqual(int(movimentos["quantidade_exportada_parte"].sum()), len(self.movimentos))
+            esperado = [tuple(v if v != "" else None for v in linha) for linha in self.movimentos]
+            for pasta in (sequencial, paralelo):
+                lidas = [tuple(v if v != "" else None for v in linha) for linha in self._linhas(pasta, "03_movimentos_cp")]
+                self.assertEqual(lidas, esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
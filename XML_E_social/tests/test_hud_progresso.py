@@ -31,6 +31,16 @@ class HUDProgressoTest(unittest.TestCase):
         self.assertEqual(dados.volume_restante, "28,0 GB")
         self.assertEqual(dados.tempo_decorrido, "1min 27s")
 
+    def test_modo_paralelo_expoe_ritmo_por_worker(self):
+        detalhes = DETALHES.replace(
+            "1,2 MB/s | ", "1,2 MB/s | workers 4/4 | 104,4 itens/s por worker | "
+        )
+        dados = extrair_hud_ingestao(detalhes)
+        self.assertEqual(dados.ritmo, "417,5 itens/s")
+        self.assertEqual(dados.workers, "4 de 4")
+        self.assertEqual(dados.ritmo_por_worker, "104,4 itens/s")
+        self.assertEqual(extrair_hud_ingestao(DETALHES).ritmo_por_worker, "—")
+
     def test_mensagem_sem_metricas_permanece_segura(self):
         dados = extrair_hud_ingestao("Preparando a ingestão...")
         self.assertEqual(dados.fonte, "—")
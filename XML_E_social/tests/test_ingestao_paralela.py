@@ -0,0 +1,151 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+from unittest.mock import patch
+
+from modules.processador_zip import (
+    _criar_schema,
+    _gravar_xml_preparado,
+    _preparar_xml_ingestao,
+    _segunda_passagem,
+    processar_fontes_esocial,
+)
+
+
+S1200 = """<eSocial><evtRemun Id="ID1200"><ideEvento><indRetif>1</indRetif><perApur>2026-01</perApur></ideEvento><ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador><ideTrabalhador><cpfTrab>12345678901</cpfTrab></ideTrabalhador><dmDev><ideDmDev>1</ideDmDev><codCateg>101</codCateg><infoPerApur><ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc><codLotacao>1</codLotacao><remunPerApur><matricula>1</matricula><itensRemun><codRubr>100</codRubr><ideTabRubr>1</ideTabRubr><vrRubr>100.00</vrRubr></itensRemun></remunPerApur></ideEstabLot></infoPerApur></dmDev><recibo><nrRecibo>R1</nrRecibo></recibo></evtRemun></eSocial>"""
+
+S1010 = """<eSocial><evtTabRubrica Id="ID1010"><ideEvento><iniValid>2026-01</iniValid></ideEvento><ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador><infoRubrica><inclusao><ideRubrica><codRubr>100</codRubr><ideTabRubr>1</ideTabRubr><iniValid>2026-01</iniValid></ideRubrica><dadosRubrica><dscRubr>Salário</dscRubr><natRubr>1000</natRubr><tpRubr>1</tpRubr><codIncCP>11</codIncCP></dadosRubrica></inclusao></infoRubrica></evtTabRubrica></eSocial>"""
+
+S3000 = """<eSocial><evtExclusao Id="ID3000"><ideEvento><perApur>2026-01</perApur></ideEvento><ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador><infoExclusao><tpEvento>S-1200</tpEvento><nrRecEvt>R1</nrRecEvt></infoExclusao></evtExclusao></eSocial>"""
+
+S1200_RETIF = S1200.replace(
+    '<indRetif>1</indRetif><perApur>',
+    '<indRetif>2</indRetif><nrRecibo>R1</nrRecibo><perApur>',
+).replace('<vrRubr>100.00</vrRubr>', '<vrRubr>250.00</vrRubr>').replace(
+    '<nrRecibo>R1</nrRecibo></recibo>', '<nrRecibo>R2</nrRecibo></recibo>'
+)
+
+
+def zip_corpus() -> bytes:
+    memoria = io.BytesIO()
+    with zipfile.ZipFile(memoria, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("tabelas/s1010.xml", S1010)
+        for indice in range(150):
+            xml = S1200.replace("ID1200", f"ID1200_{indice}").replace(
+                "<cpfTrab>12345678901</cpfTrab>",
+                f"<cpfTrab>{indice:011d}</cpfTrab>",
+            ).replace("<nrRecibo>R1</nrRecibo></recibo>", f"<nrRecibo>RL{indice}</nrRecibo></recibo>")
+            zf.writestr(f"remun/{indice:04d}.xml", xml)
+        zf.writestr("remun/duplicado.xml", S1200.replace("ID1200", "ID1200_0").replace(
+            "<cpfTrab>12345678901</cpfTrab>", f"<cpfTrab>{0:011d}</cpfTrab>",
+        ).replace("<nrRecibo>R1</nrRecibo></recibo>", "<nrRecibo>RL0</nrRecibo></recibo>"))
+        zf.writestr("remun/retificacao.xml", S1200_RETIF)
+        zf.writestr("remun/original.xml", S1200)
+        zf.writestr("exclusao/s3000.xml", S3000)
+        zf.writestr("invalido.xml", "<eSocial><evtRemun>")
+    return memoria.getvalue()
+
+
+class IngestaoParalelaTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp.cleanup)
+
+    def _processar(self, workers: str) -> dict:
+        pasta = Path(self.temp.name) / f"workers_{workers}"
+        with patch.dict(os.environ, {
+            "ESOCIAL_WORKSPACES_DIR": str(pasta),
+            "ESOCIAL_V10_WORKERS": workers,
+        }):
+            resultado = processar_fontes_esocial([("corpus.zip", zip_corpus())])
+        conn = sqlite3.connect(resultado["db_path"])
+        try:
+            return {
+                "eventos": conn.execute(
+                    "SELECT arquivo,tipo,ativo,hash_conteudo,recibo_evento FROM eventos ORDER BY arquivo"
+                ).fetchall(),
+                "contagem": conn.execute(
+                    "SELECT tipo,quantidade FROM contagem_eventos ORDER BY tipo"
+                ).fetchall(),
+                "erros": conn.execute("SELECT arquivo FROM erros ORDER BY arquivo").fetchall(),
+                "movimentos": conn.execute(
+                    "SELECT cpf,per_apur,cod_rubr,vr_rubr,status_cp FROM rel_movimentos_cp ORDER BY cpf"
+                ).fetchall(),
+                "checkpoint": conn.execute(
+                    "SELECT status,ultimo_indice,total_membros FROM fontes"
+                ).fetchall(),
+                "workers": conn.execute(
+                    "SELECT valor FROM telemetria WHERE chave='workers_ingestao'"
+                ).fetchone(),
+            }
+        finally:
+            conn.close()
+
+    def test_pool_de_workers_equivale_ao_modo_sequencial(self):
+        sequencial = self._processar("0")
+        paralelo = self._processar("2")
+        for chave in ("eventos", "contagem", "erros", "movimentos", "checkpoint"):
+            self.assertEqual(paralelo[chave], sequencial[chave], chave)
+        self.assertIsNone(sequencial["workers"])
+        self.assertEqual(paralelo["workers"], ("2",))
+        self.assertEqual(len(paralelo["erros"]), 1)
+
+    def test_preparacao_nao_depende_do_sqlite(self):
+        preparado = _preparar_xml_ingestao("a.xml", S1010.encode(), len(S1010))
+        self.assertEqual(preparado.metadados.tipo, "S-1010")
+        self.assertEqual([c for c, _ in preparado.objetos], ["empresa", "rubricas"])
+        conn = sqlite3.connect(":memory:")
+        try:
+            _criar_schema(conn)
+            self.assertEqual(_gravar_xml_preparado(conn, preparado), "S-1010")
+            self.assertEqual(_gravar_xml_preparado(conn, preparado), "duplicado")
+        finally:
+            conn.close()
+
+    def _segunda_passagem_isolada(self, workers: int) -> tuple[list, list]:
+        conn = sqlite3.connect(":memory:")
+        try:
+            _criar_schema(conn)
+            _gravar_xml_preparado(conn, _preparar_xml_ingestao("s1010.xml", S1010.encode(), len(S1010)))
+            for indice in range(40):
+                xml = S1200.replace("ID1200", f"ID1200_{indice}").replace(
+                    "<cpfTrab>12345678901</cpfTrab>", f"<cpfTrab>{indice:011d}</cpfTrab>",
+                )
+                _gravar_xml_preparado(conn, _preparar_xml_ingestao(f"{indice:04d}.xml", xml.encode(), len(xml)))
+            # Blob corrompido apos a ingestao: deve virar erro sem interromper o lote.
+            conn.execute(
+                "UPDATE eventos SET xml_zlib=? WHERE arquivo='0007.xml'",
+                (zlib.compress(b"<eSocial><evtRemun>"),),
+            )
+            conn.commit()
+            _segunda_passagem(conn, None, workers=workers)
+            objetos = conn.execute(
+                "SELECT evento_id, cpf, cod_rubr, vr_rubr, cod_inc_cp "
+                "FROM stg_remuneracoes ORDER BY id"
+            ).fetchall()
+            pendentes = conn.execute(
+                "SELECT COUNT(*) FROM eventos WHERE tipo='S-1200' AND processado_segunda=0"
+            ).fetchone()[0]
+            erros = conn.execute("SELECT arquivo FROM erros").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(pendentes, 0)
+        return objetos, erros
+
+    def test_segunda_passagem_paralela_grava_na_ordem_dos_eventos(self):
+        sequencial = self._segunda_passagem_isolada(0)
+        paralelo = self._segunda_passagem_isolada(2)
+        self.assertEqual(paralelo, sequencial)
+        self.assertEqual(paralelo[1], [("0007.xml",)])
+        self.assertEqual(len(paralelo[0]), 39)
+        # O indice de rubricas chegou aos workers: a incidencia veio do S-1010.
+        self.assertEqual(paralelo[0][0][4], "11")
+
+
+if __name__ == "__main__":
+    unittest.main()
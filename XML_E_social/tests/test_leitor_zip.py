@@ -0,0 +1,162 @@
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import zipfile
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.leitor_zip import LeituraAntecipada, abrir_zip_fonte, materializar_cadeia
+from modules.processador_zip import processar_fontes_esocial
+
+
+def _zip(arquivos: dict[str, bytes], compressao: int) -> bytes:
+    memoria = io.BytesIO()
+    with zipfile.ZipFile(memoria, "w", compressao) as zf:
+        for nome, conteudo in arquivos.items():
+            zf.writestr(nome, conteudo)
+    return memoria.getvalue()
+
+
+class LeitorZipTest(unittest.TestCase):
+    def test_cadeia_de_zips_internos_e_lida_sem_copia(self):
+        interno = _zip({f"{i}.xml": f"<x>{i}</x>".encode() for i in range(20)}, zipfile.ZIP_DEFLATED)
+        meio = _zip({"pasta/interno.zip": interno, "meio.xml": b"<m/>"}, zipfile.ZIP_STORED)
+        externo = _zip({"meio.zip": meio, "comprimido.zip": interno}, zipfile.ZIP_STORED)
+        with tempfile.TemporaryDirectory() as temp:
+            caminho = Path(temp) / "externo.zip"
+            caminho.write_bytes(externo)
+            with ExitStack() as pilha:
+                zf = abrir_zip_fonte(pilha, caminho, ["meio.zip", "pasta/interno.zip"])
+                self.assertEqual(zf.read("7.xml"), b"<x>7</x>")
+                self.assertEqual(len(zf.infolist()), 20)
+            with ExitStack() as pilha:
+                self.assertEqual(abrir_zip_fonte(pilha, caminho, ["meio.zip"]).read("meio.xml"), b"<m/>")
+            with ExitStack() as pilha:
+                self.assertEqual(abrir_zip_fonte(pilha, caminho, ["comprimido.zip"]).read("19.xml"), b"<x>19</x>")
+            with ExitStack() as pilha, self.assertRaises(KeyError):
+                abrir_zip_fonte(pilha, caminho, ["inexistente.zip"])
+
+    def test_materializar_cadeia_descomprime_cada_zip_interno_uma_vez(self):
+        interno = _zip({f"{i}.xml": f"<x>{i}</x>".encode() for i in range(5)}, zipfile.ZIP_DEFLATED)
+        meio = _zip({"pasta/interno.zip": interno}, zipfile.ZIP_STORED)
+        externo = _zip({"meio.zip": meio, "direto.zip": interno}, zipfile.ZIP_DEFLATED)
+        with tempfile.TemporaryDirectory() as temp:
+            caminho = Path(temp) / "externo.zip"
+            caminho.write_bytes(_zip({"externo.zip": externo, "solto.zip": meio}, zipfile.ZIP_STORED))
+            copias = Path(temp) / "copias"
+
+            self.assertEqual(
+                materializar_cadeia(caminho, ["solto.zip", "pasta/interno.zip"], copias, "a"),
+                (caminho, ("solto.zip", "pasta/interno.zip")),
+            )
+            self.assertFalse(copias.exists())
+
+            raiz, cadeia = materializar_cadeia(
+                caminho, ["externo.zip", "meio.zip", "pasta/interno.zip"], copias, "b",
+            )
+            self.assertEqual((raiz, cadeia), (copias / "b_1.zip", ("pasta/interno.zip",)))
+            self.assertEqual(sorted(p.name for p in copias.iterdir()), ["b_1.zip"])
+            with ExitStack() as pilha, patch(
+                "modules.leitor_zip.tempfile.SpooledTemporaryFile",
+                side_effect=AssertionError("cadeia restante deveria ser lida no lugar"),
+            ):
+                self.assertEqual(abrir_zip_fonte(pilha, raiz, cadeia).read("4.xml"), b"<x>4</x>")
+
+            with self.assertRaises(KeyError):
+                materializar_cadeia(caminho, ["externo.zip", "inexistente.zip"], copias, "c")
+            self.assertEqual(sorted(p.name for p in copias.iterdir()), ["b_1.zip"])
+
+    def test_leitura_antecipada_preserva_ordem_e_para_ao_fechar(self):
+        membros = {f"{i:03d}.xml": f"<x>{i}</x>".encode() * 50 for i in range(40)}
+        with tempfile.TemporaryDirectory() as temp:
+            caminho = Path(temp) / "membros.zip"
+            caminho.write_bytes(_zip(membros, zipfile.ZIP_DEFLATED))
+            leitura = LeituraAntecipada(
+                lambda pilha: abrir_zip_fonte(pilha, caminho), range(3, 40), 1 << 20,
+                membros=4, limite_bytes=1_000,
+            )
+            try:
+                lidos = list(leitura)
+            finally:
+                leitura.fechar()
+            self.assertEqual([indice for indice, _, _ in lidos], list(range(3, 40)))
+            self.assertEqual(lidos[0][1], membros["003.xml"])
+
+            interrompida = LeituraAntecipada(lambda pilha: abrir_zip_fonte(pilha, caminho), range(40), 1 << 20, membros=2)
+            next(iter(interrompida))
+            interrompida.fechar()
+            self.assertFalse(interrompida._thread.is_alive())
+
+    def _processar(self, fontes, ambiente: dict[str, str]) -> tuple[list, list, Path]:
+        with patch.dict(os.environ, ambiente):
+            resultado = processar_fontes_esocial(fontes)
+        conn = sqlite3.connect(resultado["db_path"])
+        try:
+            contagem = conn.execute("SELECT tipo, quantidade FROM contagem_eventos ORDER BY tipo").fetchall()
+            movimentos = conn.execute(
+                "SELECT cpf, per_apur, cod_rubr, vr_rubr FROM rel_movimentos_cp ORDER BY 1, 2, 3, 4"
+            ).fetchall()
+        finally:
+            conn.close()
+        return contagem, movimentos, Path(resultado["db_path"]).parent
+
+    def test_pipeline_le_zip_aninhado_no_arquivo_de_origem(self):
+        nome, conteudo = gerar_corpus("pequeno")["inicial"][0]
+        with tempfile.TemporaryDirectory() as temp:
+            base = {"ESOCIAL_WORKSPACES_DIR": temp}
+            esperado = self._processar([(nome, conteudo)], {**base, "ESOCIAL_LEITURA_ANTECIPADA": "0"})[:2]
+            variantes = [
+                (compressao, variante)
+                for compressao in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+                for variante in ({"ESOCIAL_LEITURA_ANTECIPADA": "0"}, {}, {"ESOCIAL_V10_WORKERS": "2"})
+            ]
+            for compressao, variante in variantes:
+                embrulhado = [("[PRINCIPAL] embrulhado.zip", _zip({"lote/benchmark.zip": conteudo}, compressao))]
+                # ZIPs internos comprimidos sao copiados uma vez para disco; nenhum
+                # leitor volta a descomprimi-los em memoria.
+                with self.subTest(compressao=compressao, **variante), patch(
+                    "modules.leitor_zip.tempfile.SpooledTemporaryFile",
+                    side_effect=AssertionError("ZIP interno descomprimido novamente"),
+                ):
+                    contagem, movimentos, workspace = self._processar(embrulhado, {**base, **variante})
+                    self.assertEqual((contagem, movimentos), esperado)
+                    self.assertFalse((workspace / "fontes_aninhadas").exists())
+                    conn = sqlite3.connect(workspace / "processamento.db")
+                    try:
+                        cadeias = [r[0] for r in conn.execute(
+                            "SELECT membros_aninhados FROM fontes WHERE nivel>0 ORDER BY nivel"
+                        )]
+                    finally:
+                        conn.close()
+                    self.assertEqual(
+                        cadeias, ['["lote/benchmark.zip"]', '["lote/benchmark.zip", "bases/s5001.zip"]']
+                    )
+
+    def test_falha_da_leitura_antecipada_marca_so_a_fonte_com_erro(self):
+        nome, conteudo = gerar_corpus("pequeno")["inicial"][0]
+        abrir_original = abrir_zip_fonte
+
+        def abrir(pilha, caminho, membros=()):
+            if threading.current_thread().name == "leitura-antecipada-zip":
+                raise OSError("mídia removida")
+            return abrir_original(pilha, caminho, membros)
+
+        with tempfile.TemporaryDirectory() as temp, patch("modules.processador_zip.abrir_zip_fonte", abrir):
+            _, _, workspace = self._processar([(nome, conteudo)], {"ESOCIAL_WORKSPACES_DIR": temp})
+            conn = sqlite3.connect(workspace / "processamento.db")
+            try:
+                status = conn.execute("SELECT status FROM fontes WHERE nivel=0").fetchone()[0]
+                erros = [r[0] for r in conn.execute("SELECT erro FROM erros")]
+            finally:
+                conn.close()
+        self.assertEqual(status, "erro")
+        self.assertTrue(any("mídia removida" in erro for erro in erros), erros)
+
+
+if __name__ == "__main__":
+    unittest.main()
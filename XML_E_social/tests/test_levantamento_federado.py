@@ -0,0 +1,140 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from modules.data_source import SQLiteDataSource, WorkspaceContext
+from modules.levantamento_federado import (
+    FonteFederada,
+    consultar_levantamento_federado,
+    consultar_rubricas_federado,
+    gerar_excel_levantamento_federado,
+)
+from modules.levantamento_sqlite import FiltrosLevantamento, consultar_levantamento
+
+
+COLUNAS_MOVIMENTOS = [
+    "cod_rubr", "ide_tab_rubr", "dsc_rubr", "nat_rubr", "cod_inc_cp",
+    "status_cp", "carater_verba", "tipo_verba", "per_apur", "cpf", "vr_rubr",
+]
+
+
+def _workspace(pasta: Path, nome: str, cnpj: str, fator: float) -> Path:
+    workspace = pasta / nome
+    workspace.mkdir()
+    dados = pd.DataFrame(
+        [
+            ["100", "1", "Salário", "1000", "11", "Incide CP", "Mensal", "Remuneratória", "2026-01", "111", 100.0 * fator],
+            ["100", "1", "Salário", "1000", "11", "Incide CP", "Mensal", "Remuneratória", "2026-02", "222", 200.0 * fator],
+            ["200", "1", "Bônus", "1200", "11", "Incide CP", "Eventual", "Remuneratória", "2026-01", "111", 50.0 * fator],
+            ["200", "1", "Bônus", "1200", "11", "Incide CP", "Eventual", "Remuneratória", "2026-02", "333", -5.0],
+        ],
+        columns=COLUNAS_MOVIMENTOS,
+    )
+    conn = sqlite3.connect(workspace / "processamento.db")
+    try:
+        conn.execute("CREATE TABLE meta(chave TEXT PRIMARY KEY, valor TEXT)")
+        conn.execute("INSERT INTO meta VALUES('status','concluido')")
+        conn.execute("CREATE TABLE dados_empresa(nome_empresa TEXT,cnpj_empregador TEXT)")
+        conn.execute("INSERT INTO dados_empresa VALUES(?,?)", (f"Empresa {nome}", cnpj))
+        dados.to_sql("rel_movimentos_cp", conn, index=False)
+        conn.commit()
+    finally:
+        conn.close()
+    return workspace
+
+
+class LevantamentoFederadoTest(unittest.TestCase):
+    def _fonte(self, pasta: str) -> tuple[FonteFederada, list[Path]]:
+        base = Path(pasta)
+        caminhos = [
+            _workspace(base, "ws_a", "12345678000199", 1.0),
+            _workspace(base, "ws_b", "98765432000110", 3.0),
+        ]
+        fonte = FonteFederada.de_caminhos(caminhos + [caminhos[0], base / "inexistente"])
+        return fonte, caminhos
+
+    def test_consolidado_equivale_a_soma_dos_workspaces(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            fonte, caminhos = self._fonte(pasta)
+            self.assertEqual([w.nome for w in fonte], ["ws_a", "ws_b"])
+            self.assertEqual([w.cnpj for w in fonte], ["12.345.678/0001-99", "98.765.432/0001-10"])
+            self.assertEqual(list(fonte.ignorados), [str(Path(pasta) / "inexistente")])
+
+            filtros = FiltrosLevantamento()
+            rubricas, falhas_rubricas = consultar_rubricas_federado(fonte, filtros, max_workers=2)
+            self.assertEqual(falhas_rubricas, {})
+            self.assertEqual(sorted(rubricas["chave_federada"]), ["ws_a::100||1", "ws_a::200||1", "ws_b::100||1", "ws_b::200||1"])
+
+            resultado = consultar_levantamento_federado(
+                fonte, filtros, ["100||1", "200||1"], 20.0, limite_previa=5, contagem_exata=True
+            )
+            individuais = [
+                consultar_levantamento(
+                    SQLiteDataSource(WorkspaceContext.from_path(caminho)), filtros, ["100||1", "200||1"], 20.0,
+                    contagem_exata=True,
+                )
+                for caminho in caminhos
+            ]
+            self.assertEqual(resultado.falhas, {})
+            self.assertAlmostEqual(resultado.total, sum(r.total for r in individuais))
+            self.assertAlmostEqual(resultado.cpp, resultado.total * 0.20)
+            self.assertEqual(resultado.qtd_movimentos, 6)
+            self.assertEqual(resultado.qtd_cpfs, 4)
+            self.assertEqual(resultado.por_workspace["valor_total"].tolist(), [350.0, 1050.0])
+            self.assertEqual(len(resultado.movimentos_previa), 5)
+            self.assertEqual(resultado.movimentos_previa["workspace"].tolist(), ["ws_a"] * 3 + ["ws_b"] * 2)
+            matriz = resultado.resumo_competencia.set_index("Periodo de apuracao")
+            self.assertEqual(matriz.loc["2026-01", "12.345.678/0001-99 - Empresa ws_a"], 150.0)
+            self.assertEqual(matriz.loc["2026-02", "Total"], 800.0)
+
+            so_b = consultar_levantamento_federado(fonte, filtros, ["ws_b::200||1"], 20.0)
+            self.assertEqual(so_b.por_workspace["workspace"].tolist(), ["ws_b"])
+            self.assertAlmostEqual(so_b.total, 150.0)
+
+    def test_workspace_sem_leitura_volta_em_falhas_nas_rubricas(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            fonte, caminhos = self._fonte(pasta)
+            conn = sqlite3.connect(caminhos[1] / "processamento.db")
+            try:
+                conn.execute("DROP TABLE rel_movimentos_cp")
+                conn.commit()
+            finally:
+                conn.close()
+
+            filtros = FiltrosLevantamento()
+            rubricas, falhas = consultar_rubricas_federado(fonte, filtros)
+            self.assertEqual(sorted(rubricas["workspace"].unique()), ["ws_a"])
+            self.assertEqual(list(falhas), ["ws_b"])
+            resultado = consultar_levantamento_federado(fonte, filtros, ["100||1"], 20.0)
+            self.assertEqual(list(resultado.falhas), list(falhas))
+
+    def test_excel_consolidado_traz_movimentos_de_todos_os_workspaces(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            fonte, _ = self._fonte(pasta)
+            filtros = FiltrosLevantamento()
+            chaves = ["ws_a::100||1", "ws_b::100||1", "ws_b::200||1"]
+            resultado = consultar_levantamento_federado(fonte, filtros, chaves, 20.0)
+            destino = Path(pasta) / "saida" / "consolidado.xlsx"
+            destino.parent.mkdir()
+            gerar_excel_levantamento_federado(
+                fonte, destino, filtros, chaves, resultado,
+                pd.DataFrame([{"Indicador": "Teste", "Valor": "OK"}]), True,
+            )
+            self.assertEqual([p.name for p in destino.parent.iterdir()], ["consolidado.xlsx"])
+            workbook = load_workbook(destino, read_only=True)
+            try:
+                linhas = list(workbook["03_movimentos"].iter_rows(values_only=True))
+                self.assertIn("00_empresas", workbook.sheetnames)
+            finally:
+                workbook.close()
+            movimentos = pd.DataFrame(linhas[1:], columns=linhas[0])
+            self.assertEqual(movimentos["workspace"].tolist(), ["ws_a"] * 2 + ["ws_b"] * 3)
+            self.assertAlmostEqual(movimentos["vr_rubr"].sum(), resultado.total)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,7 @@ from modules.levantamento_sqlite import (
     gerar_excel_levantamento_sqlite,
     obter_opcoes_filtros,
 )
+from modules.sqlite_relatorio import _SQL_REL_LEVANTAMENTO_CUBO, registrar_funcoes_cubo
 
 
 COLUNAS_MOVIMENTOS = [
@@ -159,5 +160,60 @@ class LevantamentoSQLiteTest(unittest.TestCase):
             self.assertEqual(resultado.qtd_rubricas, 1_100)
 
 
+    def test_cubo_responde_igual_aos_movimentos(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            workspace, _ = self._workspace(pasta)
+            fonte = SQLiteDataSource(WorkspaceContext.from_path(workspace))
+            chaves = ["100||1", "200||1", "300||1"]
+            cenarios = [
+                FiltrosLevantamento(),
+                FiltrosLevantamento(apenas_positivos=False),
+                FiltrosLevantamento(status_cp="Incide CP", competencias=("2026-01",)),
+                FiltrosLevantamento(cod_inc_cp="Sem S-1010", apenas_positivos=False),
+            ]
+            sem_cubo = [
+                (consultar_rubricas(fonte, f), consultar_levantamento(fonte, f, chaves, 20.0))
+                for f in cenarios
+            ]
+            # sem o cubo a contagem é sempre exata, mesmo quando a estimativa é pedida
+            self.assertTrue(all(
+                consultar_levantamento(fonte, f, chaves, 20.0, contagem_exata=False).cpfs_exatos
+                for f in cenarios
+            ))
+            opcoes_sem_cubo = obter_opcoes_filtros(fonte)
+
+            conn = sqlite3.connect(workspace / "processamento.db")
+            try:
+                registrar_funcoes_cubo(conn)
+                conn.execute(
+                    "CREATE TABLE rel_levantamento_cubo AS "
+                    + _SQL_REL_LEVANTAMENTO_CUBO.format(filtro="1=1")
+                )
+                # Movimentos fora do cubo provam que os resumos não voltam à base bruta.
+                conn.execute("UPDATE rel_movimentos_cp SET vr_rubr=vr_rubr*1000")
+                conn.commit()
+            finally:
+                conn.close()
+
+            self.assertEqual(obter_opcoes_filtros(fonte), opcoes_sem_cubo)
+            for filtros, (rubricas, esperado) in zip(cenarios, sem_cubo):
+                with self.subTest(filtros=filtros):
+                    pd.testing.assert_frame_equal(consultar_rubricas(fonte, filtros), rubricas)
+                    resultado = consultar_levantamento(fonte, filtros, chaves, 20.0)
+                    self.assertAlmostEqual(resultado.total, esperado.total)
+                    self.assertEqual(resultado.qtd_movimentos, esperado.qtd_movimentos)
+                    self.assertEqual(resultado.qtd_rubricas, esperado.qtd_rubricas)
+                    self.assertEqual(resultado.qtd_cpfs, esperado.qtd_cpfs)
+                    self.assertTrue(resultado.cpfs_exatos)
+                    estimado = consultar_levantamento(fonte, filtros, chaves, 20.0, contagem_exata=False)
+                    self.assertFalse(estimado.cpfs_exatos)
+                    self.assertEqual(estimado.qtd_cpfs, esperado.qtd_cpfs)
+                    pd.testing.assert_frame_equal(resultado.resumo_rubricas, esperado.resumo_rubricas)
+                    pd.testing.assert_frame_equal(
+                        resultado.resumo_competencia_rubrica, esperado.resumo_competencia_rubrica
+                    )
+                    pd.testing.assert_frame_equal(resultado.resumo_competencia, esperado.resumo_competencia)
+
+
 if __name__ == "__main__":
     unittest.main()
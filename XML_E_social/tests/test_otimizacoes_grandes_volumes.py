@@ -5,12 +5,21 @@ import zlib
 from pathlib import Path
 from unittest.mock import patch
 
+from modules.parser_xml import RubricaPagamento
 from modules.processador_zip import (
     _adquirir_bloqueio_workspace,
+    _criar_schema,
     _liberar_bloqueio_workspace,
+    _salvar_objetos,
     _segunda_passagem,
 )
-from modules.sqlite_relatorio import _metricas_movimentos, carregar_pacote_resumido
+from modules.sqlite_relatorio import (
+    _metricas_movimentos,
+    carregar_pacote_resumido,
+    linhas_staging,
+    materializar_tabelas_analiticas,
+    salvar_staging,
+)
 
 
 class OtimizacoesGrandesVolumesTest(unittest.TestCase):
@@ -58,6 +67,36 @@ class OtimizacoesGrandesVolumesTest(unittest.TestCase):
             conn.close()
         self.assertEqual(processados, 5)
 
+    def test_staging_tipado_materializa_igual_ao_payload_legado(self):
+        def pagamento(arquivo: str, cod_inc_cp: str, dsc_rubr: str) -> RubricaPagamento:
+            return RubricaPagamento(
+                arquivo, "123", "1", "2026-01", "101", "1", "123", "L1", "100", "T",
+                150.25, "1000", cod_inc_cp, dsc_rubr, "1", "2026-01", "", "inclusao",
+                "Download principal", "s1010.xml", "exato", "S-1010", "Alta", "OK", "", "R1",
+            )
+
+        conn = sqlite3.connect(":memory:")
+        try:
+            _criar_schema(conn)
+            # Workspace anterior: blocos pickle ainda pendentes de materialização.
+            _salvar_objetos(conn, "remuneracoes", 1, [
+                pagamento("legado.xml", "11", "Salário"), pagamento("legado.xml", "00", "Ajuda de custo"),
+            ])
+            salvar_staging(conn, "remuneracoes", 2, linhas_staging("remuneracoes", [
+                pagamento("staging.xml", "11", "Salário"), pagamento("staging.xml", "00", "Ajuda de custo"),
+            ]))
+            conn.commit()
+            materializar_tabelas_analiticas(conn)
+            linhas = conn.execute("SELECT * FROM dados_remuneracoes ORDER BY arquivo, cod_inc_cp").fetchall()
+            retomada = conn.execute(
+                "SELECT valor FROM meta WHERE chave='materializado_stg_remuneracoes_ate'"
+            ).fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual([l[1:] for l in linhas[:2]], [l[1:] for l in linhas[2:]])
+        self.assertEqual(retomada, ("2",))
+
     def test_metricas_consolidadas_preservam_contagens_e_valores(self):
         conn = sqlite3.connect(":memory:")
         try:
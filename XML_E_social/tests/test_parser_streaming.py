@@ -0,0 +1,245 @@
+import os
+import random
+import sqlite3
+import unittest
+import xml.etree.ElementTree as ET
+from unittest.mock import patch
+
+from modules.parser_streaming import (
+    parse_s1200_streaming,
+    parse_s5001_streaming,
+    parse_s5011_streaming,
+)
+from modules.parser_xml import parse_s1010, parse_s1200, parse_s5001, parse_s5011
+from modules.processador_zip import (
+    _criar_schema,
+    _gravar_xml_preparado,
+    _montar_indice_rubricas,
+    _preparar_xml_ingestao,
+    _segunda_passagem,
+)
+
+
+NS_S1200 = 'xmlns="http://www.esocial.gov.br/schema/evt/evtRemun/v_S_01_03_00"'
+
+S1010 = """<eSocial><evtTabRubrica Id="ID1010"><ideEvento><iniValid>2025-01</iniValid></ideEvento>
+<ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador><infoRubrica>
+<inclusao><ideRubrica><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><iniValid>2025-01</iniValid>
+<fimValid>2025-12</fimValid></ideRubrica><dadosRubrica><dscRubr>Salário</dscRubr><natRubr>1000</natRubr>
+<tpRubr>1</tpRubr><codIncCP>11</codIncCP></dadosRubrica></inclusao>
+<inclusao><ideRubrica><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><iniValid>2026-01</iniValid>
+</ideRubrica><dadosRubrica><dscRubr>Salário base</dscRubr><natRubr>1000</natRubr><tpRubr>1</tpRubr>
+<codIncCP>11</codIncCP></dadosRubrica></inclusao>
+<inclusao><ideRubrica><codRubr>200</codRubr><ideTabRubr>T2</ideTabRubr><iniValid>2026-01</iniValid>
+</ideRubrica><dadosRubrica><dscRubr>Ajuda de custo</dscRubr><natRubr>1200</natRubr><tpRubr>1</tpRubr>
+<codIncCP>00</codIncCP></dadosRubrica></inclusao></infoRubrica></evtTabRubrica></eSocial>"""
+
+S1200_COMPLETO = f"""<retornoEventoCompleto><eSocial {NS_S1200}><evtRemun Id="ID1">
+<ideEvento><indRetif>2</indRetif><nrRecibo>REC-ANTERIOR</nrRecibo><perApur>2026-03</perApur></ideEvento>
+<ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador>
+<ideTrabalhador><cpfTrab>123.456.789-01</cpfTrab></ideTrabalhador>
+<dmDev><ideDmDev>A</ideDmDev><codCateg>101</codCateg>
+  <infoPerApur><ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc><codLotacao>L1</codLotacao>
+    <remunPerApur><matricula>M1</matricula>
+      <itensRemun><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><vrRubr>1.234,56</vrRubr></itensRemun>
+      <itensRemun><codRubr>200</codRubr><ideTabRubr>T9</ideTabRubr><vrRubr>10.5</vrRubr></itensRemun>
+      <itensRemun><codRubr>999</codRubr><vrRubr> </vrRubr></itensRemun>
+      <itensRemun><ideTabRubr>T1</ideTabRubr><vrRubr>3</vrRubr></itensRemun>
+    </remunPerApur></ideEstabLot>
+    <ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000270</nrInsc><codLotacao>L2</codLotacao>
+    <remunPerApur><itensRemun><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><vrRubr>5</vrRubr></itensRemun>
+    </remunPerApur></ideEstabLot></infoPerApur>
+  <infoPerAnt><idePeriodo><perRef>2025-06</perRef>
+    <ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc><codLotacao>L1</codLotacao>
+      <remunPerAnt><matricula>M-ANT</matricula>
+        <itensRemun><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><vrRubr>77</vrRubr></itensRemun>
+      </remunPerAnt></ideEstabLot></idePeriodo></infoPerAnt>
+</dmDev>
+<dmDev><ideDmDev>B</ideDmDev><codCateg>701</codCateg>
+  <ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc><codLotacao>L3</codLotacao>
+    <itensRemun><codRubr>100</codRubr><vrRubr>1</vrRubr></itensRemun></ideEstabLot>
+  <matricula>M-TARDIA</matricula>
+</dmDev>
+</evtRemun></eSocial><recibo><nrRecibo>REC-NOVO</nrRecibo></recibo></retornoEventoCompleto>"""
+
+S1200_SEM_RECIBO = """<eSocial><evtRemun Id="ID2"><ideEvento><indRetif>1</indRetif><perApur>2024-12</perApur>
+</ideEvento><ideTrabalhador><cpfTrab>98765432100</cpfTrab></ideTrabalhador><dmDev><codCateg>101</codCateg>
+<infoPerApur><ideEstabLot><codLotacao>L1</codLotacao><remunPerApur><matricula></matricula>
+<itensRemun><codRubr>100</codRubr><ideTabRubr>T1</ideTabRubr><vrRubr>50</vrRubr></itensRemun>
+</remunPerApur></ideEstabLot></infoPerApur></dmDev><nrProtEntr>PROT-1</nrProtEntr></evtRemun></eSocial>"""
+
+S5001 = """<eSocial><evtBasesTrab Id="ID5001"><ideEvento><perApur>2026-03</perApur></ideEvento>
+<ideEmpregador><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc></ideEmpregador>
+<ideTrabalhador><cpfTrab>123.456.789-01</cpfTrab></ideTrabalhador>
+<infoCpCalc><tpCR>108201</tpCR></infoCpCalc>
+<infoCp><ideEstabLot><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc><codLotacao>L1</codLotacao>
+  <infoCategIncid><matricula>M1</matricula><codCateg>101</codCateg>
+    <infoBaseCS><ind13>0</ind13><tpValor>11</tpValor><valor>1234,56</valor></infoBaseCS>
+    <infoBaseCS><ind13>1</ind13><tpValor>11</tpValor><valor>100</valor></infoBaseCS>
+    <infoPerRef><perRef>2025-12</perRef>
+      <detInfoPerRef><ind13>0</ind13><tpValor>11</tpValor><vrPerRef>10</vrPerRef></detInfoPerRef>
+      <detInfoPerRef><tpValor>12</tpValor><vrPerRef>5.5</vrPerRef></detInfoPerRef></infoPerRef>
+    <infoPerRef><detInfoPerRef><tpValor>11</tpValor><vrPerRef>1</vrPerRef></detInfoPerRef></infoPerRef>
+  </infoCategIncid>
+  <infoCategIncid><codCateg>701</codCateg>
+    <infoBaseCS><tpValor>11</tpValor><valor>9</valor></infoBaseCS></infoCategIncid>
+</ideEstabLot></infoCp>
+<nrRecArqBase>BASE-1</nrRecArqBase></evtBasesTrab></eSocial>"""
+
+S5001_SEM_BASE = """<eSocial><evtBasesTrab Id="ID5001B"><ideEvento><perApur>2026-04</perApur></ideEvento>
+<ideTrabalhador><cpfTrab>11122233344</cpfTrab></ideTrabalhador></evtBasesTrab></eSocial>"""
+
+S5001_RAIZ = """<evtBasesTrab><ideEvento><perApur>2026-05</perApur></ideEvento>
+<ideTrabalhador><nisTrab>1</nisTrab></ideTrabalhador><outro><cpfTrab>55566677788</cpfTrab></outro>
+</evtBasesTrab>"""
+
+S5011 = """<eSocial><evtCS Id="ID5011"><ideEvento><perApur>2026-03</perApur></ideEvento>
+<infoCS><ideEstab><tpInsc>1</tpInsc><nrInsc>12345678000199</nrInsc>
+  <infoEstab><cnaePrep>1234</cnaePrep><aliqRatAjust>2,5</aliqRatAjust></infoEstab>
+  <ideLotacao><codLotacao>L1</codLotacao><fpas>515</fpas><codTercs>0115</codTercs>
+    <basesRemun><indIncid>1</indIncid><codCateg>101</codCateg>
+      <basesCp><vrBcCp00>1000</vrBcCp00><vrBcCp15>1,5</vrBcCp15></basesCp></basesRemun>
+    <basesRemun><indIncid>2</indIncid><codCateg>701</codCateg><vrBcCp20>20</vrBcCp20></basesRemun>
+  </ideLotacao>
+  <ideLotacao><codLotacao>L2</codLotacao></ideLotacao>
+</ideEstab>
+<ideEstab><tpInsc>1</tpInsc><nrInsc>12345678000270</nrInsc><aliqRatAjust>3</aliqRatAjust>
+  <ideLotacao><codLotacao>L9</codLotacao><basesRemun><codCateg>101</codCateg>
+    <basesCp><vrBcCp25>25</vrBcCp25></basesCp></basesRemun></ideLotacao></ideEstab>
+</infoCS><nrRecArqBase>CS-1</nrRecArqBase></evtCS></eSocial>"""
+
+
+def _rubricas_map():
+    return _montar_indice_rubricas(parse_s1010(ET.fromstring(S1010), "s1010.xml"))
+
+
+def _s1200_sintetico(semente: int) -> str:
+    """Gera S-1200 com combinações aleatórias de blocos opcionais."""
+    sorteio = random.Random(semente)
+    dmdevs = []
+    for dm in range(sorteio.randint(1, 3)):
+        periodos = []
+        for tag_periodo, tag_remun in (("infoPerApur", "remunPerApur"), ("infoPerAnt", "remunPerAnt")):
+            if sorteio.random() < 0.4:
+                continue
+            estabs = []
+            for estab in range(sorteio.randint(1, 3)):
+                remuns = []
+                for _ in range(sorteio.randint(0, 2)):
+                    itens = "".join(
+                        f"<itensRemun><codRubr>{sorteio.choice(['100', '200', '300'])}</codRubr>"
+                        f"<ideTabRubr>{sorteio.choice(['T1', 'T2', ''])}</ideTabRubr>"
+                        f"<vrRubr>{sorteio.randint(1, 99999) / 100}</vrRubr></itensRemun>"
+                        for _ in range(sorteio.randint(1, 5))
+                    )
+                    matricula = f"<matricula>M{sorteio.randint(1, 9)}</matricula>" if sorteio.random() < 0.7 else ""
+                    per_ref = f"<perRef>2025-{sorteio.randint(1, 12):02d}</perRef>" if sorteio.random() < 0.3 else ""
+                    remuns.append(f"<{tag_remun}>{matricula}{per_ref}{itens}</{tag_remun}>")
+                if not remuns:
+                    remuns.append("<itensRemun><codRubr>100</codRubr><vrRubr>1</vrRubr></itensRemun>")
+                estabs.append(
+                    f"<ideEstabLot><tpInsc>1</tpInsc><nrInsc>{estab}</nrInsc>"
+                    f"<codLotacao>L{estab}</codLotacao>{''.join(remuns)}</ideEstabLot>"
+                )
+            if tag_periodo == "infoPerAnt":
+                conteudo = f"<idePeriodo><perRef>2025-0{dm + 1}</perRef>{''.join(estabs)}</idePeriodo>"
+            else:
+                conteudo = "".join(estabs)
+            periodos.append(f"<{tag_periodo}>{conteudo}</{tag_periodo}>")
+        if not periodos:
+            periodos.append(
+                "<ideEstabLot><codLotacao>LX</codLotacao><remunPerApur><itensRemun>"
+                "<codRubr>200</codRubr><vrRubr>2</vrRubr></itensRemun></remunPerApur></ideEstabLot>"
+            )
+        dmdevs.append(f"<dmDev><ideDmDev>{dm}</ideDmDev><codCateg>10{dm}</codCateg>{''.join(periodos)}</dmDev>")
+    return (
+        f"<eSocial {NS_S1200}><evtRemun Id=\"S{semente}\"><ideEvento><perApur>2026-0{semente % 9 + 1}</perApur>"
+        f"</ideEvento><ideTrabalhador><cpfTrab>{semente:011d}</cpfTrab></ideTrabalhador>"
+        f"{''.join(dmdevs)}<recibo><nrRecibo>R{semente}</nrRecibo></recibo></evtRemun></eSocial>"
+    )
+
+
+class ParserStreamingEquivalenciaTest(unittest.TestCase):
+    def assertS1200Equivalente(self, xml: str):
+        rubricas = _rubricas_map()
+        legado = parse_s1200(ET.fromstring(xml), rubricas, "a.xml")
+        v10 = parse_s1200_streaming(xml.encode(), rubricas, "a.xml")
+        self.assertEqual(v10, legado)
+        return v10
+
+    def test_s1200_com_periodos_estabelecimentos_e_envelope(self):
+        itens = self.assertS1200Equivalente(S1200_COMPLETO)
+        self.assertEqual(len(itens), 6)
+        # Regras legadas preservadas: primeiro nrRecibo do documento, perRef do
+        # período anterior e matrícula buscada em todo o dmDev.
+        self.assertEqual(itens[0].nr_recibo_evento, "REC-ANTERIOR")
+        self.assertEqual(itens[4].per_apur, "2025-06")
+        self.assertEqual(itens[-1].matricula, "M-TARDIA")
+
+    def test_s1200_sem_recibo_usa_protocolo(self):
+        itens = self.assertS1200Equivalente(S1200_SEM_RECIBO)
+        self.assertEqual(itens[0].nr_recibo_evento, "PROT-1")
+
+    def test_s1200_corpus_sintetico(self):
+        for semente in range(60):
+            with self.subTest(semente=semente):
+                self.assertS1200Equivalente(_s1200_sintetico(semente))
+
+    def test_s5001_equivale_ao_legado(self):
+        for xml in (S5001, S5001_SEM_BASE, S5001_RAIZ):
+            with self.subTest(xml=xml[:40]):
+                legado = parse_s5001(ET.fromstring(xml), "b.xml")
+                self.assertEqual(parse_s5001_streaming(xml.encode(), "b.xml"), legado)
+        self.assertEqual(len(parse_s5001_streaming(S5001.encode(), "b.xml")), 6)
+
+    def test_s5011_equivale_ao_legado(self):
+        legado = parse_s5011(ET.fromstring(S5011), "c.xml")
+        v10 = parse_s5011_streaming(S5011.encode(), "c.xml")
+        self.assertEqual(v10, legado)
+        self.assertEqual([b.aliq_rat_ajust for b in v10], [2.5, 2.5, 3.0])
+
+
+class ParserStreamingSombraTest(unittest.TestCase):
+    def _segunda_passagem(self, flags: dict) -> tuple[list, list, list]:
+        conn = sqlite3.connect(":memory:")
+        try:
+            _criar_schema(conn)
+            for nome, xml in (("s1010.xml", S1010), ("s1200.xml", S1200_COMPLETO), ("s5001.xml", S5001), ("s5011.xml", S5011)):
+                _gravar_xml_preparado(conn, _preparar_xml_ingestao(nome, xml.encode(), len(xml)))
+            conn.commit()
+            with patch.dict(os.environ, flags):
+                _segunda_passagem(conn, None, workers=0)
+            return (
+                conn.execute("SELECT * FROM stg_remuneracoes ORDER BY id").fetchall(),
+                conn.execute("SELECT * FROM stg_bases_trabalhador ORDER BY id").fetchall(),
+                conn.execute("SELECT arquivo, tipo, detalhe FROM divergencias_parser ORDER BY id").fetchall(),
+            )
+        finally:
+            conn.close()
+
+    def test_modo_sombra_grava_legado_sem_divergencias(self):
+        legado = self._segunda_passagem({})
+        sombra = self._segunda_passagem({"ESOCIAL_V10_PARSER_S1200": "sombra", "ESOCIAL_V10_PARSER_BASES": "sombra"})
+        ativo = self._segunda_passagem({"ESOCIAL_V10_PARSER_S1200": "1", "ESOCIAL_V10_PARSER_BASES": "1"})
+        self.assertEqual(sombra, legado)
+        self.assertEqual(ativo, legado)
+        self.assertEqual(legado[2], [])
+
+    def test_divergencia_em_sombra_fica_registrada_e_mantem_legado(self):
+        legado = self._segunda_passagem({})
+
+        def divergente(xml_bytes, rubricas_map, arquivo):
+            itens = parse_s1200_streaming(xml_bytes, rubricas_map, arquivo)
+            itens[0].vr_rubr += 1
+            return itens
+
+        with patch("modules.processador_zip.parse_s1200_streaming", side_effect=divergente):
+            sombra = self._segunda_passagem({"ESOCIAL_V10_PARSER_S1200": "sombra"})
+        self.assertEqual(sombra[0], legado[0])
+        self.assertEqual(len(sombra[2]), 1)
+        self.assertEqual(sombra[2][0][:2], ("s1200.xml", "S-1200"))
+        self.assertIn("vr_rubr", sombra[2][0][2])
+
+
+if __name__ == "__main__":
+    unittest.main()
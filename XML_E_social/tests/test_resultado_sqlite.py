@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.processador_zip import carregar_resultado_sqlite_existente, processar_fontes_esocial
+
+
+class ResultadoSQLiteTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": cls.temp.name}):
+            cls.resultado = processar_fontes_esocial(gerar_corpus("mini")["inicial"])
+        conn = sqlite3.connect(cls.resultado["db_path"])
+        try:
+            cls.movimentos = pd.read_sql_query("SELECT * FROM rel_movimentos_cp", conn)
+        finally:
+            conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp.cleanup()
+
+    def test_categorias_sao_lidas_apenas_quando_acessadas(self):
+        resultado = self.resultado
+        resultado.liberar()
+        self.assertFalse(resultado["modo_sqlite_seguro"])
+        self.assertIn("remuneracoes", resultado.categorias_sql)
+        self.assertFalse(resultado.materializada("remuneracoes"))
+
+        remuneracoes = resultado["remuneracoes"]
+        self.assertTrue(resultado.materializada("remuneracoes"))
+        pd.testing.assert_frame_equal(remuneracoes, self.movimentos)
+        self.assertIs(resultado.get("remuneracoes"), remuneracoes)
+
+        resultado.liberar()
+        self.assertFalse(resultado.materializada("remuneracoes"))
+
+    def test_pagina_com_projecao_sem_materializar(self):
+        resultado = self.resultado
+        resultado.liberar()
+        total = resultado.contar("remuneracoes")
+        self.assertEqual(total, len(self.movimentos))
+
+        paginas = [
+            resultado.pagina("remuneracoes", limite=10, deslocamento=inicio, colunas=["cpf", "vr_rubr"])
+            for inicio in range(0, total, 10)
+        ]
+        self.assertFalse(resultado.materializada("remuneracoes"))
+        self.assertTrue(all(list(p.columns) == ["cpf", "vr_rubr"] for p in paginas))
+        pd.testing.assert_frame_equal(
+            pd.concat(paginas, ignore_index=True), self.movimentos[["cpf", "vr_rubr"]]
+        )
+        with self.assertRaises(KeyError):
+            resultado.pagina("remuneracoes", colunas=["coluna_inexistente"])
+
+    def test_workspace_existente_preserva_interface_de_dicionario(self):
+        resultado = carregar_resultado_sqlite_existente(self.resultado["db_path"])
+        self.assertTrue(resultado["modo_sqlite_seguro"])
+        self.assertNotIn("remuneracoes", resultado.categorias_sql)
+        self.assertIs(resultado["remuneracoes"], resultado["pacote_sqlite"]["movimentos_cp"])
+        self.assertEqual(resultado.get("inexistente", "padrao"), "padrao")
+        self.assertFalse(any(resultado.materializada(c) for c in resultado.categorias_sql))
+
+        self.assertFalse(resultado["rubricas"].empty)
+        resultado["carga_incremental"] = {"id_carga": 2}
+        self.assertEqual(resultado["carga_incremental"], {"id_carga": 2})
+        self.assertIn("carga_incremental", set(resultado))
+
+
+if __name__ == "__main__":
+    unittest.main()
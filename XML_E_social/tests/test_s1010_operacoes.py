@@ -1,7 +1,9 @@
+import pickle
+import random
 import xml.etree.ElementTree as ET
 import unittest
 
-from modules.parser_xml import parse_s1010, selecionar_rubrica_vigente
+from modules.parser_xml import IndiceRubricas, RubricaInfo, parse_s1010, selecionar_rubrica_vigente
 from modules.processador_zip import _montar_indice_rubricas
 
 
@@ -51,5 +53,59 @@ class OperacoesS1010Test(unittest.TestCase):
         self.assertEqual(selecao.status_auditoria, "SEM_S1010")
 
 
+class IndiceRubricasTest(unittest.TestCase):
+    def _versoes(self, semente: int) -> list[RubricaInfo]:
+        sorteio = random.Random(semente)
+        competencias = ["", "2024-01", "2024-07", "2025-01", "2025-06", "12/2025", "2026-01"]
+        versoes = []
+        for _ in range(sorteio.randint(5, 40)):
+            versoes.append(RubricaInfo(
+                cod_rubr=sorteio.choice(["1", "2", "3", "4"]),
+                ide_tab_rubr=sorteio.choice(["A", "B", ""]),
+                dsc_rubr=f"Rubrica {sorteio.randint(1, 3)}",
+                nat_rubr="1000",
+                cod_inc_cp=sorteio.choice(["11", "11", "00", ""]),
+                cod_inc_fgts="",
+                cod_inc_irrf="",
+                tp_rubr="1",
+                origem_bloco=sorteio.choice(["inclusao", "alteracao", "nova_validade"]),
+                ini_valid=sorteio.choice(competencias),
+                fim_valid=sorteio.choice(competencias),
+                fonte_dados=sorteio.choice(["Download principal", "Recibo S-1010"]),
+            ))
+        return versoes
+
+    def test_indice_compilado_equivale_a_selecao_linear(self):
+        consultas = ["", "2023-12", "2024-01", "2024-03", "2024-07", "2025-06", "06/2025", "2025-12", "2027-01"]
+        for semente in range(40):
+            indice = _montar_indice_rubricas(self._versoes(semente))
+            linear = {chave: list(versoes) for chave, versoes in indice.items()}
+            for cod in ("1", "2", "3", "4", "9"):
+                for tab in ("A", "B", "", " A "):
+                    for competencia in consultas:
+                        with self.subTest(semente=semente, cod=cod, tab=tab, competencia=competencia):
+                            self.assertEqual(
+                                selecionar_rubrica_vigente(indice, cod, tab, competencia),
+                                selecionar_rubrica_vigente(linear, cod, tab, competencia),
+                            )
+
+    def test_selecao_memorizada_e_indice_serializavel_para_workers(self):
+        rubricas = parse_s1010(
+            ET.fromstring(evento_s1010("inclusao", "2025-10", "11")), arquivo="a.xml"
+        )
+        indice = _montar_indice_rubricas(rubricas)
+        primeira = selecionar_rubrica_vigente(indice, "273", "0001", "2025-11")
+        self.assertIs(selecionar_rubrica_vigente(indice, " 273", "0001", "2025-11-01"), primeira)
+        self.assertTrue(indice.historico_compativel("273"))
+
+        copia = pickle.loads(pickle.dumps(indice))
+        self.assertIsInstance(copia, IndiceRubricas)
+        self.assertEqual(dict(copia), dict(indice))
+        self.assertEqual(copia.selecionar("273", "0001", "2025-11"), primeira)
+
+        indice.clear()
+        self.assertEqual(indice.selecionar("273", "0001", "2025-11").status_auditoria, "SEM_S1010")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.benchmark_pipeline import gerar_corpus
+from modules.processador_zip import processar_fontes_esocial
+from modules.sqlite_relatorio import gerar_pacote_colunar_sqlite
+from modules.telemetria import PERFIL_ETAPAS_ENV, memoria_processo_bytes, perfil_etapa
+
+
+class TelemetriaEtapasTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp.cleanup)
+
+    def _processar(self, **env):
+        corpus = gerar_corpus("mini")
+        with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": self.temp.name, **env}):
+            return processar_fontes_esocial(corpus["inicial"]), corpus
+
+    def _telemetria(self, db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            metricas = dict(conn.execute("SELECT chave, valor FROM telemetria"))
+            etapas = {
+                tipo: (quantidade, tempo)
+                for tipo, quantidade, tempo in conn.execute(
+                    "SELECT tipo, quantidade, tempo_segundos FROM telemetria_eventos WHERE tipo LIKE 'etapa:%'"
+                )
+            }
+        finally:
+            conn.close()
+        return metricas, etapas
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "sem /proc")
+    def test_memoria_no_linux_vem_do_proc(self):
+        atual, pico = memoria_processo_bytes()
+        self.assertGreater(atual, 0)
+        self.assertGreaterEqual(pico, atual)
+
+    def test_etapas_do_pipeline_persistidas(self):
+        resultado, corpus = self._processar()
+        metricas, etapas = self._telemetria(resultado["db_path"])
+        self.assertEqual(
+            set(etapas),
+            {"etapa:ingestao", "etapa:segunda_passagem", "etapa:consolidacao", "etapa:resumo"},
+        )
+        self.assertEqual(etapas["etapa:ingestao"][0], corpus["xml_inicial"])
+        self.assertGreater(etapas["etapa:segunda_passagem"][0], 0)
+        for etapa in ("ingestao", "segunda_passagem", "consolidacao"):
+            self.assertGreater(float(metricas[f"etapa_{etapa}_parede_segundos"]), 0)
+            self.assertGreater(float(metricas[f"etapa_{etapa}_linhas_por_segundo"]), 0)
+            self.assertIn(f"etapa_{etapa}_memoria_pico_bytes", metricas)
+        self.assertNotIn("etapa_ingestao_arquivo_perfil", metricas)
+        self.assertFalse((Path(resultado["workspace_temporario"]) / "perfis").exists())
+
+        # Exportar não altera o workspace (mtime do catálogo) salvo com o perfil ativo.
+        mtime = os.stat(resultado["db_path"]).st_mtime_ns
+        with tempfile.TemporaryDirectory() as pasta:
+            gerar_pacote_colunar_sqlite(resultado["db_path"], pasta, formato="csv")
+        self.assertEqual(os.stat(resultado["db_path"]).st_mtime_ns, mtime)
+        self.assertNotIn("etapa:exportacao_colunar", self._telemetria(resultado["db_path"])[1])
+        with tempfile.TemporaryDirectory() as pasta, patch.dict(os.environ, {PERFIL_ETAPAS_ENV: "1"}):
+            gerar_pacote_colunar_sqlite(resultado["db_path"], pasta, formato="csv")
+        metricas, etapas = self._telemetria(resultado["db_path"])
+        self.assertIn("etapa:exportacao_colunar", etapas)
+        self.assertGreater(float(metricas["etapa_exportacao_colunar_bytes_por_segundo"]), 0)
+
+    def test_cprofile_opcional_por_variavel_de_ambiente(self):
+        resultado, _ = self._processar(**{PERFIL_ETAPAS_ENV: "cprofile"})
+        metricas, _ = self._telemetria(resultado["db_path"])
+        perfis = Path(resultado["workspace_temporario"]) / "perfis"
+        self.assertTrue(Path(metricas["etapa_ingestao_arquivo_perfil"]).exists())
+        self.assertTrue(list(perfis.glob("consolidacao_*.txt")))
+
+    def test_etapa_com_falha_nao_grava(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE telemetria(chave TEXT PRIMARY KEY, valor TEXT, unidade TEXT, atualizado_em REAL)")
+        with self.assertRaises(ZeroDivisionError):
+            with perfil_etapa("falha", conn):
+                1 / 0
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM telemetria").fetchone()[0], 0)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@ import tempfile
 import unittest
 from pathlib import Path
 
-from modules.processador_zip import _criar_schema, _processar_xml_ingestao
+from modules.processador_zip import ContadoresIngestao, _criar_schema, _processar_xml_ingestao
 from modules.telemetria import TelemetriaCarga
 
 
@@ -38,6 +38,33 @@ class PacotesV10Test(unittest.TestCase):
         self.assertEqual(_processar_xml_ingestao(self.conn, "b.xml", XML, len(XML)), "duplicado")
         self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0], 1)
 
+    def test_contagens_ficam_em_memoria_ate_o_checkpoint(self):
+        self.conn.execute(
+            "INSERT INTO historico_cargas(id_carga,workspace_id,data_inicio) VALUES(7,'teste',0)"
+        )
+        contadores = ContadoresIngestao.carregar(self.conn, 7)
+        comandos = []
+        self.conn.set_trace_callback(comandos.append)
+        for indice, periodo in enumerate(("2026-03", "2025-11", "2026-01")):
+            xml = XML.replace(b"ID1", f"ID{indice + 10}".encode()).replace(b"2026-01", periodo.encode())
+            _processar_xml_ingestao(self.conn, f"{indice}.xml", xml, len(xml), 7, contadores=contadores)
+        _processar_xml_ingestao(self.conn, "dup.xml", XML.replace(b"ID1", b"ID10").replace(b"2026-01", b"2026-03"),
+                                len(XML), 7, contadores=contadores)
+        self.conn.set_trace_callback(None)
+        self.assertFalse([c for c in comandos if "contagem_eventos" in c or "historico_cargas" in c])
+        self.assertEqual(contadores.total_eventos, 3)
+
+        contadores.descarregar(self.conn)
+        self.assertEqual(
+            self.conn.execute(
+                "SELECT quantidade_xml_localizados,quantidade_xml_novos,quantidade_duplicados,"
+                "periodo_minimo_adicionado,periodo_maximo_adicionado FROM historico_cargas WHERE id_carga=7"
+            ).fetchone(),
+            (4, 3, 1, "2025-11", "2026-03"),
+        )
+        self.assertEqual(self.conn.execute("SELECT quantidade FROM contagem_eventos WHERE tipo='S-1200'").fetchone()[0], 3)
+        self.assertEqual(ContadoresIngestao.carregar(self.conn).total_eventos, 3)
+
     def test_schema_e_telemetria_local(self):
         telemetria = TelemetriaCarga()
         _processar_xml_ingestao(self.conn, "a.xml", XML, len(XML), telemetria=telemetria)
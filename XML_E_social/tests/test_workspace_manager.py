@@ -1,4 +1,5 @@
 import os
+import shutil
 import sqlite3
 import tempfile
 import unittest
@@ -8,7 +9,10 @@ from unittest.mock import patch
 import pandas as pd
 
 from modules.workspace_manager import (
+    ARQUIVO_CATALOGO,
     abrir_workspace,
+    atualizar_catalogo_em_segundo_plano,
+    atualizar_catalogo_workspace,
     enviar_workspace_para_lixeira,
     formatar_tamanho,
     listar_workspaces_disponiveis,
@@ -122,6 +126,73 @@ class WorkspaceManagerTest(unittest.TestCase):
             (Path(pasta) / "pasta_qualquer").mkdir()
             self.assertEqual(listar_workspaces_disponiveis(pasta), [])
 
+    def _marcar_status(self, workspace: Path, status: str) -> None:
+        conn = sqlite3.connect(workspace / "processamento.db")
+        try:
+            conn.execute("UPDATE meta SET valor=? WHERE chave='status'", (status,))
+            conn.execute("CREATE TABLE IF NOT EXISTS alteracao(x)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_catalogo_persistente_so_reabre_workspace_alterado(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            workspace = self._criar_workspace(pasta, status="interrompido")
+            self.assertEqual(listar_workspaces_disponiveis(pasta)[0].status, "Interrompido")
+            self.assertTrue((Path(pasta) / ARQUIVO_CATALOGO).is_file())
+
+            with patch("modules.workspace_manager._catalogar_workspace") as catalogar:
+                self.assertEqual(listar_workspaces_disponiveis(pasta)[0].status, "Interrompido")
+            catalogar.assert_not_called()
+
+            self._marcar_status(workspace, "concluido")
+            self.assertEqual(listar_workspaces_disponiveis(pasta)[0].status, "Concluído")
+
+            (workspace / "processamento.db").unlink()
+            self.assertEqual(listar_workspaces_disponiveis(pasta), [])
+            self.assertNotIn(workspace.name, (Path(pasta) / ARQUIVO_CATALOGO).read_text(encoding="utf-8"))
+
+    def test_revalidacao_em_segundo_plano_devolve_versao_anterior(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            workspace = self._criar_workspace(pasta, status="processando")
+            atualizar_catalogo_workspace(workspace)
+            self._marcar_status(workspace, "concluido")
+
+            with patch("modules.workspace_manager.atualizar_catalogo_em_segundo_plano") as atualizar:
+                itens = listar_workspaces_disponiveis(pasta, segundo_plano=True)
+            self.assertEqual(itens[0].status, "Em processamento")
+            atualizar.assert_called_once()
+            base, pendentes = atualizar.call_args.args
+            self.assertEqual([caminho.name for caminho, _ in pendentes], [workspace.name])
+
+            atualizar_catalogo_em_segundo_plano(base, pendentes).join(timeout=10)
+            with patch("modules.workspace_manager._catalogar_workspace") as catalogar:
+                self.assertEqual(listar_workspaces_disponiveis(pasta, segundo_plano=True)[0].status, "Concluído")
+            catalogar.assert_not_called()
+
+    def test_segundo_plano_grava_novas_e_obsoletas_na_chamada(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            workspace = self._criar_workspace(pasta, status="processando")
+            removido = shutil.copytree(workspace, Path(pasta) / "esocial_v3_removido")
+            listar_workspaces_disponiveis(pasta)
+            shutil.rmtree(removido)
+            novo = shutil.copytree(workspace, Path(pasta) / "esocial_v3_novo")
+            self._marcar_status(workspace, "concluido")
+
+            with patch("modules.workspace_manager.atualizar_catalogo_em_segundo_plano") as atualizar:
+                itens = listar_workspaces_disponiveis(pasta, segundo_plano=True)
+            self.assertEqual(len(itens), 2)
+            atualizar.assert_called_once()
+            catalogo = (Path(pasta) / ARQUIVO_CATALOGO).read_text(encoding="utf-8")
+            self.assertIn(novo.name, catalogo)
+            self.assertNotIn(removido.name, catalogo)
+
+            with patch("modules.workspace_manager._catalogar_workspace") as catalogar, patch(
+                "modules.workspace_manager.atualizar_catalogo_em_segundo_plano"
+            ):
+                self.assertEqual(len(listar_workspaces_disponiveis(pasta, segundo_plano=True)), 2)
+            catalogar.assert_not_called()
+
     def test_pasta_padrao_respeita_configuracao(self):
         with tempfile.TemporaryDirectory() as pasta:
             with patch.dict(os.environ, {"ESOCIAL_WORKSPACES_DIR": pasta}):